@@ -12,6 +12,7 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
+import json
 import os
 import platform
 import subprocess
@@ -87,6 +88,43 @@ save_edit_options = [
     url_option]
 
 
+# Common options for the updates query and export commands
+query_options = [
+    click.option('--updateid', help='Query by update ID (eg: FEDORA-2015-0001)'),
+    click.option('--approved-since', help='Approved after a specific timestamp'),
+    click.option('--modified-since', help='Modified after a specific timestamp'),
+    click.option('--builds', help='Query updates based on builds'),
+    click.option('--bugs', help='A list of bug numbers'),
+    click.option('--critpath', is_flag=True, default=None,
+                 help='Query only critical path packages'),
+    click.option('--cves', help='Query by CVE id'),
+    click.option('--packages', help='Query by package name(s)'),
+    click.option('--content-type', help='Query updates based on content type',
+                 type=click.Choice(['rpm', 'module'])),  # And someday, container.
+    click.option('--pushed', is_flag=True, default=None,
+                 help='Filter by pushed updates'),
+    click.option('--pushed-since',
+                 help='Updates that have been pushed after a certain time'),
+    click.option('--releases', help='Updates for specific releases'),
+    click.option('--locked', help='Updates that are in a locked state'),
+    click.option('--request', help='Updates with a specific request',
+                 type=click.Choice(['testing', 'stable', 'unpush', 'batched'])),
+    click.option('--submitted-since',
+                 help='Updates that have been submitted since a certain time'),
+    click.option('--status', help='Filter by update status',
+                 type=click.Choice(['pending', 'testing', 'stable', 'obsolete',
+                                    'unpushed', 'processing'])),
+    click.option('--suggest', help='Filter by post-update user suggestion',
+                 type=click.Choice(['logout', 'reboot'])),
+    click.option('--type', default=None, help='Filter by update type',
+                 type=click.Choice(['newpackage', 'security', 'bugfix', 'enhancement'])),
+    click.option('--user', help='Updates submitted by a specific user'),
+    click.option('--mine', is_flag=True, help='Show only your updates'),
+    click.option('--staging', help='Use the staging bodhi instance',
+                 is_flag=True, default=False),
+    url_option]
+
+
 def add_options(options):
     """ Given a list of click options this creates a decorator that
     will return a function used to add the options to a click command.
@@ -275,39 +313,7 @@ def edit(user, password, url, **kwargs):
 
 
 @updates.command()
-@click.option('--updateid', help='Query by update ID (eg: FEDORA-2015-0001)')
-@click.option('--approved-since', help='Approved after a specific timestamp')
-@click.option('--modified-since', help='Modified after a specific timestamp')
-@click.option('--builds', help='Query updates based on builds')
-@click.option('--bugs', help='A list of bug numbers')
-@click.option('--critpath', is_flag=True, default=None,
-              help='Query only critical path packages')
-@click.option('--cves', help='Query by CVE id')
-@click.option('--packages', help='Query by package name(s)')
-@click.option('--content-type', help='Query updates based on content type',
-              type=click.Choice(['rpm', 'module']))  # And someday, container.
-@click.option('--pushed', is_flag=True, default=None,
-              help='Filter by pushed updates')
-@click.option('--pushed-since',
-              help='Updates that have been pushed after a certain time')
-@click.option('--releases', help='Updates for specific releases')
-@click.option('--locked', help='Updates that are in a locked state')
-@click.option('--request', help='Updates with a specific request',
-              type=click.Choice(['testing', 'stable', 'unpush', 'batched']))
-@click.option('--submitted-since',
-              help='Updates that have been submitted since a certain time')
-@click.option('--status', help='Filter by update status',
-              type=click.Choice(['pending', 'testing', 'stable', 'obsolete',
-                                 'unpushed', 'processing']))
-@click.option('--suggest', help='Filter by post-update user suggestion',
-              type=click.Choice(['logout', 'reboot']))
-@click.option('--type', default=None, help='Filter by update type',
-              type=click.Choice(['newpackage', 'security', 'bugfix', 'enhancement']))
-@click.option('--user', help='Updates submitted by a specific user')
-@click.option('--mine', is_flag=True, help='Show only your updates')
-@click.option('--staging', help='Use the staging bodhi instance',
-              is_flag=True, default=False)
-@url_option
+@add_options(query_options)
 @handle_errors
 def query(url, mine=False, **kwargs):
     # User Docs that show in the --help
@@ -327,15 +333,52 @@ def query(url, mine=False, **kwargs):
     """
     client = bindings.BodhiClient(base_url=url, staging=kwargs['staging'])
     if mine:
-        if 'USERNAME' in os.environ:
-            kwargs['user'] = os.environ['USERNAME']
-        else:
-            client.init_username()
-            kwargs['user'] = client.username
+        _set_mine(client, kwargs)
     resp = client.query(**kwargs)
     print_resp(resp, client)
 
 
+@updates.command()
+@add_options(query_options)
+@handle_errors
+def export(url, mine=False, **kwargs):
+    # User Docs that show in the --help
+    """
+    Export all the updates matching a query as JSON, one update per line
+    """
+
+    # Developer Docs
+    """
+    Write the JSON of all the updates matching the flags to stdout, one update per line.
+
+    Args:
+        url (unicode): The URL of a Bodhi server to export the updates of. Ignored if staging is
+                       True.
+        mine (Boolean): If the --mine flag was set
+        kwargs (dict): Other keyword arguments passed to us by click.
+    """
+    client = bindings.BodhiClient(base_url=url, staging=kwargs['staging'])
+    if mine:
+        _set_mine(client, kwargs)
+    for update in client.export(**kwargs):
+        click.echo(json.dumps(update))
+
+
+def _set_mine(client, kwargs):
+    """
+    Restrict the query to the updates of the current user.
+
+    Args:
+        client (bindings.BodhiClient): The client of the Bodhi server.
+        kwargs (dict): The keyword arguments of the query, whose user is set.
+    """
+    if 'USERNAME' in os.environ:
+        kwargs['user'] = os.environ['USERNAME']
+    else:
+        client.init_username()
+        kwargs['user'] = client.username
+
+
 @updates.command()
 @click.argument('update')
 @click.argument('state')
@@ -456,31 +499,41 @@ def download(url, **kwargs):
         click.echo("ERROR: must specify at least one of --cves, --updateid, --builds")
         sys.exit(1)
 
-    # As the query method doesn't let us construct OR queries, we're
-    # gonna run one query for each option that was passed. The syntax
-    # for this is a bit ugly, sorry.
-    for (attr, value) in kwargs.items():
-        if value:
-            expecteds = len(value.split(','))
-            resp = client.query(**{attr: value})
-            if len(resp.updates) == 0:
-                click.echo("WARNING: No {0} found!".format(attr))
-            elif len(resp.updates) < expecteds:
-                click.echo("WARNING: Some {0} not found!".format(attr))
-            # Not sure if we need a check for > expecteds, I don't
-            # *think* that should ever be possible for these opts.
-
-            for update in resp.updates:
-                click.echo("Downloading packages from {0}".format(update['title']))
-                for build in update['builds']:
-                    # subprocess is icky, but koji module doesn't
-                    # expose this in any usable way, and we don't want
-                    # to rewrite it here.
-                    args = ('koji', 'download-build', '--arch=noarch',
-                            '--arch={0}'.format(platform.machine()), build['nvr'])
-                    ret = subprocess.call(args)
-                    if ret:
-                        click.echo("WARNING: download of {0} failed!".format(build['nvr']))
+    # Updates and builds are looked up together in one request, but the CVEs
+    # still need a query of their own.
+    updates = []
+    ids = [i.strip() for attr in ('updateid', 'builds') if kwargs[attr]
+           for i in kwargs[attr].split(',') if i.strip()]
+    if ids:
+        resp = client.get_updates(ids)
+        for id in resp.not_found:
+            click.echo("WARNING: {0} not found!".format(id))
+        updates.extend(resp.updates[id] for id in ids if id in resp.updates)
+    if kwargs['cves']:
+        expecteds = len(kwargs['cves'].split(','))
+        resp = client.query(cves=kwargs['cves'])
+        if len(resp.updates) == 0:
+            click.echo("WARNING: No cves found!")
+        elif len(resp.updates) < expecteds:
+            click.echo("WARNING: Some cves not found!")
+        updates.extend(resp.updates)
+
+    downloaded = set()
+    for update in updates:
+        # An update may have been asked for more than once, by its ID and its builds.
+        if update['title'] in downloaded:
+            continue
+        downloaded.add(update['title'])
+        click.echo("Downloading packages from {0}".format(update['title']))
+        for build in update['builds']:
+            # subprocess is icky, but koji module doesn't
+            # expose this in any usable way, and we don't want
+            # to rewrite it here.
+            args = ('koji', 'download-build', '--arch=noarch',
+                    '--arch={0}'.format(platform.machine()), build['nvr'])
+            ret = subprocess.call(args)
+            if ret:
+                click.echo("WARNING: download of {0} failed!".format(build['nvr']))
 
 
 def _get_notes(**kwargs):
@@ -262,8 +262,55 @@ class BodhiClient(OpenIdBaseClient):
         :kwarg rows_per_page: Limit the results to a certain number of rows per
                     page (min:1 max: 100 default: 20)
         :kwarg page: Return a specific page of results
+        :kwarg cursor: Return the page after the one whose ``next_cursor`` this is
+        :kwarg count: False to skip counting the total number of results
 
         """
+        return self.send_request('updates/', verb='GET', params=self._query_params(kwargs))
+
+    @errorhandled
+    def get_updates(self, ids, **params):
+        """ Look up many updates at once by their titles, aliases or build NVRs.
+
+        :arg ids: A list of update titles, update aliases or build NVRs.
+        :kwarg fields: The fields of the updates to return.
+
+        Returns a Munch with the ``updates`` found, keyed by the identifiers
+        they were found by, and the identifiers that were ``not_found``.
+        """
+        return self.send_request('updates/bulk', verb='POST', params=params,
+                                 data={'ids': ' '.join(ids)})
+
+    def query_all(self, **kwargs):
+        """ Yield all the updates matching a query, following the cursors of its pages.
+
+        This accepts the same arguments as :meth:`query`, except ``page``.
+        """
+        return self.paginate('updates/', 'updates', **self._query_params(kwargs))
+
+    def export(self, **kwargs):
+        """ Yield all the updates matching a query, streamed by the export endpoint.
+
+        The server streams the updates as it reads them and they are yielded
+        as they arrive, so this is the cheapest way to get a large number of
+        updates. This accepts the same arguments as :meth:`query`, except those
+        of pagination.
+
+        :raises BodhiClientException: If the server refuses the query.
+        """
+        response = self._session.get(
+            self.base_url + 'updates/export', params=self._query_params(kwargs), stream=True,
+            timeout=self.timeout)
+        if response.status_code == 400:
+            raise BodhiClientException(
+                "\n".join([e['description'] for e in response.json()['errors']]))
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+
+    def _query_params(self, kwargs):
+        """ Return the query parameters of the updates endpoint for the arguments of query(). """
         # bodhi1 compat
         if 'limit' in kwargs:
             kwargs['rows_per_page'] = kwargs['limit']
@@ -294,7 +341,32 @@ class BodhiClient(OpenIdBaseClient):
         # checks for 'if bugs is not None', not 'if not bugs'
         if 'bugs' in kwargs and kwargs['bugs'] == '':
             kwargs['bugs'] = None
-        return self.send_request('updates/', verb='GET', params=kwargs)
+        return kwargs
+
+    def paginate(self, path, key, **params):
+        """ Yield all the results of a list endpoint, following the cursors of its pages.
+
+        The total number of results isn't counted, and each page is only
+        requested once the results of the previous one have been consumed.
+
+        :arg path: The path of the endpoint, e.g. ``updates/``.
+        :arg key: The key of the results in the responses, e.g. ``updates``.
+        :kwarg params: The query parameters of the endpoint.
+        """
+        params = dict(params, count=False)
+        params.pop('page', None)
+        while True:
+            response = self._get_page(path, params)
+            for result in response[key]:
+                yield result
+            if not response.get('next_cursor'):
+                break
+            params = dict(params, cursor=response['next_cursor'])
+
+    @errorhandled
+    def _get_page(self, path, params):
+        """ Return the response of a list endpoint for the given query parameters. """
+        return self.send_request(path, verb='GET', params=params)
 
     @errorhandled
     def comment(self, update, comment, karma=0, email=None):
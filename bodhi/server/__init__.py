@@ -21,11 +21,11 @@ from collections import defaultdict
 import logging
 
 from cornice.validators import DEFAULT_FILTERS
-from dogpile.cache import make_region
 from munch import munchify
 from pyramid.authentication import AuthTktAuthenticationPolicy
 from pyramid.authorization import ACLAuthorizationPolicy
 from pyramid.config import Configurator
+from pyramid.events import NewRequest
 from pyramid.exceptions import HTTPForbidden
 from pyramid.renderers import JSONP
 from sqlalchemy import engine_from_config, event
@@ -82,26 +82,13 @@ def get_db_session_for_request(request=None):
     return session
 
 
-def get_cacheregion(request):
-    """
-    Return a CacheRegion to be used to cache results.
-
-    Args:
-        request (pyramid.request.Request): The current web request. Unused.
-    Returns:
-        dogpile.cache.region.CacheRegion: A configured CacheRegion.
-    """
-    region = make_region()
-    region.configure_from_config(bodhi_config, "dogpile.cache.")
-    return region
-
-
 def get_user(request):
     """
     Return a Munch describing the User or None.
 
     A Munch is only returned if the request has a truthy value in its unauthenticated_userid
-    attribute.
+    attribute. It is built from the user's cached identity (see
+    :func:`bodhi.server.security.get_identity`), so it doesn't query the database once cached.
 
     Args:
         request (pyramid.request.Request): The current web request.
@@ -109,12 +96,19 @@ def get_user(request):
         munch.Munch or None: A Munch object describing the unauthenticated user, or None if there is
             no user for the Request.
     """
-    from bodhi.server.models import User
+    from bodhi.server.security import get_identity
+    from bodhi.server.util import avatar
     userid = request.unauthenticated_userid
     if userid is not None:
-        user = request.db.query(User).filter_by(name=unicode(userid)).first()
+        identity = get_identity(request.db, unicode(userid))
+        if identity is None:
+            return None
+        user = dict(identity, groups=[{'name': group} for group in identity['groups']])
+        user['avatar'] = avatar(context=dict(request=request), username=user['name'], size=24)
+        user['openid'] = request.registry.settings.get('openid_template').format(
+            username=user['name'])
         # Why munch?  https://github.com/fedora-infra/bodhi/issues/473
-        return munchify(user.__json__(request=request))
+        return munchify(user)
 
 
 def groupfinder(userid, request):
@@ -132,22 +126,47 @@ def groupfinder(userid, request):
     Returns:
         list or None: A list of the user's groups, or None if the user is not authenticated.
     """
-    from bodhi.server.models import User
     if request.user:
-        user = User.get(request.user.name, request.db)
-        return ['group:' + group.name for group in user.groups]
+        return ['group:' + group.name for group in request.user.groups]
 
 
 def get_koji(request):
     """
     Return a Koji client, or a duck-type of a Koji client, depending on config.
 
+    The read-only calls of a real Koji client are cached for the duration of the request.
+
     Args:
         request (pyramid.request.Request): The current web request. Unused.
     Returns:
-        koji.ClientSession or DevBuildSys: A Koji client, or a dev Koji mock.
+        bodhi.server.buildsys.CachedSession or DevBuildSys: A Koji client, or a dev Koji mock.
+    """
+    return buildsys.get_cached_session(per_request=True)
+
+
+def release_koji_sessions(request):
+    """
+    Return the Koji sessions leased while handling the request to the session pool.
+
+    This is a post-request hook.
+
+    Args:
+        request (pyramid.request.Request): The current web request. Unused.
+    """
+    buildsys.release_session()
+
+
+def add_koji_release_callback(event):
+    """
+    Make sure Koji sessions leased by the request's thread are released when it is finished.
+
+    Koji sessions can be leased by request.koji as well as by the models, so this is done for
+    every request.
+
+    Args:
+        event (pyramid.events.NewRequest): The event for the new request.
     """
-    return buildsys.get_session()
+    event.request.add_finished_callback(release_koji_sessions)
 
 
 def get_buildinfo(request):
@@ -229,6 +248,9 @@ def initialize_db(config):
             lambda db_con, con_record: db_con.execute('PRAGMA foreign_keys=ON')
         )
     Session.configure(bind=engine)
+    # These modules keep the cache generations and update statistics up to date with the flushes
+    # of the Session, so they need to be imported by every process that writes to the database.
+    from bodhi.server import pagination, stats  # noqa: F401
     return engine
 
 
@@ -255,6 +277,7 @@ def main(global_config, testing=None, session=None, **settings):
 
     # Sessions & Caching
     from pyramid.session import SignedCookieSessionFactory
+    from bodhi.server import caches
     session_factory = SignedCookieSessionFactory(bodhi_config['session.secret'])
 
     # Construct a list of all groups we're interested in
@@ -273,6 +296,7 @@ def main(global_config, testing=None, session=None, **settings):
 
     # Initialize the database scoped session
     initialize_db(bodhi_config)
+    caches.configure_regions(bodhi_config)
 
     # Lazy-loaded memoized request properties
     if session:
@@ -284,9 +308,9 @@ def main(global_config, testing=None, session=None, **settings):
 
     config.add_request_method(get_user, 'user', reify=True)
     config.add_request_method(get_koji, 'koji', reify=True)
-    config.add_request_method(get_cacheregion, 'cache', reify=True)
     config.add_request_method(get_buildinfo, 'buildinfo', reify=True)
     config.add_request_method(get_releases, 'releases', reify=True)
+    config.add_subscriber(add_koji_release_callback, NewRequest)
 
     # Templating
     config.add_mako_renderer('.html', settings_prefix='mako.')
@@ -12,18 +12,29 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 
-from threading import Lock
+from collections import OrderedDict, defaultdict
+from threading import Condition, Lock, RLock, local
+import copy
+import hashlib
+import itertools
 import logging
+import random
 import time
-from functools import wraps
+from functools import partial, wraps
 
 import koji
 
+from bodhi.server.exceptions import KojiTaskTimeoutException
+
 
 log = logging.getLogger('bodhi')
 _buildsystem = None
 # URL of the koji hub
 _koji_hub = None
+# The KojiSessionPool used when talking to a real Koji
+_session_pool = None
+# The process-wide KojiCache used when talking to a real Koji
+_koji_cache = None
 
 
 def multicall_enabled(func):
@@ -73,6 +84,9 @@ class Buildsystem(object):
     def taskFinished(self, *args, **kw):
         raise NotImplementedError
 
+    def getTaskInfo(self, *args, **kw):
+        raise NotImplementedError
+
     def tagBuild(self, *args, **kw):
         raise NotImplementedError
 
@@ -140,6 +154,7 @@ class DevBuildsys(Buildsystem):
     def taskFinished(self, task):
         return True
 
+    @multicall_enabled
     def getTaskInfo(self, task):
         return {'state': koji.TASK_STATES['CLOSED']}
 
@@ -260,6 +275,7 @@ class DevBuildsys(Buildsystem):
         rpms += DevBuildsys.__rpms__
         return rpms
 
+    @multicall_enabled
     def listTags(self, build, *args, **kw):
         if 'el5' in build:
             result = [
@@ -311,6 +327,7 @@ class DevBuildsys(Buildsystem):
         log.debug(builds)
         return builds
 
+    @multicall_enabled
     def getLatestBuilds(self, *args, **kw):
         return [self.getBuild()]
 
@@ -329,6 +346,7 @@ class DevBuildsys(Buildsystem):
                 'perm': None, 'id': 246, 'arches': None,
                 'maven_include_all': False, 'perm_id': None}
 
+    @multicall_enabled
     def getRPMHeaders(self, rpmID, headers):
         if rpmID == 'raise-exception.src':
             raise Exception
@@ -374,6 +392,915 @@ class DevBuildsys(Buildsystem):
             }
 
 
+class KojiSimulator(object):
+    """
+    A stateful, in-memory model of Koji, used to benchmark Bodhi without a real Koji.
+
+    Unlike DevBuildsys, which answers with canned data, the simulator keeps track of tags,
+    builds, RPMs and tasks, so that builds tagged by one call show up in the results of the next.
+    Sessions are created by calling the simulator and support multicalls the way
+    ``koji.ClientSession`` does: successful calls are returned as one element lists and failed
+    ones as fault dictionaries.
+
+    Every round trip to the simulated hub, which is a single call or a whole multicall, sleeps for
+    ``latency`` seconds, and each call fails with a ``koji.GenericError`` with a probability of
+    ``failure_rate``. Tasks stay open for ``task_duration`` seconds. The number of calls to each
+    method and the number of round trips are counted in :attr:`calls` and :attr:`round_trips`.
+    """
+
+    #: The Koji API methods the simulator implements
+    METHODS = ('getBuild', 'getLatestBuilds', 'getLoggedInUser', 'getRPMHeaders', 'getTag',
+               'getTaskInfo', 'getTaskRequest', 'listBuildRPMs', 'listPackages', 'listTagged',
+               'listTags', 'logout', 'moveBuild', 'ssl_login', 'tagBuild', 'taskFinished',
+               'untagBuild')
+
+    def __init__(self, latency=0.0, failure_rate=0.0, task_duration=0.0, seed=None):
+        """
+        Initialize the simulator, without any tags or builds.
+
+        Args:
+            latency (float): How many seconds each round trip to the simulated hub takes.
+            failure_rate (float): The probability, between 0 and 1, that a call fails.
+            task_duration (float): How many seconds tasks stay open.
+            seed (int or None): Seed for the failures, so that runs can be repeated.
+        """
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.task_duration = task_duration
+        self._random = random.Random(seed)
+        self._lock = RLock()
+        self._ids = itertools.count(1)
+        # name -> tag info
+        self._tags = {}
+        # nvr -> build info, and build id -> nvr
+        self._builds = {}
+        self._build_ids = {}
+        # package name -> package id
+        self._packages = {}
+        # build id -> RPM infos, and "name-version-release.arch" -> RPM info
+        self._rpms = {}
+        self._rpms_by_name = {}
+        # tag name -> build ids, in the order they were tagged
+        self._tagged = defaultdict(OrderedDict)
+        # task id -> task info
+        self._tasks = {}
+        self.calls = defaultdict(int)
+        self.round_trips = 0
+
+    def __call__(self):
+        """
+        Return a new session on the simulated hub.
+
+        Returns:
+            SimulatedSession: A new session.
+        """
+        return SimulatedSession(self)
+
+    def add_tag(self, name, arches='i386 x86_64', locked=False):
+        """
+        Create a tag, if it does not exist yet.
+
+        Args:
+            name (basestring): The name of the tag.
+            arches (basestring): The space separated architectures of the tag.
+            locked (bool): Whether the tag is locked.
+        Returns:
+            dict: The tag info.
+        """
+        with self._lock:
+            if name not in self._tags:
+                self._tags[name] = {'id': next(self._ids), 'name': name, 'arches': arches,
+                                    'locked': locked, 'perm': None, 'perm_id': None,
+                                    'maven_support': False, 'maven_include_all': False}
+            return self._tags[name]
+
+    def add_build(self, nvr, tags=(), arches=('src', 'noarch'), epoch=None, owner='bodhi'):
+        """
+        Create a completed build and its RPMs, and tag it.
+
+        Args:
+            nvr (basestring): The name-version-release of the build.
+            tags (iterable): The names of the tags to tag the build with. Missing tags are
+                created.
+            arches (iterable): The architectures to create RPMs for.
+            epoch (int or None): The epoch of the build.
+            owner (basestring): The name of the user who built it.
+        Returns:
+            dict: The build info.
+        """
+        name, version, release = nvr.rsplit('-', 2)
+        with self._lock:
+            if nvr not in self._builds:
+                if name not in self._packages:
+                    self._packages[name] = next(self._ids)
+                build_id = next(self._ids)
+                now = time.time()
+                self._builds[nvr] = {
+                    'id': build_id, 'build_id': build_id, 'nvr': nvr, 'name': name,
+                    'package_name': name, 'package_id': self._packages[name],
+                    'version': version, 'release': release, 'epoch': epoch, 'state': 1,
+                    'owner_name': owner, 'task_id': next(self._ids), 'extra': None,
+                    'creation_time': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(now)),
+                    'completion_time': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(now)),
+                    'completion_ts': now}
+                self._build_ids[build_id] = nvr
+                self._rpms[build_id] = []
+                for arch in arches:
+                    rpm = {'id': next(self._ids), 'build_id': build_id, 'name': name,
+                           'version': version, 'release': release, 'epoch': epoch,
+                           'arch': arch, 'nvr': nvr, 'size': 1024, 'buildtime': int(now),
+                           'payloadhash': hashlib.md5('%s.%s' % (nvr, arch)).hexdigest()}
+                    self._rpms[build_id].append(rpm)
+                    self._rpms_by_name['%s.%s' % (nvr, arch)] = rpm
+            for tag in tags:
+                self.add_tag(tag)
+                self._tagged[tag][self._builds[nvr]['id']] = True
+            return self._builds[nvr]
+
+    def populate(self, tag, count, packages=None, release='1.fc26'):
+        """
+        Tag ``count`` generated builds into the given tag, for benchmarks at a realistic scale.
+
+        The builds are spread over ``packages`` packages, so that each package has several
+        versions in the tag.
+
+        Args:
+            tag (basestring): The tag to fill.
+            count (int): How many builds to create.
+            packages (int or None): How many packages to spread the builds over. Defaults to
+                ``count``, i.e. one build per package.
+            release (basestring): The release of the generated builds.
+        Returns:
+            list: The nvrs of the created builds.
+        """
+        packages = packages or count
+        nvrs = []
+        for i in range(count):
+            nvr = 'package%05d-%d.0-%s' % (i % packages, i // packages + 1, release)
+            self.add_build(nvr, tags=[tag])
+            nvrs.append(nvr)
+        return nvrs
+
+    def _build(self, build, strict=True):
+        """
+        Find a build by nvr or id.
+
+        Args:
+            build (basestring or int): The nvr or id of the build.
+            strict (bool): Whether to raise if there is no such build.
+        Returns:
+            dict or None: The build info, or None if there is no such build and strict is False.
+        Raises:
+            koji.GenericError: If there is no such build and strict is True.
+        """
+        if isinstance(build, (int, long)):
+            build = self._build_ids.get(build)
+        if build in self._builds:
+            return self._builds[build]
+        if strict:
+            raise koji.GenericError('No such build: %s' % build)
+        return None
+
+    def _tag(self, tag, strict=True):
+        """
+        Find a tag by name or id.
+
+        Args:
+            tag (basestring or int): The name or id of the tag.
+            strict (bool): Whether to raise if there is no such tag.
+        Returns:
+            dict or None: The tag info, or None if there is no such tag and strict is False.
+        Raises:
+            koji.GenericError: If there is no such tag and strict is True.
+        """
+        if isinstance(tag, (int, long)):
+            for info in self._tags.itervalues():
+                if info['id'] == tag:
+                    return info
+        elif tag in self._tags:
+            return self._tags[tag]
+        if strict:
+            raise koji.GenericError('No such tagInfo: %r' % tag)
+        return None
+
+    def _create_task(self, method, request, error=None):
+        """
+        Create a task that closes, or fails with the given error, after task_duration seconds.
+
+        Returns:
+            int: The id of the new task.
+        """
+        task_id = next(self._ids)
+        self._tasks[task_id] = {'id': task_id, 'method': method, 'request': request,
+                                'create_ts': time.time(), 'error': error}
+        return task_id
+
+    def dispatch(self, method, *args, **kwargs):
+        """
+        Make a call to the simulated hub, without any latency.
+
+        Args:
+            method (basestring): The name of the Koji API method to call.
+            args (tuple): The positional arguments of the call.
+            kwargs (dict): The keyword arguments of the call.
+        Returns:
+            object: A copy of the result of the call.
+        Raises:
+            koji.GenericError: If the call failed, or if a failure was injected.
+        """
+        if method not in self.METHODS:
+            raise koji.GenericError('Invalid method: %s' % method)
+        with self._lock:
+            self.calls[method] += 1
+            if self.failure_rate and self._random.random() < self.failure_rate:
+                raise koji.GenericError('Simulated failure of %s' % method)
+            return copy.deepcopy(getattr(self, '_%s' % method)(*args, **kwargs))
+
+    def round_trip(self):
+        """Count a round trip to the simulated hub, and wait for its latency."""
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _getBuild(self, buildInfo, strict=False):
+        return self._build(buildInfo, strict=strict)
+
+    def _getLatestBuilds(self, tag, event=None, package=None, type=None):
+        return self._listTagged(tag, latest=True, package=package)
+
+    def _getLoggedInUser(self):
+        return {'id': 1, 'name': 'bodhi', 'status': 0, 'usertype': 0}
+
+    def _getRPMHeaders(self, rpmID=None, taskID=None, filepath=None, headers=None):
+        if isinstance(rpmID, (int, long)):
+            rpm = None
+            for rpms in self._rpms.itervalues():
+                for rpm_ in rpms:
+                    if rpm_['id'] == rpmID:
+                        rpm = rpm_
+        else:
+            rpm = self._rpms_by_name.get(rpmID)
+        if rpm is None:
+            return {}
+        values = {
+            'name': rpm['name'], 'version': rpm['version'], 'release': rpm['release'],
+            'epoch': rpm['epoch'], 'arch': rpm['arch'], 'summary': 'The %s package' % rpm['name'],
+            'description': 'The %s package, built by the Koji simulator.' % rpm['name'],
+            'url': 'https://example.com/%s' % rpm['name'],
+            'changelogtime': [rpm['buildtime']],
+            'changelogname': ['Bodhi <bodhi@example.com> - %s-%s' % (rpm['version'],
+                                                                     rpm['release'])],
+            'changelogtext': ['- Simulated build']}
+        return dict((header, values.get(header)) for header in headers or values)
+
+    def _getTag(self, taginfo, strict=False, event=None):
+        return self._tag(taginfo, strict=strict)
+
+    def _getTaskInfo(self, task_id, request=False):
+        task = self._tasks.get(task_id)
+        if task is None:
+            return None
+        if time.time() < task['create_ts'] + self.task_duration:
+            state = koji.TASK_STATES['OPEN']
+        elif task['error']:
+            state = koji.TASK_STATES['FAILED']
+        else:
+            state = koji.TASK_STATES['CLOSED']
+        info = {'id': task_id, 'method': task['method'], 'state': state,
+                'create_ts': task['create_ts']}
+        if request:
+            info['request'] = task['request']
+        return info
+
+    def _getTaskRequest(self, task_id):
+        return self._tasks[task_id]['request']
+
+    def _listBuildRPMs(self, buildID):
+        build = self._build(buildID, strict=False)
+        return self._rpms[build['id']] if build else []
+
+    def _listPackages(self):
+        return [{'package_id': id_, 'package_name': name}
+                for name, id_ in sorted(self._packages.items())]
+
+    def _listTagged(self, tag, event=None, inherit=False, prefix=None, latest=False,
+                    package=None, owner=None, type=None):
+        taginfo = self._tag(tag)
+        builds = []
+        seen = set()
+        # Koji lists the most recently tagged builds first.
+        for build_id in reversed(self._tagged[taginfo['name']].keys()):
+            build = self._builds[self._build_ids[build_id]]
+            if package is not None and build['package_name'] != package:
+                continue
+            if latest:
+                if build['package_name'] in seen:
+                    continue
+                seen.add(build['package_name'])
+            build = dict(build, tag_id=taginfo['id'], tag_name=taginfo['name'])
+            builds.append(build)
+        return builds
+
+    def _listTags(self, build=None, package=None, perms=True):
+        build = self._build(build)
+        return [self._tags[tag] for tag in sorted(self._tagged)
+                if build['id'] in self._tagged[tag]]
+
+    def _logout(self):
+        return None
+
+    def _moveBuild(self, tag1, tag2, build, force=False):
+        from_tag = self._tag(tag1)['name']
+        to_tag = self._tag(tag2)['name']
+        build = self._build(build)
+        error = None
+        if build['id'] not in self._tagged[from_tag]:
+            error = 'build %s not in tag %s' % (build['nvr'], from_tag)
+        else:
+            del self._tagged[from_tag][build['id']]
+            self._tagged[to_tag][build['id']] = True
+        return self._create_task('tagBuild', [to_tag, build['id'], force, from_tag], error)
+
+    def _ssl_login(self, *args, **kwargs):
+        return True
+
+    def _tagBuild(self, tag, build, force=False, fromtag=None):
+        tag = self._tag(tag)['name']
+        build = self._build(build)
+        error = None
+        if build['id'] in self._tagged[tag]:
+            error = 'build %s already tagged (%s)' % (build['nvr'], tag)
+        else:
+            self._tagged[tag][build['id']] = True
+        return self._create_task('tagBuild', [tag, build['id'], force, fromtag], error)
+
+    def _taskFinished(self, task_id):
+        return self._getTaskInfo(task_id)['state'] != koji.TASK_STATES['OPEN']
+
+    def _untagBuild(self, tag, build, strict=True, force=False):
+        tag = self._tag(tag)['name']
+        build = self._build(build)
+        if build['id'] in self._tagged[tag]:
+            del self._tagged[tag][build['id']]
+        elif strict:
+            raise koji.GenericError('build %s not in tag %s' % (build['nvr'], tag))
+
+
+class SimulatedSession(object):
+    """
+    A session on a :class:`KojiSimulator`, with the call and multicall interface of
+    ``koji.ClientSession``.
+    """
+
+    def __init__(self, simulator):
+        """
+        Initialize the session.
+
+        Args:
+            simulator (KojiSimulator): The simulated hub to talk to.
+        """
+        self._simulator = simulator
+        self.multicall = False
+        self._calls = []
+
+    def __getattr__(self, name):
+        """
+        Return a function making the given call to the simulated hub.
+
+        Args:
+            name (basestring): The name of the Koji API method.
+        Returns:
+            callable: A function making the call, or queueing it during a multicall.
+        Raises:
+            AttributeError: If the simulator does not implement the method.
+        """
+        if name not in KojiSimulator.METHODS:
+            raise AttributeError(name)
+        return partial(self._call, name)
+
+    def _call(self, method, *args, **kwargs):
+        """Make the given call, or queue it if a multicall is in progress."""
+        if self.multicall:
+            self._calls.append((method, args, kwargs))
+            return None
+        self._simulator.round_trip()
+        return self._simulator.dispatch(method, *args, **kwargs)
+
+    def multiCall(self, strict=False):
+        """
+        Make all the queued calls in a single round trip.
+
+        Args:
+            strict (bool): If True, raise the first failure instead of returning it as a fault.
+        Returns:
+            list: A one element list with the result for each successful call, and a fault
+                dictionary for each failed one.
+        Raises:
+            koji.GenericError: If strict is True and one of the calls failed.
+        """
+        calls, self._calls = self._calls, []
+        self.multicall = False
+        self._simulator.round_trip()
+        results = []
+        for method, args, kwargs in calls:
+            try:
+                results.append([self._simulator.dispatch(method, *args, **kwargs)])
+            except koji.GenericError as e:
+                if strict:
+                    raise
+                results.append({'faultCode': 1000, 'faultString': str(e)})
+        return results
+
+
+class KojiSessionPool(object):
+    """
+    A thread-safe pool of authenticated Koji sessions.
+
+    Logging in to Koji costs a full Kerberos handshake, so instead of logging in every time a
+    session is needed the pool keeps up to ``size`` authenticated ``koji.ClientSession`` objects
+    per process and hands them out again. A ``ClientSession`` must not be used by two threads at
+    once, so :meth:`get_session` leases sessions to the calling thread until that thread calls
+    :meth:`release`. Sessions that sat idle for longer than ``check_interval`` seconds are health
+    checked before being reused, and are only logged in again when Koji no longer considers them
+    authenticated. Sessions kept by a thread for longer log in again themselves when a call fails
+    authentication, see :class:`ReauthenticatingSession`.
+
+    The pool also counts checkouts, logins and the time callers spent waiting for a session, see
+    :meth:`stats`.
+    """
+
+    def __init__(self, factory, size=4, timeout=30, check_interval=300, login_lock=None):
+        """
+        Initialize the pool.
+
+        Args:
+            factory (callable): Called without arguments to create a new, logged in, session.
+            size (int): The maximum number of sessions this process keeps in the pool.
+            timeout (int): How many seconds to wait for a session to come back to an exhausted
+                pool. After this, an unpooled session is created so the caller is not stuck.
+            check_interval (int): Sessions idle for longer than this many seconds are checked
+                with Koji before they are handed out again.
+            login_lock (threading.Lock or None): If given, held while logging in so that
+                logins are serialized.
+        """
+        self._factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self._login_lock = login_lock or Lock()
+        self._condition = Condition(Lock())
+        self._local = local()
+        # (session, time it was returned) tuples, most recently returned last
+        self._idle = []
+        # ids of the pooled sessions currently checked out
+        self._leased = set()
+        # pooled sessions currently being logged in
+        self._logging_in = 0
+        self.checkouts = 0
+        self.logins = 0
+        self.relogins = 0
+        self.overflows = 0
+        self.wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def _login(self):
+        """Log in a new session and count it."""
+        with self._login_lock:
+            session = self._factory()
+        with self._condition:
+            self.logins += 1
+        return session
+
+    def _is_healthy(self, session):
+        """
+        Return whether Koji still considers the given session to be logged in.
+
+        Args:
+            session (koji.ClientSession): The session to check.
+        Returns:
+            bool: True if the session is still authenticated, False otherwise.
+        """
+        try:
+            return bool(session.getLoggedInUser())
+        except koji.AuthError:
+            return False
+        except Exception:
+            log.exception('Koji session health check failed')
+            return False
+
+    def _discard(self, session):
+        """Log the given session out, ignoring any errors since it is being thrown away."""
+        try:
+            session.logout()
+        except Exception:
+            log.debug('Ignoring error while logging out a discarded Koji session', exc_info=True)
+
+    def acquire(self):
+        """
+        Check a session out of the pool, waiting up to ``timeout`` seconds for one to be free.
+
+        Returns:
+            koji.ClientSession: An authenticated session.
+        """
+        start = time.time()
+        session = None
+        with self._condition:
+            while not self._idle and self._in_use() >= self.size:
+                remaining = start + self.timeout - time.time()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            waited = time.time() - start
+            self.checkouts += 1
+            self.wait_time += waited
+            self.max_wait_time = max(self.max_wait_time, waited)
+            if self._idle:
+                session, idle_since = self._idle.pop()
+                pooled = True
+            else:
+                pooled = self._in_use() < self.size
+                if not pooled:
+                    self.overflows += 1
+            if pooled:
+                # Hold the slot while (re)logging in so other threads see it as taken.
+                self._logging_in += 1
+
+        if waited > 1:
+            log.warning('Waited %.2f seconds for a Koji session' % waited)
+        if not pooled:
+            log.warning('Koji session pool exhausted, using an unpooled session')
+
+        try:
+            if session is not None and time.time() - idle_since > self.check_interval:
+                if not self._is_healthy(session):
+                    log.info('Koji session is no longer authenticated, logging in again')
+                    self._discard(session)
+                    session = None
+                    with self._condition:
+                        self.relogins += 1
+            if session is None:
+                session = self._login()
+        finally:
+            if pooled:
+                with self._condition:
+                    self._logging_in -= 1
+                    if session is not None:
+                        self._leased.add(id(session))
+                    else:
+                        self._condition.notify()
+        return session
+
+    def _in_use(self):
+        """Return how many pooled sessions are checked out or being logged in."""
+        return len(self._leased) + self._logging_in
+
+    def checkin(self, session):
+        """
+        Return a session checked out with :meth:`acquire` to the pool.
+
+        Sessions left in the middle of a multicall are logged out instead of being reused, as are
+        the unpooled sessions handed out while the pool was exhausted.
+
+        Args:
+            session (koji.ClientSession): The session to return.
+        """
+        with self._condition:
+            pooled = id(session) in self._leased
+            self._leased.discard(id(session))
+            if pooled and not session.multicall:
+                self._idle.append((session, time.time()))
+            self._condition.notify()
+        if not pooled or session.multicall:
+            self._discard(session)
+
+    def get_session(self):
+        """
+        Return a session leased to the calling thread, checking one out if needed.
+
+        The same session is returned to every caller in a thread until :meth:`release` is called,
+        unless that session is in the middle of a multicall. In that case another session is leased
+        so that the caller's calls are not queued into somebody else's multicall.
+
+        Returns:
+            koji.ClientSession: An authenticated session.
+        """
+        leases = self._leases()
+        for session in leases:
+            if not session.multicall:
+                return session
+        session = self.acquire()
+        leases.append(session)
+        return session
+
+    def release(self):
+        """Return all the sessions leased to the calling thread to the pool."""
+        leases = self._leases()
+        self._local.leases = []
+        for session in leases:
+            self.checkin(session)
+
+    def _leases(self):
+        """Return the list of sessions leased to the calling thread."""
+        if not hasattr(self._local, 'leases'):
+            self._local.leases = []
+        return self._local.leases
+
+    def stats(self):
+        """
+        Return a snapshot of the pool's counters.
+
+        Returns:
+            dict: A dictionary with the following keys: size, idle, leased, checkouts, logins,
+                relogins, overflows, wait_time (the total seconds spent waiting for sessions) and
+                max_wait_time.
+        """
+        with self._condition:
+            return {
+                'size': self.size, 'idle': len(self._idle), 'leased': self._in_use(),
+                'checkouts': self.checkouts, 'logins': self.logins, 'relogins': self.relogins,
+                'overflows': self.overflows, 'wait_time': self.wait_time,
+                'max_wait_time': self.max_wait_time}
+
+
+class KojiCache(object):
+    """
+    A bounded, expiring cache for the read-only Koji calls Bodhi repeats the most.
+
+    Results of calls whose answer changes when builds are tagged or untagged (``TAG_METHODS``)
+    are kept for ``ttl`` seconds, and results of calls that do not change once a build exists
+    (``BUILD_METHODS``) for ``build_ttl`` seconds. Once there are more than ``max_entries``
+    results the least recently used ones are dropped. Each entry remembers which builds and tags
+    it depends on, so that :meth:`invalidate` can drop it when one of them is tagged or untagged.
+
+    Use :meth:`wrap` to get a session whose calls go through the cache.
+    """
+
+    #: Calls whose results change when builds are tagged or untagged
+    TAG_METHODS = ('listTags', 'getLatestBuilds')
+    #: Calls whose results do not change once the build exists
+    BUILD_METHODS = ('getBuild', 'listBuildRPMs', 'getRPMHeaders')
+
+    def __init__(self, ttl=300, build_ttl=86400, max_entries=10000):
+        """
+        Initialize the cache.
+
+        Args:
+            ttl (int): How many seconds to keep the results of TAG_METHODS.
+            build_ttl (int): How many seconds to keep the results of BUILD_METHODS.
+            max_entries (int): The maximum number of results to keep.
+        """
+        self.ttl = ttl
+        self.build_ttl = build_ttl
+        self.max_entries = max_entries
+        self._lock = Lock()
+        # key -> (expiration time, builds, tags, value), least recently used first
+        self._entries = OrderedDict()
+        self._by_build = defaultdict(set)
+        self._by_tag = defaultdict(set)
+        self.hits = 0
+        self.misses = 0
+
+    #: The name of the argument identifying the build or tag each cached call is about
+    ARGUMENTS = {'getBuild': 'buildInfo', 'listTags': 'build', 'listBuildRPMs': 'buildID',
+                 'getRPMHeaders': 'rpmID', 'getLatestBuilds': 'tag'}
+
+    def _dependencies(self, method, args, kwargs, value):
+        """
+        Return the builds and tags the result of the given call depends on.
+
+        Args:
+            method (basestring): The name of the Koji call.
+            args (tuple): The call's positional arguments.
+            kwargs (dict): The call's keyword arguments.
+            value (object): The call's result.
+        Returns:
+            tuple: A 2-tuple of sets, the builds and the tags.
+        """
+        builds, tags = set(), set()
+        subject = args[0] if args else kwargs.get(self.ARGUMENTS[method])
+        if subject is not None:
+            if method == 'getLatestBuilds':
+                tags.add(subject)
+            else:
+                builds.add(subject)
+        if method == 'getBuild' and isinstance(value, dict) and 'nvr' in value:
+            builds.add(value['nvr'])
+        return builds, tags
+
+    def _remove(self, key):
+        """Remove the given key from the cache and from the dependency indexes."""
+        expires, builds, tags, value = self._entries.pop(key)
+        for build in builds:
+            self._by_build[build].discard(key)
+            if not self._by_build[build]:
+                del self._by_build[build]
+        for tag in tags:
+            self._by_tag[tag].discard(key)
+            if not self._by_tag[tag]:
+                del self._by_tag[tag]
+
+    def call(self, function, method, *args, **kwargs):
+        """
+        Return the result of the given call, from the cache if possible.
+
+        Args:
+            function (callable): The session's method to call on a cache miss.
+            method (basestring): The name of the Koji call.
+            args (tuple): The call's positional arguments.
+            kwargs (dict): The call's keyword arguments.
+        Returns:
+            object: The call's result. Callers get their own copy, so it is safe to modify.
+        """
+        key = (method, repr(args), repr(sorted(kwargs.items())))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.time():
+                self.hits += 1
+                # Mark it as the most recently used
+                del self._entries[key]
+                self._entries[key] = entry
+                return copy.deepcopy(entry[3])
+            self.misses += 1
+
+        value = function(*args, **kwargs)
+        # Don't remember missing builds, they might show up soon.
+        if value is None:
+            return value
+
+        builds, tags = self._dependencies(method, args, kwargs, value)
+        ttl = self.ttl if method in self.TAG_METHODS else self.build_ttl
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.time() + ttl, builds, tags, copy.deepcopy(value))
+            for build in builds:
+                self._by_build[build].add(key)
+            for tag in tags:
+                self._by_tag[tag].add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+        return value
+
+    def invalidate(self, build=None, tag=None):
+        """
+        Drop the cached results that depend on the given build or tag.
+
+        Args:
+            build (basestring or None): A build's nvr.
+            tag (basestring or None): A tag's name.
+        """
+        with self._lock:
+            keys = set(self._by_build.get(build, ())) | set(self._by_tag.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+        if keys:
+            log.debug('Dropped %d cached Koji results for build %s, tag %s' % (
+                len(keys), build, tag))
+
+    def clear(self):
+        """Drop everything from the cache."""
+        with self._lock:
+            self._entries.clear()
+            self._by_build.clear()
+            self._by_tag.clear()
+
+    def wrap(self, session):
+        """
+        Return the given session wrapped so that its read-only calls use this cache.
+
+        Args:
+            session (koji.ClientSession or DevBuildsys): The session to wrap.
+        Returns:
+            CachedSession: The wrapped session.
+        """
+        return CachedSession(session, self)
+
+
+class CachedSession(object):
+    """
+    A Koji session that answers the calls cached by a KojiCache from that cache.
+
+    Calls made while the session is in a multicall go straight to Koji, and calls that tag, untag
+    or move builds invalidate the cached results they affect once they are made, or once the
+    multicall they are part of is. Everything else is passed through to the wrapped session.
+    """
+
+    #: Calls that change tags, and the positions of their tag and build arguments
+    WRITE_METHODS = {'tagBuild': ((0,), 1), 'untagBuild': ((0,), 1), 'moveBuild': ((0, 1), 2)}
+
+    def __init__(self, session, cache):
+        """
+        Initialize the wrapper.
+
+        Args:
+            session (koji.ClientSession or DevBuildsys): The session to wrap.
+            cache (KojiCache): The cache to use.
+        """
+        self.__dict__['_session'] = session
+        self.__dict__['_cache'] = cache
+        # (build, tag) pairs to invalidate once the current multicall is made
+        self.__dict__['_pending'] = []
+
+    def __getattr__(self, name):
+        """Return the wrapped session's attribute, going through the cache if it's cached."""
+        attr = getattr(self._session, name)
+        if name in self.WRITE_METHODS:
+            return partial(self._write, attr, name)
+        if name == 'multiCall':
+            return partial(self._multicall, attr)
+        if self._session.multicall:
+            return attr
+        if name in KojiCache.TAG_METHODS or name in KojiCache.BUILD_METHODS:
+            return partial(self._cache.call, attr, name)
+        return attr
+
+    def __setattr__(self, name, value):
+        """Set the attribute on the wrapped session, so that ``multicall`` works as usual."""
+        setattr(self._session, name, value)
+
+    def _write(self, function, method, *args, **kwargs):
+        """
+        Make a tag change, and invalidate the results it affects.
+
+        The results are invalidated after the change is made, so that a concurrent miss can't cache
+        the results from before it. In a multicall, they are invalidated after the multicall.
+        """
+        tag_positions, build_position = self.WRITE_METHODS[method]
+        build = args[build_position] if len(args) > build_position else None
+        changes = [(build, args[position]) for position in tag_positions if position < len(args)]
+        if self._session.multicall:
+            self._pending.extend(changes)
+            return function(*args, **kwargs)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self._invalidate(changes)
+
+    def _multicall(self, function, *args, **kwargs):
+        """Make the multicall, and invalidate the results affected by its tag changes."""
+        changes = list(self._pending)
+        del self._pending[:]
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self._invalidate(changes)
+
+    def _invalidate(self, changes):
+        """Invalidate the results affected by the given (build, tag) changes."""
+        for build, tag in changes:
+            self._cache.invalidate(build=build, tag=tag)
+
+
+class ReauthenticatingSession(koji.ClientSession):
+    """
+    A Koji session that logs in again and retries once when Koji rejects its authentication.
+
+    The pool only checks sessions when they are handed out, but threads such as the fedmsg
+    consumers keep their session for much longer than a Kerberos ticket lasts. A call failing with
+    an AuthError never reached Koji's handlers, so it is safe to make it again once logged in.
+    """
+
+    def __init__(self, baseurl, opts, login_args):
+        """
+        Initialize the session.
+
+        Args:
+            baseurl (basestring): The URL of the Koji hub.
+            opts (dict): The options of the koji.ClientSession.
+            login_args (dict): The keyword arguments of krb_login().
+        """
+        koji.ClientSession.__init__(self, baseurl, opts)
+        self._login_args = login_args
+        self._relogging_in = False
+
+    def relogin(self):
+        """
+        Forget the current session and log in again.
+
+        Returns:
+            bool: Whether the login succeeded.
+        """
+        self.setSession(None)
+        self._relogging_in = True
+        try:
+            return self.krb_login(**self._login_args)
+        finally:
+            self._relogging_in = False
+
+    def _callMethod(self, name, args, kwargs=None, retry=True):
+        """Make the call, logging in again and retrying it once if the session's login expired."""
+        try:
+            return koji.ClientSession._callMethod(self, name, args, kwargs, retry)
+        except koji.AuthError:
+            if self.multicall or self._relogging_in or not self.logged_in:
+                raise
+            log.info('Koji rejected the session\'s authentication, logging in again')
+            if not self.relogin():
+                raise
+            return koji.ClientSession._callMethod(self, name, args, kwargs, retry)
+
+
 def koji_login(config):
     """ Login to Koji and return the session """
 
@@ -386,7 +1313,7 @@ def koji_login(config):
         'anon_retry': True,
     }
 
-    koji_client = koji.ClientSession(_koji_hub, koji_options)
+    koji_client = ReauthenticatingSession(_koji_hub, koji_options, get_krb_conf(config))
     if not koji_client.krb_login(**get_krb_conf(config)):
         log.error('Koji krb_login failed')
     return koji_client
@@ -408,22 +1335,73 @@ def get_krb_conf(config):
 
 
 def get_session():
-    """ Get a new buildsystem instance """
+    """
+    Get a buildsystem instance.
+
+    With Koji, this is a pooled session leased to the calling thread. Call release_session() when
+    done with it so it can go back to the pool.
+    """
     global _buildsystem, _buildsystem_login_lock
     if _buildsystem is None:
         raise RuntimeError('Buildsys needs to be setup')
+    if _session_pool is not None:
+        # The pool serializes logins itself.
+        return _session_pool.get_session()
     with _buildsystem_login_lock:
         return _buildsystem()
 
 
+def get_cached_session(per_request=False):
+    """
+    Get a buildsystem instance whose read-only calls go through the Koji cache.
+
+    Without Koji there is no cache and this is the same as get_session().
+
+    Args:
+        per_request (bool): If True, the session gets a new, empty cache of its own instead of
+            the process-wide cache. This is what web requests use, since the process-wide cache of
+            the web server is not told about builds being tagged.
+    Returns:
+        CachedSession or DevBuildsys: A session using the cache.
+    """
+    session = get_session()
+    if _koji_cache is None:
+        return session
+    cache = _koji_cache
+    if per_request:
+        cache = KojiCache(ttl=cache.ttl, build_ttl=cache.build_ttl,
+                          max_entries=cache.max_entries)
+    return cache.wrap(session)
+
+
+def invalidate_cache(build=None, tag=None):
+    """
+    Drop the results in the process-wide Koji cache that depend on the given build or tag.
+
+    Args:
+        build (basestring or None): A build's nvr.
+        tag (basestring or None): A tag's name.
+    """
+    if _koji_cache is not None:
+        _koji_cache.invalidate(build=build, tag=tag)
+
+
+def release_session():
+    """ Return the Koji sessions leased to the calling thread to the pool """
+    if _session_pool is not None:
+        _session_pool.release()
+
+
 def teardown_buildsystem():
-    global _buildsystem
+    global _buildsystem, _session_pool, _koji_cache
     _buildsystem = None
+    _session_pool = None
+    _koji_cache = None
     DevBuildsys.clear()
 
 
 def setup_buildsystem(settings):
-    global _buildsystem, _koji_hub, _buildsystem_login_lock
+    global _buildsystem, _koji_hub, _buildsystem_login_lock, _session_pool, _koji_cache
     if _buildsystem:
         return
 
@@ -438,7 +1416,23 @@ def setup_buildsystem(settings):
             """Call koji_login with settings and return the result."""
             return koji_login(config=settings)
 
-        _buildsystem = get_koji_login
+        _session_pool = KojiSessionPool(
+            get_koji_login, size=int(settings.get('koji_pool.size', 4)),
+            timeout=int(settings.get('koji_pool.timeout', 30)),
+            check_interval=int(settings.get('koji_pool.check_interval', 300)),
+            login_lock=_buildsystem_login_lock)
+        _buildsystem = _session_pool.get_session
+        _koji_cache = KojiCache(
+            ttl=int(settings.get('koji_cache.ttl', 60)),
+            build_ttl=int(settings.get('koji_cache.build_ttl', 86400)),
+            max_entries=int(settings.get('koji_cache.max_entries', 10000)))
+    elif buildsys == 'simulator':
+        log.debug('Using KojiSimulator')
+        _buildsystem = KojiSimulator(
+            latency=float(settings.get('koji_simulator.latency', 0.0)),
+            failure_rate=float(settings.get('koji_simulator.failure_rate', 0.0)),
+            task_duration=float(settings.get('koji_simulator.task_duration', 0.0)),
+            seed=settings.get('koji_simulator.seed'))
     elif buildsys in ('dev', 'dummy', None):
         log.debug('Using DevBuildsys')
         _buildsystem = DevBuildsys
@@ -446,24 +1440,170 @@ def setup_buildsystem(settings):
         raise ValueError('Buildsys %s not known' % buildsys)
 
 
-def wait_for_tasks(tasks, session=None, sleep=300):
+class TaskWatcher(object):
+    """
+    Watch Koji tasks until they finish.
+
+    Every outstanding task is polled with a single getTaskInfo multicall per tick. The time
+    between ticks starts at ``interval`` seconds, is multiplied by ``backoff`` after each tick
+    where no task finished, up to ``max_interval`` seconds, and goes back to ``interval`` as soon
+    as tasks finish. Failed tasks are logged as soon as they are seen.
+
+    Attributes:
+        pending (list): The ids of the tasks that have not finished yet.
+        succeeded (list): The ids of the tasks that finished successfully.
+        failed (list): The ids of the tasks that failed or were canceled, in the order they were
+            seen to fail.
+    """
+
+    #: Task states that mean the task is done
+    DONE_STATES = (koji.TASK_STATES['CLOSED'], koji.TASK_STATES['FAILED'],
+                   koji.TASK_STATES['CANCELED'])
+
+    def __init__(self, tasks, session=None, interval=1, max_interval=300, backoff=2,
+                 timeout=None):
+        """
+        Initialize the watcher.
+
+        Args:
+            tasks (list): The ids of the tasks to watch. Falsy ids are skipped.
+            session (koji.ClientSession or None): The session to poll with. If None, one is
+                taken from get_session().
+            interval (int): The initial number of seconds between ticks.
+            max_interval (int): The maximum number of seconds between ticks.
+            backoff (int): What to multiply the time between ticks by when nothing finished.
+            timeout (int or None): If given, wait() gives up after this many seconds.
+        """
+        self.pending = []
+        for task in tasks:
+            if not task:
+                log.debug("Skipping task: %s" % task)
+                continue
+            self.pending.append(task)
+        self.succeeded = []
+        self.failed = []
+        self.session = session or get_session()
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout = timeout
+
+    @property
+    def progress(self):
+        """
+        Return how far along the tasks are.
+
+        Returns:
+            dict: The number of tasks in total, done, succeeded, failed, and pending.
+        """
+        done = len(self.succeeded) + len(self.failed)
+        return {'total': done + len(self.pending), 'done': done, 'succeeded': len(self.succeeded),
+                'failed': len(self.failed), 'pending': len(self.pending)}
+
+    def poll(self):
+        """
+        Poll all the pending tasks with a single multicall.
+
+        Returns:
+            list: The ids of the tasks that finished since the last poll.
+        """
+        if not self.pending:
+            return []
+
+        self.session.multicall = True
+        for task in self.pending:
+            self.session.getTaskInfo(task)
+        results = self.session.multiCall()
+
+        finished = []
+        still_pending = []
+        for task, result in zip(self.pending, results):
+            # Successful calls are returned as one element lists, faults as dictionaries.
+            if not isinstance(result, list):
+                log.warning("Unable to get info for Koji task %d: %s" % (
+                    task, result.get('faultString')))
+                still_pending.append(task)
+                continue
+            if result[0] is None:
+                # Koji doesn't know the task, so it will never finish.
+                log.error("Koji task %d does not exist" % task)
+                finished.append(task)
+                self.failed.append(task)
+                continue
+            state = result[0]['state']
+            if state not in self.DONE_STATES:
+                still_pending.append(task)
+                continue
+            finished.append(task)
+            if state == koji.TASK_STATES['CLOSED']:
+                self.succeeded.append(task)
+            else:
+                log.error("Koji task %d failed" % task)
+                self.failed.append(task)
+        self.pending = still_pending
+        return finished
+
+    def wait(self, fail_fast=False, callback=None):
+        """
+        Poll the tasks until they have all finished.
+
+        Args:
+            fail_fast (bool): If True, return as soon as a task fails instead of waiting for the
+                others.
+            callback (callable or None): If given, called with the progress dictionary after
+                every tick.
+        Returns:
+            list: The ids of the tasks that failed.
+        Raises:
+            KojiTaskTimeoutException: If the tasks did not finish within the timeout.
+        """
+        log.debug("Waiting for %d tasks to complete: %s" % (len(self.pending), self.pending))
+        start = time.time()
+        interval = self.interval
+        while True:
+            finished = self.poll()
+            progress = self.progress
+            log.debug("%(done)d of %(total)d Koji tasks done, %(failed)d failed" % progress)
+            if callback is not None:
+                callback(progress)
+            if not self.pending or (fail_fast and self.failed):
+                break
+
+            if finished:
+                interval = self.interval
+            else:
+                interval = min(interval * self.backoff, self.max_interval)
+            if self.timeout is not None:
+                remaining = start + self.timeout - time.time()
+                if remaining <= 0:
+                    raise KojiTaskTimeoutException(
+                        "Koji tasks did not finish within %d seconds: %s" % (
+                            self.timeout, self.pending))
+                interval = min(interval, remaining)
+            time.sleep(interval)
+
+        if not self.failed:
+            log.debug("Tasks completed successfully!")
+        return self.failed
+
+
+def wait_for_tasks(tasks, session=None, sleep=300, timeout=None, fail_fast=False):
     """
-    Wait for a list of koji tasks to complete.  Return the first task number
-    to fail, otherwise zero.
+    Wait for a list of koji tasks to complete.  Return the tasks that failed.
+
+    The tasks are polled together with a TaskWatcher, backing off from one second between polls
+    up to ``sleep`` seconds while nothing finishes.
+
+    Args:
+        tasks (list): The ids of the tasks to wait for.
+        session (koji.ClientSession or None): The session to poll with.
+        sleep (int): The maximum number of seconds between polls.
+        timeout (int or None): If given, give up after this many seconds.
+        fail_fast (bool): If True, return as soon as a task fails.
+    Returns:
+        list: The ids of the tasks that failed.
+    Raises:
+        KojiTaskTimeoutException: If the tasks did not finish within the timeout.
     """
-    log.debug("Waiting for %d tasks to complete: %s" % (len(tasks), tasks))
-    failed_tasks = []
-    if not session:
-        session = get_session()
-    for task in tasks:
-        if not task:
-            log.debug("Skipping task: %s" % task)
-            continue
-        while not session.taskFinished(task):
-            time.sleep(sleep)
-        task_info = session.getTaskInfo(task)
-        if task_info['state'] != koji.TASK_STATES['CLOSED']:
-            log.error("Koji task %d failed" % task)
-            failed_tasks.append(task)
-    log.debug("Tasks completed successfully!")
-    return failed_tasks
+    watcher = TaskWatcher(tasks, session=session, max_interval=sleep, timeout=timeout)
+    return watcher.wait(fail_fast=fail_fast)
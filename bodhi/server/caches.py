@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+The process-wide cache regions of Bodhi, one for each thing it caches.
+
+The regions are created once, when the app starts or when they are first used by other
+processes. Each region is configured by the ``dogpile.cache.*`` settings, which the
+``<name>_cache.*`` settings of the region override, so that every region can have its own backend
+and expiration time. The regions default to the ``dogpile.cache.memory`` backend, so each process
+has its own.
+
+The values of a region are stored with the generations of the tables they are computed from (see
+:mod:`bodhi.server.pagination`), and are only read back while those are current, so writing to
+one of the tables invalidates the values in every process that shares the ``totals_cache``
+backend. A region that depends on tables can only use a backend shared by the processes if the
+generations are shared too, or the writes of a process would not invalidate the values the others
+stored. The keys don't change with the generations, so a value computed again replaces the stale
+one instead of adding to backends that never evict anything. Each region also counts its hits and
+misses, and the time spent reading its backend, which the ``/admin/caches`` view returns with the
+name of the backend.
+"""
+
+from threading import local, Lock
+import time
+
+from dogpile.cache import make_region
+from dogpile.cache.api import CachedValue, NO_VALUE
+from dogpile.cache.proxy import ProxyBackend
+
+from bodhi.server.config import config
+from bodhi.server.pagination import get_generations, PROCESS_BACKENDS, shared_generations
+
+
+#: The names of the regions, and the generations of the tables whose writes invalidate them
+REGIONS = {
+    'avatars': (),
+    'candidates': ('releases',),
+    'counts': ('updates', 'releases'),
+    'home': ('updates', 'comments', 'users', 'releases'),
+    # The identities are versioned by a generation in the database instead.
+    'identities': (),
+}
+
+_regions = {}
+_stats = {}
+_regions_lock = Lock()
+
+
+class Generations(ProxyBackend):
+    """A proxy of the backend of a region that stores its values with the tables' generations."""
+
+    def __init__(self, tables):
+        """
+        Initialize the proxy.
+
+        Args:
+            tables (tuple): The names of the generations of the tables the values depend on.
+        """
+        super(Generations, self).__init__()
+        self.tables = tables
+        self._missed = local()
+
+    def _pending(self):
+        """Return the generations of the keys this thread missed, by key."""
+        if not hasattr(self._missed, 'generations'):
+            self._missed.generations = {}
+        return self._missed.generations
+
+    def _unwrap(self, key, value, generations):
+        """Return the value read for the key if it has the given generations, or NO_VALUE."""
+        if value is not NO_VALUE and value.payload[0] == generations:
+            return CachedValue(value.payload[1], value.metadata)
+        # The value computed for the missing key depends on the tables as they were now, so it is
+        # stored with these generations even if the tables are written in between.
+        self._pending()[key] = generations
+        return NO_VALUE
+
+    def _wrap(self, key, value):
+        """Return the value to store for the key, with its generations."""
+        generations = self._pending().pop(key, None) or get_generations(self.tables)
+        return CachedValue((generations, value.payload), value.metadata)
+
+    def get(self, key):
+        """Return the value of the key, or NO_VALUE if its generations are not current."""
+        generations = get_generations(self.tables)
+        return self._unwrap(key, self.proxied.get(key), generations)
+
+    def get_multi(self, keys):
+        """Return the values of the keys, with NO_VALUE for those of other generations."""
+        generations = get_generations(self.tables)
+        return [self._unwrap(key, value, generations)
+                for key, value in zip(keys, self.proxied.get_multi(keys))]
+
+    def set(self, key, value):
+        """Store the value of the key with its generations."""
+        self.proxied.set(key, self._wrap(key, value))
+
+    def set_multi(self, mapping):
+        """Store the values of the keys with their generations."""
+        self.proxied.set_multi(dict((key, self._wrap(key, value))
+                                    for key, value in mapping.items()))
+
+
+class CacheStats(ProxyBackend):
+    """A proxy of the backend of a region that counts its hits, misses and reading time."""
+
+    def __init__(self, backend=None):
+        """
+        Initialize the counters.
+
+        Args:
+            backend (basestring): The name of the backend of the region.
+        """
+        super(CacheStats, self).__init__()
+        self.backend = backend
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.seconds = 0.0
+
+    def _count(self, values, start):
+        """Count the given values read from the backend since the given time."""
+        elapsed = time.time() - start
+        misses = len([value for value in values if value is NO_VALUE])
+        with self._lock:
+            self.hits += len(values) - misses
+            self.misses += misses
+            self.seconds += elapsed
+
+    def get(self, key):
+        """Return the value of the key from the backend, counting it."""
+        start = time.time()
+        value = self.proxied.get(key)
+        self._count([value], start)
+        return value
+
+    def get_multi(self, keys):
+        """Return the values of the keys from the backend, counting them."""
+        start = time.time()
+        values = self.proxied.get_multi(keys)
+        self._count(values, start)
+        return values
+
+    def __json__(self, request=None):
+        """
+        Return the counters, the average time of a read in milliseconds, and the backend.
+
+        The counters of a per-process backend only count the reads of this process.
+        """
+        with self._lock:
+            reads = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses,
+                    'average_ms': 1000 * self.seconds / reads if reads else 0.0,
+                    'backend': self.backend, 'per_process': self.backend in PROCESS_BACKENDS}
+
+
+def _region_settings(settings, name):
+    """
+    Return the settings of the named region, with the ``cache.`` prefix.
+
+    Args:
+        settings (dict): The Bodhi settings.
+        name (str): The name of the region.
+    Returns:
+        dict: The ``dogpile.cache.*`` settings, overridden by the ``<name>_cache.*`` ones. The
+            arguments of the ``dogpile.cache.backend`` are left out if the region has another one.
+    """
+    same_backend = settings.get('%s_cache.backend' % name) in (
+        None, settings.get('dogpile.cache.backend'))
+    region_settings = {}
+    for prefix in ('dogpile.cache.', '%s_cache.' % name):
+        for key, value in settings.items():
+            if not key.startswith(prefix) or value is None:
+                continue
+            key = 'cache.' + key[len(prefix):]
+            # The arguments of the dogpile.cache.backend don't apply to another backend.
+            if prefix == 'dogpile.cache.' and key.startswith('cache.arguments.') and \
+                    not same_backend:
+                continue
+            region_settings[key] = value
+    return region_settings
+
+
+def _make_region(settings, name, tables):
+    """
+    Return a configured region whose values are invalidated by the writes of the given tables.
+
+    Args:
+        settings (dict): The Bodhi settings.
+        name (str): The name of the region.
+        tables (tuple): The names of the generations of the tables the region's values depend on.
+    Returns:
+        tuple: The dogpile.cache.region.CacheRegion and its CacheStats.
+    Raises:
+        ValueError: If the region would be shared by the processes, but not the generations of its
+            tables.
+    """
+    region_settings = _region_settings(settings, name)
+    backend = region_settings.get('cache.backend')
+    if tables and backend not in PROCESS_BACKENDS and not shared_generations(settings):
+        raise ValueError(
+            'The %s_cache.backend %s is shared by the processes, but totals_cache.backend is not, '
+            'so their writes would not invalidate each other\'s values.' % (name, backend))
+    region = make_region(name=name)
+    region.configure_from_config(region_settings, 'cache.')
+    if tables:
+        region.wrap(Generations(tables))
+    # The statistics wrap the generations, so the values of old generations count as misses.
+    stats = CacheStats(backend)
+    region.wrap(stats)
+    return region, stats
+
+
+def configure_regions(settings):
+    """
+    Create the regions, replacing any previous ones.
+
+    Args:
+        settings (dict): The Bodhi settings.
+    """
+    with _regions_lock:
+        for name, tables in REGIONS.items():
+            _regions[name], _stats[name] = _make_region(settings, name, tables)
+
+
+def get_region(name):
+    """
+    Return the named region, creating the regions on first use.
+
+    Args:
+        name (str): The name of the region, from REGIONS.
+    Returns:
+        dogpile.cache.region.CacheRegion: The region.
+    """
+    if name not in _regions:
+        # Copying the configuration loads it, which iterating over it doesn't.
+        configure_regions(config.copy())
+    return _regions[name]
+
+
+def get_stats():
+    """
+    Return the counters of the regions created by this process.
+
+    Returns:
+        dict: The CacheStats of each region, by name.
+    """
+    return dict(_stats)
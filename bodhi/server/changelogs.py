@@ -0,0 +1,284 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""Parse, cache, and diff the RPM changelogs of builds for the update notices."""
+
+from collections import namedtuple, OrderedDict
+from threading import Lock
+import time
+
+import rpm
+
+from bodhi.server import buildsys, log
+from bodhi.server.config import config
+from bodhi.server.util import build_evr, get_rpm_header
+
+
+class ChangelogEntry(namedtuple('ChangelogEntry', ['time', 'name', 'text'])):
+    """
+    One entry of an RPM changelog.
+
+    Attributes:
+        time (int): The entry's timestamp, as the number of seconds since 1970-01-01 00:00:00 UTC.
+        name (basestring): The author and version line of the entry.
+        text (basestring): The entry's text.
+    """
+
+    def format(self):
+        """Return the entry formatted the way it is in the spec file."""
+        return '* %s %s\n%s\n' % (time.strftime("%a %b %e %Y", time.localtime(self.time)),
+                                  self.name, self.text)
+
+
+class ChangelogService(object):
+    """
+    Remember the RPM headers and parsed changelogs of builds, and the changelogs between them.
+
+    The headers of a build never change, so they are kept until more than
+    ``changelogs.max_entries`` builds are known, at which point the least recently used ones are
+    dropped. The previous build of each build (see :meth:`latest`) depends on what is tagged, so
+    it is only remembered for ``changelogs.latest_ttl`` seconds.
+
+    Call :meth:`prefetch` with all the builds of a push before generating their notices, so that
+    everything they need is fetched from Koji in two multicalls instead of several calls per build.
+    """
+
+    #: The RPM headers fetched for each build
+    HEADERS = ('name', 'summary', 'version', 'release', 'url', 'description', 'changelogtime',
+               'changelogname', 'changelogtext')
+
+    def __init__(self):
+        """Initialize the empty service."""
+        self._lock = Lock()
+        # nvr -> (header without the changelog, tuple of ChangelogEntries), least recently used
+        # first
+        self._headers = OrderedDict()
+        # (nvr, since nvr) -> changelog text, least recently used first
+        self._since = OrderedDict()
+        # nvr -> (expiration time, nvr of the previous build or None)
+        self._latest = {}
+
+    def clear(self):
+        """Forget everything."""
+        with self._lock:
+            self._headers.clear()
+            self._since.clear()
+            self._latest.clear()
+
+    @staticmethod
+    def _parse(header):
+        """
+        Split the given RPM header into the rest of the header and the changelog entries.
+
+        Args:
+            header (dict): The header, as returned by Koji's getRPMHeaders().
+        Returns:
+            tuple: A 2-tuple of the header without the changelog fields and the tuple of
+                ChangelogEntries, newest first.
+        """
+        header = dict(header)
+        fields = [header.pop(name, None) or [] for name in (
+            'changelogtime', 'changelogname', 'changelogtext')]
+        # Koji returns single values instead of lists when there is only one entry.
+        fields = [field if isinstance(field, list) else [field] for field in fields]
+        return header, tuple(ChangelogEntry(*entry) for entry in zip(*fields))
+
+    def _remember(self, cache, key, value):
+        """Store the value in one of the LRU caches, dropping old values if it is full."""
+        with self._lock:
+            cache.pop(key, None)
+            cache[key] = value
+            while len(cache) > config.get('changelogs.max_entries'):
+                cache.popitem(last=False)
+
+    def _recall(self, cache, key):
+        """Return the value from one of the LRU caches and mark it as recently used, or None."""
+        with self._lock:
+            value = cache.pop(key, None)
+            if value is not None:
+                cache[key] = value
+            return value
+
+    def _parsed(self, nvr):
+        """Return the parsed header of the given build, fetching it if needed."""
+        parsed = self._recall(self._headers, nvr)
+        if parsed is None:
+            parsed = self._parse(get_rpm_header(nvr))
+            self._remember(self._headers, nvr, parsed)
+        return parsed
+
+    def header(self, nvr):
+        """
+        Return the RPM header of the given build, without the changelog.
+
+        Args:
+            nvr (basestring): The build's nvr.
+        Returns:
+            dict: The header fields in HEADERS, other than the changelog ones.
+        Raises:
+            ValueError: If Koji has no header for the build.
+        """
+        return dict(self._parsed(nvr)[0])
+
+    def entries(self, nvr):
+        """
+        Return the changelog entries of the given build.
+
+        Args:
+            nvr (basestring): The build's nvr.
+        Returns:
+            tuple: The ChangelogEntries, newest first.
+        Raises:
+            ValueError: If Koji has no header for the build.
+        """
+        return self._parsed(nvr)[1]
+
+    def changelog(self, nvr, timelimit=0):
+        """
+        Return the changelog of the given build since the given time.
+
+        Args:
+            nvr (basestring): The build's nvr.
+            timelimit (int): Only include the entries newer than this timestamp.
+        Returns:
+            basestring: The formatted changelog entries.
+        """
+        entries = []
+        for entry in self.entries(nvr):
+            if entry.time <= timelimit:
+                break
+            entries.append(entry.format())
+        return ''.join(entries)
+
+    def changelog_since(self, nvr, since):
+        """
+        Return the changelog entries of a build that are newer than the newest entry of another.
+
+        The result is remembered, since both builds' changelogs never change.
+
+        Args:
+            nvr (basestring): The build's nvr.
+            since (basestring): The nvr of the older build.
+        Returns:
+            basestring: The formatted changelog entries.
+        """
+        text = self._recall(self._since, (nvr, since))
+        if text is None:
+            older = self.entries(since)
+            text = self.changelog(nvr, older[0].time if older else 0)
+            self._remember(self._since, (nvr, since), text)
+        return text
+
+    @staticmethod
+    def _tags(build):
+        """Return the tags to look for the previous build of the given build in, in order."""
+        return [build.update.release.stable_tag, build.update.release.dist_tag]
+
+    @staticmethod
+    def _find_latest(evr, tagged):
+        """
+        Return the nvr of the first build older than the given EVR.
+
+        Args:
+            evr (tuple): The epoch, version, and release of the newer build.
+            tagged (list): The lists of builds returned by getLatestBuilds() for each tag, in the
+                order the tags should be searched.
+        Returns:
+            basestring or None: The nvr of the older build, or None if there is none.
+        """
+        for builds in tagged:
+            for build in builds:
+                if rpm.labelCompare(evr, build_evr(build)) < 0:
+                    return build['nvr']
+        return None
+
+    def latest(self, build):
+        """
+        Return the nvr of the most recent build older than the given one.
+
+        The build is looked for in the release's stable tag, then in its dist tag.
+
+        Args:
+            build (bodhi.server.models.RpmBuild): The build to find the previous build of.
+        Returns:
+            basestring or None: The nvr of the previous build, or None if there is none.
+        """
+        with self._lock:
+            expires, latest = self._latest.get(build.nvr, (0, None))
+        if expires > time.time():
+            return latest
+
+        koji_session = buildsys.get_cached_session()
+        for tag in self._tags(build):
+            builds = koji_session.getLatestBuilds(tag, package=build.package.name)
+            latest = self._find_latest(build.evr, [builds])
+            if latest:
+                break
+        self._set_latest(build.nvr, latest)
+        return latest
+
+    def _set_latest(self, nvr, latest):
+        """Remember the previous build of the given build for changelogs.latest_ttl seconds."""
+        with self._lock:
+            now = time.time()
+            for key in [key for key, value in self._latest.items() if value[0] <= now]:
+                del self._latest[key]
+            self._latest[nvr] = (now + config.get('changelogs.latest_ttl'), latest)
+
+    def prefetch(self, builds):
+        """
+        Fetch what the notices of the given builds need from Koji, with one multicall for their
+        previous builds and one for all the headers.
+
+        Failures are only logged: whatever could not be prefetched is fetched again when needed.
+
+        Args:
+            builds (list): The RpmBuilds to prefetch.
+        """
+        koji_session = buildsys.get_cached_session()
+        try:
+            koji_session.multicall = True
+            for build in builds:
+                for tag in self._tags(build):
+                    koji_session.getLatestBuilds(tag, package=build.package.name)
+            results = koji_session.multiCall()
+
+            nvrs = set()
+            for i, build in enumerate(builds):
+                nvrs.add(build.nvr)
+                tagged = results[2 * i:2 * i + 2]
+                if not all(isinstance(result, list) for result in tagged):
+                    continue
+                latest = self._find_latest(build.evr, [result[0] for result in tagged])
+                self._set_latest(build.nvr, latest)
+                if latest:
+                    nvrs.add(latest)
+
+            nvrs = sorted(nvr for nvr in nvrs if self._recall(self._headers, nvr) is None)
+            koji_session.multicall = True
+            for nvr in nvrs:
+                koji_session.getRPMHeaders(rpmID=nvr + '.src', headers=list(self.HEADERS))
+            for nvr, result in zip(nvrs, koji_session.multiCall()):
+                if isinstance(result, list) and result[0]:
+                    self._remember(self._headers, nvr, self._parse(result[0]))
+        except Exception:
+            koji_session.multicall = False
+            log.exception('Unable to prefetch the changelogs of %d builds' % len(builds))
+
+
+changelogs = ChangelogService()
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Answer conditional GET requests without rendering the resources that did not change.
+
+The views are wrapped by :func:`conditional`, which asks a function for the state of the
+resource before the view's validators load anything. The state is made of the generations of the
+tables the resource is built from (see :mod:`bodhi.server.pagination`) and, for single updates,
+their status, request, and modification, push, and latest comment times. It becomes the
+resource's ``ETag`` and ``Last-Modified`` headers, and requests whose ``If-None-Match`` or
+``If-Modified-Since`` headers match it are answered with ``304 Not Modified``.
+
+The generations of the tables are only seen by all the processes if the ``totals_cache`` backend
+is shared by them, so lists and updates only answer conditional requests then. Releases are
+versioned by the ``releases`` :class:`bodhi.server.models.CacheGeneration` in the database
+instead, which every process sees.
+"""
+
+from datetime import timedelta
+import functools
+import hashlib
+import json
+
+from pyramid.httpexceptions import HTTPNotModified
+from sqlalchemy import func, or_
+
+from bodhi.server.models import CacheGeneration, Comment, ReleaseRegistry, Update
+from bodhi.server.pagination import generation_time, get_generations, shared_generations
+
+
+#: The generations of the tables the JSON of updates is built from
+UPDATE_TABLES = ('updates', 'comments', 'builds', 'bugs', 'releases', 'users')
+
+
+def _ceil_seconds(when):
+    """Return the given datetime rounded up to the second, the precision of HTTP dates."""
+    if when.microsecond:
+        return when.replace(microsecond=0) + timedelta(seconds=1)
+    return when
+
+
+def _state(request, parts, generations, times=()):
+    """
+    Return the ETag and Last-Modified time of a resource in the given state.
+
+    The ETag also depends on what the request asks for and who asks it, since the representations
+    of a resource differ with the query string, the Accept header and the user.
+
+    Args:
+        request (pyramid.request): The current request.
+        parts (list): What identifies the resource and its version, serializable to JSON.
+        generations (list): The generations of the tables the resource is built from.
+        times (iterable): Other times the resource was modified at, some of which may be None.
+    Returns:
+        tuple: The ETag and the Last-Modified datetime in UTC, which is None if there are neither
+            generations nor times.
+    """
+    variant = [request.path_qs, request.headers.get('Accept'), request.unauthenticated_userid]
+    etag = hashlib.sha1(json.dumps(
+        [variant, parts, generations], default=unicode, sort_keys=True)).hexdigest()
+    times = [generation_time(g) for g in generations] + [t for t in times if t]
+    return etag, _ceil_seconds(max(times)) if times else None
+
+
+def _not_modified(request, etag, last_modified):
+    """
+    Return whether the client already has the version of the resource the request asks for.
+
+    As RFC 7232 says, If-Modified-Since is ignored when If-None-Match is given.
+
+    Args:
+        request (pyramid.request): The current request.
+        etag (str): The resource's ETag.
+        last_modified (datetime.datetime or None): The time the resource was last modified, in
+            UTC, if it is known.
+    Returns:
+        bool: True if the request's conditional headers match the resource.
+    """
+    if request.if_none_match:
+        return etag in request.if_none_match
+    if request.if_modified_since is not None and last_modified is not None:
+        return last_modified <= request.if_modified_since.replace(tzinfo=None)
+    return False
+
+
+def conditional(get_state):
+    """
+    Return a view decorator that answers conditional requests for the resources of the view.
+
+    Args:
+        get_state (callable): A function that receives the request and returns the ETag and
+            Last-Modified time of the resource it asks for, or None if the view should always be
+            called, for example when the resource doesn't exist.
+    Returns:
+        callable: A decorator for the ``decorator`` argument of views.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(context, request):
+            state = get_state(request) if request.method == 'GET' else None
+            if state is None:
+                return view(context, request)
+
+            etag, last_modified = state
+            if _not_modified(request, etag, last_modified):
+                response = HTTPNotModified()
+            else:
+                response = view(context, request)
+                if response.status_code != 200:
+                    return response
+            response.etag = etag
+            response.last_modified = last_modified
+            return response
+        return wrapper
+    return decorator
+
+
+def list_state(*tables):
+    """
+    Return a function that gives the state of a list that is built from the given tables.
+
+    Args:
+        tables (tuple): The names of the generations of the tables.
+    Returns:
+        callable: A function for :func:`conditional`, which gives None unless the generations are
+            shared by all the processes.
+    """
+    def get_state(request):
+        if not shared_generations():
+            return None
+        return _state(request, [], get_generations(tables))
+    return get_state
+
+
+def update_state(request):
+    """
+    Return the state of the update the request asks for, with one query for its timestamps.
+
+    The status, request, and push time are part of the state, since the masher changes them
+    without touching the modification time.
+
+    Args:
+        request (pyramid.request): The current request.
+    Returns:
+        tuple or None: The ETag and Last-Modified time of the update, or None if it doesn't exist
+            or the generations are not shared by all the processes.
+    """
+    if not shared_generations():
+        return None
+    id = request.matchdict['id']
+    latest_comment = request.db.query(func.max(Comment.timestamp)).filter(
+        Comment.update_id == Update.id).correlate(Update).as_scalar()
+    row = request.db.query(
+        Update.id, Update.status, Update.request, Update.date_submitted, Update.date_modified,
+        Update.date_pushed, latest_comment).filter(
+            or_(*[getattr(Update, col) == id for col in Update.__get_by__])).first()
+    if row is None:
+        return None
+    return _state(request, ['update'] + list(row), get_generations(UPDATE_TABLES), row[3:])
+
+
+def release_state(request):
+    """
+    Return the state of the release the request asks for.
+
+    The state is the generation of the releases in the database, which has no time, so releases
+    have an ETag but no Last-Modified time.
+
+    Args:
+        request (pyramid.request): The current request.
+    Returns:
+        tuple: The ETag and Last-Modified time of the release.
+    """
+    generation = CacheGeneration.current(request.db, ReleaseRegistry.GENERATION)
+    return _state(request, ['release', generation], [])
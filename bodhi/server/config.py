@@ -266,6 +266,12 @@ class BodhiConfig(dict):
         'authtkt.timeout': {
             'value': 86400,
             'validator': int},
+        'avatars_cache.backend': {
+            'value': 'dogpile.cache.memory',
+            'validator': unicode},
+        'avatars_cache.expiration_time': {
+            'value': 86400,
+            'validator': int},
         'badge_ids': {
             'value': [],
             'validator': _generate_list_validator('|')},
@@ -296,6 +302,12 @@ class BodhiConfig(dict):
         'bz_server': {
             'value': 'https://bugzilla.redhat.com/xmlrpc.cgi',
             'validator': unicode},
+        'candidates_cache.backend': {
+            'value': 'dogpile.cache.memory',
+            'validator': unicode},
+        'candidates_cache.expiration_time': {
+            'value': 100,
+            'validator': int},
         'captcha.background_color': {
             'value': '#ffffff',
             'validator': _validate_color},
@@ -323,6 +335,12 @@ class BodhiConfig(dict):
         'captcha.ttl': {
             'value': 300,
             'validator': int},
+        'changelogs.latest_ttl': {
+            'value': 300,
+            'validator': int},
+        'changelogs.max_entries': {
+            'value': 1000,
+            'validator': int},
         'compose_atomic_trees': {
             'value': False,
             'validator': _validate_bool},
@@ -341,6 +359,12 @@ class BodhiConfig(dict):
         'cors_origins_rw': {
             'value': 'https://bodhi.fedoraproject.org',
             'validator': unicode},
+        'counts_cache.backend': {
+            'value': 'dogpile.cache.memory',
+            'validator': unicode},
+        'counts_cache.expiration_time': {
+            'value': 3600,
+            'validator': int},
         'critpath_pkgs': {
             'value': [],
             'validator': _generate_list_validator()},
@@ -394,6 +418,15 @@ class BodhiConfig(dict):
         'fmn_url': {
             'value': 'https://apps.fedoraproject.org/notifications/',
             'validator': unicode},
+        'home_cache.backend': {
+            'value': 'dogpile.cache.memory',
+            'validator': unicode},
+        'home_cache.expiration_time': {
+            'value': 300,
+            'validator': int},
+        'identities_cache.backend': {
+            'value': 'dogpile.cache.memory',
+            'validator': unicode},
         'important_groups': {
             'value': ['proventesters', 'provenpackager,' 'releng', 'security_respons', 'packager',
                       'bodhiadmin'],
@@ -407,6 +440,36 @@ class BodhiConfig(dict):
         'koji_hub': {
             'value': 'https://koji.stg.fedoraproject.org/kojihub',
             'validator': str},
+        'koji_cache.build_ttl': {
+            'value': 86400,
+            'validator': int},
+        'koji_cache.max_entries': {
+            'value': 10000,
+            'validator': int},
+        'koji_cache.ttl': {
+            'value': 60,
+            'validator': int},
+        'koji_pool.check_interval': {
+            'value': 300,
+            'validator': int},
+        'koji_pool.size': {
+            'value': 4,
+            'validator': int},
+        'koji_pool.timeout': {
+            'value': 30,
+            'validator': int},
+        'koji_simulator.failure_rate': {
+            'value': 0.0,
+            'validator': float},
+        'koji_simulator.latency': {
+            'value': 0.0,
+            'validator': float},
+        'koji_simulator.seed': {
+            'value': None,
+            'validator': _validate_none_or(int)},
+        'koji_simulator.task_duration': {
+            'value': 0.0,
+            'validator': float},
         'krb_ccache': {
             'value': None,
             'validator': _validate_none_or(str)},
@@ -416,6 +479,12 @@ class BodhiConfig(dict):
         'krb_principal': {
             'value': None,
             'validator': _validate_none_or(str)},
+        'latest_builds.expiration_time': {
+            'value': 60,
+            'validator': int},
+        'latest_builds.missing_tag_expiration_time': {
+            'value': 3600,
+            'validator': int},
         'libravatar_dns': {
             'value': False,
             'validator': _validate_bool},
@@ -482,12 +551,18 @@ class BodhiConfig(dict):
         'query_wiki_test_cases': {
             'value': False,
             'validator': _validate_bool},
+        'release_registry.check_interval': {
+            'value': 60,
+            'validator': int},
         'release_team_address': {
             'value': 'bodhiadmin-members@fedoraproject.org',
             'validator': unicode},
         'resultsdb_api_url': {
             'value': 'https://taskotron.fedoraproject.org/resultsdb_api/',
             'validator': unicode},
+        'search_packages.refresh_interval': {
+            'value': 3600,
+            'validator': int},
         'session.secret': {
             'value': 'CHANGEME',
             'validator': _validate_secret},
@@ -541,6 +616,12 @@ class BodhiConfig(dict):
         'top_testers_timeframe': {
             'value': 7,
             'validator': int},
+        'totals_cache.backend': {
+            'value': 'dogpile.cache.memory',
+            'validator': unicode},
+        'totals_cache.expiration_time': {
+            'value': 300,
+            'validator': int},
         'test_gating.required': {
             'value': False,
             'validator': _validate_bool},
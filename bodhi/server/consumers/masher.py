@@ -37,11 +37,12 @@ from sqlalchemy import engine_from_config
 import fedmsg.consumers
 
 from bodhi.server import bugs, log, buildsys, notifications, mail, util
+from bodhi.server.changelogs import changelogs
 from bodhi.server.config import config
 from bodhi.server.exceptions import BodhiException
 from bodhi.server.metadata import ExtendedMetadata
 from bodhi.server.models import (Update, UpdateRequest, UpdateType, Release,
-                                 UpdateStatus, ReleaseState, Base)
+                                 UpdateStatus, ReleaseState, RpmBuild, Base)
 from bodhi.server.util import sorted_updates, sanity_check_repodata, transactional_session_maker
 
 
@@ -215,7 +216,8 @@ Once mash is done:
         # {Release: {UpdateRequest: [Update,]}}
         releases = defaultdict(lambda: defaultdict(list))
         for title in body['updates']:
-            update = session.query(Update).filter_by(title=title).first()
+            update = session.query(Update).options(
+                *Update.loading_profile('masher')).filter_by(title=title).first()
             if update:
                 if not update.request:
                     self.log.info('%s request revoked' % update.title)
@@ -261,6 +263,8 @@ class MasherThread(threading.Thread):
                 self.db = None
         except:
             self.log.exception('MasherThread failed. Transaction rolled back.')
+        finally:
+            buildsys.release_session()
 
     def results(self):
         attrs = ['name', 'success']
@@ -376,12 +380,14 @@ class MasherThread(threading.Thread):
         self.log.debug('Loading updates')
         updates = []
         for title in self.state['updates']:
-            update = self.db.query(Update).filter_by(title=title).first()
+            update = self.db.query(Update).options(
+                *Update.loading_profile('masher')).filter_by(title=title).first()
             if update:
                 updates.append(update)
         if not updates:
             raise Exception('Unable to load updates: %r' %
                             self.state['updates'])
+        Update.prefetch_test_cases(self.db, updates)
         self.updates = updates
 
     def unlock_updates(self):
@@ -443,10 +449,10 @@ class MasherThread(threading.Thread):
         # Remove the pending tag as well
         if update.request is UpdateRequest.stable:
             update.remove_tag(update.release.pending_stable_tag,
-                              koji=buildsys.get_session())
+                              koji=buildsys.get_cached_session())
         elif update.request is UpdateRequest.testing:
             update.remove_tag(update.release.pending_testing_tag,
-                              koji=buildsys.get_session())
+                              koji=buildsys.get_cached_session())
         update.request = None
         if update.title in self.state['updates']:
             self.state['updates'].remove(update.title)
@@ -571,7 +577,7 @@ class MasherThread(threading.Thread):
                         self.move_tags_async.extend(move_tags)
 
     def _perform_tag_actions(self):
-        koji = buildsys.get_session()
+        koji = buildsys.get_cached_session()
         for i, batches in enumerate([(self.add_tags_sync, self.move_tags_sync),
                                      (self.add_tags_async, self.move_tags_async)]):
             add, move = batches
@@ -595,6 +601,10 @@ class MasherThread(threading.Thread):
                                                        koji, sleep=15)
                 if failed_tasks:
                     raise Exception("Failed to move builds: %s" % failed_tasks)
+                # Builds are moved by Koji tasks, which finished after the multicall was made.
+                for from_tag, to_tag, build in move:
+                    buildsys.invalidate_cache(build=build, tag=from_tag)
+                    buildsys.invalidate_cache(build=build, tag=to_tag)
 
     def expire_buildroot_overrides(self):
         """ Expire any buildroot overrides that are in this push """
@@ -610,7 +620,7 @@ class MasherThread(threading.Thread):
     def remove_pending_tags(self):
         """ Remove all pending tags from these updates """
         self.log.debug("Removing pending tags from builds")
-        koji = buildsys.get_session()
+        koji = buildsys.get_cached_session()
         koji.multicall = True
         for update in self.updates:
             if update.request is UpdateRequest.stable:
@@ -687,8 +697,20 @@ class MasherThread(threading.Thread):
                 update, use_template='maillist_template')):
             self.testing_digest[prefix][update.builds[i].nvr] = subbody[1]
 
+    def prefetch_changelogs(self, status):
+        """
+        Fetch the RPM headers and previous builds needed by the notices of the updates with the
+        given status from Koji all at once.
+
+        Args:
+            status (bodhi.server.models.UpdateStatus): The status of the updates to prefetch.
+        """
+        changelogs.prefetch([build for update in self.updates if update.status is status
+                             for build in update.builds if isinstance(build, RpmBuild)])
+
     def generate_testing_digest(self):
         self.log.info('Generating testing digest for %s' % self.release.name)
+        self.prefetch_changelogs(UpdateStatus.testing)
         for update in self.updates:
             if update.status is UpdateStatus.testing:
                 self.add_to_digest(update)
@@ -803,6 +825,7 @@ class MasherThread(threading.Thread):
     @checkpoint
     def send_stable_announcements(self):
         self.log.info('Sending stable update announcements')
+        self.prefetch_changelogs(UpdateStatus.stable)
         for update in self.updates:
             if update.status is UpdateStatus.stable:
                 update.send_update_notice()
@@ -861,7 +884,7 @@ class MasherThread(threading.Thread):
 
     def get_security_updates(self, release):
         release = self.db.query(Release).filter_by(long_name=release).one()
-        updates = self.db.query(Update).filter(
+        updates = self.db.query(Update).options(*Update.loading_profile('masher')).filter(
             Update.type == UpdateType.security,
             Update.status == UpdateStatus.testing,
             Update.release == release,
@@ -884,7 +907,7 @@ class MasherThread(threading.Thread):
             list: The list of unapproved critical path updates for the given release.
         """
         release = self.db.query(Release).filter_by(long_name=release).one()
-        updates = self.db.query(Update).filter_by(
+        updates = self.db.query(Update).options(*Update.loading_profile('masher')).filter_by(
             critpath=True,
             status=UpdateStatus.testing,
             request=None,
@@ -28,7 +28,7 @@ import pprint
 
 import fedmsg.consumers
 
-from bodhi.server import initialize_db
+from bodhi.server import buildsys, initialize_db
 from bodhi.server.config import config
 from bodhi.server.models import Build
 from bodhi.server.util import transactional_session_maker
@@ -41,7 +41,7 @@ class SignedHandler(fedmsg.consumers.FedmsgConsumer):
     """
     The Bodhi Signed Handler.
 
-    A fedmsg listener waiting for messages from koji about builds being tagged.
+    A fedmsg listener waiting for messages from koji about builds being tagged or untagged.
     """
 
     config_key = 'signed_handler'
@@ -60,7 +60,8 @@ class SignedHandler(fedmsg.consumers.FedmsgConsumer):
         prefix = hub.config.get('topic_prefix')
         env = hub.config.get('environment')
         self.topic = [
-            prefix + '.' + env + '.buildsys.tag'
+            prefix + '.' + env + '.buildsys.tag',
+            prefix + '.' + env + '.buildsys.untag',
         ]
 
         super(SignedHandler, self).__init__(hub, *args, **kwargs)
@@ -71,7 +72,8 @@ class SignedHandler(fedmsg.consumers.FedmsgConsumer):
         """
         Handle fedmsgs arriving with the configured topic.
 
-        This marks a build as signed if it is assigned to the pending testing release tag.
+        This drops the cached Koji results about the build and the tag, and marks a build as
+        signed if it is assigned to the pending testing release tag.
 
         Example message format::
             {
@@ -106,6 +108,12 @@ class SignedHandler(fedmsg.consumers.FedmsgConsumer):
         build_nvr = '%(name)s-%(version)s-%(release)s' % msg
         tag = msg['tag']
 
+        buildsys.invalidate_cache(build=build_nvr, tag=tag)
+
+        if message['body']['topic'].endswith('.untag'):
+            log.info("%s untagged from %s" % (build_nvr, tag))
+            return
+
         log.info("%s tagged into %s" % (build_nvr, tag))
 
         with self.db_factory() as session:
@@ -27,3 +27,7 @@ class RepodataException(Exception):
 
 class LockedUpdateException(Exception):
     pass
+
+
+class KojiTaskTimeoutException(Exception):
+    pass
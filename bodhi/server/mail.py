@@ -20,7 +20,7 @@ from kitchen.text.converters import to_unicode, to_bytes
 
 from bodhi.server import log
 from bodhi.server.config import config
-from bodhi.server.util import get_rpm_header
+from bodhi.server.changelogs import changelogs
 
 
 #
@@ -335,6 +335,9 @@ maillist_template = u"""\
 def get_template(update, use_template='fedora_errata_template'):
     """
     Build the update notice for a given update.
+
+    The RPM headers and changelogs come from the changelogs service, so call
+    changelogs.prefetch() with the builds of all the updates first when building many notices.
     @param use_template: the template to generate this notice with
     """
     from bodhi.server.models import UpdateStatus, UpdateType
@@ -343,7 +346,7 @@ def get_template(update, use_template='fedora_errata_template'):
     templates = []
 
     for build in update.builds:
-        h = get_rpm_header(build.nvr)
+        h = changelogs.header(build.nvr)
         info = {}
         info['date'] = str(update.date_pushed)
         info['name'] = h['name']
@@ -398,19 +401,11 @@ def get_template(update, use_template='fedora_errata_template'):
         # Find the most recent update for this package, other than this one
         lastpkg = build.get_latest()
 
-        # Grab the RPM header of the previous update, and generate a ChangeLog
+        # Generate a ChangeLog since the previous update
         info['changelog'] = u""
         if lastpkg:
-            oldh = get_rpm_header(lastpkg)
-            oldtime = oldh['changelogtime']
-            text = oldh['changelogtext']
-            del oldh
-            if not text:
-                oldtime = 0
-            elif len(text) != 1:
-                oldtime = oldtime[0]
             info['changelog'] = u"ChangeLog:\n\n%s%s" % \
-                (to_unicode(build.get_changelog(oldtime)), line)
+                (to_unicode(changelogs.changelog_since(build.nvr, lastpkg)), line)
 
         try:
             templates.append((info['subject'], use_template % info))
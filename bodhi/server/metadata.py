@@ -19,7 +19,7 @@ import tempfile
 from kitchen.text.converters import to_bytes
 import createrepo_c as cr
 
-from bodhi.server.buildsys import get_session
+from bodhi.server.buildsys import get_cached_session, get_session
 from bodhi.server.config import config
 from bodhi.server.models import Build, UpdateStatus, UpdateRequest, UpdateSuggestion
 
@@ -209,7 +209,7 @@ class ExtendedMetadata(object):
         col.name = to_bytes(update.release.long_name)
         col.shortname = to_bytes(update.release.name)
 
-        koji = get_session()
+        koji = get_cached_session()
         for build in update.builds:
             try:
                 kojiBuild = self.builds[build.nvr]
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Add the evr_key column to builds.
+
+Revision ID: 4df1fcd59050
+Revises: b1637b42c3f0
+Create Date: 2017-08-23 10:41:37.205114
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4df1fcd59050'
+down_revision = 'b1637b42c3f0'
+
+
+def upgrade():
+    """
+    Add the evr_key column to builds, with an index for finding newer builds of a package.
+
+    Existing builds are left with a NULL evr_key; run bodhi-backfill-evr to fill it in.
+    """
+    op.add_column('builds', sa.Column('evr_key', sa.UnicodeText(), nullable=True))
+    op.create_index('ix_builds_package_id_evr_key', 'builds', ['package_id', 'evr_key'])
+
+
+def downgrade():
+    """Drop the evr_key column from builds."""
+    op.drop_index('ix_builds_package_id_evr_key', table_name='builds')
+    op.drop_column('builds', 'evr_key')
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Add the update_stats table.
+
+Revision ID: a6f3c1b9e2d4
+Revises: d48119cc3082
+Create Date: 2017-08-31 10:21:45.118302
+"""
+from alembic import op
+from sqlalchemy.dialects import postgresql
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6f3c1b9e2d4'
+down_revision = 'd48119cc3082'
+
+
+def upgrade():
+    """
+    Create the update_stats table.
+
+    The table is empty until bodhi-rebuild-stats is run to count the existing updates.
+    """
+    update_type = postgresql.ENUM(name='ck_update_type', create_type=False)
+    update_status = postgresql.ENUM(name='ck_update_status', create_type=False)
+    op.create_table(
+        'update_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('release_id', sa.Integer(), nullable=False),
+        sa.Column('type', update_type, nullable=False),
+        sa.Column('status', update_status, nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('updates', sa.Integer(), nullable=False),
+        sa.Column('positive_comments', sa.Integer(), nullable=False),
+        sa.Column('neutral_comments', sa.Integer(), nullable=False),
+        sa.Column('negative_comments', sa.Integer(), nullable=False),
+        sa.Column('anonymous_feedback', sa.Integer(), nullable=False),
+        sa.Column('updates_with_feedback', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['release_id'], ['releases.id']),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('release_id', 'type', 'status', 'day', name='update_stats_key'))
+
+
+def downgrade():
+    """Drop the update_stats table."""
+    op.drop_table('update_stats')
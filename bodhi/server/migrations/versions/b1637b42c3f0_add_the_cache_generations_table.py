@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Add the cache_generations table.
+
+Revision ID: b1637b42c3f0
+Revises: 95ce24bed77a
+Create Date: 2017-08-21 14:02:11.518470
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b1637b42c3f0'
+down_revision = '95ce24bed77a'
+
+
+def upgrade():
+    """Create the cache_generations table, with a row for the release registry."""
+    cache_generations = op.create_table(
+        'cache_generations',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.Unicode(length=64), nullable=False),
+        sa.Column('generation', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name'))
+    op.bulk_insert(cache_generations, [{'name': u'releases', 'generation': 0}])
+
+
+def downgrade():
+    """Drop the cache_generations table."""
+    op.drop_table('cache_generations')
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Add full-text search to updates and comments.
+
+Revision ID: d48119cc3082
+Revises: e9da6a93d4cd
+Create Date: 2017-08-30 10:41:27.204815
+"""
+from alembic import op
+from sqlalchemy.dialects.postgresql import TSVECTOR
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd48119cc3082'
+down_revision = 'e9da6a93d4cd'
+
+
+UPGRADE = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE FUNCTION updates_search_vector_trigger() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.alias, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce((
+                SELECT string_agg(packages.name, ' ') FROM builds
+                JOIN packages ON packages.id = builds.package_id
+                WHERE builds.update_id = NEW.id), '')), 'A') ||
+            setweight(to_tsvector('english', coalesce((
+                SELECT string_agg(cves.cve_id, ' ') FROM update_cve_table
+                JOIN cves ON cves.id = update_cve_table.cve_id
+                WHERE update_cve_table.update_id = NEW.id), '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.notes, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce((
+                SELECT string_agg(bugs.title, ' ') FROM update_bug_table
+                JOIN bugs ON bugs.id = update_bug_table.bug_id
+                WHERE update_bug_table.update_id = NEW.id), '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER updates_search_vector BEFORE INSERT OR UPDATE OF title, alias, notes,
+    search_vector ON updates FOR EACH ROW EXECUTE PROCEDURE updates_search_vector_trigger()
+    """,
+    """
+    CREATE FUNCTION refresh_update_search_vector() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'DELETE' THEN
+            UPDATE updates SET search_vector = NULL WHERE id = NEW.update_id;
+        END IF;
+        IF TG_OP <> 'INSERT' THEN
+            UPDATE updates SET search_vector = NULL WHERE id = OLD.update_id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER builds_search_vector AFTER INSERT OR DELETE OR UPDATE OF update_id, package_id
+    ON builds FOR EACH ROW EXECUTE PROCEDURE refresh_update_search_vector()
+    """,
+    """
+    CREATE TRIGGER update_bug_table_search_vector AFTER INSERT OR DELETE ON update_bug_table
+    FOR EACH ROW EXECUTE PROCEDURE refresh_update_search_vector()
+    """,
+    """
+    CREATE TRIGGER update_cve_table_search_vector AFTER INSERT OR DELETE ON update_cve_table
+    FOR EACH ROW EXECUTE PROCEDURE refresh_update_search_vector()
+    """,
+    """
+    CREATE FUNCTION refresh_bug_updates_search_vector() RETURNS trigger AS $$
+    BEGIN
+        UPDATE updates SET search_vector = NULL WHERE id IN (
+            SELECT update_id FROM update_bug_table WHERE bug_id = NEW.id);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER bugs_search_vector AFTER UPDATE OF title ON bugs
+    FOR EACH ROW EXECUTE PROCEDURE refresh_bug_updates_search_vector()
+    """,
+    """
+    CREATE TRIGGER comments_search_vector BEFORE INSERT OR UPDATE OF text ON comments
+    FOR EACH ROW EXECUTE PROCEDURE
+    tsvector_update_trigger(search_vector, 'pg_catalog.english', text)
+    """,
+    # Fill the search vectors of the existing rows through the triggers.
+    "UPDATE updates SET search_vector = NULL",
+    "UPDATE comments SET search_vector = to_tsvector('pg_catalog.english', text)",
+    "CREATE INDEX ix_updates_search_vector ON updates USING gin (search_vector)",
+    "CREATE INDEX ix_comments_search_vector ON comments USING gin (search_vector)",
+    "CREATE INDEX ix_updates_title_trgm ON updates USING gin (title gin_trgm_ops)",
+    "CREATE INDEX ix_updates_alias_trgm ON updates USING gin (alias gin_trgm_ops)",
+    "CREATE INDEX ix_comments_text_trgm ON comments USING gin (text gin_trgm_ops)",
+    "CREATE INDEX ix_packages_name_trgm ON packages USING gin (name gin_trgm_ops)",
+)
+
+DOWNGRADE = (
+    "DROP INDEX ix_packages_name_trgm",
+    "DROP INDEX ix_comments_text_trgm",
+    "DROP INDEX ix_updates_alias_trgm",
+    "DROP INDEX ix_updates_title_trgm",
+    "DROP INDEX ix_comments_search_vector",
+    "DROP INDEX ix_updates_search_vector",
+    "DROP TRIGGER comments_search_vector ON comments",
+    "DROP TRIGGER bugs_search_vector ON bugs",
+    "DROP FUNCTION refresh_bug_updates_search_vector()",
+    "DROP TRIGGER update_cve_table_search_vector ON update_cve_table",
+    "DROP TRIGGER update_bug_table_search_vector ON update_bug_table",
+    "DROP TRIGGER builds_search_vector ON builds",
+    "DROP FUNCTION refresh_update_search_vector()",
+    "DROP TRIGGER updates_search_vector ON updates",
+    "DROP FUNCTION updates_search_vector_trigger()",
+)
+
+
+def upgrade():
+    """
+    Add the search vectors of updates and comments, with their triggers and indexes.
+
+    The search vectors of all the existing updates and comments are computed, which takes a while
+    on a large database.
+    """
+    op.add_column('updates', sa.Column('search_vector', TSVECTOR(), nullable=True))
+    op.add_column('comments', sa.Column('search_vector', TSVECTOR(), nullable=True))
+    for statement in UPGRADE:
+        op.execute(statement)
+
+
+def downgrade():
+    """Drop the search vectors of updates and comments, with their triggers and indexes."""
+    for statement in DOWNGRADE:
+        op.execute(statement)
+    op.drop_column('comments', 'search_vector')
+    op.drop_column('updates', 'search_vector')
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Add karma counters to updates.
+
+Revision ID: e9da6a93d4cd
+Revises: 4df1fcd59050
+Create Date: 2017-08-28 14:12:03.518290
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e9da6a93d4cd'
+down_revision = '4df1fcd59050'
+
+
+# The karma the comments since the last karma reset of each update give it, counting only the
+# last comment each user gave karma with, like Update.tally_karma() does.
+BACKFILL = """
+WITH ordered AS (
+    SELECT comments.id, comments.update_id, comments.user_id, comments.karma,
+           comments.anonymous,
+           users.name = 'bodhi' AND (strpos(comments.text, 'New build') > 0 OR
+                                     strpos(comments.text, 'Removed build') > 0) AS resets_karma,
+           row_number() OVER (PARTITION BY comments.update_id
+                              ORDER BY comments.timestamp, comments.id) AS position
+    FROM comments JOIN users ON users.id = comments.user_id
+), resets AS (
+    SELECT DISTINCT ON (update_id) update_id, id, position
+    FROM ordered WHERE resets_karma
+    ORDER BY update_id, position DESC
+), karma AS (
+    SELECT DISTINCT ON (ordered.update_id, ordered.user_id) ordered.update_id, ordered.karma
+    FROM ordered LEFT JOIN resets ON resets.update_id = ordered.update_id
+    WHERE ordered.karma != 0 AND NOT ordered.anonymous
+        AND ordered.position > coalesce(resets.position, 0)
+    ORDER BY ordered.update_id, ordered.user_id, ordered.position DESC
+)
+UPDATE updates
+SET positive_karma = counts.positive_karma, negative_karma = counts.negative_karma,
+    karma_reset_id = counts.karma_reset_id
+FROM (
+    SELECT update_id, max(reset_id) AS karma_reset_id,
+           coalesce(sum(greatest(karma, 0)), 0) AS positive_karma,
+           coalesce(sum(least(karma, 0)), 0) AS negative_karma
+    FROM (SELECT update_id, id AS reset_id, NULL AS karma FROM resets
+          UNION ALL
+          SELECT update_id, NULL, karma FROM karma) AS counted
+    GROUP BY update_id
+) AS counts
+WHERE updates.id = counts.update_id
+"""
+
+
+def upgrade():
+    """Add the karma counter columns to updates, and count the karma of the existing updates."""
+    op.add_column('updates', sa.Column('positive_karma', sa.Integer(), server_default='0',
+                                       nullable=False))
+    op.add_column('updates', sa.Column('negative_karma', sa.Integer(), server_default='0',
+                                       nullable=False))
+    op.add_column('updates', sa.Column('karma_reset_id', sa.Integer(), nullable=True))
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    """Drop the karma counter columns from updates."""
+    op.drop_column('updates', 'karma_reset_id')
+    op.drop_column('updates', 'negative_karma')
+    op.drop_column('updates', 'positive_karma')
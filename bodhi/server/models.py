@@ -24,6 +24,7 @@ import copy
 import hashlib
 import json
 import os
+from threading import RLock
 import re
 import rpm
 import time
@@ -32,21 +33,28 @@ import uuid
 from pkgdb2client import PkgDB
 from simplemediawiki import MediaWiki
 from six.moves.urllib.parse import quote
-from sqlalchemy import (and_, Boolean, Column, DateTime, ForeignKey, Integer, or_, Table, Unicode,
-                        UnicodeText, UniqueConstraint)
+from sqlalchemy import (and_, Boolean, cast, Column, Date, DateTime, event, Float, ForeignKey,
+                        func, Index, inspect, Integer, or_, select, Table, Unicode, UnicodeText,
+                        UniqueConstraint)
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import class_mapper, relationship, backref, validates
+from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy.orm import (class_mapper, column_property, defaultload, deferred, joinedload,
+                            lazyload, relationship, backref, subqueryload, validates)
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.orm.exc import NoResultFound
 from sqlalchemy.orm.properties import RelationshipProperty
+from sqlalchemy.schema import DDL
 from sqlalchemy.sql import text
 from sqlalchemy.types import SchemaType, TypeDecorator, Enum
 
 from bodhi.server import bugs, buildsys, log, mail, notifications, Session
+from bodhi.server.changelogs import changelogs
 from bodhi.server.config import config
 from bodhi.server.exceptions import BodhiException, LockedUpdateException
 from bodhi.server.util import (
-    avatar as get_avatar, build_evr, flash_log, get_critpath_components,
-    get_nvr, get_rpm_header, header, packagename_from_nvr, tokenize, pagure_api_get)
+    avatar as get_avatar, evr_sort_key, flash_log, get_critpath_components, get_nvr, header,
+    packagename_from_nvr, tokenize, pagure_api_get)
 import bodhi.server.util
 
 
@@ -158,6 +166,112 @@ class DeclEnumType(SchemaType, TypeDecorator):
             t.impl.drop(bind=bind, checkfirst=checkfirst)
 
 
+# How to serialize each model class to JSON, see BodhiBase._json_plan()
+_json_plans = {}
+# The column types whose values are serialized as they are
+_JSON_PLAIN_TYPES = (Boolean, Integer, Unicode, UnicodeText)
+
+
+class JSONFields(object):
+    """
+    Which fields and relationships of a model to serialize, as asked with the ``fields`` and
+    ``expand`` API parameters.
+
+    ``fields`` is a list of dotted paths, such as ``['alias', 'builds.nvr']``, restricting the
+    keys of each level of the result to the ones listed. ``expand`` is a list of dotted paths of the
+    relationships to serialize; when it is given, the relationships it doesn't list are left out.
+    Naming a relationship in ``fields`` also expands it.
+
+    Attributes:
+        fields (set or None): The keys to include at this level, or None for all of them.
+        expand (set or None): The relationships to serialize at this level, or None for all of
+            them.
+        children (dict): Maps relationship names to the JSONFields of the related objects.
+    """
+
+    def __init__(self, fields=None, expand=None):
+        """
+        Initialize the JSONFields of one level of the result.
+
+        Args:
+            fields (set or None): The keys to include, or None for all of them.
+            expand (set or None): The relationships to serialize, or None for all of them.
+        """
+        self.fields = fields
+        self.expand = expand
+        self.children = {}
+
+    @classmethod
+    def parse(cls, fields=None, expand=None):
+        """
+        Return the JSONFields for the given fields and expand API parameters.
+
+        Args:
+            fields (list or None): The dotted paths of the keys to include. None or an empty list
+                includes everything.
+            expand (list or None): The dotted paths of the relationships to serialize, or None to
+                serialize all of them.
+        Returns:
+            JSONFields: The root of the tree of JSONFields.
+        """
+        root = cls(set() if fields else None, None if expand is None else set())
+        for path in expand or []:
+            root._add(path.split('.'), False)
+        for path in fields or []:
+            root._add(path.split('.'), True)
+        return root
+
+    @classmethod
+    def from_request(cls, request):
+        """
+        Return the JSONFields for the fields and expand parameters validated for the request.
+
+        Args:
+            request (pyramid.request.Request or None): The current request.
+        Returns:
+            JSONFields: The root of the tree of JSONFields.
+        """
+        validated = getattr(request, 'validated', None) or {}
+        return cls.parse(validated.get('fields'), validated.get('expand'))
+
+    def _add(self, keys, restrict):
+        """Add the path made of the given keys to the tree, as a field if restrict is True."""
+        node = self
+        for i, key in enumerate(keys):
+            if restrict:
+                node.fields.add(key)
+            if node.expand is not None:
+                node.expand.add(key)
+            child = node.children.get(key)
+            if child is None:
+                child = node.children[key] = JSONFields(
+                    expand=None if node.expand is None else set())
+            node = child
+            if restrict and i < len(keys) - 1 and node.fields is None:
+                node.fields = set()
+
+    @property
+    def everything(self):
+        """Return whether everything is serialized at this level and below."""
+        return self.fields is None and self.expand is None
+
+    def includes(self, key):
+        """Return whether the given column or extra is included at this level."""
+        return self.fields is None or key in self.fields
+
+    def includes_relationship(self, key):
+        """Return whether the given relationship is serialized at this level."""
+        return self.includes(key) and (self.expand is None or key in self.expand)
+
+    def child(self, key):
+        """Return the JSONFields of the objects of the given relationship."""
+        return self.children.get(key, ALL_FIELDS)
+
+
+#: The JSONFields that serializes everything
+ALL_FIELDS = JSONFields()
+
+
 class BodhiBase(object):
     """
     Base class for the SQLAlchemy model base class.
@@ -165,6 +279,8 @@ class BodhiBase(object):
     Attributes:
         __exclude_columns__ (tuple): A list of columns to exclude from JSON
         __include_extras__ (tuple): A list of methods or attrs to include in JSON
+        __json_requires__ (dict): Maps the keys of the JSON to the relationships they are computed
+            from, so that :meth:`json_load_options` keeps loading them eagerly.
         __get_by__ (tuple): A list of columns that :meth:`.get` will query.
         id (int): An integer id that serves as the default primary key.
         query (sqlalchemy.orm.query.Query): a class property which produces a
@@ -172,6 +288,7 @@ class BodhiBase(object):
     """
     __exclude_columns__ = ('id',)
     __include_extras__ = tuple()
+    __json_requires__ = {}
     __get_by__ = ()
 
     id = Column(Integer, primary_key=True)
@@ -179,50 +296,147 @@ class BodhiBase(object):
     query = Session.query_property()
 
     @classmethod
-    def get(cls, id, db):
-        return db.query(cls).filter(or_(
+    def get(cls, id, db, options=()):
+        return db.query(cls).options(*options).filter(or_(
             getattr(cls, col) == id for col in cls.__get_by__
         )).first()
 
+    @classmethod
+    def get_many(cls, ids, db, options=(), batch_size=250):
+        """
+        Return the objects that have the given identifiers, with one query per batch of them.
+
+        Like with :meth:`get`, an identifier can be the value of any of the columns in
+        ``__get_by__``.
+
+        Args:
+            ids (list): The identifiers to look up.
+            db (sqlalchemy.orm.session.Session): A database session.
+            options (iterable): Options for sqlalchemy.orm.query.Query.options().
+            batch_size (int): The maximum number of identifiers to query at once.
+        Returns:
+            dict: The objects that were found, by identifier. The identifiers that are not keys
+                of it were not found.
+        """
+        found = {}
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            query = db.query(cls).options(*options).filter(or_(*cls._get_many_criteria(batch)))
+            for obj in query:
+                for identifier in obj._identifiers():
+                    found[identifier] = obj
+        return dict((id, found[id]) for id in ids if id in found)
+
+    @classmethod
+    def _get_many_criteria(cls, ids):
+        """Return the filters for the objects that have one of the given identifiers."""
+        return [getattr(cls, col).in_(ids) for col in cls.__get_by__]
+
+    def _identifiers(self):
+        """Return the values that identify this object for :meth:`get_many`."""
+        return [getattr(self, col) for col in self.__get_by__]
+
     def __getitem__(self, key):
         return getattr(self, key)
 
     def __repr__(self):
         return '<{0} {1}>'.format(self.__class__.__name__, self.__json__())
 
-    def __json__(self, request=None, anonymize=False):
-        return self._to_json(self, request=request, anonymize=anonymize)
+    def __json__(self, request=None, anonymize=False, fields=None):
+        if fields is None:
+            fields = JSONFields.from_request(request)
+        return self._to_json(self, request=request, anonymize=anonymize, fields=fields)
 
     @classmethod
-    def _to_json(cls, obj, seen=None, request=None, anonymize=False):
-        if not seen:
-            seen = []
+    def json_load_options(cls, fields, _path=()):
+        """
+        Return the query options that stop eagerly loading the relationships fields leaves out.
+
+        The relationships are loaded lazily instead, even if the query's other options or the
+        mapper would load them eagerly, unless they are serialized or needed by one of the keys in
+        __json_requires__.
+
+        Args:
+            fields (JSONFields): What will be serialized.
+        Returns:
+            list: Options for sqlalchemy.orm.query.Query.options().
+        """
+        if fields.everything:
+            return []
+        required = set()
+        for key, relationships in cls.__json_requires__.items():
+            if fields.includes(key):
+                required.update(relationships)
+
+        options = []
+        for key, target in cls._json_plan(cls)[2]:
+            path = _path + (getattr(cls, key),)
+            if fields.includes_relationship(key):
+                options.extend(target.json_load_options(fields.child(key), path))
+            elif key not in required and class_mapper(cls).relationships[key].lazy != 'dynamic':
+                option = lazyload(path[-1])
+                if len(path) > 1:
+                    option = defaultload(*path[:-1]).lazyload(path[-1])
+                options.append(option)
+        return options
+
+    @staticmethod
+    def _json_plan(model):
+        """
+        Return how to serialize instances of the given model class, computing it the first time.
+
+        Args:
+            model (type): A mapped class.
+        Returns:
+            tuple: A 5-tuple of the names of the columns to include, the names of the extras to
+                include, 2-tuples of the name and target class of the relationships to include, the
+                names of the columns and extras that may hold datetimes or EnumSymbols, and the
+                items of the class's __anonymity_map__.
+        """
+        plan = _json_plans.get(model)
+        if plan is None:
+            exclude = getattr(model, '__exclude_columns__', [])
+            properties = list(class_mapper(model).iterate_properties)
+            rels = [p for p in properties if type(p) is RelationshipProperty]
+            columns = [p for p in properties if type(p) is not RelationshipProperty and
+                       p.key not in exclude and not p.key.startswith('_')]
+            extras = tuple(getattr(model, '__include_extras__', []))
+            # Columns of these types never need to be converted.
+            plain = [p.key for p in columns if len(p.columns) == 1 and
+                     type(p.columns[0].type) in _JSON_PLAIN_TYPES]
+            plan = (tuple(p.key for p in columns), extras,
+                    tuple((p.key, p.mapper.class_) for p in rels if p.key not in exclude),
+                    tuple(p.key for p in columns if p.key not in plain) + extras,
+                    tuple(getattr(model, '__anonymity_map__', {}).items()))
+            _json_plans[model] = plan
+        return plan
+
+    @classmethod
+    def _to_json(cls, obj, seen=None, request=None, anonymize=False, fields=ALL_FIELDS):
         if not obj:
             return
+        seen = frozenset(seen) if seen else frozenset()
 
-        exclude = getattr(obj, '__exclude_columns__', [])
-        properties = list(class_mapper(type(obj)).iterate_properties)
-        rels = [p.key for p in properties if type(p) is RelationshipProperty]
-        attrs = [p.key for p in properties if p.key not in rels]
-        d = dict([(attr, getattr(obj, attr)) for attr in attrs
-                  if attr not in exclude and not attr.startswith('_')])
+        attrs, extras, rels, converted, anonymity_map = cls._json_plan(type(obj))
+        if fields.fields is not None:
+            attrs = [attr for attr in attrs if attr in fields.fields]
+            extras = [name for name in extras if name in fields.fields]
+            converted = [key for key in converted if key in fields.fields]
+        d = dict([(attr, getattr(obj, attr)) for attr in attrs])
 
-        extras = getattr(obj, '__include_extras__', [])
         for name in extras:
             attribute = getattr(obj, name)
             if callable(attribute):
                 attribute = attribute(request)
             d[name] = attribute
 
-        for attr in rels:
-            if attr in exclude:
-                continue
-            target = getattr(type(obj), attr).property.mapper.class_
-            if target in seen:
+        for attr, target in rels:
+            if target in seen or not fields.includes_relationship(attr):
                 continue
-            d[attr] = cls._expand(obj, getattr(obj, attr), seen, request)
+            d[attr] = cls._expand(obj, getattr(obj, attr), seen, request, fields.child(attr))
 
-        for key, value in d.iteritems():
+        for key in converted:
+            value = d[key]
             if isinstance(value, datetime):
                 d[key] = value.strftime('%Y-%m-%d %H:%M:%S')
             if isinstance(value, EnumSymbol):
@@ -234,21 +448,21 @@ class BodhiBase(object):
         # authenticated FAS usernames in the 'author' field, but we want to
         # scrub out anonymous users' email addresses.
         if anonymize:
-            for key1, key2 in getattr(obj, '__anonymity_map__', {}).items():
-                if getattr(obj, key2):
+            for key1, key2 in anonymity_map:
+                if fields.includes(key1) and getattr(obj, key2):
                     d[key1] = 'anonymous'
 
         return d
 
     @classmethod
-    def _expand(cls, obj, relation, seen, req):
+    def _expand(cls, obj, relation, seen, req, fields=ALL_FIELDS):
         """ Return the to_json or id of a sqlalchemy relationship. """
         if hasattr(relation, 'all'):
             relation = relation.all()
         if hasattr(relation, '__iter__'):
-            return [cls._expand(obj, item, seen, req) for item in relation]
+            return [cls._expand(obj, item, seen, req, fields) for item in relation]
         if type(relation) not in seen:
-            return cls._to_json(relation, seen + [type(obj)], req)
+            return cls._to_json(relation, seen | frozenset([type(obj)]), req, fields=fields)
         else:
             return relation.id
 
@@ -458,6 +672,56 @@ user_package_table = Table(
     Column('package_id', Integer, ForeignKey('packages.id')))
 
 
+class CacheGeneration(Base):
+    """
+    A counter that is incremented every time the data behind an in-process cache changes.
+
+    Every process compares the generation its cache was built from with the one in the database,
+    so that a change made by one process invalidates the caches of all the others.
+
+    Attributes:
+        name (unicode): The name of the cache.
+        generation (int): How many times the data behind the cache changed.
+    """
+    __tablename__ = 'cache_generations'
+    __get_by__ = ('name',)
+
+    name = Column(Unicode(64), unique=True, nullable=False)
+    generation = Column(Integer, default=0, nullable=False)
+
+    @classmethod
+    def current(cls, session, name):
+        """
+        Return the current generation of the named cache.
+
+        Args:
+            session (sqlalchemy.orm.session.Session): A database session.
+            name (unicode): The name of the cache.
+        Returns:
+            int: The current generation, or 0 if the cache never changed.
+        """
+        generation = session.query(cls.generation).filter_by(name=name).scalar()
+        return generation or 0
+
+    @classmethod
+    def bump(cls, session, name):
+        """
+        Increment the generation of the named cache.
+
+        The increment is done by the database, so that concurrent bumps are never lost.
+
+        Args:
+            session (sqlalchemy.orm.session.Session): A database session.
+            name (unicode): The name of the cache.
+        """
+        with session.no_autoflush:
+            row = session.query(cls).filter_by(name=name).first()
+        if row is None:
+            session.add(cls(name=name, generation=1))
+        else:
+            row.generation = cls.generation + 1
+
+
 class Release(Base):
     __tablename__ = 'releases'
     __exclude_columns__ = ('id', 'builds')
@@ -507,40 +771,251 @@ class Release(Base):
 
     @classmethod
     def all_releases(cls, session):
-        if cls._all_releases:
-            return cls._all_releases
-        releases = defaultdict(list)
-        for release in session.query(cls).order_by(cls.name.desc()).all():
-            releases[release.state.value].append(release.__json__())
-        cls._all_releases = releases
-        return cls._all_releases
-    _all_releases = None
+        """
+        Return the JSON of all the releases, from the release registry.
+
+        Args:
+            session (sqlalchemy.orm.session.Session): A database session.
+        Returns:
+            collections.defaultdict: A dictionary mapping release states to lists of the JSON of
+                the releases in that state.
+        """
+        return cls.registry.all_releases(session)
 
     @classmethod
     def get_tags(cls, session):
-        if cls._tag_cache:
-            return cls._tag_cache
-        data = {'candidate': [], 'testing': [], 'stable': [], 'override': [],
-                'pending_testing': [], 'pending_stable': []}
-        tags = {}  # tag -> release lookup
-        for release in session.query(cls).all():
-            for key in data:
-                tag = getattr(release, '%s_tag' % key)
-                data[key].append(tag)
-                tags[tag] = release.name
-        cls._tag_cache = (data, tags)
-        return cls._tag_cache
-    _tag_cache = None
+        """
+        Return the tags of all the releases, from the release registry.
+
+        Args:
+            session (sqlalchemy.orm.session.Session): A database session.
+        Returns:
+            tuple: A 2-tuple of a dictionary mapping tag types to lists of tags, and a dictionary
+                mapping tags to the names of their releases.
+        """
+        return cls.registry.get_tags(session)
 
     @classmethod
     def from_tags(cls, tags, session):
-        tag_types, tag_rels = cls.get_tags(session)
+        """
+        Return the release of the first of the given tags.
+
+        Args:
+            tags (list): A list of tag names.
+            session (sqlalchemy.orm.session.Session): A database session.
+        Returns:
+            Release or None: The release of the first tag, or None if no tags were given.
+        Raises:
+            KeyError: If the first tag does not belong to any release.
+        """
+        return cls.registry.from_tags(tags, session)
+
+
+class ReleaseRegistry(object):
+    """
+    An in-process registry of the releases, so that looking them up does not query the database.
+
+    The registry maps tags to release names, release names to release ids, and release states to
+    the JSON of the releases. It is loaded on first use and then reused by every request. It is
+    cleared when this process changes a release, and reloaded when the ``releases``
+    :class:`CacheGeneration` shows that another process did, which is checked at most every
+    ``release_registry.check_interval`` seconds.
+    """
+
+    #: The name of the CacheGeneration of the releases
+    GENERATION = u'releases'
+    #: The tag types of the releases
+    TAG_TYPES = ('candidate', 'testing', 'stable', 'override', 'pending_testing',
+                 'pending_stable')
+
+    def __init__(self):
+        """Initialize the empty registry."""
+        # Reentrant, as loading the releases can flush the session, which clears the registry
+        self._lock = RLock()
+        self.clear()
+
+    def clear(self):
+        """Forget the releases, so that they are loaded again when next needed."""
+        with self._lock:
+            self._loaded = False
+            self._generation = None
+            self._checked = 0
+            self._tags = None
+            self._ids = {}
+            self._releases = None
+
+    def _load(self, session):
+        """
+        Load the releases from the database.
+
+        Args:
+            session (sqlalchemy.orm.session.Session): A database session.
+        """
+        generation = CacheGeneration.current(session, self.GENERATION)
+        tag_types = dict((key, []) for key in self.TAG_TYPES)
+        tag_rels = {}
+        ids = {}
+        releases = defaultdict(list)
+        for release in session.query(Release).order_by(Release.name.desc()).all():
+            ids[release.name] = release.id
+            releases[release.state.value].append(release.__json__())
+            for key in self.TAG_TYPES:
+                tag = getattr(release, '%s_tag' % key)
+                tag_types[key].append(tag)
+                tag_rels[tag] = release.name
+        self._generation = generation
+        self._tags = (tag_types, tag_rels)
+        self._ids = ids
+        self._releases = releases
+        self._loaded = True
+        log.debug('Loaded %d releases into the release registry' % len(ids))
+
+    def _refresh(self, session):
+        """
+        Load the releases if they are not loaded or another process changed them.
+
+        Args:
+            session (sqlalchemy.orm.session.Session): A database session.
+        """
+        now = time.time()
+        if not self._loaded:
+            self._load(session)
+            self._checked = now
+        elif now - self._checked >= config.get('release_registry.check_interval'):
+            self._checked = now
+            if CacheGeneration.current(session, self.GENERATION) != self._generation:
+                self._load(session)
+
+    def all_releases(self, session):
+        """
+        Return the JSON of all the releases.
+
+        Args:
+            session (sqlalchemy.orm.session.Session): A database session.
+        Returns:
+            collections.defaultdict: A dictionary mapping release states to lists of the JSON of
+                the releases in that state, by descending name.
+        """
+        with self._lock:
+            self._refresh(session)
+            return self._releases
+
+    def get_tags(self, session):
+        """
+        Return the tags of all the releases.
+
+        Args:
+            session (sqlalchemy.orm.session.Session): A database session.
+        Returns:
+            tuple: A 2-tuple of a dictionary mapping tag types to lists of tags, and a dictionary
+                mapping tags to the names of their releases. They are copies, which the caller may
+                modify.
+        """
+        with self._lock:
+            self._refresh(session)
+            tag_types, tag_rels = self._tags
+            return (dict((key, list(tags)) for key, tags in tag_types.items()), dict(tag_rels))
+
+    def get(self, name, session):
+        """
+        Return the release with the given name.
+
+        The release is looked up by its primary key, so no query is made if it is already in the
+        session.
+
+        Args:
+            name (unicode): The name of the release.
+            session (sqlalchemy.orm.session.Session): A database session.
+        Returns:
+            Release or None: The release, or None if there is no such release.
+        """
+        with self._lock:
+            self._refresh(session)
+            release_id = self._ids.get(name)
+        if release_id is None:
+            return None
+        return session.query(Release).get(release_id)
+
+    def from_tags(self, tags, session):
+        """
+        Return the release of the first of the given tags.
+
+        Args:
+            tags (list): A list of tag names.
+            session (sqlalchemy.orm.session.Session): A database session.
+        Returns:
+            Release or None: The release of the first tag, or None if no tags were given.
+        Raises:
+            KeyError: If the first tag does not belong to any release.
+        """
+        tag_types, tag_rels = self.get_tags(session)
         for tag in tags:
-            release = session.query(cls).filter_by(name=tag_rels[tag]).first()
+            release = self.get(tag_rels[tag], session)
             if release:
                 return release
 
 
+Release.registry = ReleaseRegistry()
+
+
+@event.listens_for(Session, 'before_flush')
+def bump_release_generation(session, flush_context, instances):
+    """
+    Increment the releases CacheGeneration when releases are created, edited or deleted.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): The session being flushed.
+        flush_context (sqlalchemy.orm.session.UOWTransaction): Unused.
+        instances (list): Unused.
+    """
+    changed = [obj for obj in list(session.new) + list(session.deleted)
+               if isinstance(obj, Release)]
+    changed += [obj for obj in session.dirty
+                if isinstance(obj, Release) and session.is_modified(obj)]
+    if changed:
+        CacheGeneration.bump(session, ReleaseRegistry.GENERATION)
+        session.info['release_registry'] = True
+
+
+@event.listens_for(Session, 'after_flush')
+def clear_release_registry_after_flush(session, flush_context):
+    """
+    Clear the release registry after releases were changed by this process.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): The session that was flushed.
+        flush_context (sqlalchemy.orm.session.UOWTransaction): Unused.
+    """
+    if session.info.get('release_registry'):
+        Release.registry.clear()
+
+
+@event.listens_for(Session, 'after_commit')
+def forget_release_changes_after_commit(session):
+    """
+    Forget that releases were changed once the changes are committed.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): The session that was committed.
+    """
+    session.info.pop('release_registry', None)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def clear_release_registry_after_rollback(session, previous_transaction):
+    """
+    Clear the release registry when changes to releases are rolled back.
+
+    The registry may have been loaded with the changes before they were rolled back.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): The session that was rolled back.
+        previous_transaction (sqlalchemy.orm.session.SessionTransaction): Unused.
+    """
+    if session.info.pop('release_registry', None):
+        Release.registry.clear()
+
+
 class TestCase(Base):
     """Test cases from the wiki"""
     __tablename__ = 'testcases'
@@ -804,9 +1279,12 @@ class Build(Base):
     release = relationship('Release', backref='builds', lazy=False)
 
     type = Column(ContentType.db_type(), nullable=False)
+    # Load the columns of all the types of builds, so that a query of builds of different types
+    # doesn't need another query per build for the columns of its type.
     __mapper_args__ = {
         'polymorphic_on': type,
         'polymorphic_identity': ContentType.base,
+        'with_polymorphic': '*',
     }
 
     def get_url(self):
@@ -898,9 +1376,14 @@ class RpmBuild(Build):
         nvr (unicode): A dash (-) separated string of an RPM's name, version, and release (e.g.
             u'bodhi-2.5.0-1.fc26')
         epoch (int): The RPM's epoch.
+        evr_key (unicode): A string that sorts RpmBuilds of the same package the same way as
+            rpm.labelCompare() sorts their epoch, version, and release. It is None until the epoch
+            has been fetched from Koji.
     """
+    __exclude_columns__ = Build.__exclude_columns__ + ('evr_key',)
 
     epoch = Column(Integer, default=0)
+    evr_key = Column(UnicodeText, default=None, nullable=True)
 
     __mapper_args__ = {
         'polymorphic_identity': ContentType.rpm,
@@ -911,18 +1394,77 @@ class RpmBuild(Build):
         """
         The RpmBuild's epoch, version, release, all basestrings in a 3-tuple.
 
+        The epoch is only fetched from Koji if neither it nor the EVR sort key were stored yet.
+
         Return:
             tuple: (epoch, version, release)
         """
-        if self.epoch:
-            name, version, release = get_nvr(self.nvr)
-            return (str(self.epoch), version, release)
-        else:
-            koji_session = buildsys.get_session()
-            build = koji_session.getBuild(self.nvr)
-            evr = build_evr(build)
-            self.epoch = int(evr[0])
-            return evr
+        if self.evr_key is None:
+            if self.epoch:
+                self.set_evr({'epoch': self.epoch})
+            else:
+                koji_session = buildsys.get_cached_session()
+                self.set_evr(koji_session.getBuild(self.nvr))
+        name, version, release = get_nvr(self.nvr)
+        return (str(self.epoch or 0), str(version), str(release))
+
+    def set_evr(self, buildinfo):
+        """
+        Store the epoch and the EVR sort key of this build.
+
+        Args:
+            buildinfo (dict): The build as returned by Koji's getBuild().
+        """
+        self.epoch = int(buildinfo['epoch'] or 0)
+        name, version, release = get_nvr(self.nvr)
+        self.evr_key = evr_sort_key((self.epoch, version, release))
+
+    def is_newer_than(self, other):
+        """
+        Return whether this build is newer than another build of the same package.
+
+        The builds are compared by their EVR sort keys, or with rpm.labelCompare() if either key
+        was not stored yet.
+
+        Args:
+            other (RpmBuild): The other build.
+        Returns:
+            bool: True if this build's epoch, version, and release are newer than the other's.
+        """
+        if self.evr_key is not None and other.evr_key is not None:
+            return self.evr_key > other.evr_key
+        return rpm.labelCompare(self.evr, other.evr) > 0
+
+    def newer_builds(self, db, statuses, release=None):
+        """
+        Return the other builds of this package that are newer than this one.
+
+        The builds are found by comparing their EVR sort keys in the database. Builds whose epoch
+        was not stored yet (see the bodhi-backfill-evr command) are compared with
+        rpm.labelCompare() instead.
+
+        Args:
+            db (sqlalchemy.orm.session.Session): A database session.
+            statuses (iterable): Only consider builds of updates in these UpdateStatuses.
+            release (Release or None): If given, only consider builds of updates for this
+                release.
+        Returns:
+            list: The newer RpmBuilds.
+        """
+        evr = self.evr
+        query = db.query(RpmBuild).join(Update).filter(
+            RpmBuild.package_id == self.package_id, RpmBuild.nvr != self.nvr,
+            Update.status.in_(statuses),
+            or_(RpmBuild.evr_key > self.evr_key, RpmBuild.evr_key.is_(None)))
+        if release is not None:
+            query = query.filter(Update.release == release)
+
+        builds = []
+        for build in query:
+            if build.evr_key is None and rpm.labelCompare(build.evr, evr) <= 0:
+                continue
+            builds.append(build)
+        return builds
 
     def get_latest(self):
         """
@@ -933,30 +1475,12 @@ class RpmBuild(Build):
             basestring or None: An nvr string, formatted like RpmBuild.nvr. If there is no other
                 Build, returns None.
         """
-        koji_session = buildsys.get_session()
-
-        # Grab a list of builds tagged with ``Release.stable_tag`` release
-        # tags, and find the most recent update for this package, other than
-        # this one.  If nothing is tagged for -updates, then grab the first
-        # thing in ``Release.dist_tag``.  We aren't checking
+        # The changelogs service looks for the most recent update for this package in
+        # ``Release.stable_tag``, then in ``Release.dist_tag``.  We aren't checking
         # ``Release.candidate_tag`` first, because there could potentially be
         # packages that never make their way over stable, so we don't want to
         # generate ChangeLogs against those.
-        latest = None
-        evr = self.evr
-        for tag in [self.update.release.stable_tag, self.update.release.dist_tag]:
-            builds = koji_session.getLatestBuilds(
-                tag, package=self.package.name)
-
-            # Find the first build that is older than us
-            for build in builds:
-                new_evr = build_evr(build)
-                if rpm.labelCompare(evr, new_evr) < 0:
-                    latest = build['nvr']
-                    break
-            if latest:
-                break
-        return latest
+        return changelogs.latest(self)
 
     def get_changelog(self, timelimit=0):
         """
@@ -968,26 +1492,10 @@ class RpmBuild(Build):
         Return:
             str: The RpmBuild's changelog.
         """
-        rpm_header = get_rpm_header(self.nvr)
-        descrip = rpm_header['changelogtext']
-        if not descrip:
-            return ""
-
-        who = rpm_header['changelogname']
-        when = rpm_header['changelogtime']
+        return changelogs.changelog(self.nvr, timelimit)
 
-        num = len(descrip)
-        if num == 1:
-            when = [when]
 
-        str = ""
-        i = 0
-        while (i < num) and (when[i] > timelimit):
-            str += '* %s %s\n%s\n' % (time.strftime("%a %b %e %Y",
-                                      time.localtime(when[i])), who[i],
-                                      descrip[i])
-            i += 1
-        return str
+Index('ix_builds_package_id_evr_key', Build.__table__.c.package_id, Build.__table__.c.evr_key)
 
 
 class Update(Base):
@@ -1067,8 +1575,11 @@ class Update(Base):
             (e.g. 2 of 32 required tests failed).
     """
     __tablename__ = 'updates'
-    __exclude_columns__ = ('id', 'user_id', 'release_id', 'cves')
+    __exclude_columns__ = ('id', 'user_id', 'release_id', 'cves', 'positive_karma',
+                           'negative_karma', 'karma_reset_id', 'search_vector')
     __include_extras__ = ('meets_testing_requirements', 'url',)
+    __json_requires__ = {'karma': ('comments',), 'meets_testing_requirements': ('comments',),
+                         'content_type': ('builds',), 'test_cases': ('builds',)}
     __get_by__ = ('title', 'alias')
 
     title = Column(UnicodeText, unique=True, default=None, index=True)
@@ -1083,10 +1594,12 @@ class Update(Base):
     notes = Column(UnicodeText, nullable=False)  # Mandatory notes
 
     # Enumerated types
-    type = Column(UpdateType.db_type(), nullable=False)
-    status = Column(UpdateStatus.db_type(),
-                    default=UpdateStatus.pending,
-                    nullable=False)
+    # The old type, status, release and submission date are loaded before they change, since
+    # bodhi.server.stats moves the statistics of the update from the update_stats row they key.
+    type = column_property(Column(UpdateType.db_type(), nullable=False), active_history=True)
+    status = column_property(Column(UpdateStatus.db_type(),
+                                    default=UpdateStatus.pending,
+                                    nullable=False), active_history=True)
     request = Column(UpdateRequest.db_type())
     severity = Column(UpdateSeverity.db_type(), default=UpdateSeverity.unspecified)
     suggest = Column(UpdateSuggestion.db_type(), default=UpdateSuggestion.unspecified)
@@ -1100,7 +1613,8 @@ class Update(Base):
     close_bugs = Column(Boolean, default=True)
 
     # Timestamps
-    date_submitted = Column(DateTime, default=datetime.utcnow, index=True)
+    date_submitted = column_property(Column(DateTime, default=datetime.utcnow, index=True),
+                                     active_history=True)
     date_modified = Column(DateTime)
     date_approved = Column(DateTime)
     date_pushed = Column(DateTime)
@@ -1115,8 +1629,8 @@ class Update(Base):
     old_updateid = Column(Unicode(32), default=None)
 
     # One-to-one relationships
-    release_id = Column(Integer, ForeignKey('releases.id'))
-    release = relationship('Release', lazy='joined')
+    release_id = column_property(Column(Integer, ForeignKey('releases.id')), active_history=True)
+    release = relationship('Release', lazy='joined', active_history=True)
 
     # One-to-many relationships
     comments = relationship('Comment', backref=backref('update', lazy='joined'), lazy='joined',
@@ -1134,6 +1648,79 @@ class Update(Base):
     test_gating_status = Column(TestGatingStatus.db_type(), default=None, nullable=True)
     greenwave_summary_string = Column(Unicode(255))
 
+    # Karma counters, kept up to date by comment()
+    positive_karma = Column(Integer, default=0, server_default='0', nullable=False)
+    negative_karma = Column(Integer, default=0, server_default='0', nullable=False)
+    # The id of the most recent comment that reset the karma, if any
+    karma_reset_id = Column(Integer, nullable=True)
+
+    # The words of the title, alias, notes, package names, CVE ids and bug titles, kept up to date
+    # by triggers on PostgreSQL (see SEARCH_DDL)
+    search_vector = deferred(Column(TSVECTOR().with_variant(UnicodeText(), 'sqlite')))
+
+    @classmethod
+    def search(cls, session, terms):
+        """
+        Return the filter and rank of the updates matching the given search terms.
+
+        On PostgreSQL, the updates whose search_vector matches the terms are ranked first. The
+        updates whose title or alias contains the terms, such as a partial package name, are
+        matched too, with the trigram indexes. Other databases only have the latter.
+
+        Args:
+            session (sqlalchemy.orm.session.Session): A database session.
+            terms (basestring): The search terms.
+        Returns:
+            tuple: A 2-tuple of the filter, and of the rank to sort the results by in descending
+                order, or None if the database does not rank the results.
+        """
+        like = or_(cls.title.ilike('%%%s%%' % terms), cls.alias.ilike('%%%s%%' % terms))
+        return _search(session, cls.search_vector, terms, like)
+
+    @classmethod
+    def loading_profile(cls, name):
+        """
+        Return the query options that load the relationships a kind of call site needs.
+
+        The comments and builds of updates are joined eagerly by default, which multiplies the
+        rows of every query of updates by their numbers of comments and builds. The profiles load
+        each collection with one more query for all the updates instead, and don't join the
+        updates back from their comments and builds:
+
+        - ``list``: pages of updates, with everything their JSON contains but the test cases,
+          which :meth:`prefetch_test_cases` loads.
+        - ``detail``: a single update, with the same relationships as ``list``.
+        - ``masher``: updates being pushed, with their builds and release but not their comments.
+
+        Args:
+            name (basestring): The name of the profile.
+        Returns:
+            list: Options for sqlalchemy.orm.query.Query.options().
+        Raises:
+            ValueError: If there is no profile with the given name.
+        """
+        if name not in ('list', 'detail', 'masher'):
+            raise ValueError('Unknown loading profile: %s' % name)
+
+        builds = subqueryload(cls.builds)
+        options = [builds.lazyload(Build.update), joinedload(cls.release)]
+        if name == 'masher':
+            return options + [lazyload(cls.comments)]
+
+        comments = subqueryload(cls.comments)
+        options.extend([
+            comments.lazyload(Comment.update),
+            comments.subqueryload(Comment.bug_feedback).joinedload(BugKarma.bug),
+            comments.subqueryload(Comment.testcase_feedback).joinedload(TestCaseKarma.testcase),
+            subqueryload(cls.bugs).subqueryload(Bug.feedback),
+            subqueryload(cls.cves),
+        ])
+        # The buildroot overrides of users are not part of their JSON.
+        for user in (joinedload(cls.user), comments.joinedload(Comment.user)):
+            options.extend([user.subqueryload(User.groups),
+                            user.lazyload(User.buildroot_overrides)])
+        return options
+
     @validates('builds')
     def validate_builds(self, key, build):
         """
@@ -1166,10 +1753,10 @@ class Update(Base):
         days = self.release.mandatory_days_in_testing
         return days if days else 0
 
-    @property
+    @hybrid_property
     def karma(self):
         """
-        Calculate and return the karma for the Update.
+        Return the karma for the Update.
 
         :return: The Update's current karma.
         :rtype:  int
@@ -1177,29 +1764,26 @@ class Update(Base):
         positive_karma, negative_karma = self._composite_karma
         return positive_karma + negative_karma
 
+    @karma.expression
+    def karma(cls):
+        """Return the SQL expression of the karma, for filtering and sorting updates by it."""
+        return cls.positive_karma + cls.negative_karma
+
     @property
     def _composite_karma(self):
         """
-        Calculate and return a 2-tuple of the sum of the positive karma comments, and the sum of the
+        Return a 2-tuple of the sum of the positive karma comments, and the sum of the
         negative karma comments. The total karma is simply the sum of the two elements of this
         2-tuple.
 
         :return: a 2-tuple of (positive_karma, negative_karma)
         :rtype:  tuple
         """
-        positive_karma = 0
-        negative_karma = 0
-        users_counted = set()
-        for comment in self.comments_since_karma_reset:
-            if comment.karma and not comment.anonymous and comment.user.name not in users_counted:
-                # Make sure we only count the last comment this user made
-                users_counted.add(comment.user.name)
-                if comment.karma > 0:
-                    positive_karma += comment.karma
-                else:
-                    negative_karma += comment.karma
-
-        return positive_karma, negative_karma
+        if self.positive_karma is None:
+            # The update was never flushed, so its counters have no values yet.
+            counters = self.tally_karma()
+            return counters['positive_karma'], counters['negative_karma']
+        return self.positive_karma, self.negative_karma
 
     @property
     def comments_since_karma_reset(self):
@@ -1209,20 +1793,101 @@ class Update(Base):
         :return: an iterable of recent comments
         :rtype: generator
         """
+        karma_reset_id = self.karma_reset_id
+        if self.positive_karma is None:
+            karma_reset_id = self.tally_karma()['karma_reset_id']
         # We want to traverse the comments in reverse order so we only consider
         # the most recent comments from any given user and only the comments
         # since the most recent karma reset event.
         for comment in reversed(self.comments):
-            if (comment.user.name == u'bodhi' and
-                    ('New build' in comment.text or 'Removed build' in comment.text)):
-                # We only want to consider comments since the most recent karma
-                # reset, which happens whenever a build is added or removed
-                # from an Update. Since we are traversing the comments in
-                # reverse order, once we find one of these comments we can
-                # simply exit this loop.
+            if karma_reset_id is not None and comment.id == karma_reset_id:
                 break
             yield comment
 
+    @staticmethod
+    def _resets_karma(comment):
+        """
+        Return whether the given comment resets the karma of its update, which happens whenever a
+        build is added or removed from an Update.
+        """
+        return comment.user.name == u'bodhi' and (
+            'New build' in comment.text or 'Removed build' in comment.text)
+
+    @staticmethod
+    def _is_admin_approval(comment):
+        """Return whether the given comment is a Releng/QA approval."""
+        if comment.karma != 1:
+            return False
+        admin_groups = config.get('admin_groups')
+        return any(group.name in admin_groups for group in comment.user.groups)
+
+    def tally_karma(self):
+        """
+        Count the karma of this update from all of its comments, without storing it.
+
+        Returns:
+            dict: The values of the positive_karma, negative_karma, and karma_reset_id counters.
+        """
+        counters = {'positive_karma': 0, 'negative_karma': 0, 'karma_reset_id': None}
+        users_counted = set()
+        # We want to traverse the comments in reverse order so we only consider
+        # the most recent comments from any given user and only the comments
+        # since the most recent karma reset event.
+        for comment in reversed(self.comments):
+            if self._resets_karma(comment):
+                counters['karma_reset_id'] = comment.id
+                break
+            elif comment.karma and not comment.anonymous and comment.user.name not in users_counted:
+                # Make sure we only count the last comment this user made
+                users_counted.add(comment.user.name)
+                if comment.karma > 0:
+                    counters['positive_karma'] += comment.karma
+                else:
+                    counters['negative_karma'] += comment.karma
+        return counters
+
+    def recount_karma(self):
+        """
+        Count the karma of this update from all of its comments, and store the counters.
+
+        comment() keeps the counters up to date, so this is only needed for the updates that were
+        commented on by other means.
+        """
+        for key, value in self.tally_karma().items():
+            setattr(self, key, value)
+
+    def _count_karma(self, comment):
+        """
+        Add the given comment, which was just added to this update, to the karma counters.
+
+        Args:
+            comment (Comment): The new comment.
+        """
+        if self.positive_karma is None:
+            self.recount_karma()
+            return
+        if self._resets_karma(comment):
+            self.positive_karma = self.negative_karma = 0
+            self.karma_reset_id = comment.id
+            return
+        if not comment.karma or comment.anonymous:
+            return
+
+        # Only the last karma each user gave since the karma was reset counts.
+        for previous in self.comments_since_karma_reset:
+            if (previous is not comment and previous.user_id == comment.user_id and
+                    previous.karma and not previous.anonymous):
+                self._add_karma(previous.karma, -1)
+                break
+        self._add_karma(comment.karma)
+
+    def _add_karma(self, karma, sign=1):
+        """Add (or with a negative sign, remove) karma to the counter of karma of its sign."""
+        if karma > 0:
+            self.positive_karma += sign * karma
+        else:
+            self.negative_karma += sign * karma
+
     @staticmethod
     def contains_critpath_component(builds, release_name):
         """
@@ -1505,11 +2170,12 @@ class Update(Base):
                      or_(Update.status == UpdateStatus.testing,
                          Update.status == UpdateStatus.pending))
             ).all():
-                obsoletable = False
-                nvr = get_nvr(build.nvr)
-                if rpm.labelCompare(get_nvr(oldBuild.nvr), nvr) < 0:
-                    log.debug("%s is newer than %s" % (nvr, oldBuild.nvr))
-                    obsoletable = True
+                if isinstance(build, RpmBuild) and isinstance(oldBuild, RpmBuild):
+                    obsoletable = build.is_newer_than(oldBuild)
+                else:
+                    obsoletable = rpm.labelCompare(get_nvr(oldBuild.nvr), get_nvr(build.nvr)) < 0
+                if obsoletable:
+                    log.debug("%s is newer than %s" % (build.nvr, oldBuild.nvr))
 
                 # Ensure that all of the packages in the old update are
                 # present in the new one.
@@ -2087,6 +2753,7 @@ class Update(Base):
         user.comments.append(comment)
         self.comments.append(comment)
         session.flush()
+        self._count_karma(comment)
 
         if not anonymous and karma != 0:
             # Determine whether this user has already left karma, and if so what the most recent
@@ -2522,17 +3189,13 @@ class Update(Base):
 
     @property
     def num_admin_approvals(self):
-        """ Return the number of Releng/QA approvals of this update """
-        approvals = 0
-        for comment in self.comments:
-            if comment.karma != 1:
-                continue
-            admin_groups = config.get('admin_groups')
-            for group in comment.user.groups:
-                if group.name in admin_groups:
-                    approvals += 1
-                    break
-        return approvals
+        """
+        Return the number of Releng/QA approvals of this update.
+
+        The approvals are counted from the groups the commenters are in now, rather than when they
+        commented, so they are not stored with the karma counters.
+        """
+        return len([c for c in self.comments if self._is_admin_approval(c)])
 
     @property
     def test_cases(self):
@@ -2553,6 +3216,55 @@ class Update(Base):
                     tests.add(test)
         return sorted(list(tests))
 
+    @classmethod
+    def _get_many_criteria(cls, ids):
+        """Return the filters for the updates that have one of the given titles, aliases or NVRs."""
+        builds = select([Build.update_id]).where(Build.nvr.in_(ids))
+        return super(Update, cls)._get_many_criteria(ids) + [cls.id.in_(builds)]
+
+    def _identifiers(self):
+        """Return the title, alias and the NVRs of the builds of this update."""
+        return super(Update, self)._identifiers() + [build.nvr for build in self.builds]
+
+    @staticmethod
+    def prefetch_test_cases(db, updates, batch_size=500):
+        """
+        Load the packages of the builds of the given updates, and the test cases of the packages.
+
+        test_cases and full_test_cases would otherwise load the test cases of each package one at
+        a time. This loads them all with one query (per batch_size packages), and the packages
+        that weren't joined with their builds with one more, and should be called before
+        serializing a page of updates or the updates of a push.
+
+        Args:
+            db (sqlalchemy.orm.session.Session): A database session.
+            updates (iterable): The Updates to load the test cases of.
+            batch_size (int): The maximum number of package ids to query at once.
+        """
+        builds = [build for update in updates for build in update.builds]
+        unloaded = [build for build in builds
+                    if 'package' not in build.__dict__ and build.package_id is not None]
+        missing = sorted(set(build.package_id for build in unloaded))
+        loaded = {}
+        for i in range(0, len(missing), batch_size):
+            query = db.query(Package).filter(Package.id.in_(missing[i:i + batch_size]))
+            loaded.update((package.id, package) for package in query)
+        for build in unloaded:
+            set_committed_value(build, 'package', loaded.get(build.package_id))
+
+        packages = dict((build.package.id, build.package) for build in builds
+                        if build.package is not None and build.package.id is not None and
+                        'test_cases' not in build.package.__dict__)
+        package_ids = sorted(packages)
+        test_cases = defaultdict(list)
+        for i in range(0, len(package_ids), batch_size):
+            query = db.query(TestCase).filter(
+                TestCase.package_id.in_(package_ids[i:i + batch_size])).order_by(TestCase.id)
+            for test in query:
+                test_cases[test.package_id].append(test)
+        for package_id, package in packages.items():
+            set_committed_value(package, 'test_cases', test_cases[package_id])
+
     @property
     def requested_tag(self):
         """Return the tag that update has requested"""
@@ -2572,32 +3284,40 @@ class Update(Base):
                 'Unable to determine requested tag for %s.' % self.title)
         return tag
 
-    def __json__(self, request=None, anonymize=False):
+    def __json__(self, request=None, anonymize=False, fields=None):
+        if fields is None:
+            fields = JSONFields.from_request(request)
         result = super(Update, self).__json__(
-            request=request, anonymize=anonymize)
+            request=request, anonymize=anonymize, fields=fields)
         # Duplicate alias as updateid for backwards compat with bodhi1
-        result['updateid'] = result['alias']
+        if fields.includes('updateid'):
+            result['updateid'] = self.alias
         # Also, put the update submitter's name in the same place we put
         # it for bodhi1 to make fedmsg.meta compat much more simple.
-        result['submitter'] = result['user']['name']
+        if fields.includes('submitter'):
+            result['submitter'] = self.user.name
         # Include the karma total in the results
-        result['karma'] = self.karma
+        if fields.includes('karma'):
+            result['karma'] = self.karma
         # Also, the Update content_type (derived from the builds content_types)
-        result['content_type'] = self.content_type.value if self.content_type else None
+        if fields.includes('content_type'):
+            result['content_type'] = self.content_type.value if self.content_type else None
 
         # For https://github.com/fedora-infra/bodhi/issues/270, throw the JSON
         # of the test cases in our output as well but take extra care to
         # short-circuit some of the insane recursion for
         # https://github.com/fedora-infra/bodhi/issues/343
-        seen = [Package, TestCaseKarma]
-        result['test_cases'] = [
-            test._to_json(
-                obj=test,
-                seen=seen,
-                request=request,
-                anonymize=anonymize)
-            for test in self.full_test_cases
-        ]
+        if fields.includes_relationship('test_cases'):
+            seen = [Package, TestCaseKarma]
+            result['test_cases'] = [
+                test._to_json(
+                    obj=test,
+                    seen=seen,
+                    request=request,
+                    anonymize=anonymize,
+                    fields=fields.child('test_cases'))
+                for test in self.full_test_cases
+            ]
 
         return result
 
@@ -2630,10 +3350,11 @@ class TestCaseKarma(Base):
 
 class Comment(Base):
     __tablename__ = 'comments'
-    __exclude_columns__ = tuple()
+    __exclude_columns__ = ('search_vector',)
     __get_by__ = ('id',)
     # If 'anonymous' is true, then scrub the 'author' field in __json__(...)
     __anonymity_map__ = {'user': u'anonymous'}
+    __json_requires__ = {'update_title': ('update',)}
 
     karma = Column(Integer, default=0)
     karma_critpath = Column(Integer, default=0)
@@ -2644,6 +3365,26 @@ class Comment(Base):
     update_id = Column(Integer, ForeignKey('updates.id'))
     user_id = Column(Integer, ForeignKey('users.id'))
 
+    # The words of the text, kept up to date by a trigger on PostgreSQL (see SEARCH_DDL)
+    search_vector = deferred(Column(TSVECTOR().with_variant(UnicodeText(), 'sqlite')))
+
+    @classmethod
+    def search(cls, session, terms):
+        """
+        Return the filter and rank of the comments matching the given search terms.
+
+        On PostgreSQL, the comments whose search_vector matches the terms are ranked first, and
+        the comments containing the terms are matched too. Other databases only have the latter.
+
+        Args:
+            session (sqlalchemy.orm.session.Session): A database session.
+            terms (basestring): The search terms.
+        Returns:
+            tuple: A 2-tuple of the filter, and of the rank to sort the results by in descending
+                order, or None if the database does not rank the results.
+        """
+        return _search(session, cls.search_vector, terms, cls.text.ilike('%%%s%%' % terms))
+
     def url(self):
         url = '/updates/' + self.update.title + '#comment-' + str(self.id)
         return url
@@ -2663,22 +3404,28 @@ class Comment(Base):
 
         return filtered_feedbacks
 
-    def __json__(self, *args, **kwargs):
-        result = super(Comment, self).__json__(*args, **kwargs)
+    def __json__(self, request=None, anonymize=False, fields=None):
+        if fields is None:
+            fields = JSONFields.from_request(request)
+        result = super(Comment, self).__json__(
+            request=request, anonymize=anonymize, fields=fields)
         # Duplicate 'user' as 'author' just for backwards compat with bodhi1.
         # Things like fedmsg and fedbadges rely on this.
-        if not self.anonymous and result['user']:
-            result['author'] = result['user']['name']
-        else:
-            result['author'] = u'anonymous'
+        if fields.includes('author'):
+            if not self.anonymous and self.user:
+                result['author'] = self.user.name
+            else:
+                result['author'] = u'anonymous'
 
         # Similarly, duplicate the update's title as update_title.
-        result['update_title'] = result['update']['title']
+        if fields.includes('update_title'):
+            result['update_title'] = self.update.title
 
         # Updates used to have a karma column which would be included in result['update']. The
         # column was replaced with a property, so we need to include it here for backwards
         # compatibility.
-        result['update']['karma'] = self.update.karma
+        if result.get('update') is not None and fields.child('update').includes('karma'):
+            result['update']['karma'] = self.update.karma
 
         return result
 
@@ -2694,6 +3441,46 @@ class Comment(Base):
                                               self.timestamp, karma, self.text)
 
 
+class UpdateStats(Base):
+    """
+    The statistics of the updates of a release with the same type and status, submitted on a day.
+
+    The rows are kept up to date as updates and comments are written, by
+    :mod:`bodhi.server.stats`, which can also rebuild them from scratch. The comment counters
+    leave out the comments of Bodhi itself and of AutoQA.
+
+    Attributes:
+        release (Release): The release of the updates.
+        type (UpdateType): The type of the updates.
+        status (UpdateStatus): The current status of the updates.
+        day (datetime.date): The day the updates were submitted.
+        updates (int): The number of updates.
+        positive_comments (int): The number of comments with positive karma on the updates.
+        neutral_comments (int): The number of comments without karma on the updates.
+        negative_comments (int): The number of comments with negative karma on the updates.
+        anonymous_feedback (int): The number of anonymous comments with karma on the updates.
+        updates_with_feedback (int): The number of updates that received karma from an
+            authenticated user.
+    """
+    __tablename__ = 'update_stats'
+    __table_args__ = (
+        UniqueConstraint('release_id', 'type', 'status', 'day', name='update_stats_key'),
+    )
+
+    release_id = Column(Integer, ForeignKey('releases.id'), nullable=False)
+    type = Column(UpdateType.db_type(), nullable=False)
+    status = Column(UpdateStatus.db_type(), nullable=False)
+    day = Column(Date, nullable=False)
+    updates = Column(Integer, default=0, nullable=False)
+    positive_comments = Column(Integer, default=0, nullable=False)
+    neutral_comments = Column(Integer, default=0, nullable=False)
+    negative_comments = Column(Integer, default=0, nullable=False)
+    anonymous_feedback = Column(Integer, default=0, nullable=False)
+    updates_with_feedback = Column(Integer, default=0, nullable=False)
+
+    release = relationship('Release')
+
+
 class CVE(Base):
     __tablename__ = 'cves'
     __exclude_columns__ = ('id', 'updates', 'bugs')
@@ -2815,6 +3602,10 @@ class User(Base):
     __include_extras__ = ('avatar', 'openid')
     __get_by__ = ('name',)
 
+    #: The name of the CacheGeneration of the users and their groups, which versions the identities
+    #: cached by bodhi.server.security.get_identity()
+    GENERATION = u'users'
+
     name = Column(Unicode(64), unique=True, nullable=False)
     email = Column(UnicodeText, unique=True)
 
@@ -2851,6 +3642,57 @@ class Group(Base):
     # users backref
 
 
+def _changes_identity(session, obj):
+    """
+    Return whether the given pending object changes the identity of a user.
+
+    The comments and updates of users are left out, since they are not part of their identities.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): The session being flushed.
+        obj (object): A new, dirty or deleted object of the session.
+    Returns:
+        bool: Whether the object is a user or a group that was created, deleted or changed.
+    """
+    if not isinstance(obj, (User, Group)):
+        return False
+    if obj in session.new or obj in session.deleted:
+        return True
+    if isinstance(obj, User):
+        return session.is_modified(obj, include_collections=False) or \
+            inspect(obj).attrs.groups.history.has_changes()
+    return session.is_modified(obj)
+
+
+@event.listens_for(Session, 'before_flush')
+def bump_user_generation(session, flush_context, instances):
+    """
+    Increment the users CacheGeneration when users, groups, or their memberships are written.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): The session being flushed.
+        flush_context (sqlalchemy.orm.session.UOWTransaction): Unused.
+        instances (list): Unused.
+    """
+    objects = list(session.new) + list(session.dirty) + list(session.deleted)
+    if any(_changes_identity(session, obj) for obj in objects):
+        CacheGeneration.bump(session, User.GENERATION)
+        session.info['user_generation'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+@event.listens_for(Session, 'after_soft_rollback')
+def forget_user_changes(session, *args):
+    """
+    Forget that users were changed once the changes are committed or rolled back.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): The session.
+        args (tuple): The previous transaction, for rollbacks.
+    """
+    session.info.pop('user_generation', None)
+
+
 class BuildrootOverride(Base):
     """
     This model represents a Koji buildroot override.
@@ -3000,3 +3842,120 @@ class Stack(Base):
     # Many-to-many relationships
     groups = relationship("Group", secondary=stack_group_table, backref='stacks')
     users = relationship("User", secondary=stack_user_table, backref='stacks')
+
+
+##
+#  Full-text search
+##
+
+#: The PostgreSQL text search configuration of the search vectors
+SEARCH_CONFIG = 'english'
+
+#: The PostgreSQL functions, triggers, and indexes that keep the search vectors up to date and
+#: make searching fast. They are created by create_all() and by the migration that added them.
+SEARCH_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    CREATE FUNCTION updates_search_vector_trigger() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.alias, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce((
+                SELECT string_agg(packages.name, ' ') FROM builds
+                JOIN packages ON packages.id = builds.package_id
+                WHERE builds.update_id = NEW.id), '')), 'A') ||
+            setweight(to_tsvector('english', coalesce((
+                SELECT string_agg(cves.cve_id, ' ') FROM update_cve_table
+                JOIN cves ON cves.id = update_cve_table.cve_id
+                WHERE update_cve_table.update_id = NEW.id), '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.notes, '')), 'B') ||
+            setweight(to_tsvector('english', coalesce((
+                SELECT string_agg(bugs.title, ' ') FROM update_bug_table
+                JOIN bugs ON bugs.id = update_bug_table.bug_id
+                WHERE update_bug_table.update_id = NEW.id), '')), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER updates_search_vector BEFORE INSERT OR UPDATE OF title, alias, notes,
+    search_vector ON updates FOR EACH ROW EXECUTE PROCEDURE updates_search_vector_trigger()
+    """,
+    # The rows related to updates refresh the search vectors of their updates when they change.
+    """
+    CREATE FUNCTION refresh_update_search_vector() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP <> 'DELETE' THEN
+            UPDATE updates SET search_vector = NULL WHERE id = NEW.update_id;
+        END IF;
+        IF TG_OP <> 'INSERT' THEN
+            UPDATE updates SET search_vector = NULL WHERE id = OLD.update_id;
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER builds_search_vector AFTER INSERT OR DELETE OR UPDATE OF update_id, package_id
+    ON builds FOR EACH ROW EXECUTE PROCEDURE refresh_update_search_vector()
+    """,
+    """
+    CREATE TRIGGER update_bug_table_search_vector AFTER INSERT OR DELETE ON update_bug_table
+    FOR EACH ROW EXECUTE PROCEDURE refresh_update_search_vector()
+    """,
+    """
+    CREATE TRIGGER update_cve_table_search_vector AFTER INSERT OR DELETE ON update_cve_table
+    FOR EACH ROW EXECUTE PROCEDURE refresh_update_search_vector()
+    """,
+    """
+    CREATE FUNCTION refresh_bug_updates_search_vector() RETURNS trigger AS $$
+    BEGIN
+        UPDATE updates SET search_vector = NULL WHERE id IN (
+            SELECT update_id FROM update_bug_table WHERE bug_id = NEW.id);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER bugs_search_vector AFTER UPDATE OF title ON bugs
+    FOR EACH ROW EXECUTE PROCEDURE refresh_bug_updates_search_vector()
+    """,
+    """
+    CREATE TRIGGER comments_search_vector BEFORE INSERT OR UPDATE OF text ON comments
+    FOR EACH ROW EXECUTE PROCEDURE
+    tsvector_update_trigger(search_vector, 'pg_catalog.english', text)
+    """,
+    "CREATE INDEX ix_updates_search_vector ON updates USING gin (search_vector)",
+    "CREATE INDEX ix_comments_search_vector ON comments USING gin (search_vector)",
+    "CREATE INDEX ix_updates_title_trgm ON updates USING gin (title gin_trgm_ops)",
+    "CREATE INDEX ix_updates_alias_trgm ON updates USING gin (alias gin_trgm_ops)",
+    "CREATE INDEX ix_comments_text_trgm ON comments USING gin (text gin_trgm_ops)",
+    "CREATE INDEX ix_packages_name_trgm ON packages USING gin (name gin_trgm_ops)",
+)
+
+for statement in SEARCH_DDL:
+    event.listen(metadata, 'after_create', DDL(statement).execute_if(dialect='postgresql'))
+
+
+def _search(session, search_vector, terms, like):
+    """
+    Return the filter and rank of the rows matching the given search terms.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): A database session.
+        search_vector (sqlalchemy.Column): The search vector column of the rows.
+        terms (basestring): The search terms.
+        like (sqlalchemy.sql.expression.ClauseElement): The filter of the rows containing the
+            terms, used on its own on databases without full-text search.
+    Returns:
+        tuple: A 2-tuple of the filter, and of the rank to sort the results by in descending
+            order, or None if the database does not rank the results.
+    """
+    if session.get_bind().dialect.name != 'postgresql':
+        return like, None
+    query = func.plainto_tsquery(SEARCH_CONFIG, terms)
+    # ts_rank() returns a real, which doesn't survive the round trip through the float of a
+    # pagination cursor, so it would never equal the rank in the cursor. A double precision does.
+    rank = cast(func.ts_rank(search_vector, query), Float(53))
+    return or_(search_vector.op('@@')(query), like), rank
@@ -0,0 +1,409 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Page the results of the list endpoints, by page number or by cursor.
+
+A cursor is an opaque string holding the sort key of the last result of a page. The next page is
+the results after that key, which the database finds through the index of the sort key instead
+of counting and skipping all the results of the previous pages the way ``OFFSET`` does.
+
+The total numbers of results are cached in the ``totals_cache`` region for each combination of
+filters. Each table the totals depend on has a generation, a token that is replaced whenever the
+table is written, and the totals are cached under the generations of their tables. A generation
+also tells when it started, which :mod:`bodhi.server.conditional` uses as the time the table was
+last modified.
+"""
+
+import base64
+import binascii
+from datetime import datetime
+import hashlib
+import json
+import math
+from threading import Lock
+import time
+import uuid
+
+from dogpile.cache import make_region
+from dogpile.cache.api import NO_VALUE
+from pyramid.httpexceptions import HTTPBadRequest
+from sqlalchemy import and_, distinct, event, func, inspect, or_
+
+from bodhi.server import log, Session
+from bodhi.server.config import config
+from bodhi.server.models import (
+    Base, Bug, Build, BuildrootOverride, Comment, EnumSymbol, Release, Update, User)
+
+
+#: The format of the datetimes in cursors
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+#: The datetime that nullable datetime sort keys sort NULL as, see not_null()
+NULL_DATETIME = datetime(1970, 1, 1)
+#: The validated parameters that don't filter the results, and so don't change their total
+NON_FILTERS = ('chrome', 'count', 'cursor', 'display_request', 'display_user', 'expand', 'fields',
+               'page', 'rows_per_page')
+#: The names of the generations of the tables, by model
+GENERATIONS = ((Update, 'updates'), (Comment, 'comments'), (Build, 'builds'),
+               (BuildrootOverride, 'overrides'), (Bug, 'bugs'), (Release, 'releases'),
+               (User, 'users'))
+
+#: The dogpile.cache backends that keep the generations in each process rather than sharing them
+PROCESS_BACKENDS = ('dogpile.cache.memory', 'dogpile.cache.memory_pickle', 'dogpile.cache.null')
+
+totals_cache = make_region()
+_totals_cache_lock = Lock()
+
+
+def _encode_value(value):
+    """Return the given key value as something JSON can serialize."""
+    if isinstance(value, datetime):
+        return {'datetime': value.strftime(DATETIME_FORMAT)}
+    return value
+
+
+def _decode_value(value):
+    """Return the key value encoded by _encode_value()."""
+    if isinstance(value, dict):
+        return datetime.strptime(value['datetime'], DATETIME_FORMAT)
+    return value
+
+
+def encode_cursor(values):
+    """
+    Return the cursor for the given sort key.
+
+    Args:
+        values (list): The values of the sort key of the last result of a page.
+    Returns:
+        str: The opaque cursor.
+    """
+    return base64.urlsafe_b64encode(json.dumps([_encode_value(v) for v in values]))
+
+
+def decode_cursor(cursor):
+    """
+    Return the sort key of the given cursor.
+
+    Args:
+        cursor (basestring): A cursor returned by encode_cursor().
+    Returns:
+        list: The values of the sort key.
+    Raises:
+        ValueError: If the cursor is not one that encode_cursor() returns.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(str(cursor)))
+        if not isinstance(values, list):
+            raise ValueError('Not a list')
+        return [_decode_value(v) for v in values]
+    except (binascii.Error, KeyError, TypeError, UnicodeError, ValueError):
+        raise ValueError('Invalid cursor: %s' % cursor)
+
+
+def _after(keys, values, descending):
+    """
+    Return the filter for the results that come after the given sort key.
+
+    Args:
+        keys (list): The columns of the sort key.
+        values (list): The values of the sort key of the last result of the previous page.
+        descending (bool): Whether the results are sorted in descending order.
+    Returns:
+        sqlalchemy.sql.expression.ClauseElement: The filter.
+    """
+    clauses = []
+    for i, (key, value) in enumerate(zip(keys, values)):
+        equal = [k == v for k, v in zip(keys[:i], values[:i])]
+        clauses.append(and_(*(equal + [key < value if descending else key > value])))
+    return or_(*clauses)
+
+
+def not_null(column, default=NULL_DATETIME):
+    """
+    Return the given nullable column as a sort key for paginate(), which sorts NULL as default.
+
+    The comparisons of the sort key with the cursor would never be true for NULL.
+
+    Args:
+        column (sqlalchemy.Column): A nullable column.
+        default (object): The value to sort NULL as.
+    Returns:
+        sqlalchemy.sql.functions.coalesce: The sort key.
+    """
+    return func.coalesce(column, default)
+
+
+def shared_generations(settings=config):
+    """
+    Return whether the generations of the tables are shared by all the processes.
+
+    Args:
+        settings (dict): The Bodhi settings. Defaults to the configuration.
+    Returns:
+        bool: Whether the totals_cache backend is shared by the processes.
+    """
+    return settings.get('totals_cache.backend') not in PROCESS_BACKENDS
+
+
+def _get_totals_cache():
+    """Return the totals_cache region, configuring it on first use."""
+    with _totals_cache_lock:
+        if not totals_cache.is_configured:
+            totals_cache.configure_from_config(config, 'totals_cache.')
+    return totals_cache
+
+
+def _normalize(value):
+    """Return the given validated parameter as something JSON serializes the same every time."""
+    if isinstance(value, Base):
+        return [type(value).__name__] + list(inspect(value).identity)
+    if isinstance(value, (list, tuple, set)):
+        return sorted(_normalize(v) for v in value)
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    if isinstance(value, EnumSymbol):
+        return value.value
+    return value
+
+
+def filter_signature(validated):
+    """
+    Return a hash of the filters of a list request, which is the same for the same filters.
+
+    Args:
+        validated (dict): The request's validated parameters.
+    Returns:
+        str: The hexadecimal hash.
+    """
+    filters = dict((key, _normalize(value)) for key, value in validated.items()
+                   if key not in NON_FILTERS and value is not None)
+    return hashlib.sha1(json.dumps(filters, sort_keys=True, default=unicode)).hexdigest()
+
+
+def _new_generation():
+    """Return a new generation: the time it starts, and a random part that makes it unique."""
+    return '%.6f-%s' % (time.time(), uuid.uuid4().hex)
+
+
+def generation_time(generation):
+    """
+    Return the time the given generation started.
+
+    Args:
+        generation (str): A generation returned by get_generations().
+    Returns:
+        datetime.datetime: The time, in UTC.
+    """
+    return datetime.utcfromtimestamp(float(generation.split('-', 1)[0]))
+
+
+def get_generations(names):
+    """
+    Return the current generations of the given tables.
+
+    Args:
+        names (iterable): The names of the tables' generations, from GENERATIONS.
+    Returns:
+        list: The generation of each table, in the same order.
+    """
+    region = _get_totals_cache()
+    keys = ['generation:%s' % name for name in names]
+    generations = region.get_multi(keys)
+    for i, generation in enumerate(generations):
+        if generation is NO_VALUE:
+            generations[i] = _new_generation()
+            region.set(keys[i], generations[i])
+    return generations
+
+
+def bump_generations(names):
+    """
+    Replace the generations of the given tables, invalidating the totals that depend on them.
+
+    Args:
+        names (iterable): The names of the tables' generations, from GENERATIONS.
+    """
+    region = _get_totals_cache()
+    region.set_multi(dict(('generation:%s' % name, _new_generation()) for name in names))
+
+
+def _count(request, query, count_column):
+    """Return the number of distinct values of count_column in the results of the query."""
+    # We can't use ``query.count()`` here because it is naive with respect to
+    # all the joins that the services do.
+    count_query = query.with_labels().statement\
+        .with_only_columns([func.count(distinct(count_column))])\
+        .order_by(None)
+    return request.db.execute(count_query).scalar()
+
+
+def _cached_count(request, query, name, count_column, depends_on):
+    """
+    Return the number of results of the query, from the totals_cache if it is there.
+
+    The total is cached along with the generations of its tables, and counted again if they
+    changed. Keeping the generations out of the key replaces the stale total instead of leaving it
+    in the cache, which the memory and dbm backends would never evict.
+
+    Args:
+        request (pyramid.request): The current request.
+        query (sqlalchemy.orm.query.Query): The query for the results.
+        name (str): The name of the list, to tell apart the totals of different lists.
+        count_column (sqlalchemy.Column): The column that identifies the results.
+        depends_on (tuple): The names of the generations of the tables the total depends on.
+    Returns:
+        int: The total number of results.
+    """
+    region = _get_totals_cache()
+    key = 'total:%s:%s' % (name, filter_signature(request.validated))
+    # The generations are read before counting, so a total counted while a table is written is
+    # stored under the generation from before the write.
+    generations = get_generations(depends_on)
+    cached = region.get(key)
+    if cached is not NO_VALUE and cached[0] == generations:
+        return cached[1]
+    total = _count(request, query, count_column)
+    region.set(key, (generations, total))
+    return total
+
+
+def paginate(request, query, name, keys, count_column, descending=False, depends_on=()):
+    """
+    Return a page of the results of the given query, as asked by the request.
+
+    The results are sorted by the given keys, which must identify them uniquely, so the last
+    result of a page is all it takes to find the next one. The query must return each result
+    once, so it must filter on to-many relationships with ``any()`` rather than with joins. The
+    request's ``cursor`` is the ``next_cursor`` of the previous page, and takes precedence over
+    its ``page``. Its ``count`` can be false to skip counting all the results, in which case
+    ``total`` and ``pages`` are None.
+
+    Args:
+        request (pyramid.request): The current request, validated by a PaginatedSchema.
+        query (sqlalchemy.orm.query.Query): The query for the results, without any ordering.
+        name (str): The key of the results in the returned dictionary.
+        keys (list): The non-nullable columns or SQL expressions to sort the results by. Nullable
+            columns can be wrapped with not_null().
+        count_column (sqlalchemy.Column): The column that identifies the results, to count them.
+        descending (bool): Whether to sort the results in descending order.
+        depends_on (tuple): The names of the generations of all the tables the filters of the
+            list use, to cache the total in the totals_cache region. The total isn't cached if
+            this is empty.
+    Returns:
+        dict: A dictionary with the following key mappings:
+            <name>: The list of results of the page.
+            page: The current page.
+            pages: The total number of pages, or None.
+            rows_per_page: The maximum number of results per page.
+            total: The total number of results, or None.
+            next_cursor: The cursor of the next page, or None if this page is the last one.
+    Raises:
+        pyramid.httpexceptions.HTTPBadRequest: If the cursor does not match the keys.
+    """
+    data = request.validated
+    page = data.get('page')
+    rows_per_page = data.get('rows_per_page')
+
+    total = pages = None
+    if data.get('count', True):
+        if depends_on:
+            total = _cached_count(request, query, name, count_column, depends_on)
+        else:
+            total = _count(request, query, count_column)
+        pages = int(math.ceil(total / float(rows_per_page)))
+
+    query = query.order_by(*[key.desc() if descending else key for key in keys])
+    cursor = data.get('cursor')
+    if cursor is not None:
+        values = decode_cursor(cursor)
+        if len(values) != len(keys):
+            raise HTTPBadRequest('Invalid cursor')
+        query = query.filter(_after(keys, values, descending))
+    else:
+        query = query.offset(rows_per_page * (page - 1))
+
+    # Fetching one more result tells whether there is a next page without counting them. The keys
+    # are fetched along with the results, since they may be expressions like search ranks.
+    rows = query.add_columns(*keys).limit(rows_per_page + 1).all()
+    results = [row[0] for row in rows[:rows_per_page]]
+    next_cursor = None
+    if len(rows) > rows_per_page:
+        next_cursor = encode_cursor(list(rows[rows_per_page - 1][1:]))
+
+    return {name: results, 'page': page, 'pages': pages, 'rows_per_page': rows_per_page,
+            'total': total, 'next_cursor': next_cursor}
+
+
+def _written_generations(session):
+    """Return the names of the generations of the tables the session is about to write."""
+    changed = list(session.new) + list(session.deleted) + [
+        obj for obj in session.dirty if session.is_modified(obj)]
+    return set(name for model, name in GENERATIONS
+               for obj in changed if isinstance(obj, model))
+
+
+@event.listens_for(Session, 'after_flush')
+def bump_generations_after_flush(session, flush_context):
+    """
+    Invalidate the cached totals of the tables that were written by the flush.
+
+    The generations are bumped again once the changes are committed or rolled back, since other
+    processes may have cached totals without the changes in between.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): The session that was flushed.
+        flush_context (sqlalchemy.orm.session.UOWTransaction): Unused.
+    """
+    names = _written_generations(session)
+    if names:
+        session.info.setdefault('written_generations', set()).update(names)
+        _bump_generations_safely(names)
+
+
+def _bump_generations_safely(names):
+    """Bump the generations of the given tables, only logging the errors of the cache."""
+    try:
+        bump_generations(names)
+    except Exception:
+        log.exception('Unable to invalidate the cached totals of %s' % ', '.join(sorted(names)))
+
+
+@event.listens_for(Session, 'after_commit')
+def bump_generations_after_commit(session):
+    """
+    Invalidate the cached totals of the tables that were written by the committed transaction.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): The session that was committed.
+    """
+    names = session.info.pop('written_generations', None)
+    if names:
+        _bump_generations_safely(names)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def bump_generations_after_rollback(session, previous_transaction):
+    """
+    Invalidate the cached totals of the tables that were written by a rolled back transaction.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): The session that was rolled back.
+        previous_transaction (sqlalchemy.orm.session.SessionTransaction): Unused.
+    """
+    bump_generations_after_commit(session)
@@ -66,6 +66,7 @@ def push(username, cert_prefix, **kwargs):
     db_factory = transactional_session_maker()
     with db_factory() as session:
         updates = []
+        masher = Update.loading_profile('masher')
         # If we're resuming a push
         if resume:
             for lockfile in lockfiles:
@@ -73,14 +74,16 @@ def push(username, cert_prefix, **kwargs):
                     continue
 
                 for update in lockfiles[lockfile]:
-                    update = session.query(Update).filter(Update.title == update).first()
+                    update = session.query(Update).options(*masher).filter(
+                        Update.title == update).first()
                     updates.append(update)
         else:
             # Accept both comma and space separated request list
             requests = kwargs['request'].replace(',', ' ').split(' ')
             requests = [UpdateRequest.from_string(val) for val in requests]
 
-            query = session.query(Update).filter(Update.request.in_(requests))
+            query = session.query(Update).options(*masher).filter(
+                Update.request.in_(requests)).order_by(Update.id)
 
             if kwargs.get('builds'):
                 query = query.join(Update.builds)
@@ -21,7 +21,7 @@ import re
 
 import colander
 
-from bodhi.server import util
+from bodhi.server import pagination, util
 from bodhi.server.models import (
     ContentType,
     ReleaseState,
@@ -90,6 +90,12 @@ class Releases(colander.SequenceSchema):
     release = colander.SchemaNode(colander.String())
 
 
+class Fields(colander.SequenceSchema):
+    """A SequenceSchema to validate a list of dotted paths to fields of the results."""
+
+    field = colander.SchemaNode(colander.String(), missing=colander.drop)
+
+
 class Groups(colander.SequenceSchema):
     """A SequenceSchema to validate a list of Group objects."""
 
@@ -102,6 +108,12 @@ class Updates(colander.SequenceSchema):
     update = colander.SchemaNode(colander.String())
 
 
+class Identifiers(colander.SequenceSchema):
+    """A SequenceSchema to validate a list of identifiers of objects."""
+
+    identifier = colander.SchemaNode(colander.String())
+
+
 class BugFeedback(colander.MappingSchema):
     """A schema for BugFeedback to be provided via API parameters."""
 
@@ -244,8 +256,20 @@ class Cosmetics(colander.MappingSchema):
     )
 
 
+def _validate_cursor(node, value):
+    """Raise colander.Invalid if the value is not a cursor returned by the list endpoints."""
+    try:
+        pagination.decode_cursor(value)
+    except ValueError:
+        raise colander.Invalid(node, 'Invalid cursor')
+
+
 class PaginatedSchema(colander.MappingSchema):
-    """A mixin class used by schemas to provide pagination support for API endpoints."""
+    """
+    A mixin class used by schemas to provide pagination support for API endpoints.
+
+    See bodhi.server.pagination.paginate for how ``cursor`` and ``count`` are interpreted.
+    """
 
     chrome = colander.SchemaNode(
         colander.Boolean(true_choices=('true', '1')),
@@ -253,6 +277,19 @@ class PaginatedSchema(colander.MappingSchema):
         missing=True,
     )
 
+    count = colander.SchemaNode(
+        colander.Boolean(true_choices=('true', '1')),
+        location="querystring",
+        missing=True,
+    )
+
+    cursor = colander.SchemaNode(
+        colander.String(),
+        location="querystring",
+        missing=None,
+        validator=_validate_cursor,
+    )
+
     page = colander.SchemaNode(
         colander.Integer(),
         validator=colander.Range(min=1),
@@ -268,6 +305,38 @@ class PaginatedSchema(colander.MappingSchema):
     )
 
 
+class FieldsSchema(colander.MappingSchema):
+    """
+    A mixin class used by schemas to let API clients choose the fields of the results.
+
+    See bodhi.server.models.JSONFields for how ``fields`` and ``expand`` are interpreted.
+    """
+
+    fields = Fields(
+        colander.Sequence(accept_scalar=True),
+        location="querystring",
+        missing=None,
+        preparer=[util.splitter],
+    )
+
+    expand = Fields(
+        colander.Sequence(accept_scalar=True),
+        location="querystring",
+        missing=None,
+        preparer=[util.splitter],
+    )
+
+
+class BulkSchema(FieldsSchema):
+    """An API schema for the endpoints that return many objects at once by their identifiers."""
+
+    ids = Identifiers(
+        colander.Sequence(accept_scalar=True),
+        validator=colander.Length(min=1, max=1000),
+        preparer=[util.splitter],
+    )
+
+
 class SearchableSchema(colander.MappingSchema):
     """A mixin class used by schemas to provide search support for API endpoints."""
 
@@ -284,7 +353,7 @@ class SearchableSchema(colander.MappingSchema):
     )
 
 
-class ListReleaseSchema(PaginatedSchema):
+class ListReleaseSchema(PaginatedSchema, FieldsSchema):
     """
     An API schema for listing releases.
 
@@ -411,7 +480,7 @@ class SaveStackSchema(CSRFProtectedSchema, colander.MappingSchema):
     )
 
 
-class ListUserSchema(PaginatedSchema, SearchableSchema):
+class ListUserSchema(PaginatedSchema, FieldsSchema, SearchableSchema):
     """An API schema for bodhi.server.services.user.query_users()."""
 
     name = colander.SchemaNode(
@@ -442,7 +511,7 @@ class ListUserSchema(PaginatedSchema, SearchableSchema):
     )
 
 
-class ListUpdateSchema(PaginatedSchema, SearchableSchema, Cosmetics):
+class ListUpdateSchema(PaginatedSchema, FieldsSchema, SearchableSchema, Cosmetics):
     """An API schema for bodhi.server.services.updates.query_updates()."""
 
     alias = Builds(
@@ -627,7 +696,7 @@ class ListPackageSchema(PaginatedSchema, SearchableSchema):
     )
 
 
-class ListBuildSchema(PaginatedSchema):
+class ListBuildSchema(PaginatedSchema, FieldsSchema):
     """An API schema for bodhi.server.services.builds.query_builds()."""
 
     nvr = colander.SchemaNode(
@@ -667,7 +736,7 @@ class UpdateRequestSchema(CSRFProtectedSchema, colander.MappingSchema):
     )
 
 
-class ListCommentSchema(PaginatedSchema, SearchableSchema):
+class ListCommentSchema(PaginatedSchema, FieldsSchema, SearchableSchema):
     """An API schema for bodhi.server.services.comments.query_comments()."""
 
     updates = Updates(
@@ -715,7 +784,7 @@ class ListCommentSchema(PaginatedSchema, SearchableSchema):
     )
 
 
-class ListOverrideSchema(PaginatedSchema, SearchableSchema, Cosmetics):
+class ListOverrideSchema(PaginatedSchema, FieldsSchema, SearchableSchema, Cosmetics):
     """An API schema for bodhi.server.services.overrides.query_overrides()."""
 
     builds = Builds(
@@ -68,8 +68,8 @@ def main(argv=sys.argv):
     db = Session()
 
     try:
-        testing = db.query(Update).filter_by(status=UpdateStatus.testing,
-                                             request=None)
+        testing = db.query(Update).options(*Update.loading_profile('list')).filter_by(
+            status=UpdateStatus.testing, request=None)
         for update in testing:
             # If this release does not have any testing requirements, skip it
             if not update.release.mandatory_days_in_testing:
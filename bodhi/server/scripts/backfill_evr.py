@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""
+Store the epoch and the EVR sort key of RPM builds that were created before Bodhi persisted them.
+
+Builds are fetched from Koji in batches, with one multicall per batch.
+"""
+import click
+
+from bodhi.server import buildsys, config, initialize_db, models, Session
+
+
+@click.command()
+@click.option('--batch-size', default=500, help='How many builds to fetch from Koji at once.')
+@click.version_option(message='%(version)s')
+def backfill(batch_size):
+    """Store the EVR sort key of every RPM build that lacks one."""
+    initialize_db(config.config)
+    buildsys.setup_buildsystem(config.config)
+    session = Session()
+    koji = buildsys.get_session()
+
+    last_id = 0
+    updated = 0
+    while True:
+        builds = session.query(models.RpmBuild).filter(
+            models.RpmBuild.evr_key.is_(None), models.RpmBuild.id > last_id).order_by(
+            models.RpmBuild.id).limit(batch_size).all()
+        if not builds:
+            break
+        last_id = builds[-1].id
+
+        koji.multicall = True
+        for build in builds:
+            koji.getBuild(build.nvr)
+        for build, result in zip(builds, koji.multiCall()):
+            if isinstance(result, dict) or not result[0]:
+                click.echo('Unable to find %s in Koji' % build.nvr)
+                continue
+            build.set_evr(result[0])
+            updated += 1
+        session.commit()
+
+    click.echo('Stored the EVR of %d builds' % updated)
+
+
+if __name__ == '__main__':
+    backfill()
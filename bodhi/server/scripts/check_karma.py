@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""
+Compare the karma counters stored on updates with their comments, and optionally fix them.
+
+Updates are loaded in batches, with their comments and the comments' users and groups.
+"""
+import sys
+
+import click
+
+from bodhi.server import config, initialize_db, models, Session
+
+
+@click.command()
+@click.option('--fix', is_flag=True, help='Store the counted karma of the wrong updates.')
+@click.option('--batch-size', default=500, help='How many updates to load at once.')
+@click.version_option(message='%(version)s')
+def check(fix, batch_size):
+    """Check the stored karma counters of every update."""
+    initialize_db(config.config)
+    session = Session()
+
+    last_id = 0
+    checked = 0
+    wrong = 0
+    while True:
+        updates = session.query(models.Update).options(
+            *models.Update.loading_profile('list')).filter(
+            models.Update.id > last_id).order_by(models.Update.id).limit(batch_size).all()
+        if not updates:
+            break
+        last_id = updates[-1].id
+
+        for update in updates:
+            checked += 1
+            counted = update.tally_karma()
+            stored = dict((key, getattr(update, key)) for key in counted)
+            if stored == counted:
+                continue
+            wrong += 1
+            click.echo('%s: stored %s, counted %s' % (
+                update.alias or update.title, _format(stored), _format(counted)))
+            if fix:
+                update.recount_karma()
+        if fix:
+            session.commit()
+        else:
+            session.rollback()
+
+    click.echo('%d of %d updates had wrong karma counters%s' % (
+        wrong, checked, ', fixed' if fix and wrong else ''))
+    if wrong and not fix:
+        sys.exit(1)
+
+
+def _format(counters):
+    """Return the given karma counters as a string."""
+    return ', '.join('%s=%s' % item for item in sorted(counters.items()))
+
+
+if __name__ == '__main__':
+    check()
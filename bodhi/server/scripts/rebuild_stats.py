@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+
+"""Count the statistics of the update_stats table again from the updates and their comments."""
+import click
+
+from bodhi.server import config, initialize_db, Session, stats
+
+
+@click.command()
+@click.version_option(message='%(version)s')
+def rebuild():
+    """Rebuild the statistics of updates used by the metrics."""
+    initialize_db(config.config)
+    session = Session()
+
+    rows = stats.rebuild_update_stats(session)
+    session.commit()
+    click.echo('Rebuilt %d rows of update statistics' % rows)
+
+
+if __name__ == '__main__':
+    rebuild()
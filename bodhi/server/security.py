@@ -18,14 +18,16 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """A collection of authentication and authorization functions and classes."""
 from cornice.errors import Errors
+from dogpile.cache.api import NO_VALUE
 
 from pyramid.security import (Allow, ALL_PERMISSIONS, DENY_ALL)
 from pyramid.security import remember, forget
 from pyramid.httpexceptions import HTTPFound
 from pyramid.threadlocal import get_current_registry
 
-from . import log
-from .models import User, Group
+from . import caches, log
+from .config import config
+from .models import CacheGeneration, User, Group
 
 
 #
@@ -62,6 +64,62 @@ def packagers_allowed_acl(request):
     ] + [DENY_ALL]
 
 
+#
+# Identities
+#
+
+def _load_identity(db, username):
+    """
+    Load the identity of the named user with a single query.
+
+    Args:
+        db (sqlalchemy.orm.session.Session): The database session.
+        username (unicode): The name of the user.
+    Returns:
+        dict or None: The identity described by get_identity(), or None if there is no such user.
+    """
+    rows = db.query(User.id, User.name, User.email, User.show_popups, Group.name)\
+        .outerjoin(User.groups).filter(User.name == username).all()
+    if not rows:
+        return None
+    id, name, email, show_popups = rows[0][:4]
+    return {'id': id, 'name': name, 'email': email, 'show_popups': show_popups,
+            'groups': sorted(row[4] for row in rows if row[4] is not None)}
+
+
+def get_identity(db, username):
+    """
+    Return the identity of the named user, which is cached for the lifetime of an auth ticket.
+
+    The identities are kept in the ``identities`` cache region with the ``users``
+    :class:`bodhi.server.models.CacheGeneration` they were loaded at, and are only used while it
+    is current. Every process bumps it in the database when it writes users, groups, or who is in
+    them, so no process keeps using the groups a user was removed from, whether the region is
+    shared or not. The pending changes of users are flushed first, as the query of an uncached
+    identity would, so that the identity includes them. The identities that include changes that
+    are not committed yet are not cached.
+
+    Args:
+        db (sqlalchemy.orm.session.Session): The database session.
+        username (unicode): The name of the user.
+    Returns:
+        dict or None: The id, name, email and show_popups preference of the user, and the sorted
+            list of the names of their groups under the "groups" key. None if there is no such user.
+    """
+    if any(isinstance(obj, User) for obj in list(db.new) + list(db.dirty)):
+        db.flush()
+    region = caches.get_region('identities')
+    generation = CacheGeneration.current(db, User.GENERATION)
+    cached = region.get(username, expiration_time=config.get('authtkt.timeout'))
+    if cached is not NO_VALUE and cached[0] == generation:
+        return cached[1]
+
+    identity = _load_identity(db, username)
+    if not db.info.get('user_generation'):
+        region.set(username, (generation, identity))
+    return identity
+
+
 #
 # OpenID views
 #
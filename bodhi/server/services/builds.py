@@ -17,20 +17,23 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """Define service endpoint for retrieving Builds."""
-import math
 
 from cornice import Service
 from pyramid.exceptions import HTTPNotFound
-from sqlalchemy import func, distinct
 from sqlalchemy.sql import or_
 
-from bodhi.server.models import Update, Build, Package, Release
+from bodhi.server.models import Update, Build, JSONFields, Package, Release
+from bodhi.server.pagination import paginate
 from bodhi.server.validators import validate_updates, validate_packages, validate_releases
 import bodhi.server.schemas
 import bodhi.server.security
 import bodhi.server.services.errors
 
 
+# Services are registered in the order of their names, and this one must come before ``build``
+# for its route to match /builds/bulk before /builds/{nvr} does.
+batch_builds = Service(name='builds_bulk', path='/builds/bulk', description='Koji builds lookup',
+                       cors_origins=bodhi.server.security.cors_origins_ro)
 build = Service(name='build', path='/builds/{nvr}', description='Koji builds',
                 cors_origins=bodhi.server.security.cors_origins_ro)
 builds = Service(name='builds', path='/builds/',
@@ -59,6 +62,25 @@ def get_build(request):
     return build
 
 
+@batch_builds.post(schema=bodhi.server.schemas.BulkSchema, renderer='json',
+                   error_handler=bodhi.server.services.errors.json_handler)
+def get_builds(request):
+    """
+    Return the Builds that have the given NVRs, all loaded at once.
+
+    Args:
+        request (pyramid.request): The current request.
+    Returns:
+        dict: A dictionary with the following key mappings:
+            builds: The Builds that were found, by NVR.
+            not_found: The NVRs that no Build has.
+    """
+    ids = request.validated['ids']
+    builds = Build.get_many(ids, request.db,
+                            options=Build.json_load_options(JSONFields.from_request(request)))
+    return dict(builds=builds, not_found=[id for id in ids if id not in builds])
+
+
 @builds.get(schema=bodhi.server.schemas.ListBuildSchema, renderer='json',
             error_handler=bodhi.server.services.errors.json_handler,
             validators=(validate_releases, validate_updates,
@@ -85,10 +107,12 @@ def query_builds(request):
             pages: The total number of pages.
             rows_per_page: The number of rows per page.
             total: The number of builds that match the search criteria.
+            next_cursor: The cursor of the next page, or None if this page is the last one.
     """
     db = request.db
     data = request.validated
-    query = db.query(Build)
+    query = db.query(Build).options(
+        *Build.json_load_options(JSONFields.from_request(request)))
 
     nvr = data.get('nvr')
     if nvr is not None:
@@ -112,22 +136,5 @@ def query_builds(request):
         query = query.join(Build.release)
         query = query.filter(or_(*[Release.id == r.id for r in releases]))
 
-    # We can't use ``query.count()`` here because it is naive with respect to
-    # all the joins that we're doing above.
-    count_query = query.with_labels().statement\
-        .with_only_columns([func.count(distinct(Build.nvr))])\
-        .order_by(None)
-    total = db.execute(count_query).scalar()
-
-    page = data.get('page')
-    rows_per_page = data.get('rows_per_page')
-    pages = int(math.ceil(total / float(rows_per_page)))
-    query = query.offset(rows_per_page * (page - 1)).limit(rows_per_page)
-
-    return dict(
-        builds=query.all(),
-        page=page,
-        pages=pages,
-        rows_per_page=rows_per_page,
-        total=total,
-    )
+    return paginate(request, query, 'builds', [Build.nvr], Build.nvr,
+                    depends_on=('builds', 'updates'))
@@ -18,15 +18,15 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """Define the service endpoints that handle Comments."""
 
-import math
 
 from cornice import Service
 from pyramid.httpexceptions import HTTPBadRequest
-from sqlalchemy import func, distinct
 from sqlalchemy.sql import or_
 
 from bodhi.server import log
-from bodhi.server.models import Comment, Build, Update
+from bodhi.server.conditional import conditional, list_state, UPDATE_TABLES
+from bodhi.server.models import Comment, Build, JSONFields, Update
+from bodhi.server.pagination import not_null, paginate
 from bodhi.server.validators import (
     validate_packages,
     validate_update,
@@ -45,6 +45,12 @@ import bodhi.server.security
 import bodhi.server.services.errors
 
 
+# Services are registered in the order of their names, and this one must come before ``comment``
+# for its route to match /comments/bulk before /comments/{id} does.
+batch_comments = Service(name='comments_bulk', path='/comments/bulk',
+                         description='Comment lookup service',
+                         cors_origins=bodhi.server.security.cors_origins_ro)
+
 comment = Service(
     name='comment', path='/comments/{id}', validators=(validate_comment_id,),
     description='Comment submission service', cors_origins=bodhi.server.security.cors_origins_ro)
@@ -88,20 +94,45 @@ validators = (
 )
 
 
+@batch_comments.post(schema=bodhi.server.schemas.BulkSchema, renderer='json',
+                     error_handler=bodhi.server.services.errors.json_handler)
+def get_comments(request):
+    """
+    Return the comments that have the given ids, all loaded at once.
+
+    Args:
+        request (pyramid.request): The current request.
+    Returns:
+        dict: A dictionary with the following key mappings:
+            comments: The comments that were found, by id.
+            not_found: The ids that no comment has.
+    """
+    ids = request.validated['ids']
+    comment_ids = dict((int(id), id) for id in ids if id.isdigit())
+    comments = Comment.get_many(
+        list(comment_ids), request.db,
+        options=Comment.json_load_options(JSONFields.from_request(request)))
+    comments = dict((comment_ids[id], comment) for id, comment in comments.items())
+    return dict(comments=comments, not_found=[id for id in ids if id not in comments])
+
+
 @comments_rss.get(
     schema=bodhi.server.schemas.ListCommentSchema, renderer='rss',
-    error_handler=bodhi.server.services.errors.html_handler, validators=validators)
+    error_handler=bodhi.server.services.errors.html_handler, validators=validators,
+    decorator=conditional(list_state(*UPDATE_TABLES)))
 @comments.get(
     schema=bodhi.server.schemas.ListCommentSchema, renderer='rss',
     accept=('application/atom+xml',),
-    error_handler=bodhi.server.services.errors.html_handler, validators=validators)
+    error_handler=bodhi.server.services.errors.html_handler, validators=validators,
+    decorator=conditional(list_state(*UPDATE_TABLES)))
 @comments.get(
     schema=bodhi.server.schemas.ListCommentSchema, accept=('application/json', 'text/json'),
-    renderer='json', error_handler=bodhi.server.services.errors.json_handler, validators=validators)
+    renderer='json', error_handler=bodhi.server.services.errors.json_handler, validators=validators,
+    decorator=conditional(list_state(*UPDATE_TABLES)))
 @comments.get(
     schema=bodhi.server.schemas.ListCommentSchema, accept=('application/javascript'),
     renderer='jsonp', error_handler=bodhi.server.services.errors.jsonp_handler,
-    validators=validators)
+    validators=validators, decorator=conditional(list_state(*UPDATE_TABLES)))
 @comments.get(
     schema=bodhi.server.schemas.ListCommentSchema, accept=('text/html'), renderer='comments.html',
     error_handler=bodhi.server.services.errors.html_handler, validators=validators)
@@ -118,11 +149,13 @@ def query_comments(request):
             pages: The total number of pages.
             rows_per_page: The number of rows per page.
             total: The number of items matching the search terms.
+            next_cursor: The cursor of the next page, or None if this page is the last one.
             chrome: A boolean indicating whether to paginate or not.
     """
     db = request.db
     data = request.validated
-    query = db.query(Comment)
+    query = db.query(Comment).options(
+        *Comment.json_load_options(JSONFields.from_request(request)))
 
     anonymous = data.get('anonymous')
     if anonymous is not None:
@@ -134,13 +167,18 @@ def query_comments(request):
             Comment.text.like('%%%s%%' % like)
         ]))
 
+    keys = [not_null(Comment.timestamp), Comment.id]
+    search = data.get('search')
+    if search is not None:
+        criterion, rank = Comment.search(db, search)
+        query = query.filter(criterion)
+        if rank is not None:
+            keys.insert(0, rank)
+
     packages = data.get('packages')
     if packages is not None:
-        query = query\
-            .join(Comment.update)\
-            .join(Update.builds)\
-            .join(Build.package)
-        query = query.filter(or_(*[Build.package == pkg for pkg in packages]))
+        query = query.filter(Comment.update.has(Update.builds.any(
+            or_(*[Build.package == pkg for pkg in packages]))))
 
     since = data.get('since')
     if since is not None:
@@ -152,8 +190,7 @@ def query_comments(request):
 
     update_owner = data.get('update_owner')
     if update_owner is not None:
-        query = query.join(Comment.update)
-        query = query.filter(Update.user == update_owner)
+        query = query.filter(Comment.update.has(Update.user == update_owner))
 
     ignore_user = data.get('ignore_user')
     if ignore_user is not None:
@@ -163,28 +200,13 @@ def query_comments(request):
     if user is not None:
         query = query.filter(Comment.user == user)
 
-    query = query.order_by(Comment.timestamp.desc())
-
-    # We can't use ``query.count()`` here because it is naive with respect to
-    # all the joins that we're doing above.
-    count_query = query.with_labels().statement\
-        .with_only_columns([func.count(distinct(Comment.id))])\
-        .order_by(None)
-    total = db.execute(count_query).scalar()
-
-    page = data.get('page')
-    rows_per_page = data.get('rows_per_page')
-    pages = int(math.ceil(total / float(rows_per_page)))
-    query = query.offset(rows_per_page * (page - 1)).limit(rows_per_page)
-
-    return dict(
-        comments=query.all(),
-        page=page,
-        pages=pages,
-        rows_per_page=rows_per_page,
-        total=total,
+    result = paginate(
+        request, query, 'comments', keys, Comment.id, descending=True,
+        depends_on=('comments', 'updates', 'builds'))
+    result.update(
         chrome=data.get('chrome'),
     )
+    return result
 
 
 @comments.post(schema=bodhi.server.schemas.SaveCommentSchema,
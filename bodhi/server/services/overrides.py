@@ -18,16 +18,16 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """Define API endpoints for managing and searching buildroot overrides."""
 
-import math
 
 from cornice import Service
 from pyramid.exceptions import HTTPNotFound
 
-from sqlalchemy import func, distinct
 from sqlalchemy.sql import or_
 
 from bodhi.server import log
-from bodhi.server.models import Build, BuildrootOverride, Package, Release, User
+from bodhi.server.conditional import conditional, list_state
+from bodhi.server.models import Build, BuildrootOverride, JSONFields, Package, Release, User
+from bodhi.server.pagination import paginate
 import bodhi.server.schemas
 import bodhi.server.services.errors
 from bodhi.server.validators import (
@@ -39,6 +39,9 @@ from bodhi.server.validators import (
 )
 
 
+#: The generations of the tables the feeds of overrides are built from
+OVERRIDE_TABLES = ('overrides', 'builds', 'releases', 'users')
+
 override = Service(name='override', path='/overrides/{nvr}',
                    description='Buildroot Overrides',
                    cors_origins=bodhi.server.security.cors_origins_ro)
@@ -99,11 +102,11 @@ validators = (
 
 @overrides_rss.get(schema=bodhi.server.schemas.ListOverrideSchema, renderer='rss',
                    error_handler=bodhi.server.services.errors.html_handler,
-                   validators=validators)
+                   validators=validators, decorator=conditional(list_state(*OVERRIDE_TABLES)))
 @overrides.get(schema=bodhi.server.schemas.ListOverrideSchema, renderer='rss',
                accept=('application/atom+xml',),
                error_handler=bodhi.server.services.errors.html_handler,
-               validators=validators)
+               validators=validators, decorator=conditional(list_state(*OVERRIDE_TABLES)))
 @overrides.get(schema=bodhi.server.schemas.ListOverrideSchema,
                accept=("application/json", "text/json"), renderer="json",
                error_handler=bodhi.server.services.errors.json_handler,
@@ -137,12 +140,14 @@ def query_overrides(request):
             pages: The number of pages of results that match the query.
             rows_per_page: The number of rows on the page.
             total: The total number of overrides that match the criteria.
+            next_cursor: The cursor of the next page, or None if this page is the last one.
             chrome: The caller supplied chrome.
             display_user: The current username.
     """
     db = request.db
     data = request.validated
-    query = db.query(BuildrootOverride)
+    query = db.query(BuildrootOverride).options(
+        *BuildrootOverride.json_load_options(JSONFields.from_request(request)))
 
     expired = data.get('expired')
     if expired is not None:
@@ -182,29 +187,14 @@ def query_overrides(request):
     if submitter is not None:
         query = query.filter(BuildrootOverride.submitter == submitter)
 
-    query = query.order_by(BuildrootOverride.submission_date.desc())
-
-    # We can't use ``query.count()`` here because it is naive with respect to
-    # all the joins that we're doing above.
-    count_query = query.with_labels().statement\
-        .with_only_columns([func.count(distinct(BuildrootOverride.id))])\
-        .order_by(None)
-    total = db.execute(count_query).scalar()
-
-    page = data.get('page')
-    rows_per_page = data.get('rows_per_page')
-    pages = int(math.ceil(total / float(rows_per_page)))
-    query = query.offset(rows_per_page * (page - 1)).limit(rows_per_page)
-
-    return dict(
-        overrides=query.all(),
-        page=page,
-        pages=pages,
-        rows_per_page=rows_per_page,
-        total=total,
+    result = paginate(
+        request, query, 'overrides', [BuildrootOverride.submission_date, BuildrootOverride.id],
+        BuildrootOverride.id, descending=True, depends_on=('overrides', 'builds'))
+    result.update(
         chrome=data.get('chrome'),
         display_user=data.get('display_user'),
     )
+    return result
 
 
 @overrides.post(schema=bodhi.server.schemas.SaveOverrideSchema,
@@ -17,13 +17,12 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """Define a service endpoint for searching for packages."""
-import math
 
 from cornice import Service
-from sqlalchemy import func, distinct
 from sqlalchemy.sql.expression import case
 
 from bodhi.server.models import Package
+from bodhi.server.pagination import paginate
 import bodhi.server.schemas
 import bodhi.server.security
 import bodhi.server.services.errors
@@ -59,6 +58,7 @@ def query_packages(request):
             pages: The number of pages of results.
             rows_per_page: The number of results per page.
             total: The total number of packages that match the search criteria.
+            next_cursor: The cursor of the next page, or None if this page is the last one.
     """
     db = request.db
     data = request.validated
@@ -72,27 +72,12 @@ def query_packages(request):
     if like is not None:
         query = query.filter(Package.name.like('%%%s%%' % like))
 
+    keys = [Package.name, Package.id]
     search = data.get('search')
     if search is not None:
         query = query.filter(Package.name.ilike('%%%s%%' % search))
-        query = query.order_by(case([(Package.name == search, Package.name)]))
+        # The package named exactly like the search comes first. This is part of the sort key, so
+        # that the cursors of the next pages hold it too.
+        keys.insert(0, case([(Package.name == search, 0)], else_=1))
 
-    # We can't use ``query.count()`` here because it is naive with respect to
-    # all the joins that we're doing above.
-    count_query = query.with_labels().statement\
-        .with_only_columns([func.count(distinct(Package.name))])\
-        .order_by(None)
-    total = db.execute(count_query).scalar()
-
-    page = data.get('page')
-    rows_per_page = data.get('rows_per_page')
-    pages = int(math.ceil(total / float(rows_per_page)))
-    query = query.offset(rows_per_page * (page - 1)).limit(rows_per_page)
-
-    return dict(
-        packages=query.all(),
-        page=page,
-        pages=pages,
-        rows_per_page=rows_per_page,
-        total=total,
-    )
+    return paginate(request, query, 'packages', keys, Package.name)
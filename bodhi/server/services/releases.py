@@ -18,23 +18,26 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """Defines API endpoints related to Release objects."""
 
-import math
+from collections import OrderedDict
 
 from cornice import Service
 from pyramid.exceptions import HTTPNotFound
-from sqlalchemy import func, distinct
+from sqlalchemy import func
 from sqlalchemy.sql import or_
 
 from bodhi.server import log
+from bodhi.server.conditional import conditional, release_state
 from bodhi.server.models import (
     Update,
     UpdateStatus,
     UpdateType,
     Build,
     BuildrootOverride,
-    Package,
+    JSONFields,
     Release,
 )
+from bodhi.server.pagination import paginate
+from bodhi.server.stats import count_updates, sum_counts
 from bodhi.server.validators import (
     validate_tags,
     validate_enums,
@@ -74,99 +77,60 @@ def get_release_html(request):
     if not release:
         request.errors.add('body', 'name', 'No such release')
         request.errors.status = HTTPNotFound.code
-    updates = request.db.query(Update).filter(Update.release == release).order_by(
-        Update.date_submitted.desc())
-
-    updates_count = request.db.query(Update.date_submitted, Update.type).filter(
+        return
+    updates = request.db.query(Update).options(*Update.loading_profile('list')).filter(
         Update.release == release).order_by(Update.date_submitted.desc())
 
+    counts = count_updates(request.db, [release.name])[release.name]
+    by_status = sum_counts(counts, 'status')
+    by_type = sum_counts(counts, 'type')
+    by_month = sum_counts(counts, 'type', 'month')
+
+    # Every type has a count for every month, so they line up with the months of the chart.
+    dates = sorted(set(count.month for count in counts if count.month is not None))
     date_commits = {}
-    dates = set()
-
-    for update in updates_count.all():
-        d = update.date_submitted
-        yearmonth = str(d.year) + '/' + str(d.month).zfill(2)
-        dates.add(yearmonth)
-        if update.type.description not in date_commits:
-            date_commits[update.type.description] = {}
-        if yearmonth in date_commits[update.type.description]:
-            date_commits[update.type.description][yearmonth] += 1
-        else:
-            date_commits[update.type.description][yearmonth] = 0
-
-    base_count_query = request.db.query(Update)\
-        .filter(Update.release == release)
-
-    num_updates_pending = base_count_query\
-        .filter(Update.status == UpdateStatus.pending).count()
-    num_updates_testing = base_count_query\
-        .filter(Update.status == UpdateStatus.testing).count()
-    num_updates_stable = base_count_query\
-        .filter(Update.status == UpdateStatus.stable).count()
-    num_updates_unpushed = base_count_query\
-        .filter(Update.status == UpdateStatus.unpushed).count()
-    num_updates_obsolete = base_count_query\
-        .filter(Update.status == UpdateStatus.obsolete).count()
-
-    num_updates_security = base_count_query\
-        .filter(Update.type == UpdateType.security).count()
-    num_updates_bugfix = base_count_query\
-        .filter(Update.type == UpdateType.bugfix).count()
-    num_updates_enhancement = base_count_query\
-        .filter(Update.type == UpdateType.enhancement).count()
-    num_updates_newpackage = base_count_query\
-        .filter(Update.type == UpdateType.newpackage).count()
-
-    num_active_overrides = request.db.query(
-        BuildrootOverride
-    ).filter(
-        BuildrootOverride.expired_date.is_(None)
-    ).join(
-        BuildrootOverride.build
-    ).join(
-        Build.release
-    ).filter(
-        Build.release == release
-    ).count()
+    for type_ in by_type:
+        date_commits[type_] = OrderedDict(
+            (yearmonth, by_month.get((type_, yearmonth), 0)) for yearmonth in dates)
 
-    num_expired_overrides = request.db.query(
-        BuildrootOverride
-    ).filter(
-        BuildrootOverride.expired_date.isnot(None)
+    overrides = dict(request.db.query(
+        BuildrootOverride.expired_date.is_(None), func.count(BuildrootOverride.id)
     ).join(
         BuildrootOverride.build
-    ).join(
-        Build.release
     ).filter(
         Build.release == release
-    ).count()
+    ).group_by(
+        BuildrootOverride.expired_date.is_(None)
+    ))
 
     return dict(release=release,
                 latest_updates=updates.limit(25).all(),
-                count=updates.count(),
+                count=sum(by_status.values()),
                 date_commits=date_commits,
-                dates=sorted(dates),
+                dates=dates,
 
-                num_updates_pending=num_updates_pending,
-                num_updates_testing=num_updates_testing,
-                num_updates_stable=num_updates_stable,
-                num_updates_unpushed=num_updates_unpushed,
-                num_updates_obsolete=num_updates_obsolete,
+                num_updates_pending=by_status.get(UpdateStatus.pending.description, 0),
+                num_updates_testing=by_status.get(UpdateStatus.testing.description, 0),
+                num_updates_stable=by_status.get(UpdateStatus.stable.description, 0),
+                num_updates_unpushed=by_status.get(UpdateStatus.unpushed.description, 0),
+                num_updates_obsolete=by_status.get(UpdateStatus.obsolete.description, 0),
 
-                num_updates_security=num_updates_security,
-                num_updates_bugfix=num_updates_bugfix,
-                num_updates_enhancement=num_updates_enhancement,
-                num_updates_newpackage=num_updates_newpackage,
+                num_updates_security=by_type.get(UpdateType.security.description, 0),
+                num_updates_bugfix=by_type.get(UpdateType.bugfix.description, 0),
+                num_updates_enhancement=by_type.get(UpdateType.enhancement.description, 0),
+                num_updates_newpackage=by_type.get(UpdateType.newpackage.description, 0),
 
-                num_active_overrides=num_active_overrides,
-                num_expired_overrides=num_expired_overrides,
+                num_active_overrides=overrides.get(True, 0),
+                num_expired_overrides=overrides.get(False, 0),
                 )
 
 
 @release.get(accept=('application/json', 'text/json'), renderer='json',
-             error_handler=bodhi.server.services.errors.json_handler)
+             error_handler=bodhi.server.services.errors.json_handler,
+             decorator=conditional(release_state))
 @release.get(accept=('application/javascript'), renderer='jsonp',
-             error_handler=bodhi.server.services.errors.jsonp_handler)
+             error_handler=bodhi.server.services.errors.jsonp_handler,
+             decorator=conditional(release_state))
 def get_release_json(request):
     """
     Return JSON for a release given by name.
@@ -231,10 +195,12 @@ def query_releases_json(request):
             pages: The total number of pages.
             rows_per_page: The number of rown on a page.
             total: The number of matching results.
+            next_cursor: The cursor of the next page, or None if this page is the last one.
     """
     db = request.db
     data = request.validated
-    query = db.query(Release)
+    query = db.query(Release).options(
+        *Release.json_load_options(JSONFields.from_request(request)))
 
     name = data.get('name')
     if name is not None:
@@ -242,36 +208,17 @@ def query_releases_json(request):
 
     updates = data.get('updates')
     if updates is not None:
-        query = query.join(Release.builds).join(Build.update)
         args = \
             [Update.title == update.title for update in updates] +\
             [Update.alias == update.alias for update in updates]
-        query = query.filter(or_(*args))
+        query = query.filter(Release.builds.any(Build.update.has(or_(*args))))
 
     packages = data.get('packages')
     if packages is not None:
-        query = query.join(Release.builds).join(Build.package)
-        query = query.filter(or_(*[Package.id == p.id for p in packages]))
-
-    # We can't use ``query.count()`` here because it is naive with respect to
-    # all the joins that we're doing above.
-    count_query = query.with_labels().statement\
-        .with_only_columns([func.count(distinct(Release.id))])\
-        .order_by(None)
-    total = db.execute(count_query).scalar()
-
-    page = data.get('page')
-    rows_per_page = data.get('rows_per_page')
-    pages = int(math.ceil(total / float(rows_per_page)))
-    query = query.offset(rows_per_page * (page - 1)).limit(rows_per_page)
-
-    return dict(
-        releases=query.all(),
-        page=page,
-        pages=pages,
-        rows_per_page=rows_per_page,
-        total=total,
-    )
+        query = query.filter(Release.builds.any(
+            or_(*[Build.package_id == p.id for p in packages])))
+
+    return paginate(request, query, 'releases', [Release.name], Release.id)
 
 
 @releases.post(schema=bodhi.server.schemas.SaveReleaseSchema,
@@ -18,17 +18,16 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """Define web services that pertain to Stacks."""
 
-import math
 
 from cornice import Service
 from pyramid.exceptions import HTTPForbidden
 from pyramid.view import view_config
-from sqlalchemy import func, distinct
 from sqlalchemy.sql import or_
 
 from bodhi.server import log, notifications
 from bodhi.server.config import config
 from bodhi.server.models import Package, Stack, Group, User
+from bodhi.server.pagination import paginate
 from bodhi.server.util import tokenize
 from bodhi.server.validators import validate_packages, validate_stack, validate_requirements
 import bodhi.server.schemas
@@ -88,7 +87,7 @@ def query_stacks(request):
             number of matched Stacks.
     """
     data = request.validated
-    query = request.db.query(Stack).order_by(Stack.name.desc())
+    query = request.db.query(Stack)
 
     name = data.get('name')
     if name:
@@ -100,28 +99,10 @@ def query_stacks(request):
 
     packages = data.get('packages')
     if packages:
-        query = query.join(Package.stack)
-        query = query.filter(or_(*[Package.name == pkg.name for pkg in packages]))
-
-    # We can't use ``query.count()`` here because it is naive with respect to
-    # all the joins that we're doing above.
-    count_query = query.with_labels().statement\
-        .with_only_columns([func.count(distinct(Stack.id))])\
-        .order_by(None)
-    total = request.db.execute(count_query).scalar()
-
-    page = data.get('page')
-    rows_per_page = data.get('rows_per_page')
-    pages = int(math.ceil(total / float(rows_per_page)))
-    query = query.offset(rows_per_page * (page - 1)).limit(rows_per_page)
-
-    return dict(
-        stacks=query.all(),
-        page=page,
-        pages=pages,
-        rows_per_page=rows_per_page,
-        total=total,
-    )
+        query = query.filter(Stack.packages.any(
+            or_(*[Package.name == pkg.name for pkg in packages])))
+
+    return paginate(request, query, 'stacks', [Stack.name], Stack.id, descending=True)
 
 
 @stacks.post(schema=bodhi.server.schemas.SaveStackSchema,
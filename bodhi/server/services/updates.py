@@ -19,15 +19,19 @@
 """Defines service endpoints pertaining to Updates."""
 
 import copy
-import math
+from itertools import islice
+import json
 
 from cornice import Service
-from sqlalchemy import func, distinct
+from pyramid.response import Response
+from sqlalchemy.orm import subqueryload
 from sqlalchemy.sql import or_
 
 from bodhi.server import log
+from bodhi.server.conditional import conditional, list_state, update_state, UPDATE_TABLES
 from bodhi.server.exceptions import BodhiException, LockedUpdateException
 from bodhi.server.models import (
+    Base,
     Update,
     Bug,
     ContentType,
@@ -35,13 +39,17 @@ from bodhi.server.models import (
     UpdateRequest,
     ReleaseState,
     Build,
+    JSONFields,
     Package,
+    RpmBuild,
 )
+from bodhi.server.pagination import not_null, paginate
 import bodhi.server.schemas
 import bodhi.server.security
 import bodhi.server.services.errors
 import bodhi.server.util
 from bodhi.server.validators import (
+    prefetch_builds,
     validate_nvrs,
     validate_uniqueness,
     validate_build_tags,
@@ -58,6 +66,23 @@ from bodhi.server.validators import (
 )
 
 
+#: How many updates the export endpoint loads and serializes at a time
+EXPORT_BATCH_SIZE = 100
+
+
+# Services are registered in the order of their names, and this one must come before ``update``
+# for its route to match /updates/export before /updates/{id} does.
+export_updates = Service(name='updates_export', path='/updates/export',
+                         acl=bodhi.server.security.packagers_allowed_acl,
+                         description='Update export service',
+                         cors_origins=bodhi.server.security.cors_origins_ro)
+
+# Like export_updates, this must come before ``update``.
+batch_updates = Service(name='updates_bulk', path='/updates/bulk',
+                        acl=bodhi.server.security.packagers_allowed_acl,
+                        description='Update lookup service',
+                        cors_origins=bodhi.server.security.cors_origins_ro)
+
 update = Service(name='update', path='/updates/{id}',
                  validators=(validate_update_id,),
                  description='Update submission service',
@@ -86,9 +111,11 @@ update_request = Service(name='update_request', path='/updates/{id}/request',
 
 
 @update.get(accept=('application/json', 'text/json'), renderer='json',
-            error_handler=bodhi.server.services.errors.json_handler)
+            error_handler=bodhi.server.services.errors.json_handler,
+            decorator=conditional(update_state))
 @update.get(accept=('application/javascript'), renderer='jsonp',
-            error_handler=bodhi.server.services.errors.jsonp_handler)
+            error_handler=bodhi.server.services.errors.jsonp_handler,
+            decorator=conditional(update_state))
 @update.get(accept="text/html", renderer="update.html",
             error_handler=bodhi.server.services.errors.html_handler)
 def get_update(request):
@@ -107,9 +134,37 @@ def get_update(request):
     # If validate_acls produced 0 errors, then we can edit this update.
     can_edit = len(proxy_request.errors) == 0
 
+    Update.prefetch_test_cases(request.db, [request.validated['update']])
     return dict(update=request.validated['update'], can_edit=can_edit)
 
 
+@batch_updates.post(schema=bodhi.server.schemas.BulkSchema, renderer='json',
+                    error_handler=bodhi.server.services.errors.json_handler)
+def get_updates(request):
+    """
+    Return the updates that have the given titles, aliases, or build NVRs.
+
+    The updates are all loaded at once, with the same eager loading as a page of updates.
+
+    Args:
+        request (pyramid.request): The current request.
+    Returns:
+        dict: A dictionary with the following key mappings:
+            updates: The updates that were found, by identifier.
+            not_found: The identifiers that no update has.
+    """
+    db = request.db
+    ids = request.validated['ids']
+    fields = JSONFields.from_request(request)
+    # The builds tell which NVRs were found, whatever fields leaves out.
+    options = Update.loading_profile('list') + Update.json_load_options(fields) + [
+        subqueryload(Update.builds).lazyload(Build.update)]
+    updates = Update.get_many(ids, db, options=options)
+    if fields.includes_relationship('test_cases'):
+        Update.prefetch_test_cases(db, set(updates.values()))
+    return dict(updates=updates, not_found=[id for id in ids if id not in updates])
+
+
 @update_edit.get(accept="text/html", renderer="new_update.html",
                  error_handler=bodhi.server.services.errors.html_handler,
                  permission='edit',
@@ -200,19 +255,19 @@ validators = (
 
 @updates_rss.get(schema=bodhi.server.schemas.ListUpdateSchema, renderer='rss',
                  error_handler=bodhi.server.services.errors.html_handler,
-                 validators=validators)
+                 validators=validators, decorator=conditional(list_state(*UPDATE_TABLES)))
 @updates.get(schema=bodhi.server.schemas.ListUpdateSchema, renderer='rss',
              accept=('application/atom+xml',),
              error_handler=bodhi.server.services.errors.html_handler,
-             validators=validators)
+             validators=validators, decorator=conditional(list_state(*UPDATE_TABLES)))
 @updates.get(schema=bodhi.server.schemas.ListUpdateSchema,
              accept=('application/json', 'text/json'), renderer='json',
              error_handler=bodhi.server.services.errors.json_handler,
-             validators=validators)
+             validators=validators, decorator=conditional(list_state(*UPDATE_TABLES)))
 @updates.get(schema=bodhi.server.schemas.ListUpdateSchema,
              accept=('application/javascript'), renderer='jsonp',
              error_handler=bodhi.server.services.errors.jsonp_handler,
-             validators=validators)
+             validators=validators, decorator=conditional(list_state(*UPDATE_TABLES)))
 @updates.get(schema=bodhi.server.schemas.ListUpdateSchema,
              accept=('text/html'), renderer='updates.html',
              error_handler=bodhi.server.services.errors.html_handler,
@@ -230,11 +285,112 @@ def query_updates(request):
             pages: The total number of pages.
             rows_per_page: How many results on on the page.
             total: The total number of updates matching the query.
+            next_cursor: The cursor of the next page, or None if this page is the last one.
             package: The package corresponding to the first update found in the search.
     """
     db = request.db
     data = request.validated
-    query = db.query(Update)
+    fields = JSONFields.from_request(request)
+    query = db.query(Update).options(*Update.loading_profile('list')).options(
+        *Update.json_load_options(fields))
+    query, rank = _filter_updates(request, query)
+
+    keys = [not_null(Update.date_submitted), Update.id]
+    if rank is not None:
+        keys.insert(0, rank)
+
+    package = None
+    packages = data.get('packages')
+    if packages:
+        package = packages[0]
+
+    result = paginate(
+        request, query, 'updates', keys, Update.id, descending=True,
+        depends_on=('updates', 'builds'))
+    if fields.includes_relationship('test_cases'):
+        Update.prefetch_test_cases(db, result['updates'])
+    result.update(
+        chrome=data.get('chrome'),
+        display_user=data.get('display_user', False),
+        display_request=data.get('display_request', True),
+        package=package,
+    )
+    return result
+
+
+@export_updates.get(schema=bodhi.server.schemas.ListUpdateSchema,
+                    error_handler=bodhi.server.services.errors.json_handler,
+                    validators=validators)
+def export_updates_ndjson(request):
+    """
+    Stream all the updates that match the given criteria, as newline-delimited JSON.
+
+    The criteria are the same as the ones of :func:`query_updates`, but there are no pages: the
+    updates are read through a server-side cursor and written one per line as they are read, in
+    the order of their ids, so the memory this takes doesn't grow with their number.
+
+    Args:
+        request (pyramid.request): The current request.
+    Returns:
+        pyramid.response.Response: The response, which streams the updates.
+    """
+    return Response(app_iter=_export_updates(request), content_type='application/x-ndjson',
+                    charset='utf-8')
+
+
+def _export_updates(request):
+    """
+    Yield the lines of the export of the updates that match the request's criteria.
+
+    The response is streamed after the request's database session was committed and closed, so
+    this uses it again and closes it once the stream ends.
+
+    Args:
+        request (pyramid.request): The current request.
+    Yields:
+        str: The JSON of an update, followed by a newline.
+    """
+    db = request.db
+    fields = JSONFields.from_request(request)
+    try:
+        # The filters compare the models the validators loaded, which were detached from the
+        # session when it was closed.
+        for value in request.validated.values():
+            for model in value if isinstance(value, list) else [value]:
+                if isinstance(model, Base):
+                    db.add(model)
+
+        query, rank = _filter_updates(request, db.query(Update.id))
+        ids = iter(query.distinct().order_by(Update.id).yield_per(EXPORT_BATCH_SIZE))
+        while True:
+            batch = [row.id for row in islice(ids, EXPORT_BATCH_SIZE)]
+            if not batch:
+                break
+            # The session only holds weak references to the updates, so each batch is forgotten
+            # once it is written.
+            updates = db.query(Update).options(*Update.loading_profile('list')).options(
+                *Update.json_load_options(fields)).filter(Update.id.in_(batch)).order_by(
+                    Update.id).all()
+            if fields.includes_relationship('test_cases'):
+                Update.prefetch_test_cases(db, updates)
+            for update in updates:
+                yield json.dumps(update.__json__(request=request, fields=fields)) + '\n'
+    finally:
+        db.close()
+
+
+def _filter_updates(request, query):
+    """
+    Filter the given query of updates by the criteria of a ListUpdateSchema request.
+
+    Args:
+        request (pyramid.request): The current request.
+        query (sqlalchemy.orm.query.Query): The query to filter.
+    Returns:
+        tuple: The filtered query, and the relevance of the updates to the search terms, which is
+            None if there are no search terms or the database can't rank them.
+    """
+    data = request.validated
 
     approved_since = data.get('approved_since')
     if approved_since is not None:
@@ -246,8 +402,7 @@ def query_updates(request):
 
     bugs = data.get('bugs')
     if bugs is not None:
-        query = query.join(Update.bugs)
-        query = query.filter(or_(*[Bug.bug_id == bug_id for bug_id in bugs]))
+        query = query.filter(Update.bugs.any(or_(*[Bug.bug_id == bug_id for bug_id in bugs])))
 
     critpath = data.get('critpath')
     if critpath is not None:
@@ -255,8 +410,7 @@ def query_updates(request):
 
     cves = data.get('cves')
     if cves is not None:
-        query = query.join(Update.cves)
-        query = query.filter(or_(*[CVE.cve_id == cve_id for cve_id in cves]))
+        query = query.filter(Update.cves.any(or_(*[CVE.cve_id == cve_id for cve_id in cves])))
 
     like = data.get('like')
     if like is not None:
@@ -264,10 +418,11 @@ def query_updates(request):
             Update.title.like('%%%s%%' % like)
         ]))
 
+    rank = None
     search = data.get('search')
     if search is not None:
-        query = query.filter(or_(Update.title.ilike('%%%s%%' % search),
-                                 Update.alias.ilike('%%%s%%' % search)))
+        criterion, rank = Update.search(request.db, search)
+        query = query.filter(criterion)
 
     locked = data.get('locked')
     if locked is not None:
@@ -283,17 +438,12 @@ def query_updates(request):
 
     packages = data.get('packages')
     if packages is not None:
-        query = query.join(Update.builds).join(Build.package)
-        query = query.filter(or_(*[Package.name == pkg for pkg in packages]))
-
-    package = None
-    if packages and len(packages):
-        package = packages[0]
+        query = query.filter(Update.builds.any(Build.package.has(
+            or_(*[Package.name == pkg for pkg in packages]))))
 
     builds = data.get('builds')
     if builds is not None:
-        query = query.join(Update.builds)
-        query = query.filter(or_(*[Build.nvr == build for build in builds]))
+        query = query.filter(Update.builds.any(or_(*[Build.nvr == build for build in builds])))
 
     pushed = data.get('pushed')
     if pushed is not None:
@@ -347,8 +497,7 @@ def query_updates(request):
 
     content_type = data.get('content_type')
     if content_type is not None:
-        query = query.join(Update.builds)
-        query = query.filter(Build.type == content_type)
+        query = query.filter(Update.builds.any(Build.type == content_type))
 
     user = data.get('user')
     if user is not None:
@@ -361,37 +510,14 @@ def query_updates(request):
     if alias is not None:
         query = query.filter(or_(*[Update.alias == a for a in alias]))
 
-    query = query.order_by(Update.date_submitted.desc())
-
-    # We can't use ``query.count()`` here because it is naive with respect to
-    # all the joins that we're doing above.
-    count_query = query.with_labels().statement\
-        .with_only_columns([func.count(distinct(Update.id))])\
-        .order_by(None)
-    total = db.execute(count_query).scalar()
-
-    page = data.get('page')
-    rows_per_page = data.get('rows_per_page')
-    pages = int(math.ceil(total / float(rows_per_page)))
-    query = query.offset(rows_per_page * (page - 1)).limit(rows_per_page)
-
-    return dict(
-        updates=query.all(),
-        page=page,
-        pages=pages,
-        rows_per_page=rows_per_page,
-        total=total,
-        chrome=data.get('chrome'),
-        display_user=data.get('display_user', False),
-        display_request=data.get('display_request', True),
-        package=package,
-    )
+    return query, rank
 
 
 @updates.post(schema=bodhi.server.schemas.SaveUpdateSchema,
               permission='create', renderer='json',
               error_handler=bodhi.server.services.errors.json_handler,
               validators=(
+                  prefetch_builds,
                   validate_nvrs,
                   validate_builds,
                   validate_uniqueness,
@@ -445,6 +571,8 @@ def new_update(request):
             if build is None:
                 log.debug("Adding nvr %s, type %r", nvr, build_class)
                 build = build_class(nvr=nvr, package=package)
+                if isinstance(build, RpmBuild):
+                    build.set_evr(request.buildinfo[nvr]['info'])
                 request.db.add(build)
                 request.db.flush()
 
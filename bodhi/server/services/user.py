@@ -17,14 +17,14 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """Defines API services that pertain to users."""
-import math
 
 from cornice import Service
 from pyramid.exceptions import HTTPNotFound
-from sqlalchemy import func, distinct
 from sqlalchemy.sql import or_
 
-from bodhi.server.models import Group, Package, Update, User
+from bodhi.server.conditional import conditional, list_state
+from bodhi.server.models import Group, JSONFields, Package, Update, User
+from bodhi.server.pagination import paginate
 from bodhi.server.validators import validate_updates, validate_packages, validate_groups
 import bodhi.server.schemas
 import bodhi.server.security
@@ -107,10 +107,10 @@ validators = (
 @users.get(schema=bodhi.server.schemas.ListUserSchema, renderer="rss",
            accept=('application/atom+xml',),
            error_handler=bodhi.server.services.errors.html_handler,
-           validators=validators)
+           validators=validators, decorator=conditional(list_state('users')))
 @users_rss.get(schema=bodhi.server.schemas.ListUserSchema, renderer="rss",
                error_handler=bodhi.server.services.errors.html_handler,
-               validators=validators)
+               validators=validators, decorator=conditional(list_state('users')))
 def query_users(request):
     """
     Search for users by various criteria.
@@ -124,10 +124,12 @@ def query_users(request):
             pages: The total number of pages available.
             rows_per_page: The number of users on the page.
             total: The total number of users matching the search criteria.
+            next_cursor: The cursor of the next page, or None if this page is the last one.
     """
     db = request.db
     data = request.validated
-    query = db.query(User)
+    query = db.query(User).options(
+        *User.json_load_options(JSONFields.from_request(request)))
 
     like = data.get('like')
     if like is not None:
@@ -145,38 +147,17 @@ def query_users(request):
 
     groups = data.get('groups')
     if groups is not None:
-        query = query.join(User.groups)
-        query = query.filter(or_(*[Group.id == grp.id for grp in groups]))
+        query = query.filter(User.groups.any(or_(*[Group.id == grp.id for grp in groups])))
 
     updates = data.get('updates')
     if updates is not None:
-        query = query.join(User.updates)
         args = \
             [Update.title == update.title for update in updates] +\
             [Update.alias == update.alias for update in updates]
-        query = query.filter(or_(*args))
+        query = query.filter(User.updates.any(or_(*args)))
 
     packages = data.get('packages')
     if packages is not None:
-        query = query.join(User.packages)
-        query = query.filter(or_(*[Package.id == p.id for p in packages]))
-
-    # We can't use ``query.count()`` here because it is naive with respect to
-    # all the joins that we're doing above.
-    count_query = query.with_labels().statement\
-        .with_only_columns([func.count(distinct(User.id))])\
-        .order_by(None)
-    total = request.db.execute(count_query).scalar()
-
-    page = data.get('page')
-    rows_per_page = data.get('rows_per_page')
-    pages = int(math.ceil(total / float(rows_per_page)))
-    query = query.offset(rows_per_page * (page - 1)).limit(rows_per_page)
-
-    return dict(
-        users=query.all(),
-        page=page,
-        pages=pages,
-        rows_per_page=rows_per_page,
-        total=total,
-    )
+        query = query.filter(User.packages.any(or_(*[Package.id == p.id for p in packages])))
+
+    return paginate(request, query, 'users', [User.name], User.id)
@@ -0,0 +1,443 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""
+Count the updates of releases, and keep the statistics of the ``update_stats`` table.
+
+The home page and the release pages show many counts of the updates of releases. They are all
+sums of the counts returned by :func:`count_updates`, which come from a single ``GROUP BY`` query
+for any number of releases. The counts of each release are cached in the ``counts`` region (see
+:mod:`bodhi.server.caches`), so they are counted again once updates or releases are written.
+
+The metrics read the :class:`bodhi.server.models.UpdateStats` rollup instead, whose rows hold the
+number of updates and of their comments for each release, type, status and day of submission. The
+rows are updated after each flush that creates or deletes updates or comments, or that changes the
+key of updates, and :func:`rebuild_update_stats` counts them again from scratch.
+"""
+
+from collections import Counter, defaultdict, namedtuple
+from datetime import date, datetime
+
+from dogpile.cache.api import NO_VALUE
+from sqlalchemy import and_, case, distinct, event, extract, false, func, inspect, true
+from sqlalchemy.dialects import postgresql
+
+from bodhi.server import Session, caches
+from bodhi.server.models import Comment, Release, Update, UpdateStats, User
+
+
+#: The number of updates of a release with the same status, type and month of submission. The
+#: status and type are the descriptions of their enums, and the month is formatted as YYYY/MM, or
+#: is None for the updates without a submission date.
+UpdateCount = namedtuple('UpdateCount', ['status', 'type', 'month', 'count'])
+
+#: The users whose comments are left out of the statistics of updates
+IGNORED_COMMENTERS = (u'bodhi', u'autoqa')
+#: The counters of UpdateStats that count comments
+COMMENT_COUNTERS = ('positive_comments', 'neutral_comments', 'negative_comments',
+                    'anonymous_feedback', 'updates_with_feedback')
+#: All the counters of UpdateStats
+STATS_COUNTERS = ('updates',) + COMMENT_COUNTERS
+
+
+def _query_counts(db, names):
+    """
+    Count the updates of the given releases in one query.
+
+    Args:
+        db (sqlalchemy.orm.session.Session): The database session.
+        names (list): The names of the releases.
+    Returns:
+        dict: The list of UpdateCounts of each release, by name.
+    """
+    year = extract('year', Update.date_submitted)
+    month = extract('month', Update.date_submitted)
+    rows = db.query(Release.name, Update.status, Update.type, year, month, func.count(Update.id))\
+        .join(Update.release)\
+        .filter(Release.name.in_(names))\
+        .group_by(Release.name, Update.status, Update.type, year, month)
+
+    counts = dict((name, []) for name in names)
+    for name, status, type_, year, month, count in rows:
+        if year is not None:
+            month = '%d/%02d' % (year, month)
+        counts[name].append(UpdateCount(status.description, type_.description, month, count))
+    return counts
+
+
+def count_updates(db, names):
+    """
+    Return the counts of the updates of the given releases, by status, type and month.
+
+    The releases whose counts are not cached are counted together with one query.
+
+    Args:
+        db (sqlalchemy.orm.session.Session): The database session.
+        names (list): The names of the releases.
+    Returns:
+        dict: The list of UpdateCounts of each release, by name. The releases that don't exist
+            have no counts.
+    """
+    region = caches.get_region('counts')
+    keys = dict((name, 'update_counts:%s' % name) for name in names)
+    counts = dict((name, value) for name, value in zip(names, region.get_multi(
+        [keys[name] for name in names])) if value is not NO_VALUE)
+
+    missing = [name for name in names if name not in counts]
+    if missing:
+        counted = _query_counts(db, missing)
+        region.set_multi(dict((keys[name], value) for name, value in counted.items()))
+        counts.update(counted)
+    return counts
+
+
+def sum_counts(counts, *fields):
+    """
+    Return the sums of the given counts by the values of the given fields.
+
+    For example, ``sum_counts(counts, 'status', 'type')[('testing', 'bugfix')]`` is the number of
+    bugfix updates in testing.
+
+    Args:
+        counts (list): UpdateCounts returned by count_updates().
+        fields (tuple): The fields of UpdateCount to sum the counts by.
+    Returns:
+        dict: The sums of the counts. They are keyed by the value of the field if there is only one,
+            or by the tuple of the values of the fields.
+    """
+    sums = defaultdict(int)
+    for count in counts:
+        key = tuple(getattr(count, field) for field in fields)
+        sums[key[0] if len(fields) == 1 else key] += count.count
+    return dict(sums)
+
+
+def sum_update_stats(db, group_by, *criteria):
+    """
+    Return the sums of the counters of the update_stats rows that match the criteria.
+
+    Args:
+        db (sqlalchemy.orm.session.Session): The database session.
+        group_by (list): The columns of UpdateStats to sum the counters by.
+        criteria (tuple): Filters of the rows.
+    Returns:
+        list: A row for each group, with the values of the group_by columns followed by the sums
+            of the STATS_COUNTERS, in that order.
+    """
+    sums = [func.coalesce(func.sum(getattr(UpdateStats, name)), 0) for name in STATS_COUNTERS]
+    return db.query(*(list(group_by) + sums)).filter(*criteria).group_by(*group_by).all()
+
+
+def _count_comments(db, group_by, *criteria):
+    """
+    Count the comments of updates for the comment counters of UpdateStats.
+
+    Args:
+        db (sqlalchemy.orm.session.Session): The database session.
+        group_by (list): The columns to count the comments by.
+        criteria (tuple): Filters of the comments.
+    Returns:
+        list: A row for each group, with the values of the group_by columns followed by the
+            COMMENT_COUNTERS, in that order.
+    """
+    karma = Comment.karma != 0
+    counters = [
+        func.sum(case([(Comment.karma > 0, 1)], else_=0)),
+        func.sum(case([(Comment.karma == 0, 1)], else_=0)),
+        func.sum(case([(Comment.karma < 0, 1)], else_=0)),
+        func.sum(case([(and_(karma, Comment.anonymous == true()), 1)], else_=0)),
+        func.count(distinct(case([(and_(karma, Comment.anonymous == false()), Update.id)]))),
+    ]
+    return db.query(*(list(group_by) + counters)).select_from(Comment)\
+        .join(Comment.update).join(Comment.user)\
+        .filter(User.name.notin_(IGNORED_COMMENTERS), *criteria)\
+        .group_by(*group_by).all()
+
+
+def _to_date(value):
+    """Return the given result of the SQL date() function as a date, which SQLite doesn't."""
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def rebuild_update_stats(db):
+    """
+    Replace the rows of update_stats with the statistics of all the updates and their comments.
+
+    Args:
+        db (sqlalchemy.orm.session.Session): The database session.
+    Returns:
+        int: The number of rows.
+    """
+    key = [Update.release_id, Update.type, Update.status, func.date(Update.date_submitted)]
+    criteria = (Update.release_id.isnot(None), Update.date_submitted.isnot(None))
+
+    stats = defaultdict(lambda: dict.fromkeys(STATS_COUNTERS, 0))
+    for row in db.query(*(key + [func.count(Update.id)])).filter(*criteria).group_by(*key):
+        stats[tuple(row[:3]) + (_to_date(row[3]),)]['updates'] = row[4]
+    for row in _count_comments(db, key, *criteria):
+        stats[tuple(row[:3]) + (_to_date(row[3]),)].update(zip(COMMENT_COUNTERS, row[4:]))
+
+    db.query(UpdateStats).delete(synchronize_session=False)
+    if stats:
+        db.execute(UpdateStats.__table__.insert(), [
+            dict(counters, release_id=release_id, type=type_, status=status, day=day)
+            for (release_id, type_, status, day), counters in stats.items()])
+    return len(stats)
+
+
+def _stats_key(update, old=False):
+    """
+    Return the key of the update_stats row of the given update.
+
+    Args:
+        update (bodhi.server.models.Update): The update.
+        old (bool): Whether to return the key of the update before its pending changes.
+    Returns:
+        tuple or None: The release id, type, status and day of submission of the update, or None
+            if it has no release or submission date.
+    """
+    state = inspect(update)
+    values = []
+    for attr in ('release_id', 'type', 'status', 'date_submitted'):
+        value = getattr(update, attr)
+        if old and state.attrs[attr].history.deleted:
+            value = state.attrs[attr].history.deleted[0]
+        values.append(value)
+    release = state.attrs.release.history
+    if old and release.deleted and not state.attrs.release_id.history.deleted:
+        values[0] = release.deleted[0].id if release.deleted[0] is not None else None
+    if values[0] is None or values[3] is None:
+        return None
+    return tuple(values[:3]) + (values[3].date(),)
+
+
+def _moved_updates(session, deltas, new_comment_ids):
+    """
+    Move the statistics of the updates whose keys changed from their old rows to their new ones.
+
+    The comments created by the flush are left out, since they are counted in the new rows.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): The session that was flushed.
+        deltas (dict): The changes of the counters of each row, to add the moves to.
+        new_comment_ids (list): The ids of the comments created by the flush.
+    """
+    moved = {}
+    for obj in session.dirty:
+        if isinstance(obj, Update):
+            old, new = _stats_key(obj, old=True), _stats_key(obj)
+            if old != new:
+                moved[obj.id] = (old, new)
+    if not moved:
+        return
+
+    criteria = [Update.id.in_(list(moved))]
+    if new_comment_ids:
+        criteria.append(Comment.id.notin_(new_comment_ids))
+    counted = dict((row[0], row[1:]) for row in _count_comments(session, [Update.id], *criteria))
+    for id, (old, new) in moved.items():
+        counters = Counter(dict(zip(COMMENT_COUNTERS, counted.get(id, ()))), updates=1)
+        if old is not None:
+            deltas[old].subtract(counters)
+        if new is not None:
+            deltas[new].update(counters)
+
+
+def _comment_counters(comment):
+    """
+    Return what the given comment counts in the row of its update, but for updates_with_feedback.
+
+    Args:
+        comment (bodhi.server.models.Comment): The comment.
+    Returns:
+        collections.Counter: The counters of the comment, or None if it is not counted.
+    """
+    if comment.update is None or comment.user is None or comment.user.name in IGNORED_COMMENTERS:
+        return None
+    karma = comment.karma or 0
+    if karma > 0:
+        counters = Counter(positive_comments=1)
+    elif karma < 0:
+        counters = Counter(negative_comments=1)
+    else:
+        counters = Counter(neutral_comments=1)
+    if karma and comment.anonymous:
+        counters['anonymous_feedback'] += 1
+    return counters
+
+
+def _with_feedback(session, update_ids, excluded_ids):
+    """
+    Return which of the given updates have feedback in the database.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): The database session.
+        update_ids (list): The ids of the updates.
+        excluded_ids (list): The ids of comments to leave out.
+    Returns:
+        set: The ids of the updates that have feedback.
+    """
+    return set(row[0] for row in session.query(Comment.update_id).join(Comment.user).filter(
+        Comment.update_id.in_(update_ids), Comment.karma != 0, Comment.anonymous == false(),
+        User.name.notin_(IGNORED_COMMENTERS), Comment.id.notin_(excluded_ids)).distinct())
+
+
+def _new_comments(session, deltas, new_comments):
+    """
+    Count the comments created by a flush in the rows of their updates.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): The session that was flushed.
+        deltas (dict): The changes of the counters of each row, to add the comments to.
+        new_comments (list): The comments created by the flush.
+    """
+    feedback = {}
+    for comment in new_comments:
+        counters = _comment_counters(comment)
+        key = _stats_key(comment.update) if counters is not None else None
+        if key is None:
+            continue
+        deltas[key].update(counters)
+        if comment.karma and not comment.anonymous:
+            feedback[comment.update.id] = key
+    if not feedback:
+        return
+
+    # Only the first feedback of an update counts.
+    previous = _with_feedback(session, list(feedback), [comment.id for comment in new_comments])
+    for id in set(feedback) - previous:
+        deltas[feedback[id]]['updates_with_feedback'] += 1
+
+
+def _deleted(session):
+    """
+    Count what the updates and comments a flush is about to delete remove from their rows.
+
+    This has to run before the flush, while the deleted rows and the comments of the deleted
+    updates are still in the database.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): The session being flushed.
+    Returns:
+        dict: The changes of the counters of each row.
+    """
+    deltas = defaultdict(Counter)
+    updates = dict((obj.id, obj) for obj in session.deleted if isinstance(obj, Update))
+    if updates:
+        counted = dict((row[0], row[1:]) for row in _count_comments(
+            session, [Update.id], Update.id.in_(list(updates))))
+        for id, update in updates.items():
+            key = _stats_key(update, old=True)
+            if key is not None:
+                deltas[key].subtract(
+                    Counter(dict(zip(COMMENT_COUNTERS, counted.get(id, ()))), updates=1))
+
+    # The comments of the deleted updates were counted with them.
+    comments = [obj for obj in session.deleted
+                if isinstance(obj, Comment) and obj.update_id not in updates]
+    feedback = {}
+    for comment in comments:
+        counters = _comment_counters(comment)
+        key = _stats_key(comment.update, old=True) if counters is not None else None
+        if key is None:
+            continue
+        deltas[key].subtract(counters)
+        if comment.karma and not comment.anonymous:
+            feedback[comment.update.id] = key
+    if feedback:
+        remaining = _with_feedback(session, list(feedback), [comment.id for comment in comments])
+        for id in set(feedback) - remaining:
+            deltas[feedback[id]]['updates_with_feedback'] -= 1
+    return deltas
+
+
+def _apply_deltas(session, deltas):
+    """
+    Add the given changes to the counters of the update_stats rows, creating the missing rows.
+
+    On PostgreSQL, each row is created or updated by a single ``INSERT ... ON CONFLICT DO UPDATE``,
+    so two transactions creating the same row don't fail on its unique key. Other databases update
+    the row and create it if there was none, which is only safe because SQLite, the only other
+    database Bodhi runs on, never runs two writing transactions at once.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): The session to write the changes with.
+        deltas (dict): The changes of the counters of each row, by key.
+    """
+    table = UpdateStats.__table__
+    upsert = session.get_bind().dialect.name == 'postgresql'
+    for (release_id, type_, status, day), counters in deltas.items():
+        counters = dict((name, value) for name, value in counters.items() if value)
+        if not counters:
+            continue
+        if upsert:
+            values = dict.fromkeys(STATS_COUNTERS, 0)
+            values.update(counters)
+            insert = postgresql.insert(table).values(
+                release_id=release_id, type=type_, status=status, day=day, **values)
+            session.execute(insert.on_conflict_do_update(
+                constraint='update_stats_key',
+                set_=dict((name, table.c[name] + insert.excluded[name]) for name in counters)))
+            continue
+        key = and_(table.c.release_id == release_id, table.c.type == type_,
+                   table.c.status == status, table.c.day == day)
+        result = session.execute(table.update().where(key).values(
+            dict((name, table.c[name] + value) for name, value in counters.items())))
+        if not result.rowcount:
+            values = dict.fromkeys(STATS_COUNTERS, 0)
+            values.update(counters)
+            session.execute(table.insert().values(
+                release_id=release_id, type=type_, status=status, day=day, **values))
+
+
+@event.listens_for(Session, 'before_flush')
+def count_deleted_before_flush(session, flush_context, instances):
+    """
+    Count the statistics of the updates and comments a flush is about to delete.
+
+    update_stats_after_flush() removes them from their rows.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): The session being flushed.
+        flush_context (sqlalchemy.orm.session.UOWTransaction): Unused.
+        instances (list): Unused.
+    """
+    session.info['update_stats_deleted'] = _deleted(session) if session.deleted else None
+
+
+@event.listens_for(Session, 'after_flush')
+def update_stats_after_flush(session, flush_context):
+    """
+    Keep the rows of update_stats up to date with the updates and comments written by a flush.
+
+    Args:
+        session (sqlalchemy.orm.session.Session): The session that was flushed.
+        flush_context (sqlalchemy.orm.session.UOWTransaction): Unused.
+    """
+    deltas = session.info.pop('update_stats_deleted', None) or defaultdict(Counter)
+    new_comments = [obj for obj in session.new if isinstance(obj, Comment)]
+    for obj in session.new:
+        if isinstance(obj, Update):
+            key = _stats_key(obj)
+            if key is not None:
+                deltas[key]['updates'] += 1
+    _moved_updates(session, deltas, [comment.id for comment in new_comments])
+    _new_comments(session, deltas, new_comments)
+    _apply_deltas(session, deltas)
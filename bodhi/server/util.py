@@ -27,6 +27,7 @@ import json
 import os
 import pkg_resources
 import socket
+import string
 import subprocess
 import tempfile
 import urllib
@@ -71,7 +72,7 @@ def get_rpm_header(nvr, tries=0):
         'changelogtime', 'changelogname', 'changelogtext',
     ]
     rpmID = nvr + '.src'
-    koji_session = buildsys.get_session()
+    koji_session = buildsys.get_cached_session()
     try:
         result = koji_session.getRPMHeaders(rpmID=rpmID, headers=headers)
     except Exception as e:
@@ -157,6 +158,65 @@ def build_evr(build):
     return tuple(map(str, (build['epoch'], build['version'], build['release'])))
 
 
+#: The letters rpmvercmp knows about, in the order it sorts them
+_EVR_LETTERS = string.ascii_uppercase + string.ascii_lowercase
+
+
+def _version_sort_key(value):
+    """
+    Return a string of digits that sorts the same way rpmvercmp sorts the given version.
+
+    Each segment of the version is encoded with a marker digit that sorts tildes before the end of
+    the version, the end before carets, carets before alphabetic segments, and alphabetic segments
+    before numeric ones. Numeric segments are then encoded as their length and digits, and
+    alphabetic segments as two digits per letter followed by 00. Since the key is only made of
+    digits, it sorts the same way under any database collation.
+
+    Args:
+        value (basestring): A version or release string.
+    Returns:
+        unicode: The sort key.
+    """
+    key = []
+    position = 0
+    while position < len(value):
+        char = value[position]
+        end = position + 1
+        if char == '~':
+            key.append(u'0')
+        elif char == '^':
+            key.append(u'2')
+        elif char in string.digits:
+            while end < len(value) and value[end] in string.digits:
+                end += 1
+            digits = value[position:end].lstrip('0')
+            key.append(u'4%02d%s' % (len(digits), digits))
+        elif char in _EVR_LETTERS:
+            while end < len(value) and value[end] in _EVR_LETTERS:
+                end += 1
+            key.append(u'3%s00' % ''.join(
+                '%02d' % (_EVR_LETTERS.index(letter) + 10) for letter in value[position:end]))
+        # Any other character only separates segments.
+        position = end
+    key.append(u'1')
+    return u''.join(key)
+
+
+def evr_sort_key(evr):
+    """
+    Return a string that sorts the same way rpm.labelCompare() sorts the given epoch, version, and
+    release.
+
+    Args:
+        evr (tuple): A 3-tuple of the epoch, version, and release. An epoch of None is 0.
+    Returns:
+        unicode: The sort key, made of digits only.
+    """
+    epoch, version, release = evr
+    return u''.join([_version_sort_key(str(epoch or 0)), _version_sort_key(version),
+                     _version_sort_key(release)])
+
+
 def link(href, text):
     """
     Return an HTML anchor tag for the given href using the given text.
@@ -349,11 +409,14 @@ def avatar(context, username, size):
     if username in hardcoded_avatars:
         return hardcoded_avatars[username].format(size=size)
 
+    from bodhi.server import caches
+
     # context is a mako context object
     request = context['request']
     https = request.registry.settings.get('prefer_ssl'),
+    region = caches.get_region('avatars')
 
-    @request.cache.cache_on_arguments()
+    @region.cache_on_arguments()
     def work(username, size):
         openid = "http://%s.id.fedoraproject.org/" % username
         if config.get('libravatar_enabled'):
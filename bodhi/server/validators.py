@@ -16,11 +16,10 @@ from datetime import datetime, timedelta
 
 from pyramid.exceptions import HTTPNotFound, HTTPBadRequest
 from pyramid.httpexceptions import HTTPFound, HTTPNotImplemented
-from sqlalchemy.sql import or_, and_
+from sqlalchemy.sql import or_
 import colander
 import koji
 import pyramid.threadlocal
-import rpm
 
 from . import captcha
 from . import log
@@ -68,6 +67,40 @@ def validate_csrf_token(node, value):
         raise colander.Invalid(node, csrf_error_message)
 
 
+def prefetch_builds(request):
+    """
+    Fetch the Koji build info and tags of all the submitted builds in a single multicall.
+
+    The results are stored in request.buildinfo, where cache_nvrs() and validate_build_tags()
+    find them instead of calling Koji once per build. Calls that fail are left out, so those
+    validators make them again and report the errors as usual.
+    """
+    builds = [build for build in request.validated.get('builds', [])
+              if 'info' not in request.buildinfo[build]]
+    if not builds:
+        return
+
+    koji_session = request.koji
+    try:
+        koji_session.multicall = True
+        for build in builds:
+            koji_session.getBuild(build)
+            koji_session.listTags(build)
+        results = koji_session.multiCall()
+    except Exception:
+        koji_session.multicall = False
+        log.warning('Unable to prefetch the builds from Koji', exc_info=True)
+        return
+
+    for index, build in enumerate(builds):
+        buildinfo, tags = results[2 * index:2 * index + 2]
+        # Successful calls are returned as one element lists, faults as dictionaries.
+        if isinstance(buildinfo, list):
+            request.buildinfo[build]['info'] = buildinfo[0]
+        if isinstance(tags, list):
+            request.buildinfo[build]['tags'] = [tag['name'] for tag in tags[0]]
+
+
 def cache_nvrs(request, build):
     if build in request.buildinfo and 'nvr' in request.buildinfo[build]:
         return
@@ -80,7 +113,8 @@ def cache_nvrs(request, build):
 
     request.buildinfo[build]['nvr'] = name, version, release
     # Cram some extra information in there, used later to infer type.
-    request.buildinfo[build]['info'] = request.koji.getBuild(build)
+    if 'info' not in request.buildinfo[build]:
+        request.buildinfo[build]['info'] = request.koji.getBuild(build)
 
 
 def validate_nvrs(request):
@@ -96,7 +130,7 @@ def validate_nvrs(request):
 
 def validate_builds(request):
     edited = request.validated.get('edited')
-    user = User.get(request.user.name, request.db)
+    user = request.user
 
     if not request.validated.get('builds', []):
         request.errors.add('body', 'builds', "You may not specify an empty list of builds.")
@@ -166,14 +200,16 @@ def validate_build_tags(request):
 
     for build in request.validated.get('builds', []):
         valid = False
-        try:
-            tags = request.buildinfo[build]['tags'] = [
-                tag['name'] for tag in request.koji.listTags(build)
-            ]
-        except koji.GenericError:
-            request.errors.add('body', 'builds',
-                               'Invalid koji build: %s' % build)
-            return
+        tags = request.buildinfo[build].get('tags')
+        if tags is None:
+            try:
+                tags = request.buildinfo[build]['tags'] = [
+                    tag['name'] for tag in request.koji.listTags(build)
+                ]
+            except koji.GenericError:
+                request.errors.add('body', 'builds',
+                                   'Invalid koji build: %s' % build)
+                return
 
         # Disallow adding builds for a different release
         if edited:
@@ -234,7 +270,7 @@ def validate_acls(request):
         request.errors.add('session', 'user', 'No ACLs for anonymous user')
         return
     db = request.db
-    user = User.get(request.user.name, request.db)
+    user = request.user
     committers = []
     watchers = []
     groups = []
@@ -679,7 +715,8 @@ def validate_ignore_user(request):
 
 def validate_update_id(request):
     """Ensure that a given update id exists"""
-    update = Update.get(request.matchdict['id'], request.db)
+    update = Update.get(request.matchdict['id'], request.db,
+                        options=Update.loading_profile('detail'))
     if update:
         request.validated['update'] = update
     else:
@@ -902,6 +939,8 @@ def _validate_override_build(request, nvr, db):
         build_class = ContentType.infer_content_class(
             base=Build, build=build_info)
         build = build_class(nvr=nvr, release=release, package=package)
+        if isinstance(build, RpmBuild):
+            build.set_evr(build_info)
         db.add(build)
         db.flush()
 
@@ -1047,18 +1086,13 @@ def validate_request(request):
         return
 
     for build in update.builds:
-        other_builds = db.query(RpmBuild).join(Update).filter(
-            and_(Build.package == build.package, RpmBuild.nvr != build.nvr, Update.status == target,
-                 Update.release == update.release)).all()
-        for other_build in other_builds:
-
-            log.info('Checking against %s' % other_build.nvr)
-
-            if rpm.labelCompare(other_build.evr, build.evr) > 0:
-                log.debug('%s is older than %s', build.evr, other_build.evr)
-                request.errors.add(
-                    'querystring', 'update',
-                    'Cannot submit %s %s to %s since it is older than %s' % (
-                        build.package.name, build.evr, target.description, other_build.evr))
-                request.errors.status = HTTPBadRequest.code
-                return
+        if not isinstance(build, RpmBuild):
+            continue
+        for other_build in build.newer_builds(db, [target], release=update.release):
+            log.debug('%s is older than %s', build.evr, other_build.evr)
+            request.errors.add(
+                'querystring', 'update',
+                'Cannot submit %s %s to %s since it is older than %s' % (
+                    build.package.name, build.evr, target.description, other_build.evr))
+            request.errors.status = HTTPBadRequest.code
+            return
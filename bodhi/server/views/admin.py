@@ -20,13 +20,17 @@
 
 from cornice import Service
 
-from bodhi.server import log
+from bodhi.server import caches, log
 from bodhi.server.security import admin_only_acl
 
 admin_service = Service(name='admin', path='/admin/',
                         description='Administrator view',
                         acl=admin_only_acl)
 
+caches_service = Service(name='admin_caches', path='/admin/caches',
+                         description='The counters of the cache regions',
+                         acl=admin_only_acl)
+
 
 @admin_service.get(permission='admin')
 def admin(request):
@@ -45,3 +49,17 @@ def admin(request):
     log.info('%s logged into admin panel' % user.name)
     principals = request.effective_principals
     return {'user': user.name, 'principals': principals}
+
+
+@caches_service.get(permission='admin')
+def cache_stats(request):
+    """
+    Return the hits, misses and average read time of each cache region of this process.
+
+    Args:
+        request (pyramid.request): The current request.
+    Returns:
+        dict: A dictionary mapping "caches" to the counters of each region, by name.
+    """
+    return {'caches': dict((name, stats.__json__(request))
+                           for name, stats in caches.get_stats().items())}
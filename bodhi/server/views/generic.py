@@ -19,6 +19,9 @@
 """A collection of views that don't fit in any other common category."""
 
 import datetime
+import re
+import time
+
 import sqlalchemy as sa
 
 import cornice.errors
@@ -28,7 +31,7 @@ from pyramid.view import view_config, notfound_view_config
 from pyramid.exceptions import HTTPForbidden, HTTPBadRequest
 from pyramid.httpexceptions import HTTPFound
 
-from bodhi.server import log, models
+from bodhi.server import caches, log, models, stats
 from bodhi.server.config import config
 import bodhi.server.util
 
@@ -82,7 +85,7 @@ def get_latest_updates(request, critpath, security):
                                   5 most recent updates that are in Testing status
     """
     db = request.db
-    query = db.query(models.Update)
+    query = db.query(models.Update).options(*models.Update.loading_profile('list'))
 
     if critpath:
         query = query.filter(
@@ -95,12 +98,14 @@ def get_latest_updates(request, critpath, security):
         models.Update.status == models.UpdateStatus.testing)
 
     query = query.order_by(models.Update.date_submitted.desc())
-    return query.limit(5).all()
+    updates = query.limit(5).all()
+    models.Update.prefetch_test_cases(db, updates)
+    return updates
 
 
-def _get_status_counts(basequery, status):
+def _get_status_counts(totals, status):
     """
-    Return a dictionary with the counts of objects found in the basequery.
+    Return a dictionary with the counts of the updates with the given status.
 
     The return data is specified by total count, newpackage count, bugfix count, enhancement count,
     and security count. The dictionary keys will be named with the
@@ -114,34 +119,28 @@ def _get_status_counts(basequery, status):
         stable_security_total
 
     Args:
-        basequery (sqlalchemy.orm.query.Query):
-            The basequery of updates we want to count and further filter on.
+        totals (dict): The numbers of updates by status and type, as returned by
+            bodhi.server.stats.sum_counts().
         status (bodhi.server.models.UpdateStatus):
-            The update status we want to filter by in basequery
+            The update status we want the counts of.
     Return:
         dict: A dictionary describing the counts of the updates, as described above.
     """
-    basequery = basequery.filter(models.Update.status == status)
-    return {
-        '{}_updates_total'.format(status.description): basequery.count(),
-        '{}_newpackage_total'.format(status.description):
-            basequery.filter(models.Update.type == models.UpdateType.newpackage).count(),
-        '{}_bugfix_total'.format(status.description):
-            basequery.filter(models.Update.type == models.UpdateType.bugfix).count(),
-        '{}_enhancement_total'.format(status.description):
-            basequery.filter(models.Update.type == models.UpdateType.enhancement).count(),
-        '{}_security_total'.format(status.description):
-            basequery.filter(models.Update.type == models.UpdateType.security).count(),
-    }
-
-
-def get_update_counts(request, releaseid):
+    counts = {'{}_updates_total'.format(status.description): sum(
+        totals.get((status.description, type_.description), 0) for type_ in models.UpdateType)}
+    for type_ in models.UpdateType:
+        counts['{}_{}_total'.format(status.description, type_.description)] = totals.get(
+            (status.description, type_.description), 0)
+    return counts
+
+
+def get_update_counts(request, releaseids):
     """
-    Return counts for the various states and types of updates in the given release.
+    Return counts for the various states and types of updates in the given releases.
 
-    This function returns a dictionary that tabulates the counts of the various
-    types of Bodhi updates at the various states they can appear in. The
-    dictionary has the following keys, with pretty self-explanatory names:
+    This function returns a dictionary that tabulates, for each release, the counts of the
+    various types of Bodhi updates at the various states they can appear in. The
+    dictionary of each release has the following keys, with pretty self-explanatory names:
 
         pending_updates_total
         pending_newpackage_total
@@ -159,20 +158,22 @@ def get_update_counts(request, releaseid):
         stable_enhancement_total
         stable_security_total
 
+    The updates of all the releases are counted with one query.
+
     Args:
-        request (pyramid.util.Request): The current request
-        releaseid (basestring): The id of the Release object you would like the counts performed on
+        request (pyramid.request): The current request.
+        releaseids (list): The names of the releases we would like the counts of.
     Returns:
-        dict: A dictionary expressing the counts, as described above.
+        dict: The dictionary of counts of each release, by name.
     """
-    release = models.Release.get(releaseid, request.db)
-    basequery = request.db.query(models.Update).filter(models.Update.release == release)
-    counts = {}
-    counts.update(_get_status_counts(basequery, models.UpdateStatus.pending))
-    counts.update(_get_status_counts(basequery, models.UpdateStatus.testing))
-    counts.update(_get_status_counts(basequery, models.UpdateStatus.stable))
-
-    return counts
+    release_counts = {}
+    for name, counts in stats.count_updates(request.db, releaseids).items():
+        totals = stats.sum_counts(counts, 'status', 'type')
+        release_counts[name] = {}
+        for status in (models.UpdateStatus.pending, models.UpdateStatus.testing,
+                       models.UpdateStatus.stable):
+            release_counts[name].update(_get_status_counts(totals, status))
+    return release_counts
 
 
 @view_config(route_name='home', renderer='home.html')
@@ -201,15 +202,16 @@ def home(request):
         dict: A Dictionary expressing the values described above
     """
     r = request
+    region = caches.get_region('home')
 
-    @request.cache.cache_on_arguments()
+    @region.cache_on_arguments()
     def work():
         top_testers = get_top_testers(request)
         critpath_updates = get_latest_updates(request, True, False)
         security_updates = get_latest_updates(request, False, True)
-        release_updates_counts = {}
-        for release in request.releases['current'] + request.releases['pending']:
-            release_updates_counts[release["name"]] = get_update_counts(request, release["name"])
+        releases = request.releases['current'] + request.releases['pending']
+        release_updates_counts = get_update_counts(
+            request, [release["name"] for release in releases])
 
         return {
             "release_updates_counts": release_updates_counts,
@@ -264,8 +266,9 @@ def latest_candidates(request):
     """
     koji = request.koji
     db = request.db
+    region = caches.get_region('candidates')
 
-    @request.cache.cache_on_arguments()
+    @region.cache_on_arguments()
     def work(pkg, testing):
         result = []
         koji.multicall = True
@@ -313,28 +316,70 @@ def latest_candidates(request):
     return result
 
 
+#: Tags that Koji reported as missing, mapped to the time until which latest_builds skips them
+_missing_tags = {}
+#: The fault strings of the GenericError Koji raises for an unknown tag: the hub's "No such entry
+#: in table tag", and the "Invalid tagInfo" and "No such tagInfo" of older hubs and of the
+#: development and simulated build systems
+_MISSING_TAG_FAULT = re.compile(r'(No such entry in table tag|Invalid tagInfo|No such tagInfo)')
+
+
 @view_config(route_name='latest_builds', renderer='json')
 def latest_builds(request):
     """
     Return a list of the latest builds for a given package.
 
+    The latest build in every tag of every release is looked up in a single Koji multicall, and
+    the result is cached for ``latest_builds.expiration_time`` seconds. Tags that Koji does not
+    know about, such as the pending tags of EPEL, are skipped for
+    ``latest_builds.missing_tag_expiration_time`` seconds. Tags whose query failed for another
+    reason are left out of the result but queried again next time.
+
     Args:
         request (pyramid.util.Request): The current request. The request's "package" parameter is
             used to pass the package name being queried.
     Returns:
         dict: A dictionary of the release dist tag to the latest build.
     """
-    builds = {}
     koji = request.koji
-    package = request.params.get('package')
-    for tag_type, tags in models.Release.get_tags(request.db)[0].iteritems():
+    tag_types = models.Release.get_tags(request.db)[0]
+    region = caches.get_region('candidates')
+
+    @region.cache_on_arguments(namespace='latest_builds',
+                               expiration_time=config.get('latest_builds.expiration_time'))
+    def work(package):
+        now = time.time()
+        tags = [tag for tags in tag_types.itervalues() for tag in tags
+                if _missing_tags.get(tag, 0) <= now]
+
+        koji.multicall = True
         for tag in tags:
-            try:
-                for build in koji.getLatestBuilds(tag, package=package):
-                    builds[tag] = build['nvr']
-            except:  # Things like EPEL don't have pending tags
-                pass
-    return builds
+            koji.getLatestBuilds(tag, package=package)
+        response = koji.multiCall() or []  # Protect against None
+
+        builds = {}
+        for tag, result in zip(tags, response):
+            if isinstance(result, dict):
+                fault = result.get('faultString') or ''
+                if result.get('faultCode') == 1000 and _MISSING_TAG_FAULT.search(fault):
+                    log.debug('Skipping tag %s that Koji does not know: %s' % (tag, fault))
+                    _missing_tags[tag] = now + config.get(
+                        'latest_builds.missing_tag_expiration_time')
+                else:
+                    log.warning('Unable to query the latest builds of %s in %s: %s' % (
+                        package, tag, fault))
+                continue
+            for build in result[0]:
+                builds[tag] = build['nvr']
+        return builds
+
+    package = request.params.get('package')
+    try:
+        return work(package)
+    except Exception:
+        koji.multicall = False
+        log.exception('Unable to query the latest builds of %s' % package)
+        return {}
 
 
 @view_config(route_name='masher_status', renderer='masher.html')
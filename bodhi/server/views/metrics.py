@@ -22,6 +22,7 @@ import json
 
 from pyramid.view import view_config
 
+from bodhi.server.stats import sum_update_stats
 import bodhi.server.models as m
 
 
@@ -45,16 +46,19 @@ def compute_ticks_and_data(db, releases, update_types):
     for i, release in enumerate(releases):
         ticks.append([i, release.name])
 
+    # The numbers of stable updates by release and type, from the update_stats rollup
+    stable = {}
+    if releases:
+        for row in sum_update_stats(
+                db, [m.UpdateStats.release_id, m.UpdateStats.type],
+                m.UpdateStats.status == m.UpdateStatus.stable,
+                m.UpdateStats.release_id.in_([release.id for release in releases])):
+            stable[(row[0], row[1].value)] = row[2]
+
     for update_type, label in update_types.items():
         d = []
-        update_type = m.UpdateType.from_string(update_type)
         for i, release in enumerate(releases):
-            num = db.query(m.Update).filter_by(
-                release=release,
-                type=update_type,
-                status=m.UpdateStatus.stable
-            ).count()
-            d.append([i, num])
+            d.append([i, stable.get((release.id, update_type), 0)])
         data.append(dict(data=d, label=label))
 
     return (data, ticks)
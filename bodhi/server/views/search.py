@@ -17,9 +17,15 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """Contains a view that allows API users to search packages."""
 
+from array import array
+from threading import Lock, Thread
+import bisect
+import time
+
 from pyramid.view import view_config
 
 from bodhi.server import log, buildsys
+from bodhi.server.config import config
 
 
 def get_all_packages():
@@ -34,6 +40,110 @@ def get_all_packages():
     return [pkg['package_name'] for pkg in koji.listPackages()]
 
 
+class PackageIndex(object):
+    """
+    An in-memory index of the names of all the packages in Koji.
+
+    The names are kept in a sorted list, so that prefix searches are a bisection, along with the
+    positions of the names containing each trigram, so that substring searches only look at the
+    names that contain every trigram of the term. The index is loaded the first time it is
+    searched and reloaded in a background thread once it is older than
+    ``search_packages.refresh_interval`` seconds. Searches keep using the old index until the new
+    one is ready.
+    """
+
+    def __init__(self, loader=get_all_packages):
+        """
+        Initialize the empty index.
+
+        Args:
+            loader (callable): Called without arguments to get the list of package names.
+        """
+        self._loader = loader
+        self._lock = Lock()
+        self._refreshing = False
+        # The sorted names, and trigram -> positions of the names containing it
+        self._index = None
+        self.loaded_at = None
+
+    @staticmethod
+    def _trigrams(name):
+        """Return the set of trigrams in the given name."""
+        return set(name[i:i + 3] for i in range(len(name) - 2))
+
+    def refresh(self):
+        """Load the package names and replace the index with one built from them."""
+        names = sorted(set(self._loader()))
+        trigrams = {}
+        for position, name in enumerate(names):
+            for trigram in self._trigrams(name):
+                trigrams.setdefault(trigram, array('I')).append(position)
+        self._index = (names, trigrams)
+        self.loaded_at = time.time()
+        log.debug('Indexed %d package names' % len(names))
+
+    def _refresh_in_background(self):
+        """Refresh the index, logging instead of raising errors, then allow another refresh."""
+        try:
+            self.refresh()
+        except Exception:
+            log.exception('Unable to refresh the package index')
+        finally:
+            buildsys.release_session()
+            with self._lock:
+                self._refreshing = False
+
+    def refresh_in_background(self):
+        """Start refreshing the index in a background thread, unless one is already running."""
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        thread = Thread(target=self._refresh_in_background, name='package-index-refresh')
+        thread.daemon = True
+        thread.start()
+
+    def search(self, term):
+        """
+        Return the package names containing the given term.
+
+        Args:
+            term (basestring): The text to search for.
+        Returns:
+            list: The names starting with the term, then the other names containing it, each in
+                alphabetical order.
+        """
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self.refresh()
+        elif time.time() - self.loaded_at > config.get('search_packages.refresh_interval'):
+            self.refresh_in_background()
+        names, trigrams = self._index
+
+        prefixed = []
+        position = bisect.bisect_left(names, term)
+        while position < len(names) and names[position].startswith(term):
+            prefixed.append(names[position])
+            position += 1
+
+        if len(term) < 3:
+            candidates = range(len(names))
+        else:
+            postings = sorted((trigrams.get(t, ()) for t in self._trigrams(term)), key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+            candidates = sorted(candidates)
+        others = [names[i] for i in candidates
+                  if term in names[i] and not names[i].startswith(term)]
+        return prefixed + others
+
+
+#: The index of package names searched by search_packages
+package_index = PackageIndex()
+
+
 @view_config(route_name='search_packages', renderer='json',
              request_method='GET')
 def search_packages(request):
@@ -49,6 +159,4 @@ def search_packages(request):
         list: A list of dictionaries with keys 'id', 'label', and 'value' all indexing koji
             listPackages() results that match the search term.
     """
-    packages = get_all_packages()
-    return [{'id': p, 'label': p, 'value': p} for p in packages
-            if request.GET['term'] in p]
+    return [{'id': p, 'label': p, 'value': p} for p in package_index.search(request.GET['term'])]
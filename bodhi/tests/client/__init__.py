@@ -216,6 +216,11 @@ EXAMPLE_QUERY_MUNCH = Munch({
                   u'show_popups': True}}]})
 
 
+EXAMPLE_BULK_MUNCH = Munch({
+    u'not_found': [],
+    u'updates': {u'nodejs-grunt-wrap-0.3.0-2.fc25': EXAMPLE_QUERY_MUNCH.updates[0]}})
+
+
 EXAMPLE_QUERY_OVERRIDES_MUNCH = Munch({
     u'chrome': True,
     u'display_user': True,
@@ -22,6 +22,7 @@ import unittest
 from click import testing
 import fedora.client
 import mock
+from munch import Munch
 
 from bodhi import client
 from bodhi.client import bindings, AuthError
@@ -68,7 +69,7 @@ class TestDownload(unittest.TestCase):
     @mock.patch('bodhi.client.bindings.BodhiClient.csrf',
                 mock.MagicMock(return_value='a_csrf_token'))
     @mock.patch('bodhi.client.bindings.BodhiClient.send_request',
-                return_value=client_test_data.EXAMPLE_QUERY_MUNCH, autospec=True)
+                return_value=client_test_data.EXAMPLE_BULK_MUNCH, autospec=True)
     @mock.patch('bodhi.client.subprocess.call', return_value=0)
     def test_url_flag(self, call, send_request):
         """
@@ -85,13 +86,42 @@ class TestDownload(unittest.TestCase):
                          'Downloading packages from nodejs-grunt-wrap-0.3.0-2.fc25\n')
         bindings_client = send_request.mock_calls[0][1][0]
         send_request.assert_called_once_with(
-            bindings_client, 'updates/', verb='GET',
-            params={'builds': u'nodejs-grunt-wrap-0.3.0-2.fc25'})
+            bindings_client, 'updates/bulk', verb='POST', params={},
+            data={'ids': u'nodejs-grunt-wrap-0.3.0-2.fc25'})
         self.assertEqual(bindings_client.base_url, 'http://localhost:6543/')
         call.assert_called_once_with((
             'koji', 'download-build', '--arch=noarch', '--arch={}'.format(platform.machine()),
             'nodejs-grunt-wrap-0.3.0-2.fc25'))
 
+    @mock.patch('bodhi.client.bindings.BodhiClient.send_request', autospec=True)
+    @mock.patch('bodhi.client.subprocess.call', return_value=0)
+    def test_updateid_and_builds(self, call, send_request):
+        """
+        Assert that update IDs and builds are looked up in one request, and that each update is
+        downloaded once.
+        """
+        update = client_test_data.EXAMPLE_QUERY_MUNCH.updates[0]
+        send_request.return_value = Munch({
+            'updates': {'FEDORA-2017-c95b33872d': update,
+                        'nodejs-grunt-wrap-0.3.0-2.fc25': update},
+            'not_found': ['bodhi-2.0-1.fc25']})
+        runner = testing.CliRunner()
+
+        result = runner.invoke(
+            client.download,
+            ['--updateid', 'FEDORA-2017-c95b33872d',
+             '--builds', 'nodejs-grunt-wrap-0.3.0-2.fc25,bodhi-2.0-1.fc25'])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output,
+                         ('WARNING: bodhi-2.0-1.fc25 not found!\n'
+                          'Downloading packages from nodejs-grunt-wrap-0.3.0-2.fc25\n'))
+        send_request.assert_called_once_with(
+            send_request.mock_calls[0][1][0], 'updates/bulk', verb='POST', params={},
+            data={'ids': (u'FEDORA-2017-c95b33872d nodejs-grunt-wrap-0.3.0-2.fc25 '
+                          u'bodhi-2.0-1.fc25')})
+        self.assertEqual(call.call_count, 1)
+
 
 class TestNew(unittest.TestCase):
     """
@@ -218,6 +248,28 @@ class TestQuery(unittest.TestCase):
                 'type': None, 'cves': None})
 
 
+class TestExport(unittest.TestCase):
+    """
+    Test the export() function.
+    """
+    @mock.patch.dict('os.environ', {'USERNAME': 'dudemcpants'})
+    @mock.patch('bodhi.client.bindings.BodhiClient.export', autospec=True,
+                return_value=iter([{'title': 'bodhi-2.0-1.fc17'}, {'title': 'nodejs-1-1.fc17'}]))
+    def test_export(self, export):
+        """
+        Assert that each update is written on its own line.
+        """
+        runner = testing.CliRunner()
+
+        result = runner.invoke(client.export, ['--releases', 'F17', '--mine'])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output,
+                         '{"title": "bodhi-2.0-1.fc17"}\n{"title": "nodejs-1-1.fc17"}\n')
+        self.assertEqual(export.mock_calls[0][2]['releases'], 'F17')
+        self.assertEqual(export.mock_calls[0][2]['user'], 'dudemcpants')
+
+
 class TestQueryBuildrootOverrides(unittest.TestCase):
     """
     This class tests the query_buildroot_overrides() function.
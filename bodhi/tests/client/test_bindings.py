@@ -507,6 +507,41 @@ class TestBodhiClient_override_str(unittest.TestCase):
         self.assertEqual(override, 'this is an override')
 
 
+class TestBodhiClient_paginate(unittest.TestCase):
+    """
+    Test BodhiClient.paginate().
+    """
+    def test_follows_cursors(self):
+        """
+        Assert that the pages are requested with the cursor of the previous one, without counting.
+        """
+        client = bindings.BodhiClient()
+        client.send_request = mock.MagicMock(side_effect=[
+            {'updates': [1, 2], 'next_cursor': 'abc'}, {'updates': [3], 'next_cursor': None}])
+
+        results = list(client.paginate('updates/', 'updates', releases='F26', page=2))
+
+        self.assertEqual(results, [1, 2, 3])
+        self.assertEqual(
+            client.send_request.mock_calls,
+            [mock.call('updates/', verb='GET', params={'releases': 'F26', 'count': False}),
+             mock.call('updates/', verb='GET',
+                       params={'releases': 'F26', 'count': False, 'cursor': 'abc'})])
+
+    def test_errors(self):
+        """
+        Assert that the errors of the server are raised.
+        """
+        client = bindings.BodhiClient()
+        client.send_request = mock.MagicMock(
+            return_value={'errors': [{'description': 'Invalid cursor'}]})
+
+        with self.assertRaises(bindings.BodhiClientException) as exc:
+            list(client.paginate('updates/', 'updates', cursor='wat'))
+
+        self.assertEqual(str(exc.exception), 'Invalid cursor')
+
+
 class TestBodhiClient_password(unittest.TestCase):
     """
     This class contains tests for the BodhiClient.password property.
@@ -534,6 +569,26 @@ class TestBodhiClient_password(unittest.TestCase):
         self.assertEqual(getpass.call_count, 0)
 
 
+class TestBodhiClient_get_updates(unittest.TestCase):
+    """
+    Test BodhiClient.get_updates().
+    """
+    def test_get_updates(self):
+        """
+        Assert that the identifiers are posted to the bulk endpoint.
+        """
+        client = bindings.BodhiClient()
+        client.send_request = mock.MagicMock(return_value='return_value')
+
+        result = client.get_updates(['bodhi-2.4.0-1.fc26', 'FEDORA-2017-c95b33872d'],
+                                    fields='title')
+
+        self.assertEqual(result, 'return_value')
+        client.send_request.assert_called_once_with(
+            'updates/bulk', verb='POST', params={'fields': 'title'},
+            data={'ids': 'bodhi-2.4.0-1.fc26 FEDORA-2017-c95b33872d'})
+
+
 class TestBodhiClient_query(unittest.TestCase):
     """
     Test BodhiClient.query().
@@ -697,6 +752,64 @@ class TestBodhiClient_query(unittest.TestCase):
             'updates/', verb='GET', params={'packages': 'bodhi', 'type': 'security'})
 
 
+class TestBodhiClient_query_all(unittest.TestCase):
+    """
+    Test BodhiClient.query_all().
+    """
+    def test_query_all(self):
+        """
+        Assert that the arguments are translated like query()'s, and that all the pages are read.
+        """
+        client = bindings.BodhiClient()
+        client.send_request = mock.MagicMock(side_effect=[
+            {'updates': [1], 'next_cursor': 'abc'}, {'updates': [2], 'next_cursor': None}])
+
+        results = list(client.query_all(limit=1, release='F26'))
+
+        self.assertEqual(results, [1, 2])
+        client.send_request.assert_called_with(
+            'updates/', verb='GET',
+            params={'rows_per_page': 1, 'releases': ['F26'], 'count': False, 'cursor': 'abc'})
+
+
+class TestBodhiClient_export(unittest.TestCase):
+    """
+    Test BodhiClient.export().
+    """
+    def test_export(self):
+        """
+        Assert that the arguments are translated like query()'s, and that each line is an update.
+        """
+        client = bindings.BodhiClient(base_url='http://example.com/bodhi/')
+        response = client._session.get = mock.MagicMock()
+        response = response.return_value
+        response.status_code = 200
+        response.iter_lines.return_value = iter(['{"title": "a"}', '', '{"title": "b"}'])
+
+        results = list(client.export(release='F26'))
+
+        self.assertEqual(results, [{'title': 'a'}, {'title': 'b'}])
+        client._session.get.assert_called_once_with(
+            'http://example.com/bodhi/updates/export', params={'releases': ['F26']},
+            stream=True, timeout=None)
+        response.raise_for_status.assert_called_once_with()
+
+    def test_invalid_query(self):
+        """
+        Assert that the errors of a refused query are raised.
+        """
+        client = bindings.BodhiClient()
+        response = client._session.get = mock.MagicMock()
+        response.return_value.status_code = 400
+        response.return_value.json.return_value = {
+            'errors': [{'description': 'Invalid release specified: WAT'}]}
+
+        with self.assertRaises(bindings.BodhiClientException) as exc:
+            list(client.export(releases='WAT'))
+
+        self.assertEqual(str(exc.exception), 'Invalid release specified: WAT')
+
+
 class TestBodhiClient_save(unittest.TestCase):
     """
     This class contains tests for BodhiClient.save().
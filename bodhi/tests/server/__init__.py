@@ -97,6 +97,7 @@ def populate(db):
     comment.user = anonymous
     db.add(comment)
     update.comments.append(comment)
+    update.recount_karma()
 
     with mock.patch(target='uuid.uuid4', return_value='wat'):
         update.assign_alias()
@@ -24,6 +24,7 @@ from sqlalchemy import event
 import mock
 
 from bodhi.server import bugs, buildsys, models, initialize_db, Session, config, main
+from bodhi.server.changelogs import changelogs
 from bodhi.tests.server import create_update, populate
 
 
@@ -81,6 +82,43 @@ def _configure_test_db(db_uri=DEFAULT_DB):
     return engine
 
 
+class StatementCounter(object):
+    """
+    Count the SQL statements executed on an engine, as a context manager.
+
+    The statements that only manage transactions and savepoints are not counted.
+
+    Attributes:
+        statements (list): The statements executed so far.
+    """
+    IGNORED = ('BEGIN', 'COMMIT', 'ROLLBACK', 'SAVEPOINT', 'RELEASE')
+
+    def __init__(self, engine):
+        """
+        Initialize the counter.
+
+        Args:
+            engine (sqlalchemy.engine.Engine): The engine to count the statements of.
+        """
+        self.engine = engine
+        self.statements = []
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *args):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+    def __len__(self):
+        return len(self.statements)
+
+    def _count(self, conn, cursor, statement, parameters, context, executemany):
+        """Record the statement, unless it is one of the IGNORED ones."""
+        if not statement.lstrip().upper().startswith(self.IGNORED):
+            self.statements.append(statement)
+
+
 class BaseTestCase(unittest.TestCase):
     """
     The base test class for Bodhi.
@@ -133,8 +171,8 @@ class BaseTestCase(unittest.TestCase):
 
     def setUp(self):
         # Ensure "cached" objects are cleared before each test.
-        models.Release._all_releases = None
-        models.Release._tag_cache = None
+        models.Release.registry.clear()
+        changelogs.clear()
 
         if engine is None:
             self.engine = _configure_test_db()
@@ -183,6 +221,30 @@ class BaseTestCase(unittest.TestCase):
             _app = TestApp(main({}, testing=u'guest', **self.app_settings))
         self.app = _app
 
+    def count_statements(self):
+        """
+        Return a context manager that counts the SQL statements executed in its block.
+
+        Returns:
+            StatementCounter: The counter.
+        """
+        return StatementCounter(self.engine)
+
+    @contextmanager
+    def assertStatementCount(self, count):
+        """
+        Assert that the block executes the given number of SQL statements, to catch N+1 queries.
+
+        Args:
+            count (int): The expected number of statements.
+        """
+        with self.count_statements() as counter:
+            yield counter
+        self.assertEqual(
+            len(counter), count,
+            '%d statements were executed instead of %d:\n%s' % (
+                len(counter), count, '\n'.join(counter.statements)))
+
     def get_csrf_token(self):
         return self.app.get('/csrf').json_body['csrf_token']
 
@@ -150,8 +150,7 @@ class TestMasher(unittest.TestCase):
         self.masher = Masher(FakeHub(), db_factory=self.db_factory, mash_dir=self.tempdir)
 
         # Reset "cached" objects before each test.
-        Release._all_releases = None
-        Release._tag_cache = None
+        Release.registry.clear()
 
     def tearDown(self):
         shutil.rmtree(self.tempdir)
@@ -518,7 +517,7 @@ References:
             db.add(update)
 
             # Wipe out the tag cache so it picks up our new release
-            Release._tag_cache = None
+            Release.registry.clear()
 
         self.msg['body']['msg']['updates'] += [u'bodhi-2.0-1.fc18']
 
@@ -600,7 +599,7 @@ References:
             db.add(update)
 
             # Wipe out the tag cache so it picks up our new release
-            Release._tag_cache = None
+            Release.registry.clear()
 
         self.msg['body']['msg']['updates'] += [u'bodhi-2.0-1.fc18']
 
@@ -674,7 +673,7 @@ References:
             db.add(update)
 
             # Wipe out the tag cache so it picks up our new release
-            Release._tag_cache = None
+            Release.registry.clear()
 
         self.msg['body']['msg']['updates'] += [u'bodhi-2.0-1.fc18']
 
@@ -32,7 +32,8 @@ class TestSignedHandler___init__(unittest.TestCase):
 
         handler = signed.SignedHandler(hub)
 
-        self.assertEqual(handler.topic, ['topic_prefix.environment.buildsys.tag'])
+        self.assertEqual(handler.topic, ['topic_prefix.environment.buildsys.tag',
+                                         'topic_prefix.environment.buildsys.untag'])
 
     @mock.patch('bodhi.server.consumers.signed.fedmsg.consumers.FedmsgConsumer.__init__')
     def test_calls_super(self, __init__):
@@ -42,7 +43,8 @@ class TestSignedHandler___init__(unittest.TestCase):
 
         handler = signed.SignedHandler(hub)
 
-        self.assertEqual(handler.topic, ['topic_prefix.environment.buildsys.tag'])
+        self.assertEqual(handler.topic, ['topic_prefix.environment.buildsys.tag',
+                                         'topic_prefix.environment.buildsys.untag'])
         __init__.assert_called_once_with(hub)
 
 
@@ -114,3 +116,24 @@ class TestSignedHandlerConsume(unittest.TestCase):
 
         self.handler.consume(self.sample_message)
         mock_log.info.assert_called_with('Build was not submitted, skipping')
+
+    @mock.patch('bodhi.server.consumers.signed.buildsys.invalidate_cache')
+    @mock.patch('bodhi.server.consumers.signed.Build')
+    def test_consume_invalidates_koji_cache(self, mock_build_model, invalidate_cache):
+        """Assert that the cached Koji results about the build and tag are dropped."""
+        self.handler.consume(self.sample_message)
+
+        invalidate_cache.assert_called_once_with(
+            build='colord-1.3.4-1.fc26', tag='f26-updates-testing-pending')
+
+    @mock.patch('bodhi.server.consumers.signed.buildsys.invalidate_cache')
+    @mock.patch('bodhi.server.consumers.signed.Build')
+    def test_consume_untag(self, mock_build_model, invalidate_cache):
+        """Assert that untag messages invalidate the Koji cache and don't touch the DB."""
+        self.sample_message['body']['topic'] = 'org.fedoraproject.prod.buildsys.untag'
+
+        self.handler.consume(self.sample_message)
+
+        invalidate_cache.assert_called_once_with(
+            build='colord-1.3.4-1.fc26', tag='f26-updates-testing-pending')
+        self.assertEqual(mock_build_model.get.call_count, 0)
@@ -20,7 +20,7 @@ import copy
 
 from webtest import TestApp
 
-from bodhi.server import main
+from bodhi.server import main, stats
 from bodhi.tests.server import base
 
 
@@ -35,6 +35,18 @@ class TestAdminView(base.BaseTestCase):
         self.assertEquals(body['principals'][2], 'guest')
         self.assertEquals(body['user'], 'guest')
 
+    def test_caches(self):
+        """Test that the counters of the cache regions are returned"""
+        stats.count_updates(self.db, [u'F17'])
+        stats.count_updates(self.db, [u'F17'])
+
+        res = self.app.get('/admin/caches')
+
+        counts = res.json_body['caches']['counts']
+        self.assertEquals((counts['hits'], counts['misses']), (1, 1))
+        self.assertEquals(sorted(res.json_body['caches']),
+                          ['avatars', 'candidates', 'counts', 'home', 'identities'])
+
     def test_admin_unauthed(self):
         """Test that an unauthed user cannot see the admin endpoint"""
         anonymous_settings = copy.copy(self.app_settings)
@@ -46,3 +58,4 @@ class TestAdminView(base.BaseTestCase):
         res = app.get('/admin/', status=403)
         self.assertIn('<h1>403 <small>Forbidden</small></h1>', res)
         self.assertIn('<p class="lead">Access was denied to this resource.</p>', res)
+        app.get('/admin/caches', status=403)
@@ -25,6 +25,11 @@ class TestBuildsService(base.BaseTestCase):
         res = self.app.get('/builds/bodhi-2.0-1.fc17')
         self.assertEquals(res.json_body['nvr'], 'bodhi-2.0-1.fc17')
 
+    def test_get_builds(self):
+        res = self.app.post_json('/builds/bulk', {'ids': ['bodhi-2.0-1.fc17', 'bodhi-2.0-2.fc17']})
+        self.assertEquals(res.json_body['builds']['bodhi-2.0-1.fc17']['nvr'], 'bodhi-2.0-1.fc17')
+        self.assertEquals(res.json_body['not_found'], ['bodhi-2.0-2.fc17'])
+
     def test_list_builds(self):
         res = self.app.get('/builds/')
         body = res.json_body
@@ -235,6 +235,11 @@ class TestCommentsService(base.BaseTestCase):
         self.assertEquals(res.json_body['comment']['user_id'], 1)
         self.assertEquals(res.json_body['comment']['id'], 1)
 
+    def test_get_comments(self):
+        res = self.app.post_json('/comments/bulk', {'ids': ['1', '1000', 'wat']})
+        self.assertEquals(res.json_body['comments']['1']['id'], 1)
+        self.assertEquals(res.json_body['not_found'], ['1000', 'wat'])
+
     def test_get_single_comment_page(self):
         res = self.app.get('/comments/1', headers=dict(accept='text/html'))
         self.assertIn('text/html', res.headers['Content-Type'])
@@ -291,6 +296,15 @@ class TestCommentsService(base.BaseTestCase):
         body = res.json_body
         self.assertEquals(len(body['comments']), 0)
 
+    def test_search_comments_text(self):
+        """The search parameter finds the comments containing the terms, case insensitively."""
+        res = self.app.get('/comments/', {'search': 'Pretty GOOD'})
+        body = res.json_body
+        self.assertEquals([c['text'] for c in body['comments']], [u'srsly.  pretty good.'])
+
+        res = self.app.get('/comments/', {'search': 'wat'})
+        self.assertEquals(len(res.json_body['comments']), 0)
+
     def test_list_comments_pagination(self):
         # Then, test pagination
         res = self.app.get('/comments/',
@@ -17,11 +17,14 @@ import copy
 
 from pyramid.testing import DummyRequest
 from webtest import TestApp
+import koji
+import mock
 
-from bodhi.server import main, util
+from bodhi.server import buildsys, main, util
 from bodhi.server.models import (
     Group, User, Update, Release, ReleaseState, UpdateStatus, UpdateType)
 from bodhi.server.security import remember_me
+from bodhi.server.views import generic
 from bodhi.tests.server import base
 
 
@@ -342,6 +345,49 @@ class TestGenericViews(base.BaseTestCase):
         self.assertIn('f17-override', body)
         self.assertEquals(body['f17-updates'], 'TurboGears-1.0.2.2-2.fc17')
 
+    @mock.patch.dict('bodhi.server.views.generic._missing_tags', clear=True)
+    def test_latest_builds_multicall(self):
+        """Assert that the latest builds of all the tags are queried in a single multicall."""
+        with mock.patch('bodhi.server.buildsys.DevBuildsys.multiCall',
+                        autospec=True, side_effect=buildsys.DevBuildsys.multiCall) as multiCall:
+            res = self.app.get('/latest_builds', {'package': 'TurboGears'})
+
+        self.assertEqual(multiCall.call_count, 1)
+        self.assertEqual(len(res.json_body), 6)
+
+    @mock.patch.dict('bodhi.server.views.generic._missing_tags', clear=True)
+    def test_latest_builds_missing_tags(self):
+        """Assert that tags Koji does not know are skipped until they expire."""
+        fault = {'faultCode': 1000, 'faultString': 'Invalid tagInfo'}
+        with mock.patch('bodhi.server.buildsys.DevBuildsys.multiCall', return_value=[fault] * 6):
+            res = self.app.get('/latest_builds', {'package': 'TurboGears'})
+
+        self.assertEqual(res.json_body, {})
+        self.assertIn('f17-updates-pending', generic._missing_tags)
+        with mock.patch('bodhi.server.buildsys.DevBuildsys.getLatestBuilds') as getLatestBuilds:
+            res = self.app.get('/latest_builds', {'package': 'TurboGears'})
+        self.assertEqual(res.json_body, {})
+        self.assertEqual(getLatestBuilds.call_count, 0)
+
+    @mock.patch.dict('bodhi.server.views.generic._missing_tags', clear=True)
+    def test_latest_builds_other_faults(self):
+        """Assert that tags whose query failed for another reason are not marked missing."""
+        faults = [{'faultCode': 1000, 'faultString': 'Simulated failure of getLatestBuilds'},
+                  {'faultCode': 1014, 'faultString': 'Lock timeout'}] * 3
+        with mock.patch('bodhi.server.buildsys.DevBuildsys.multiCall', return_value=faults):
+            res = self.app.get('/latest_builds', {'package': 'TurboGears'})
+
+        self.assertEqual(res.json_body, {})
+        self.assertEqual(generic._missing_tags, {})
+
+    @mock.patch('bodhi.server.buildsys.DevBuildsys.multiCall',
+                side_effect=koji.GenericError('Koji is down'))
+    def test_latest_builds_koji_error(self, multiCall):
+        """Assert that Koji errors give an empty result instead of a server error."""
+        res = self.app.get('/latest_builds', {'package': 'TurboGears'})
+
+        self.assertEqual(res.json_body, {})
+
     def test_candidate(self):
         res = self.app.get('/latest_candidates')
         body = res.json_body
@@ -521,7 +567,7 @@ class TestFrontpageView(base.BaseTestCase):
                            [UpdateType.newpackage, 4]]]]
         _add_updates(addedupdates2, user2, pendingrelease, "fc18")
         self.db.flush()
-        Release._tag_cache = None
+        Release.registry.clear()
 
     def test_home_counts(self):
         """Test the frontpage update counts"""
@@ -67,3 +67,20 @@ class TestRpmPackagesService(base.BaseTestCase):
         resp = self.app.get('/packages/', dict(search='corebird'))
         body = resp.json_body
         self.assertEquals(len(body['packages']), 0)
+
+    def test_search_cursor(self):
+        """The package named like the search comes first, and the cursors page through all."""
+        for name in (u'abodhi', u'bodhi-a', u'bodhi-b'):
+            self.db.add(RpmPackage(name=name))
+        self.db.commit()
+
+        names = []
+        params = {'search': 'bodhi', 'rows_per_page': 1}
+        while True:
+            body = self.app.get('/packages/', params).json_body
+            names.extend(p['name'] for p in body['packages'])
+            if body['next_cursor'] is None:
+                break
+            params['cursor'] = body['next_cursor']
+
+        self.assertEqual(names, [u'bodhi', u'abodhi', u'bodhi-a', u'bodhi-b'])
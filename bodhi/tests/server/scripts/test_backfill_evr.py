@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""This module contains tests for the bodhi.server.scripts.backfill_evr module."""
+
+from click import testing
+from mock import patch
+
+from bodhi.server import models, util
+from bodhi.server.scripts import backfill_evr
+from bodhi.tests.server.base import BaseTestCase
+
+
+class TestBackfill(BaseTestCase):
+    """This class contains tests for the backfill() function."""
+    def test_backfill(self):
+        """Assert that the EVR of every build without one is stored."""
+        self.create_update([u'bodhi-2.0.1-1.fc17', u'python-nose-1.3.7-11.fc17'])
+        self.db.commit()
+        runner = testing.CliRunner()
+
+        result = runner.invoke(backfill_evr.backfill, ['--batch-size', '2'])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output, 'Stored the EVR of 3 builds\n')
+        for build in self.db.query(models.RpmBuild):
+            name, version, release = util.get_nvr(build.nvr)
+            self.assertEqual(build.epoch, 0)
+            self.assertEqual(build.evr_key, util.evr_sort_key((0, version, release)))
+
+    def test_build_missing_from_koji(self):
+        """Assert that builds Koji doesn't know are reported and skipped."""
+        runner = testing.CliRunner()
+
+        with patch('bodhi.server.scripts.backfill_evr.buildsys.get_session') as get_session:
+            get_session.return_value.multiCall.return_value = [
+                {'faultCode': 1000, 'faultString': 'No such build'}]
+            result = runner.invoke(backfill_evr.backfill, [])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output,
+                         'Unable to find bodhi-2.0-1.fc17 in Koji\nStored the EVR of 0 builds\n')
+        build = self.db.query(models.RpmBuild).filter_by(nvr=u'bodhi-2.0-1.fc17').one()
+        self.assertIsNone(build.evr_key)
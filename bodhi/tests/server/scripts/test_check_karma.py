@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""This module contains tests for the bodhi.server.scripts.check_karma module."""
+
+from click import testing
+
+from bodhi.server import models
+from bodhi.server.scripts import check_karma
+from bodhi.tests.server.base import BaseTestCase
+
+
+class TestCheck(BaseTestCase):
+    """This class contains tests for the check() function."""
+    def test_correct(self):
+        """Assert that nothing is reported when the counters are right."""
+        runner = testing.CliRunner()
+
+        result = runner.invoke(check_karma.check, [])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output, '0 of 1 updates had wrong karma counters\n')
+
+    def test_wrong(self):
+        """Assert that wrong counters are reported, and left alone without --fix."""
+        update = self.db.query(models.Update).one()
+        update.positive_karma = 3
+        self.db.commit()
+        runner = testing.CliRunner()
+
+        result = runner.invoke(check_karma.check, [])
+
+        self.assertEqual(result.exit_code, 1)
+        self.assertEqual(
+            result.output,
+            ('%s: stored karma_reset_id=None, negative_karma=0, positive_karma=3, '
+             'counted karma_reset_id=None, negative_karma=0, positive_karma=1\n'
+             '1 of 1 updates had wrong karma counters\n') % update.alias)
+        self.db.expire_all()
+        update = self.db.query(models.Update).one()
+        self.assertEqual(update.positive_karma, 3)
+
+    def test_fix(self):
+        """Assert that wrong counters are fixed with --fix."""
+        update = self.db.query(models.Update).one()
+        update.positive_karma = 3
+        self.db.commit()
+        runner = testing.CliRunner()
+
+        result = runner.invoke(check_karma.check, ['--fix', '--batch-size', '1'])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output.splitlines()[-1],
+                         '1 of 1 updates had wrong karma counters, fixed')
+        self.db.expire_all()
+        update = self.db.query(models.Update).one()
+        self.assertEqual(update.positive_karma, 1)
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""This module contains tests for the bodhi.server.scripts.rebuild_stats module."""
+
+from click import testing
+
+from bodhi.server import models
+from bodhi.server.scripts import rebuild_stats
+from bodhi.tests.server.base import BaseTestCase
+
+
+class TestRebuild(BaseTestCase):
+    """This class contains tests for the rebuild() function."""
+    def test_rebuild(self):
+        """Assert that the rows are counted again from the updates."""
+        self.db.query(models.UpdateStats).delete()
+        self.db.commit()
+        runner = testing.CliRunner()
+
+        result = runner.invoke(rebuild_stats.rebuild, [])
+
+        self.assertEqual(result.exit_code, 0)
+        self.assertEqual(result.output, 'Rebuilt 1 rows of update statistics\n')
+        self.db.expire_all()
+        row = self.db.query(models.UpdateStats).one()
+        self.assertEqual(row.release.name, u'F17')
+        self.assertEqual(row.updates, 1)
@@ -11,10 +11,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+from datetime import datetime
+
+import mock
 import webtest
 
 from bodhi import server
 from bodhi.server.models import Release, ReleaseState, Update
+from bodhi.server.services import releases
 from bodhi.tests.server import base
 
 
@@ -201,6 +205,23 @@ class TestReleasesService(base.BaseTestCase):
         self.assertEquals(res.content_type, 'text/html')
         self.assertIn('f17-updates-testing', res)
 
+    def test_get_single_release_html_counts(self):
+        """The counts of the release page are summed from one query of the updates."""
+        self.create_update([u'python-nose-1.3.7-11.fc17']).date_submitted = datetime(2017, 8, 1)
+        self.db.flush()
+        request = mock.MagicMock(db=self.db, matchdict={'name': u'F17'})
+
+        data = releases.get_release_html(request)
+
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['num_updates_pending'], 2)
+        self.assertEqual(data['num_updates_bugfix'], 2)
+        self.assertEqual(data['num_updates_security'], 0)
+        self.assertEqual(data['dates'], ['1984/11', '2017/08'])
+        self.assertEqual(data['date_commits'], {u'bugfix': {'1984/11': 1, '2017/08': 1}})
+        self.assertEqual(data['num_active_overrides'], 2)
+        self.assertEqual(data['num_expired_overrides'], 0)
+
     def test_get_non_existent_release_html(self):
         self.app.get('/releases/x', headers={'Accept': 'text/html'}, status=404)
 
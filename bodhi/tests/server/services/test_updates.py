@@ -16,6 +16,7 @@
 """This module contains tests for bodhi.server.services.updates."""
 from datetime import datetime, timedelta
 import copy
+import json
 import textwrap
 import time
 import urlparse
@@ -27,7 +28,7 @@ import mock
 from bodhi.server import main
 from bodhi.server.config import config
 from bodhi.server.models import (
-    BuildrootOverride, Group, RpmPackage, ModulePackage, Release,
+    Bug, BuildrootOverride, Group, RpmPackage, ModulePackage, Release,
     ReleaseState, RpmBuild, Update, UpdateRequest, UpdateStatus, UpdateType,
     UpdateSeverity, User, TestGatingStatus)
 from bodhi.tests.server import base
@@ -967,6 +968,35 @@ class TestUpdatesService(base.BaseTestCase):
         self.assertEquals(res.json_body['update']['title'], 'bodhi-2.0-1.fc17')
         self.assertIn('application/json', res.headers['Content-Type'])
 
+    @mock.patch(**mock_valid_requirements)
+    def test_get_updates(self, *args):
+        """Updates are looked up by title, alias or build NVR in one request."""
+        self.app.post_json('/updates/', self.get_update('bodhi-2.0.0-2.fc17'))
+        alias = Update.query.filter_by(title=u'bodhi-2.0.0-2.fc17').one().alias
+
+        res = self.app.post_json('/updates/bulk', {
+            'ids': ['bodhi-2.0-1.fc17', alias, 'bodhi-2.0.0-2.fc17', 'bodhi-3.0-1.fc17']})
+
+        updates = res.json_body['updates']
+        self.assertEqual(sorted(updates), sorted(['bodhi-2.0-1.fc17', alias, 'bodhi-2.0.0-2.fc17']))
+        self.assertEqual(updates[alias]['title'], 'bodhi-2.0.0-2.fc17')
+        self.assertEqual(updates['bodhi-2.0.0-2.fc17']['alias'], alias)
+        self.assertEqual(res.json_body['not_found'], ['bodhi-3.0-1.fc17'])
+
+    def test_get_updates_fields(self):
+        """The fields of the updates can be chosen."""
+        res = self.app.post('/updates/bulk?fields=title', {'ids': 'bodhi-2.0-1.fc17 wat'})
+
+        self.assertEqual(res.json_body['updates'],
+                         {'bodhi-2.0-1.fc17': {'title': 'bodhi-2.0-1.fc17'}})
+        self.assertEqual(res.json_body['not_found'], ['wat'])
+
+    def test_get_updates_no_ids(self):
+        """Identifiers are required."""
+        res = self.app.post_json('/updates/bulk', {'ids': []}, status=400)
+
+        self.assertEqual(res.json_body['errors'][0]['name'], 'ids')
+
     def test_get_single_update_jsonp(self):
         res = self.app.get('/updates/bodhi-2.0-1.fc17',
                            {'callback': 'callback'},
@@ -1017,6 +1047,41 @@ class TestUpdatesService(base.BaseTestCase):
         self.assertEquals(up['url'],
                           (urlparse.urljoin(config['base_address'], '/updates/%s' % alias)))
 
+    def test_list_updates_fields(self):
+        """Only the keys given in the fields parameter are returned."""
+        res = self.app.get('/updates/', {'fields': 'alias,karma,builds.nvr'})
+
+        up = res.json_body['updates'][0]
+        self.assertEqual(up, {'alias': u'FEDORA-%s-a3bbe1a8f2' % YEAR, 'karma': 1,
+                              'builds': [{'nvr': u'bodhi-2.0-1.fc17'}]})
+        self.assertEqual(res.json_body['total'], 1)
+
+    def test_list_updates_expand(self):
+        """Only the relationships given in the expand parameter are returned."""
+        res = self.app.get('/updates/', {'expand': 'release'})
+
+        up = res.json_body['updates'][0]
+        self.assertEqual(up['title'], u'bodhi-2.0-1.fc17')
+        self.assertEqual(up['release']['name'], u'F17')
+        self.assertEqual(up['karma'], 1)
+        for key in ('builds', 'comments', 'user', 'bugs'):
+            self.assertNotIn(key, up)
+
+    def test_list_updates_statement_count(self):
+        """The number of SQL statements doesn't grow with the number of updates listed."""
+        with self.count_statements() as counter:
+            self.app.get('/updates/')
+
+        for i in range(3):
+            update = self.create_update([u'package-%d-1.0-1.fc17' % i])
+            update.comment(self.db, u'Works for me', karma=1, author=u'guest')
+            update.bugs.append(Bug(bug_id=1000 + i))
+        self.db.commit()
+
+        with self.assertStatementCount(len(counter)):
+            res = self.app.get('/updates/')
+        self.assertEqual(len(res.json_body['updates']), 4)
+
     def test_list_updates_jsonp(self):
         res = self.app.get('/updates/',
                            {'callback': 'callback'},
@@ -1102,6 +1167,111 @@ class TestUpdatesService(base.BaseTestCase):
 
         self.assertNotEquals(update1, update2)
 
+    @mock.patch(**mock_valid_requirements)
+    def test_list_updates_cursor(self, *args):
+        """The next_cursor of each page leads to the next page, until the last one."""
+        self.app.post_json('/updates/', self.get_update('bodhi-2.0.0-2.fc17'))
+        self.app.post_json('/updates/', self.get_update('bodhi-2.0.0-3.fc17'))
+        expected = [u['title'] for u in self.app.get('/updates/').json_body['updates']]
+
+        titles = []
+        params = {'rows_per_page': 2}
+        while True:
+            body = self.app.get('/updates/', params).json_body
+            titles.extend(u['title'] for u in body['updates'])
+            if body['next_cursor'] is None:
+                break
+            params['cursor'] = body['next_cursor']
+
+        self.assertEqual(len(expected), 3)
+        self.assertEqual(titles, expected)
+
+    def test_list_updates_cursor_to_many_filter(self):
+        """Updates matching several values of a to-many filter are only listed once."""
+        update = self.db.query(Update).one()
+        update.bugs = [Bug(bug_id=1001), Bug(bug_id=1002)]
+        other = self.create_update([u'bodhi-2.0.0-2.fc17'])
+        other.bugs = [update.bugs[0]]
+        self.db.commit()
+
+        body = self.app.get('/updates/', {'bugs': '1001,1002', 'rows_per_page': 2}).json_body
+
+        self.assertEqual(sorted(u['title'] for u in body['updates']),
+                         [u'bodhi-2.0-1.fc17', u'bodhi-2.0.0-2.fc17'])
+        self.assertEqual(body['total'], 2)
+        self.assertIsNone(body['next_cursor'])
+
+    def test_list_updates_cursor_null_date_submitted(self):
+        """Updates without a submission date are paged through like the others."""
+        self.db.query(Update).one().date_submitted = None
+        self.create_update([u'bodhi-2.0.0-2.fc17'])
+        self.create_update([u'bodhi-2.0.0-3.fc17'])
+        self.db.commit()
+
+        titles = []
+        params = {'rows_per_page': 1}
+        while True:
+            body = self.app.get('/updates/', params).json_body
+            titles.extend(u['title'] for u in body['updates'])
+            if body['next_cursor'] is None:
+                break
+            params['cursor'] = body['next_cursor']
+
+        self.assertEqual(titles[-1], u'bodhi-2.0-1.fc17')
+        self.assertEqual(len(titles), 3)
+
+    def test_list_updates_count_false(self):
+        """The results are not counted with count=false."""
+        with self.count_statements() as counter:
+            body = self.app.get('/updates/', {'count': 'false'}).json_body
+
+        self.assertEqual(len(body['updates']), 1)
+        self.assertIsNone(body['total'])
+        self.assertIsNone(body['pages'])
+        self.assertIsNone(body['next_cursor'])
+        self.assertFalse([s for s in counter.statements if 'count(' in s.lower()])
+
+    def test_list_updates_invalid_cursor(self):
+        """Cursors that weren't returned by Bodhi are refused."""
+        res = self.app.get('/updates/', {'cursor': 'wat'}, status=400)
+
+        self.assertEqual(res.json_body['errors'][0]['name'], 'cursor')
+        self.assertEqual(res.json_body['errors'][0]['description'], 'Invalid cursor')
+
+    def test_export_updates(self):
+        """The export streams the updates as newline-delimited JSON."""
+        res = self.app.get('/updates/export')
+
+        self.assertEqual(res.content_type, 'application/x-ndjson')
+        self.assertTrue(res.body.endswith('\n'))
+        updates = [json.loads(line) for line in res.body.splitlines()]
+        self.assertEqual([u['title'] for u in updates], [u'bodhi-2.0-1.fc17'])
+        self.assertEqual(updates[0]['builds'][0]['nvr'], u'bodhi-2.0-1.fc17')
+        self.assertEqual(updates[0]['release']['name'], u'F17')
+
+    @mock.patch(**mock_valid_requirements)
+    @mock.patch('bodhi.server.services.updates.EXPORT_BATCH_SIZE', 2)
+    def test_export_updates_batches(self, *args):
+        """All the updates are exported in the order of their ids, one batch at a time."""
+        self.app.post_json('/updates/', self.get_update('bodhi-2.0.0-2.fc17'))
+        self.app.post_json('/updates/', self.get_update('bodhi-2.0.0-3.fc17'))
+
+        res = self.app.get('/updates/export', {'packages': 'bodhi'})
+
+        self.assertEqual([json.loads(line)['title'] for line in res.body.splitlines()],
+                         [u'bodhi-2.0-1.fc17', u'bodhi-2.0.0-2.fc17', u'bodhi-2.0.0-3.fc17'])
+
+    def test_export_updates_filters(self):
+        """The export has the same filters as the list of updates."""
+        self.assertEqual(self.app.get('/updates/export', {'user': 'guest'}).body.count('\n'), 1)
+        self.assertEqual(self.app.get('/updates/export', {'status': 'stable'}).body, '')
+
+    def test_export_updates_invalid(self):
+        """Invalid criteria are refused before the export starts."""
+        res = self.app.get('/updates/export', {'releases': 'WAT'}, status=400)
+
+        self.assertEqual(res.json_body['errors'][0]['name'], 'releases')
+
     def test_list_updates_by_approved_since(self):
         now = datetime.utcnow()
 
@@ -2139,7 +2309,7 @@ class TestUpdatesService(base.BaseTestCase):
         publish.assert_called_with(topic='update.request.testing', msg=ANY)
 
         # Add another release and package
-        Release._tag_cache = None
+        Release.registry.clear()
         release = Release(
             name=u'F18', long_name=u'Fedora 18',
             id_prefix=u'FEDORA', version=u'18',
@@ -2973,7 +3143,7 @@ class TestUpdatesService(base.BaseTestCase):
     def test_submitting_multi_release_updates(self, publish, *args):
         """ https://github.com/fedora-infra/bodhi/issues/219 """
         # Add another release and package
-        Release._tag_cache = None
+        Release.registry.clear()
         release = Release(
             name=u'F18', long_name=u'Fedora 18',
             id_prefix=u'FEDORA', version=u'18',
@@ -16,10 +16,13 @@
 """This test suite contains tests for bodhi.server.__init__."""
 import unittest
 
+from dogpile.cache import make_region
+from dogpile.cache.api import NO_VALUE
 from pyramid import authentication, authorization
 import mock
 
 from bodhi import server
+from bodhi.server import caches, models, pagination
 from bodhi.server.config import config
 from bodhi.tests.server import base
 
@@ -92,6 +95,96 @@ class TestMain(base.BaseTestCase):
         self.assertEqual(config['test'], 'setting')
 
 
+class TestGetUser(base.BaseTestCase):
+    """
+    Test the get_user() and groupfinder() functions.
+    """
+    def _request(self):
+        """Return a request of the guest user."""
+        return mock.MagicMock(db=self.db, unauthenticated_userid=u'guest',
+                              registry=mock.MagicMock(settings=self.app_settings))
+
+    def test_get_user(self):
+        """The user and their groups are loaded with one query, and then cached."""
+        # The other query reads the generation of the users.
+        with self.assertStatementCount(2):
+            user = server.get_user(self._request())
+
+        self.assertEqual(user.name, u'guest')
+        self.assertEqual([group.name for group in user.groups], [u'packager'])
+        self.assertEqual(user.openid, u'guest.id.fedoraproject.org')
+
+        with self.assertStatementCount(1):
+            request = self._request()
+            request.user = server.get_user(request)
+            groups = server.groupfinder(u'guest', request)
+
+        self.assertEqual(groups, ['group:packager'])
+
+    def test_groups_changed(self):
+        """The cached user is invalidated when their groups change."""
+        server.get_user(self._request())
+        user = models.User.query.filter_by(name=u'guest').one()
+        user.groups.append(models.Group.query.filter_by(name=u'provenpackager').one())
+        self.db.flush()
+
+        user = server.get_user(self._request())
+
+        self.assertEqual([group.name for group in user.groups], [u'packager', u'provenpackager'])
+
+    def test_groups_changed_by_other_process(self):
+        """The cached user is invalidated when another process changes their groups."""
+        self.db.commit()
+        self.assertEqual([g.name for g in server.get_user(self._request()).groups], [u'packager'])
+
+        # The other process has its own cache regions and generations of the tables.
+        with mock.patch.dict(caches._regions, clear=True), \
+                mock.patch.dict(caches._stats, clear=True), \
+                mock.patch.object(pagination, 'totals_cache', make_region()):
+            user = models.User.query.filter_by(name=u'guest').one()
+            user.groups = []
+            self.db.commit()
+            self.assertEqual(server.get_user(self._request()).groups, [])
+
+        self.assertEqual(server.get_user(self._request()).groups, [])
+
+    def test_uncommitted_changes_not_cached(self):
+        """The identities that include uncommitted changes are not cached."""
+        user = models.User.query.filter_by(name=u'guest').one()
+        user.groups = []
+        self.db.flush()
+
+        server.get_user(self._request())
+
+        self.assertIs(caches.get_region('identities').get(u'guest'), NO_VALUE)
+
+    def test_unknown_user(self):
+        """Users that don't exist have no identity."""
+        request = self._request()
+        request.unauthenticated_userid = u'nobody'
+
+        self.assertIsNone(server.get_user(request))
+
+
+class TestAddKojiReleaseCallback(unittest.TestCase):
+    """Test the add_koji_release_callback() function."""
+
+    def test_adds_callback(self):
+        """Assert that the request gets a callback that releases the leased Koji sessions."""
+        event = mock.Mock()
+
+        server.add_koji_release_callback(event)
+
+        event.request.add_finished_callback.assert_called_once_with(server.release_koji_sessions)
+
+    @mock.patch('bodhi.server.buildsys.release_session')
+    def test_release_koji_sessions(self, release_session):
+        """Assert that release_koji_sessions() releases the thread's Koji sessions."""
+        server.release_koji_sessions(mock.Mock())
+
+        release_session.assert_called_once_with()
+
+
 class TestGetDbSessionForRequest(unittest.TestCase):
 
     def test_session_from_registry_sessionmaker(self):
@@ -21,7 +21,7 @@ import unittest
 import koji
 import mock
 
-from bodhi.server import buildsys
+from bodhi.server import buildsys, exceptions
 
 
 class TestBuildsystem(unittest.TestCase):
@@ -35,8 +35,8 @@ class TestBuildsystem(unittest.TestCase):
 
         for method in (
                 bs.getBuild, bs.getLatestBuilds, bs.moveBuild, bs.ssl_login, bs.listBuildRPMs,
-                bs.listTags, bs.listTagged, bs.taskFinished, bs.tagBuild, bs.untagBuild,
-                bs.multiCall, bs.getTag):
+                bs.listTags, bs.listTagged, bs.taskFinished, bs.getTaskInfo, bs.tagBuild,
+                bs.untagBuild, bs.multiCall, bs.getTag):
             self.assertRaises(NotImplementedError, method)
 
     def test_raises_not_configured(self):
@@ -113,7 +113,7 @@ class TestKojiLogin(unittest.TestCase):
 
         client = buildsys.koji_login(config)
 
-        self.assertEqual(type(client), koji.ClientSession)
+        self.assertEqual(type(client), buildsys.ReauthenticatingSession)
         error.assert_called_once_with('Koji krb_login failed')
 
     # krb_login returns a bool to indicate success or failure
@@ -138,11 +138,49 @@ class TestKojiLogin(unittest.TestCase):
         for key in default_koji_opts:
             self.assertEqual(default_koji_opts[key], client.opts[key])
 
-        self.assertEqual(type(client), koji.ClientSession)
+        self.assertEqual(type(client), buildsys.ReauthenticatingSession)
         # No error should have been logged
         self.assertEqual(error.call_count, 0)
 
 
+class TestReauthenticatingSession(unittest.TestCase):
+    """This class contains tests for the ReauthenticatingSession class."""
+    def setUp(self):
+        self.session = buildsys.ReauthenticatingSession(
+            'http://example.com/koji', {}, {'principal': 'bodhi'})
+        self.session.setSession({'session-id': 1})
+
+    @mock.patch('bodhi.server.buildsys.koji.ClientSession.krb_login', return_value=True)
+    @mock.patch('bodhi.server.buildsys.koji.ClientSession._callMethod')
+    def test_retry_after_login(self, _callMethod, krb_login):
+        """Assert a call rejected for its authentication is retried once logged in again."""
+        _callMethod.side_effect = [koji.AuthExpired('expired'), {'name': 'bodhi'}]
+
+        self.assertEqual(self.session.getLoggedInUser(), {'name': 'bodhi'})
+
+        krb_login.assert_called_once_with(principal='bodhi')
+        self.assertEqual(_callMethod.call_count, 2)
+
+    @mock.patch('bodhi.server.buildsys.koji.ClientSession.krb_login', return_value=False)
+    @mock.patch('bodhi.server.buildsys.koji.ClientSession._callMethod',
+                side_effect=koji.AuthExpired('expired'))
+    def test_failed_login(self, _callMethod, krb_login):
+        """Assert the AuthError is raised if logging in again fails."""
+        self.assertRaises(koji.AuthExpired, self.session.getLoggedInUser)
+
+        self.assertEqual(_callMethod.call_count, 1)
+
+    @mock.patch('bodhi.server.buildsys.koji.ClientSession.krb_login', return_value=True)
+    @mock.patch('bodhi.server.buildsys.koji.ClientSession._callMethod',
+                side_effect=koji.AuthExpired('expired'))
+    def test_retried_once(self, _callMethod, krb_login):
+        """Assert the call is only retried once."""
+        self.assertRaises(koji.AuthExpired, self.session.getLoggedInUser)
+
+        self.assertEqual(_callMethod.call_count, 2)
+        krb_login.assert_called_once_with(principal='bodhi')
+
+
 class TestGetSession(unittest.TestCase):
     """Tests :func:`bodhi.server.buildsys.get_session` function"""
 
@@ -160,6 +198,526 @@ class TestGetSession(unittest.TestCase):
         mock_lock.__exit__.assert_called_once()
         mock_buildsystem.assert_called_once_with()
 
+    @mock.patch('bodhi.server.buildsys._buildsystem', mock.Mock())
+    @mock.patch('bodhi.server.buildsys._session_pool')
+    def test_session_pool(self, pool):
+        """Assert that get_session leases sessions from the pool when there is one."""
+        session = buildsys.get_session()
+
+        self.assertTrue(session is pool.get_session.return_value)
+        self.assertEqual(buildsys._buildsystem.call_count, 0)
+
+
+class TestReleaseSession(unittest.TestCase):
+    """Tests :func:`bodhi.server.buildsys.release_session` function"""
+
+    @mock.patch('bodhi.server.buildsys._session_pool', None)
+    def test_no_pool(self):
+        """Assert release_session does nothing without a session pool."""
+        buildsys.release_session()
+
+    @mock.patch('bodhi.server.buildsys._session_pool')
+    def test_pool(self, pool):
+        """Assert release_session releases the thread's sessions to the pool."""
+        buildsys.release_session()
+
+        pool.release.assert_called_once_with()
+
+
+class TestKojiSessionPool(unittest.TestCase):
+    """Tests for the :class:`bodhi.server.buildsys.KojiSessionPool` class."""
+
+    def setUp(self):
+        self.factory = mock.Mock(side_effect=lambda: mock.Mock(multicall=False))
+        self.pool = buildsys.KojiSessionPool(self.factory, size=2, timeout=0)
+
+    def test_get_session_reuses_lease(self):
+        """Assert the same session is handed out to a thread until it is released."""
+        session = self.pool.get_session()
+
+        self.assertTrue(self.pool.get_session() is session)
+        self.assertEqual(self.factory.call_count, 1)
+        self.assertEqual(self.pool.stats()['leased'], 1)
+
+    def test_get_session_during_multicall(self):
+        """Assert a different session is leased while the thread's session is in a multicall."""
+        session = self.pool.get_session()
+        session.multicall = True
+
+        other_session = self.pool.get_session()
+
+        self.assertFalse(other_session is session)
+        self.assertEqual(self.pool.stats()['leased'], 2)
+
+    def test_release_reuses_sessions(self):
+        """Assert released sessions are reused without logging in again."""
+        session = self.pool.get_session()
+        self.pool.release()
+
+        self.assertTrue(self.pool.get_session() is session)
+        stats = self.pool.stats()
+        self.assertEqual(stats['logins'], 1)
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(session.logout.call_count, 0)
+
+    def test_release_multicall_session(self):
+        """Assert sessions left in a multicall are logged out rather than reused."""
+        session = self.pool.get_session()
+        session.multicall = True
+        self.pool.release()
+
+        session.logout.assert_called_once_with()
+        self.assertEqual(self.pool.stats()['idle'], 0)
+
+    def test_exhausted_pool_overflows(self):
+        """Assert an unpooled session is used once the pool is exhausted."""
+        sessions = [self.pool.acquire() for i in range(3)]
+
+        self.assertEqual(self.pool.stats()['overflows'], 1)
+        self.assertEqual(self.pool.stats()['leased'], 2)
+        # The unpooled session is thrown away when checked in
+        self.pool.checkin(sessions[2])
+        sessions[2].logout.assert_called_once_with()
+        self.assertEqual(self.pool.stats()['idle'], 0)
+        self.pool.checkin(sessions[0])
+        self.assertEqual(self.pool.stats()['idle'], 1)
+
+    def test_idle_session_healthy(self):
+        """Assert healthy idle sessions are reused after the health check."""
+        self.pool.check_interval = -1
+        session = self.pool.acquire()
+        session.getLoggedInUser.return_value = {'name': 'bodhi'}
+        self.pool.checkin(session)
+
+        self.assertTrue(self.pool.acquire() is session)
+        session.getLoggedInUser.assert_called_once_with()
+        self.assertEqual(self.pool.stats()['relogins'], 0)
+
+    def test_idle_session_expired(self):
+        """Assert expired idle sessions are replaced with newly logged in ones."""
+        self.pool.check_interval = -1
+        session = self.pool.acquire()
+        session.getLoggedInUser.side_effect = koji.AuthExpired('expired')
+        self.pool.checkin(session)
+
+        new_session = self.pool.acquire()
+
+        self.assertFalse(new_session is session)
+        session.logout.assert_called_once_with()
+        stats = self.pool.stats()
+        self.assertEqual(stats['relogins'], 1)
+        self.assertEqual(stats['logins'], 2)
+        self.assertEqual(stats['leased'], 1)
+
+    def test_login_failure_frees_slot(self):
+        """Assert a failed login does not use up a slot in the pool."""
+        self.factory.side_effect = IOError('Koji is down')
+
+        self.assertRaises(IOError, self.pool.acquire)
+
+        self.assertEqual(self.pool.stats()['leased'], 0)
+
+
+class TestKojiCache(unittest.TestCase):
+    """Tests for the :class:`bodhi.server.buildsys.KojiCache` class."""
+
+    def setUp(self):
+        self.cache = buildsys.KojiCache(ttl=300, build_ttl=300, max_entries=3)
+        self.session = self.cache.wrap(buildsys.DevBuildsys())
+
+    def tearDown(self):
+        buildsys.DevBuildsys.clear()
+
+    def test_hit(self):
+        """Assert that repeated calls are answered from the cache."""
+        with mock.patch.object(buildsys.DevBuildsys, 'listTags',
+                               return_value=[{'name': 'f17'}]) as listTags:
+            self.assertEqual(self.session.listTags('bodhi-2.0-1.fc17'), [{'name': 'f17'}])
+            self.assertEqual(self.session.listTags('bodhi-2.0-1.fc17'), [{'name': 'f17'}])
+
+        listTags.assert_called_once_with('bodhi-2.0-1.fc17')
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_results_are_copies(self):
+        """Assert that callers modifying a result don't modify the cache."""
+        self.session.getBuild('bodhi-2.0-1.fc17')['nvr'] = 'modified'
+
+        self.assertEqual(self.session.getBuild('bodhi-2.0-1.fc17')['nvr'], 'bodhi-2.0-1.fc17')
+
+    def test_expired(self):
+        """Assert that expired results are fetched again."""
+        self.cache.ttl = -1
+        with mock.patch.object(buildsys.DevBuildsys, 'getLatestBuilds',
+                               return_value=[]) as getLatestBuilds:
+            self.session.getLatestBuilds('f17-updates', package='bodhi')
+            self.session.getLatestBuilds('f17-updates', package='bodhi')
+
+        self.assertEqual(getLatestBuilds.call_count, 2)
+
+    def test_none_not_cached(self):
+        """Assert that missing builds are not remembered."""
+        with mock.patch.object(buildsys.DevBuildsys, 'getBuild', return_value=None) as getBuild:
+            self.session.getBuild('bodhi-2.0-1.fc17')
+            self.session.getBuild('bodhi-2.0-1.fc17')
+
+        self.assertEqual(getBuild.call_count, 2)
+
+    def test_max_entries(self):
+        """Assert that the least recently used results are dropped."""
+        for nvr in ('a-1-1.fc17', 'b-1-1.fc17', 'c-1-1.fc17'):
+            self.session.listTags(nvr)
+        # Use a-1-1.fc17 so b-1-1.fc17 is the least recently used
+        self.session.listTags('a-1-1.fc17')
+
+        self.session.listTags('d-1-1.fc17')
+
+        self.assertEqual(len(self.cache._entries), 3)
+        self.assertEqual(sorted(self.cache._by_build.keys()),
+                         ['a-1-1.fc17', 'c-1-1.fc17', 'd-1-1.fc17'])
+
+    def test_invalidate_build(self):
+        """Assert that invalidating a build drops the results about it."""
+        self.session.listTags('bodhi-2.0-1.fc17')
+        self.session.getBuild('bodhi-2.0-1.fc17')
+        self.session.listTags('TurboGears-1.0.2.2-2.fc17')
+
+        self.cache.invalidate(build='bodhi-2.0-1.fc17')
+
+        self.assertEqual(len(self.cache._entries), 1)
+        self.assertEqual(self.cache._by_build.keys(), ['TurboGears-1.0.2.2-2.fc17'])
+
+    def test_invalidate_tag(self):
+        """Assert that invalidating a tag drops the latest builds of that tag."""
+        self.session.getLatestBuilds('f17-updates', package='bodhi')
+        self.session.getLatestBuilds('f17', package='bodhi')
+
+        self.cache.invalidate(tag='f17-updates')
+
+        self.assertEqual(len(self.cache._entries), 1)
+        self.assertEqual(self.cache._by_tag.keys(), ['f17'])
+
+    def test_write_invalidates(self):
+        """Assert that tagging a build through the wrapped session invalidates the cache."""
+        self.session.listTags('bodhi-2.0-1.fc17')
+        self.session.getLatestBuilds('f17-updates-testing', package='bodhi')
+
+        self.session.moveBuild('f17-updates-candidate', 'f17-updates-testing', 'bodhi-2.0-1.fc17')
+
+        self.assertEqual(len(self.cache._entries), 0)
+        self.assertEqual(
+            buildsys.DevBuildsys.__moved__[-1],
+            ('f17-updates-candidate', 'f17-updates-testing', 'bodhi-2.0-1.fc17'))
+
+    def test_write_invalidates_after_the_call(self):
+        """Assert that the cache is invalidated after the build is tagged."""
+        self.session.listTags('bodhi-2.0-1.fc17')
+
+        def tag_build(*args, **kwargs):
+            self.assertEqual(len(self.cache._entries), 1)
+
+        with mock.patch.object(buildsys.DevBuildsys, 'tagBuild', side_effect=tag_build):
+            self.session.tagBuild('f17-updates-testing', 'bodhi-2.0-1.fc17')
+
+        self.assertEqual(len(self.cache._entries), 0)
+
+    def test_multicall_write_invalidates_after_the_multicall(self):
+        """Assert that tag changes queued in a multicall invalidate the cache once it is made."""
+        self.session.listTags('bodhi-2.0-1.fc17')
+        self.session.multicall = True
+
+        self.session.untagBuild('f17-updates-testing', 'bodhi-2.0-1.fc17')
+
+        self.assertEqual(len(self.cache._entries), 1)
+        self.session.multiCall()
+        self.assertEqual(len(self.cache._entries), 0)
+
+    def test_multicall_bypasses_cache(self):
+        """Assert that calls made during a multicall go to the session."""
+        self.session.multicall = True
+        self.session.getBuild('bodhi-2.0-1.fc17')
+
+        self.assertEqual(self.session.multiCall()[0][0]['nvr'], 'bodhi-2.0-1.fc17')
+        self.assertEqual(len(self.cache._entries), 0)
+
+
+class TestGetCachedSession(unittest.TestCase):
+    """Tests :func:`bodhi.server.buildsys.get_cached_session` function"""
+
+    @mock.patch('bodhi.server.buildsys._koji_cache', None)
+    @mock.patch('bodhi.server.buildsys.get_session')
+    def test_no_cache(self, get_session):
+        """Assert that the session is returned as is when there is no cache."""
+        self.assertTrue(buildsys.get_cached_session() is get_session.return_value)
+
+    @mock.patch('bodhi.server.buildsys._koji_cache', buildsys.KojiCache(ttl=1, build_ttl=2))
+    @mock.patch('bodhi.server.buildsys.get_session')
+    def test_process_cache(self, get_session):
+        """Assert that the process-wide cache is used by default."""
+        session = buildsys.get_cached_session()
+
+        self.assertTrue(isinstance(session, buildsys.CachedSession))
+        self.assertTrue(session._cache is buildsys._koji_cache)
+        self.assertTrue(session._session is get_session.return_value)
+
+    @mock.patch('bodhi.server.buildsys._koji_cache', buildsys.KojiCache(ttl=1, build_ttl=2))
+    @mock.patch('bodhi.server.buildsys.get_session')
+    def test_per_request(self, get_session):
+        """Assert that per-request sessions get a cache of their own."""
+        session = buildsys.get_cached_session(per_request=True)
+
+        self.assertFalse(session._cache is buildsys._koji_cache)
+        self.assertEqual((session._cache.ttl, session._cache.build_ttl), (1, 2))
+
+    @mock.patch('bodhi.server.buildsys._koji_cache')
+    def test_invalidate_cache(self, cache):
+        """Assert that invalidate_cache() invalidates the process-wide cache."""
+        buildsys.invalidate_cache(build='bodhi-2.0-1.fc17', tag='f17')
+
+        cache.invalidate.assert_called_once_with(build='bodhi-2.0-1.fc17', tag='f17')
+
+
+class FakeTaskSession(object):
+    """A minimal multicall session that reports the given task states, one list per poll."""
+    def __init__(self, states):
+        self.states = states
+        self.polls = 0
+        self.multicall = False
+        self._calls = []
+
+    def getTaskInfo(self, task):
+        self._calls.append(task)
+
+    def multiCall(self):
+        states = self.states[min(self.polls, len(self.states) - 1)]
+        self.polls += 1
+        results = []
+        for task in self._calls:
+            if states[task] is None:
+                results.append({'faultCode': 1000, 'faultString': 'oops'})
+            else:
+                results.append([{'state': koji.TASK_STATES[states[task]]}])
+        self._calls = []
+        self.multicall = False
+        return results
+
+
+class TestTaskWatcher(unittest.TestCase):
+    """Tests :class:`bodhi.server.buildsys.TaskWatcher`"""
+
+    @mock.patch('bodhi.server.buildsys.time.sleep')
+    def test_all_succeed(self, sleep):
+        """Assert that all tasks are polled in one multicall per tick until they close."""
+        session = FakeTaskSession([
+            {1: 'OPEN', 2: 'OPEN'},
+            {1: 'CLOSED', 2: 'OPEN'},
+            {2: 'CLOSED'}])
+        watcher = buildsys.TaskWatcher([1, 2], session=session)
+
+        self.assertEqual(watcher.wait(), [])
+
+        self.assertEqual(session.polls, 3)
+        self.assertEqual(watcher.succeeded, [1, 2])
+        self.assertEqual(watcher.progress, {'total': 2, 'done': 2, 'succeeded': 2, 'failed': 0,
+                                            'pending': 0})
+
+    @mock.patch('bodhi.server.buildsys.time.sleep')
+    def test_backoff(self, sleep):
+        """Assert that the interval backs off while idle and resets when tasks finish."""
+        session = FakeTaskSession([
+            {1: 'OPEN', 2: 'OPEN'}, {1: 'OPEN', 2: 'OPEN'}, {1: 'OPEN', 2: 'OPEN'},
+            {1: 'OPEN', 2: 'OPEN'}, {1: 'CLOSED', 2: 'OPEN'}, {2: 'CLOSED'}])
+        watcher = buildsys.TaskWatcher([1, 2], session=session, interval=1, max_interval=5)
+
+        watcher.wait()
+
+        self.assertEqual([c[0][0] for c in sleep.call_args_list], [2, 4, 5, 5, 1])
+
+    @mock.patch('bodhi.server.buildsys.time.sleep')
+    def test_failures(self, sleep):
+        """Assert that failed and canceled tasks are returned, and faults are retried."""
+        session = FakeTaskSession([
+            {1: 'FAILED', 2: None, 3: 'OPEN'},
+            {2: 'CLOSED', 3: 'CANCELED'}])
+        watcher = buildsys.TaskWatcher([1, 2, 3], session=session)
+
+        self.assertEqual(watcher.wait(), [1, 3])
+
+        self.assertEqual(watcher.succeeded, [2])
+
+    @mock.patch('bodhi.server.buildsys.time.sleep')
+    def test_fail_fast(self, sleep):
+        """Assert that fail_fast stops waiting at the first failure."""
+        session = FakeTaskSession([{1: 'FAILED', 2: 'OPEN'}])
+        watcher = buildsys.TaskWatcher([1, 2], session=session)
+        callback = mock.MagicMock()
+
+        self.assertEqual(watcher.wait(fail_fast=True, callback=callback), [1])
+
+        self.assertEqual(watcher.pending, [2])
+        self.assertEqual(sleep.call_count, 0)
+        callback.assert_called_once_with({'total': 2, 'done': 1, 'succeeded': 0, 'failed': 1,
+                                          'pending': 1})
+
+    @mock.patch('bodhi.server.buildsys.time')
+    def test_timeout(self, time):
+        """Assert that KojiTaskTimeoutException is raised when the tasks take too long."""
+        time.time.side_effect = [0, 0, 3, 10]
+        session = FakeTaskSession([{1: 'OPEN'}])
+        watcher = buildsys.TaskWatcher([1], session=session, timeout=5)
+
+        self.assertRaises(exceptions.KojiTaskTimeoutException, watcher.wait)
+
+        self.assertEqual([c[0][0] for c in time.sleep.call_args_list], [2, 2])
+
+    def test_skips_falsy_tasks(self):
+        """Assert that falsy task ids are not watched."""
+        watcher = buildsys.TaskWatcher([None, 0, 1], session=FakeTaskSession([{1: 'CLOSED'}]))
+
+        self.assertEqual(watcher.pending, [1])
+
+    def test_unknown_task(self):
+        """Assert that tasks Koji doesn't know about are failed."""
+        watcher = buildsys.TaskWatcher([12345], session=buildsys.KojiSimulator()())
+
+        self.assertEqual(watcher.poll(), [12345])
+
+        self.assertEqual(watcher.failed, [12345])
+        self.assertEqual(watcher.pending, [])
+
+
+class TestWaitForTasks(unittest.TestCase):
+    """Tests :func:`bodhi.server.buildsys.wait_for_tasks` function"""
+
+    @mock.patch('bodhi.server.buildsys.time.sleep')
+    def test_wait_for_tasks(self, sleep):
+        """Assert that wait_for_tasks() returns the failed tasks and caps the interval."""
+        session = FakeTaskSession([{1: 'OPEN', 2: 'OPEN'}, {1: 'OPEN', 2: 'OPEN'},
+                                   {1: 'CLOSED', 2: 'FAILED'}])
+
+        self.assertEqual(buildsys.wait_for_tasks([1, 2], session, sleep=1), [2])
+
+        self.assertEqual([c[0][0] for c in sleep.call_args_list], [1, 1])
+
+    def test_dev_buildsys(self):
+        """Assert that wait_for_tasks() works with the DevBuildsys."""
+        self.assertEqual(buildsys.wait_for_tasks([1, 2], buildsys.DevBuildsys()), [])
+
+
+class TestKojiSimulator(unittest.TestCase):
+    """Tests :class:`bodhi.server.buildsys.KojiSimulator`"""
+
+    def setUp(self):
+        self.simulator = buildsys.KojiSimulator()
+        self.simulator.add_build('bodhi-2.0-1.fc26', tags=['f26-updates-testing'])
+        self.simulator.add_build('bodhi-2.1-1.fc26', tags=['f26-updates-testing'])
+        self.simulator.add_tag('f26')
+        self.session = self.simulator()
+
+    def test_get_build(self):
+        """Assert that builds can be found by nvr and id."""
+        build = self.session.getBuild('bodhi-2.0-1.fc26')
+
+        self.assertEqual((build['name'], build['version'], build['release']),
+                         ('bodhi', '2.0', '1.fc26'))
+        self.assertEqual(self.session.getBuild(build['id'])['nvr'], 'bodhi-2.0-1.fc26')
+        self.assertEqual(self.session.getBuild('nope-1-1.fc26'), None)
+        self.assertRaises(koji.GenericError, self.session.getBuild, 'nope-1-1.fc26', strict=True)
+
+    def test_tagging(self):
+        """Assert that tagging builds changes the results of later calls."""
+        task = self.session.moveBuild('f26-updates-testing', 'f26', 'bodhi-2.0-1.fc26')
+
+        self.assertEqual(self.session.getTaskInfo(task)['state'], koji.TASK_STATES['CLOSED'])
+        self.assertEqual([t['name'] for t in self.session.listTags('bodhi-2.0-1.fc26')], ['f26'])
+        self.assertEqual([b['nvr'] for b in self.session.listTagged('f26')],
+                         ['bodhi-2.0-1.fc26'])
+
+        self.session.untagBuild('f26', 'bodhi-2.0-1.fc26')
+
+        self.assertEqual(self.session.listTagged('f26'), [])
+        self.assertRaises(koji.GenericError, self.session.untagBuild, 'f26', 'bodhi-2.0-1.fc26')
+
+    def test_tag_build_twice(self):
+        """Assert that tagging a build into a tag it is already in gives a failed task."""
+        task = self.session.tagBuild('f26-updates-testing', 'bodhi-2.0-1.fc26')
+
+        self.assertEqual(self.session.getTaskInfo(task)['state'], koji.TASK_STATES['FAILED'])
+
+    def test_latest_builds(self):
+        """Assert that only the most recently tagged build of each package is the latest."""
+        builds = self.session.getLatestBuilds('f26-updates-testing')
+
+        self.assertEqual([b['nvr'] for b in builds], ['bodhi-2.1-1.fc26'])
+        self.assertEqual(len(self.session.listTagged('f26-updates-testing')), 2)
+        self.assertEqual(self.session.listTagged('f26-updates-testing', package='nope'), [])
+        self.assertEqual(self.session.listPackages()[0]['package_name'], 'bodhi')
+
+    def test_rpms(self):
+        """Assert that RPMs and their headers are simulated."""
+        build = self.session.getBuild('bodhi-2.0-1.fc26')
+
+        self.assertEqual([r['arch'] for r in self.session.listBuildRPMs(build['id'])],
+                         ['src', 'noarch'])
+        headers = self.session.getRPMHeaders(rpmID='bodhi-2.0-1.fc26.src',
+                                             headers=['name', 'version'])
+        self.assertEqual(headers, {'name': 'bodhi', 'version': '2.0'})
+        self.assertEqual(self.session.getRPMHeaders(rpmID='nope-1-1.fc26.src'), {})
+
+    def test_multicall(self):
+        """Assert that multicalls are a single round trip returning results and faults."""
+        self.session.multicall = True
+        self.assertEqual(self.session.getBuild('bodhi-2.0-1.fc26'), None)
+        self.session.listTagged('no-such-tag')
+        results = self.session.multiCall()
+
+        self.assertEqual(results[0][0]['nvr'], 'bodhi-2.0-1.fc26')
+        self.assertEqual(results[1]['faultCode'], 1000)
+        self.assertFalse(self.session.multicall)
+        self.assertEqual(self.simulator.round_trips, 1)
+        self.assertEqual(self.simulator.calls['getBuild'], 1)
+
+    def test_multicall_strict(self):
+        """Assert that strict multicalls raise the first failure."""
+        self.session.multicall = True
+        self.session.listTagged('no-such-tag')
+
+        self.assertRaises(koji.GenericError, self.session.multiCall, strict=True)
+
+    @mock.patch('bodhi.server.buildsys.time.sleep')
+    def test_latency(self, sleep):
+        """Assert that each round trip sleeps for the latency."""
+        self.simulator.latency = 0.25
+
+        self.session.getTag('f26')
+
+        sleep.assert_called_once_with(0.25)
+
+    def test_failure_rate(self):
+        """Assert that failures are injected at the configured rate."""
+        simulator = buildsys.KojiSimulator(failure_rate=1.0)
+
+        self.assertRaises(koji.GenericError, simulator().getLoggedInUser)
+
+    def test_task_duration(self):
+        """Assert that tasks stay open for the task duration."""
+        self.simulator.task_duration = 3600
+        task = self.session.tagBuild('f26', 'bodhi-2.0-1.fc26')
+
+        self.assertFalse(self.session.taskFinished(task))
+        self.assertEqual(buildsys.TaskWatcher([task], session=self.session).poll(), [])
+
+    def test_unknown_method(self):
+        """Assert that methods the simulator does not implement are not available."""
+        self.assertRaises(AttributeError, getattr, self.session, 'createTag')
+
+    def test_populate(self):
+        """Assert that populate() spreads builds over packages."""
+        nvrs = self.simulator.populate('f26', 6, packages=3)
+
+        self.assertEqual(nvrs[0], 'package00000-1.0-1.fc26')
+        self.assertEqual(nvrs[3], 'package00000-2.0-1.fc26')
+        self.assertEqual(len(self.session.getLatestBuilds('f26')), 3)
+
 
 class TestSetupBuildsystem(unittest.TestCase):
     """Tests :func:`bodhi.server.buildsys.setup_buildsystem` function"""
@@ -172,6 +730,8 @@ class TestSetupBuildsystem(unittest.TestCase):
         self.assertTrue(old_buildsystem is buildsys._buildsystem)
 
     @mock.patch('bodhi.server.buildsys._buildsystem', None)
+    @mock.patch('bodhi.server.buildsys._session_pool', None)
+    @mock.patch('bodhi.server.buildsys._koji_cache', None)
     @mock.patch('bodhi.server.buildsys.koji_login')
     def test_koji_buildsystem(self, mock_koji_login):
         """Assert the buildsystem initializes correctly for koji"""
@@ -181,6 +741,10 @@ class TestSetupBuildsystem(unittest.TestCase):
         self.assertFalse(buildsys._buildsystem is None)
         buildsys._buildsystem()
         mock_koji_login.assert_called_once_with(config=config)
+        self.assertTrue(isinstance(buildsys._session_pool, buildsys.KojiSessionPool))
+        self.assertEqual(buildsys._session_pool.size, 4)
+        self.assertTrue(isinstance(buildsys._koji_cache, buildsys.KojiCache))
+        self.assertEqual(buildsys._koji_cache.ttl, 60)
 
     @mock.patch('bodhi.server.buildsys._buildsystem', None)
     def test_dev_buildsystem(self):
@@ -189,6 +753,17 @@ class TestSetupBuildsystem(unittest.TestCase):
         buildsys.setup_buildsystem({'buildsystem': 'dev'})
         self.assertTrue(buildsys._buildsystem is buildsys.DevBuildsys)
 
+    @mock.patch('bodhi.server.buildsys._buildsystem', None)
+    def test_simulator_buildsystem(self):
+        """Assert the buildsystem initializes correctly for the simulator"""
+        buildsys.setup_buildsystem({'buildsystem': 'simulator', 'koji_simulator.latency': '0.5',
+                                    'koji_simulator.seed': 3})
+
+        self.assertTrue(isinstance(buildsys._buildsystem, buildsys.KojiSimulator))
+        self.assertEqual(buildsys._buildsystem.latency, 0.5)
+        self.assertEqual(buildsys._buildsystem.failure_rate, 0.0)
+        self.assertTrue(isinstance(buildsys._buildsystem(), buildsys.SimulatedSession))
+
     @mock.patch('bodhi.server.buildsys._buildsystem', None)
     def test_nonsense_buildsystem(self):
         """Assert the buildsystem setup crashes with nonsense values"""
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""This module contains tests for the bodhi.server.caches module."""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from bodhi.server import caches, pagination
+from bodhi.tests.server import base
+
+
+class TestRegionSettings(unittest.TestCase):
+    """Test _region_settings()."""
+    def test_region_settings(self):
+        """The settings of a region override the dogpile.cache settings."""
+        settings = {'dogpile.cache.backend': 'dogpile.cache.dbm',
+                    'dogpile.cache.expiration_time': 100,
+                    'dogpile.cache.arguments.filename': '/tmp/cache.dbm',
+                    'home_cache.expiration_time': 300,
+                    'avatars_cache.expiration_time': 86400}
+
+        self.assertEqual(caches._region_settings(settings, 'home'),
+                         {'cache.backend': 'dogpile.cache.dbm',
+                          'cache.expiration_time': 300,
+                          'cache.arguments.filename': '/tmp/cache.dbm'})
+
+    def test_other_backend(self):
+        """A region with its own backend doesn't get the arguments of the dogpile.cache one."""
+        settings = {'dogpile.cache.backend': 'dogpile.cache.dbm',
+                    'dogpile.cache.expiration_time': 100,
+                    'dogpile.cache.arguments.filename': '/tmp/cache.dbm',
+                    'home_cache.backend': 'dogpile.cache.memory'}
+
+        self.assertEqual(caches._region_settings(settings, 'home'),
+                         {'cache.backend': 'dogpile.cache.memory',
+                          'cache.expiration_time': 100})
+
+
+class TestMakeRegion(unittest.TestCase):
+    """Test _make_region()."""
+    def test_shared_region_in_process_generations(self):
+        """A shared region whose generations are kept in each process is refused."""
+        settings = {'home_cache.backend': 'dogpile.cache.dbm',
+                    'home_cache.arguments.filename': '/tmp/cache.dbm',
+                    'totals_cache.backend': 'dogpile.cache.memory'}
+
+        with self.assertRaises(ValueError) as exc:
+            caches._make_region(settings, 'home', ('updates',))
+
+        self.assertIn('home_cache.backend dogpile.cache.dbm', str(exc.exception))
+
+    def test_shared_region_without_tables(self):
+        """A region that doesn't depend on tables can be shared."""
+        settings = {'avatars_cache.backend': 'dogpile.cache.memory_pickle',
+                    'totals_cache.backend': 'dogpile.cache.memory'}
+
+        region, stats = caches._make_region(settings, 'avatars', ())
+
+        self.assertEqual(stats.backend, 'dogpile.cache.memory_pickle')
+        self.assertTrue(stats.__json__()['per_process'])
+
+    def test_shared_region_shared_generations(self):
+        """A shared region is accepted if the generations are shared too."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        settings = {'home_cache.backend': 'dogpile.cache.dbm',
+                    'home_cache.arguments.filename': os.path.join(directory, 'cache.dbm'),
+                    'totals_cache.backend': 'dogpile.cache.memcached'}
+
+        region, stats = caches._make_region(settings, 'home', ('updates',))
+
+        self.assertIsInstance(region.backend.proxied, caches.Generations)
+        self.assertFalse(stats.__json__()['per_process'])
+
+
+class TestRegions(base.BaseTestCase):
+    """Test the regions configured by main()."""
+    def test_invalidated_by_writes(self):
+        """The values of a region are invalidated when its tables are written."""
+        region = caches.get_region('home')
+        region.set('key', 'value')
+
+        self.assertEqual(region.get('key'), 'value')
+
+        pagination.bump_generations(['comments'])
+
+        self.assertFalse(region.get('key'))
+
+    def test_not_invalidated_by_other_writes(self):
+        """The values of a region are kept when other tables are written."""
+        region = caches.get_region('candidates')
+        region.set('key', 'value')
+
+        pagination.bump_generations(['comments'])
+
+        self.assertEqual(region.get('key'), 'value')
+
+    def test_stale_values_replaced(self):
+        """A value computed again replaces the stale one, so the backend doesn't grow."""
+        region = caches.get_region('home')
+        region.get_or_create('key', lambda: 'old')
+        keys = len(region.backend.proxied.proxied._cache)
+
+        pagination.bump_generations(['comments'])
+
+        self.assertEqual(region.get_or_create('key', lambda: 'new'), 'new')
+        self.assertEqual(len(region.backend.proxied.proxied._cache), keys)
+
+    def test_written_while_computing(self):
+        """A value computed while its tables are written is stored as stale."""
+        region = caches.get_region('home')
+
+        def creator():
+            pagination.bump_generations(['comments'])
+            return 'value'
+
+        self.assertEqual(region.get_or_create('key', creator), 'value')
+        self.assertFalse(region.get('key'))
+
+    def test_stats(self):
+        """The hits and misses of each region are counted."""
+        region = caches.get_region('avatars')
+        before = caches.get_stats()['avatars'].__json__()
+        region.get('key')
+        region.set('key', 'value')
+        region.get('key')
+        region.get_multi(['key', 'other'])
+
+        stats = caches.get_stats()['avatars'].__json__()
+
+        self.assertEqual((stats['hits'] - before['hits'], stats['misses'] - before['misses']),
+                         (2, 2))
+        self.assertTrue(stats['average_ms'] >= 0)
+        self.assertEqual(stats['backend'], 'dogpile.cache.memory')
+        self.assertTrue(stats['per_process'])
+        self.assertEqual(caches.CacheStats().__json__(),
+                         {'hits': 0, 'misses': 0, 'average_ms': 0.0, 'backend': None,
+                          'per_process': False})
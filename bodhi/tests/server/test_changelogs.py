@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""This module contains tests for the bodhi.server.changelogs module."""
+
+import time
+
+import mock
+
+from bodhi.server import changelogs, models
+from bodhi.server.config import config
+from bodhi.tests.server import base
+
+
+def fake_header(nvr, times=(1375531200, 1370952000)):
+    """Return an RPM header like Koji's for the given nvr, with a changelog entry per time."""
+    name, version, release = nvr.rsplit('-', 2)
+    return {
+        'name': name, 'summary': 'A package', 'version': version, 'release': release,
+        'url': 'http://example.com', 'description': 'A package.',
+        'changelogtime': list(times),
+        'changelogname': ['Bodhi <bodhi@example.com> - %d' % t for t in times],
+        'changelogtext': ['- Entry %d' % t for t in times]}
+
+
+class TestChangelogEntry(base.BaseTestCase):
+    """Test the ChangelogEntry class."""
+    def test_format(self):
+        """The entry is formatted the way it is in spec files."""
+        entry = changelogs.ChangelogEntry(1375531200, 'Bodhi - 2.0-1', '- New version')
+
+        self.assertEqual(
+            entry.format(),
+            '* %s Bodhi - 2.0-1\n- New version\n' % time.strftime(
+                "%a %b %e %Y", time.localtime(1375531200)))
+
+
+class TestChangelogService(base.BaseTestCase):
+    """Test the ChangelogService class."""
+    def setUp(self):
+        super(TestChangelogService, self).setUp()
+        self.service = changelogs.ChangelogService()
+        self.build = models.RpmBuild.query.filter_by(nvr=u'bodhi-2.0-1.fc17').one()
+        self.build.set_evr({'epoch': None})
+
+    def test_parse_single_entry(self):
+        """Koji returns single values instead of lists when there is only one changelog entry."""
+        header = fake_header('bodhi-2.0-1.fc17')
+        header.update(changelogtime=1, changelogname='Bodhi', changelogtext='- Entry')
+
+        parsed_header, entries = self.service._parse(header)
+
+        self.assertEqual(entries, (changelogs.ChangelogEntry(1, 'Bodhi', '- Entry'),))
+        self.assertNotIn('changelogtime', parsed_header)
+        self.assertEqual(parsed_header['name'], 'bodhi')
+
+    def test_parse_no_changelog(self):
+        """A header without changelog has no entries."""
+        header = fake_header('bodhi-2.0-1.fc17', times=())
+
+        self.assertEqual(self.service._parse(header)[1], ())
+
+    @mock.patch('bodhi.server.changelogs.get_rpm_header', side_effect=fake_header)
+    def test_header_is_cached(self, get_rpm_header):
+        """The header of a build is only fetched once."""
+        self.assertEqual(self.service.header('bodhi-2.0-1.fc17')['version'], '2.0')
+        self.assertEqual(len(self.service.entries('bodhi-2.0-1.fc17')), 2)
+
+        get_rpm_header.assert_called_once_with('bodhi-2.0-1.fc17')
+
+    @mock.patch.dict(config, {'changelogs.max_entries': 1})
+    @mock.patch('bodhi.server.changelogs.get_rpm_header', side_effect=fake_header)
+    def test_max_entries(self, get_rpm_header):
+        """The least recently used headers are dropped once there are too many."""
+        self.service.header('bodhi-2.0-1.fc17')
+        self.service.header('bodhi-2.0-2.fc17')
+        self.service.header('bodhi-2.0-1.fc17')
+
+        self.assertEqual(get_rpm_header.call_count, 3)
+
+    @mock.patch('bodhi.server.changelogs.get_rpm_header', side_effect=fake_header)
+    def test_changelog_timelimit(self, get_rpm_header):
+        """Only the entries newer than the time limit are included."""
+        changelog = self.service.changelog('bodhi-2.0-1.fc17', 1370952000)
+
+        self.assertEqual(changelog, changelogs.ChangelogEntry(
+            1375531200, 'Bodhi <bodhi@example.com> - 1375531200', '- Entry 1375531200').format())
+
+    def test_changelog_since(self):
+        """The changelog since another build starts after that build's newest entry."""
+        headers = {'bodhi-2.0-1.fc17': fake_header('bodhi-2.0-1.fc17', (3, 2, 1)),
+                   'bodhi-1.9-1.fc17': fake_header('bodhi-1.9-1.fc17', (1,))}
+
+        with mock.patch('bodhi.server.changelogs.get_rpm_header', side_effect=headers.get):
+            changelog = self.service.changelog_since('bodhi-2.0-1.fc17', 'bodhi-1.9-1.fc17')
+            self.assertEqual(
+                self.service.changelog_since('bodhi-2.0-1.fc17', 'bodhi-1.9-1.fc17'), changelog)
+
+        self.assertEqual(changelog, self.service.changelog('bodhi-2.0-1.fc17', 1))
+        self.assertEqual(changelog.count('* '), 2)
+
+    @mock.patch('bodhi.server.changelogs.buildsys.get_cached_session')
+    def test_latest(self, get_session):
+        """The previous build is looked for in the stable tag, then the dist tag, and remembered."""
+        get_session.return_value.getLatestBuilds.side_effect = [
+            [], [{'nvr': 'bodhi-2.1-1.fc17', 'epoch': None, 'version': '2.1', 'release': '1.fc17'}]]
+
+        self.assertEqual(self.service.latest(self.build), 'bodhi-2.1-1.fc17')
+        self.assertEqual(self.service.latest(self.build), 'bodhi-2.1-1.fc17')
+
+        self.assertEqual(get_session.return_value.getLatestBuilds.mock_calls, [
+            mock.call('f17-updates', package=u'bodhi'), mock.call('f17', package=u'bodhi')])
+
+    @mock.patch.dict(config, {'changelogs.latest_ttl': -1})
+    @mock.patch('bodhi.server.changelogs.buildsys.get_cached_session')
+    def test_latest_expires(self, get_session):
+        """The previous build is looked for again once it expired."""
+        get_session.return_value.getLatestBuilds.return_value = []
+
+        self.assertIsNone(self.service.latest(self.build))
+        self.assertIsNone(self.service.latest(self.build))
+
+        self.assertEqual(get_session.return_value.getLatestBuilds.call_count, 4)
+
+    @mock.patch('bodhi.server.changelogs.get_rpm_header')
+    @mock.patch('bodhi.server.changelogs.buildsys.get_cached_session')
+    def test_prefetch(self, get_session, get_rpm_header):
+        """Prefetched builds don't need any more calls to Koji."""
+        koji = get_session.return_value
+        koji.multiCall.side_effect = [
+            [[[]], [[{'nvr': 'bodhi-2.1-1.fc17', 'epoch': None, 'version': '2.1',
+                      'release': '1.fc17'}]]],
+            [[fake_header('bodhi-2.0-1.fc17')], [fake_header('bodhi-2.1-1.fc17')]]]
+
+        self.service.prefetch([self.build])
+
+        self.assertEqual(koji.multiCall.call_count, 2)
+        self.assertEqual(koji.getRPMHeaders.mock_calls, [
+            mock.call(rpmID='bodhi-2.0-1.fc17.src', headers=list(self.service.HEADERS)),
+            mock.call(rpmID='bodhi-2.1-1.fc17.src', headers=list(self.service.HEADERS))])
+        self.assertEqual(self.service.latest(self.build), 'bodhi-2.1-1.fc17')
+        self.assertEqual(self.service.header('bodhi-2.1-1.fc17')['version'], '2.1')
+        self.service.changelog_since('bodhi-2.0-1.fc17', 'bodhi-2.1-1.fc17')
+        self.assertEqual(koji.getLatestBuilds.call_count, 2)
+        self.assertEqual(get_rpm_header.call_count, 0)
+
+    @mock.patch('bodhi.server.changelogs.log.exception')
+    @mock.patch('bodhi.server.changelogs.buildsys.get_cached_session')
+    def test_prefetch_failure(self, get_session, exception):
+        """A failed prefetch is logged, and turns the multicall off."""
+        get_session.return_value.multiCall.side_effect = IOError('Koji is down')
+
+        self.service.prefetch([self.build])
+
+        exception.assert_called_once_with('Unable to prefetch the changelogs of 1 builds')
+        self.assertFalse(get_session.return_value.multicall)
+
+    @mock.patch('bodhi.server.changelogs.buildsys.get_cached_session')
+    def test_prefetch_fault(self, get_session):
+        """Builds whose tags could not be queried are not remembered."""
+        get_session.return_value.multiCall.side_effect = [
+            [{'faultCode': 1000, 'faultString': 'No such tag'}, [[]]], []]
+
+        self.service.prefetch([self.build])
+
+        self.assertEqual(self.service._latest, {})
@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""This module contains tests for the bodhi.server.conditional module."""
+
+from datetime import datetime, timedelta
+import unittest
+
+import mock
+
+from bodhi.server import conditional, models, pagination
+from bodhi.tests.server import base
+
+
+class TestCeilSeconds(unittest.TestCase):
+    """Test _ceil_seconds()."""
+    def test_ceil_seconds(self):
+        """Datetimes are rounded up to the second."""
+        self.assertEqual(conditional._ceil_seconds(datetime(2017, 8, 1, 12, 30, 15, 1)),
+                         datetime(2017, 8, 1, 12, 30, 16))
+        self.assertEqual(conditional._ceil_seconds(datetime(2017, 8, 1, 12, 30, 15)),
+                         datetime(2017, 8, 1, 12, 30, 15))
+
+
+#: A totals_cache backend that is shared by the processes, so that conditional requests are answered
+SHARED_BACKEND = {'totals_cache.backend': 'dogpile.cache.memcached'}
+
+
+@mock.patch.dict('bodhi.server.pagination.config', SHARED_BACKEND)
+class TestConditionalUpdate(base.BaseTestCase):
+    """Test the conditional GETs of updates."""
+    def test_not_modified(self):
+        """A request with the update's ETag is answered without loading it."""
+        etag = self.app.get('/updates/bodhi-2.0-1.fc17').headers['ETag']
+
+        with self.assertStatementCount(1):
+            res = self.app.get('/updates/bodhi-2.0-1.fc17', headers={'If-None-Match': etag},
+                               status=304)
+
+        self.assertEqual(res.headers['ETag'], etag)
+        self.assertEqual(res.body, '')
+
+    def test_modified_by_comment(self):
+        """The ETag of an update changes when it is commented on."""
+        etag = self.app.get('/updates/bodhi-2.0-1.fc17').headers['ETag']
+        update = models.Update.query.one()
+        update.comment(self.db, u'A comment', author=u'bob')
+        self.db.flush()
+
+        res = self.app.get('/updates/bodhi-2.0-1.fc17', headers={'If-None-Match': etag})
+
+        self.assertNotEqual(res.headers['ETag'], etag)
+        self.assertEqual(res.json_body['update']['comments'][-1]['text'], u'A comment')
+
+    def test_modified_by_push(self):
+        """The ETag of an update changes with its status and request, whatever the generations."""
+        update = models.Update.query.one()
+        etags = []
+        with mock.patch('bodhi.server.conditional.get_generations', return_value=['0.0-a']):
+            etags.append(self.app.get('/updates/bodhi-2.0-1.fc17').headers['ETag'])
+            update.status = models.UpdateStatus.testing
+            self.db.flush()
+            etags.append(self.app.get('/updates/bodhi-2.0-1.fc17').headers['ETag'])
+            update.request = None
+            self.db.flush()
+            etags.append(self.app.get('/updates/bodhi-2.0-1.fc17').headers['ETag'])
+
+        self.assertEqual(len(set(etags)), 3)
+
+    def test_if_modified_since(self):
+        """If-Modified-Since is answered with the Last-Modified time."""
+        last_modified = self.app.get('/updates/bodhi-2.0-1.fc17').headers['Last-Modified']
+
+        self.app.get('/updates/bodhi-2.0-1.fc17', headers={'If-Modified-Since': last_modified},
+                     status=304)
+        self.app.get('/updates/bodhi-2.0-1.fc17',
+                     headers={'If-Modified-Since': 'Sat, 01 Jul 2017 00:00:00 GMT'}, status=200)
+
+    def test_other_representations(self):
+        """Each representation of an update has its own ETag."""
+        json_etag = self.app.get('/updates/bodhi-2.0-1.fc17').headers['ETag']
+
+        res = self.app.get('/updates/bodhi-2.0-1.fc17', {'callback': 'receive'},
+                           headers={'Accept': 'application/javascript',
+                                    'If-None-Match': json_etag})
+
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res.headers['ETag'], json_etag)
+
+    def test_missing_update(self):
+        """Updates that don't exist have no ETag."""
+        res = self.app.get('/updates/bodhi-2.0-2.fc17', headers={'If-None-Match': '*'},
+                           status=404)
+
+        self.assertNotIn('ETag', res.headers)
+
+
+@mock.patch.dict('bodhi.server.pagination.config', SHARED_BACKEND)
+class TestConditionalList(base.BaseTestCase):
+    """Test the conditional GETs of lists and feeds."""
+    def test_updates(self):
+        """The list of updates is not modified until an update is written."""
+        etag = self.app.get('/updates/').headers['ETag']
+
+        with self.assertStatementCount(0):
+            self.app.get('/updates/', headers={'If-None-Match': etag}, status=304)
+
+        models.Update.query.one().notes = u'New notes'
+        self.db.flush()
+        self.app.get('/updates/', headers={'If-None-Match': etag}, status=200)
+
+    def test_last_modified(self):
+        """The Last-Modified time of a list is when its tables were last written."""
+        before = datetime.utcnow().replace(microsecond=0)
+        pagination.bump_generations(['comments'])
+
+        res = self.app.get('/rss/comments/')
+
+        last_modified = res.last_modified.replace(tzinfo=None)
+        self.assertTrue(before <= last_modified <= datetime.utcnow() + timedelta(seconds=1))
+
+    def test_feeds(self):
+        """The feeds of overrides and users answer conditional requests."""
+        for path in ('/rss/overrides/', '/rss/users/'):
+            etag = self.app.get(path).headers['ETag']
+
+            self.app.get(path, headers={'If-None-Match': etag}, status=304)
+
+    def test_release(self):
+        """A release is not modified until a release is written."""
+        etag = self.app.get('/releases/F17').headers['ETag']
+        self.app.get('/releases/F17', headers={'If-None-Match': etag}, status=304)
+
+        models.Release.query.one().long_name = u'Fedora 17 Beefy Miracle'
+        self.db.flush()
+
+        self.app.get('/releases/F17', headers={'If-None-Match': etag}, status=200)
+
+
+class TestProcessBackend(base.BaseTestCase):
+    """Test the conditional GETs with the default, in-process, totals_cache backend."""
+    def test_updates(self):
+        """Updates and their lists don't answer conditional requests."""
+        for path in ('/updates/bodhi-2.0-1.fc17', '/updates/', '/rss/comments/'):
+            res = self.app.get(path, headers={'If-None-Match': '*'})
+
+            self.assertNotIn('ETag', res.headers)
+            self.assertNotIn('Last-Modified', res.headers)
+
+    def test_release(self):
+        """Releases are versioned by their generation in the database, and have no time."""
+        res = self.app.get('/releases/F17')
+        self.assertNotIn('Last-Modified', res.headers)
+        self.app.get('/releases/F17', headers={'If-None-Match': res.headers['ETag']}, status=304)
+
+        models.CacheGeneration.bump(self.db, u'releases')
+        self.db.flush()
+
+        self.app.get('/releases/F17', headers={'If-None-Match': res.headers['ETag']}, status=200)
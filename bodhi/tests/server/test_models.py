@@ -21,7 +21,9 @@ import time
 import unittest
 
 from pyramid.testing import DummyRequest
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import subqueryload
 import cornice
 import mock
 
@@ -119,6 +121,447 @@ class TestPolymorphicDiscovery(BaseTestCase):
             model.Update.find_polymorphic_child("whatever")
 
 
+def legacy_to_json(obj, seen=None, request=None, anonymize=False):
+    """Serialize obj the way BodhiBase._to_json() did before it cached its plans."""
+    if not seen:
+        seen = []
+    if not obj:
+        return
+
+    exclude = getattr(obj, '__exclude_columns__', [])
+    properties = list(model.class_mapper(type(obj)).iterate_properties)
+    rels = [p.key for p in properties if type(p) is model.RelationshipProperty]
+    attrs = [p.key for p in properties if p.key not in rels]
+    d = dict([(attr, getattr(obj, attr)) for attr in attrs
+              if attr not in exclude and not attr.startswith('_')])
+
+    for name in getattr(obj, '__include_extras__', []):
+        attribute = getattr(obj, name)
+        if callable(attribute):
+            attribute = attribute(request)
+        d[name] = attribute
+
+    for attr in rels:
+        if attr in exclude:
+            continue
+        target = getattr(type(obj), attr).property.mapper.class_
+        if target in seen:
+            continue
+        d[attr] = legacy_expand(obj, getattr(obj, attr), seen, request)
+
+    for key, value in d.iteritems():
+        if isinstance(value, datetime):
+            d[key] = value.strftime('%Y-%m-%d %H:%M:%S')
+        if isinstance(value, model.EnumSymbol):
+            d[key] = unicode(value)
+
+    if anonymize:
+        for key1, key2 in getattr(obj, '__anonymity_map__', {}).items():
+            if getattr(obj, key2):
+                d[key1] = 'anonymous'
+
+    return d
+
+
+def legacy_expand(obj, relation, seen, req):
+    """Expand a relationship the way BodhiBase._expand() did before the plans were cached."""
+    if hasattr(relation, 'all'):
+        relation = relation.all()
+    if hasattr(relation, '__iter__'):
+        return [legacy_expand(obj, item, seen, req) for item in relation]
+    if type(relation) not in seen:
+        return legacy_to_json(relation, seen + [type(obj)], req)
+    else:
+        return relation.id
+
+
+class TestBodhiBaseToJSON(BaseTestCase):
+    """Test the BodhiBase._to_json() method."""
+    def setUp(self):
+        super(TestBodhiBaseToJSON, self).setUp()
+        self.update = model.Update.query.one()
+        self.update.comment(self.db, u'Anonymous and bad', karma=-1, author=u'bowlofeggs',
+                            anonymous=True)
+        self.update.comment(self.db, u'Works for me', karma=1, author=u'guest')
+        self.update.bugs.append(model.Bug(bug_id=54321))
+        self.db.flush()
+
+    @mock.patch('bodhi.server.models.get_avatar', return_value=u'https://example.com/avatar')
+    def test_same_as_legacy(self, get_avatar):
+        """The JSON is byte for byte the same as the uncached serializer's."""
+        request = DummyRequest()
+        request.registry.settings = self.app_settings
+        for obj in [self.update, self.update.builds[0], self.update.release, self.update.user]:
+            self.assertEqual(json.dumps(obj._to_json(obj, request=request)),
+                             json.dumps(legacy_to_json(obj, request=request)))
+
+    def test_same_as_legacy_anonymized(self):
+        """Anonymized comments are the same as the uncached serializer's."""
+        for comment in self.update.comments:
+            self.assertEqual(json.dumps(comment._to_json(comment, anonymize=True)),
+                             json.dumps(legacy_to_json(comment, anonymize=True)))
+
+    def test_same_as_legacy_seen(self):
+        """Classes passed in seen are skipped the same way."""
+        seen = [model.Package, model.TestCaseKarma]
+        for test in self.update.full_test_cases:
+            self.assertEqual(json.dumps(test._to_json(test, seen=seen)),
+                             json.dumps(legacy_to_json(test, seen=seen)))
+
+    def test_plan_is_cached(self):
+        """Each mapped class's properties are only inspected once."""
+        with mock.patch.dict(model._json_plans, clear=True):
+            with mock.patch('bodhi.server.models.class_mapper',
+                            side_effect=model.class_mapper) as class_mapper:
+                self.update.__json__()
+                self.update.__json__()
+
+        mapped = [c[1][0] for c in class_mapper.mock_calls]
+        self.assertEqual(mapped.count(model.Update), 1)
+        self.assertEqual(len(mapped), len(set(mapped)))
+
+    def test_falsy(self):
+        """None serializes to None."""
+        self.assertIsNone(model.Update._to_json(None))
+
+
+class TestJSONFields(unittest.TestCase):
+    """Test the JSONFields class."""
+    def test_parse_nothing(self):
+        """Without fields or expand, everything is included."""
+        fields = model.JSONFields.parse()
+
+        self.assertTrue(fields.everything)
+        self.assertTrue(fields.includes('alias'))
+        self.assertTrue(fields.includes_relationship('builds'))
+        self.assertIs(fields.child('builds'), model.ALL_FIELDS)
+
+    def test_parse_fields(self):
+        """Only the listed keys are included, and dotted paths restrict the related objects."""
+        fields = model.JSONFields.parse(['alias', 'builds.nvr'])
+
+        self.assertFalse(fields.everything)
+        self.assertTrue(fields.includes('alias'))
+        self.assertFalse(fields.includes('status'))
+        self.assertTrue(fields.includes_relationship('builds'))
+        self.assertFalse(fields.includes_relationship('comments'))
+        self.assertTrue(fields.child('builds').includes('nvr'))
+        self.assertFalse(fields.child('builds').includes('signed'))
+
+    def test_parse_empty_expand(self):
+        """An empty expand leaves all the relationships out, but keeps all the other keys."""
+        fields = model.JSONFields.parse(expand=[])
+
+        self.assertTrue(fields.includes('alias'))
+        self.assertFalse(fields.includes_relationship('builds'))
+
+    def test_parse_expand(self):
+        """Only the relationships listed in expand or fields are serialized."""
+        fields = model.JSONFields.parse(['release.name'], ['comments.user'])
+
+        self.assertTrue(fields.includes_relationship('release'))
+        self.assertFalse(fields.includes_relationship('comments'))
+        self.assertFalse(fields.includes_relationship('builds'))
+
+        fields = model.JSONFields.parse(expand=['comments.user'])
+
+        self.assertTrue(fields.includes_relationship('comments'))
+        self.assertFalse(fields.includes_relationship('builds'))
+        self.assertTrue(fields.child('comments').includes_relationship('user'))
+        self.assertFalse(fields.child('comments').includes_relationship('update'))
+        self.assertTrue(fields.child('comments').includes('text'))
+
+    def test_from_request(self):
+        """The fields and expand parameters are read from request.validated."""
+        request = DummyRequest()
+        request.validated = {'fields': ['alias'], 'expand': None}
+
+        fields = model.JSONFields.from_request(request)
+
+        self.assertTrue(fields.includes('alias'))
+        self.assertFalse(fields.includes('title'))
+        self.assertTrue(model.JSONFields.from_request(None).everything)
+
+
+class TestBodhiBaseFields(BaseTestCase):
+    """Test serializing and loading only some of the fields of models."""
+    def setUp(self):
+        super(TestBodhiBaseFields, self).setUp()
+        self.update = model.Update.query.one()
+        self.update.comment(self.db, u'Works for me', karma=1, author=u'guest')
+        self.db.flush()
+
+    def test_fields(self):
+        """Only the given keys are serialized, including the computed ones."""
+        fields = model.JSONFields.parse(['alias', 'karma', 'builds.nvr'])
+
+        result = self.update.__json__(fields=fields)
+
+        self.assertEqual(sorted(result.keys()), ['alias', 'builds', 'karma'])
+        self.assertEqual(result['karma'], self.update.karma)
+        self.assertEqual(result['builds'], [{'nvr': u'bodhi-2.0-1.fc17'}])
+
+    def test_empty_expand(self):
+        """An empty expand leaves the relationships out."""
+        result = self.update.__json__(fields=model.JSONFields.parse(expand=[]))
+
+        self.assertEqual(result['title'], self.update.title)
+        self.assertEqual(result['karma'], self.update.karma)
+        for key in ('builds', 'comments', 'release', 'user', 'bugs'):
+            self.assertNotIn(key, result)
+
+    def test_nested_comment_update(self):
+        """The karma of the update of a comment is only added when it is asked for."""
+        comment = self.update.comments[-1]
+
+        result = comment.__json__(fields=model.JSONFields.parse(['text', 'update.alias']))
+
+        self.assertEqual(result, {'text': u'Works for me', 'update': {'alias': self.update.alias}})
+
+        result = comment.__json__(fields=model.JSONFields.parse(['update.karma']))
+
+        self.assertEqual(result, {'update': {'karma': self.update.karma}})
+
+    def test_from_request(self):
+        """__json__() reads the fields from the request when they aren't given."""
+        request = DummyRequest()
+        request.validated = {'fields': ['title'], 'expand': None}
+
+        self.assertEqual(self.update.__json__(request), {'title': self.update.title})
+
+    def test_load_options_everything(self):
+        """Nothing changes when everything is serialized."""
+        self.assertEqual(model.Update.json_load_options(model.ALL_FIELDS), [])
+
+    def test_load_options_lazy(self):
+        """The joined relationships that aren't serialized or needed are loaded lazily."""
+        fields = model.JSONFields.parse(['alias', 'status'])
+
+        options = model.Update.json_load_options(fields)
+        self.db.expunge_all()
+        update = self.db.query(model.Update).options(*options).one()
+
+        for key in ('comments', 'builds', 'release'):
+            self.assertNotIn(key, update.__dict__)
+        self.assertEqual(update.__json__(fields=fields),
+                         {'alias': update.alias, 'status': update.status.value})
+
+    def test_load_options_required(self):
+        """The relationships that the requested computed keys need are still loaded eagerly."""
+        fields = model.JSONFields.parse(['karma', 'content_type'])
+
+        options = model.Update.json_load_options(fields)
+        self.db.expunge_all()
+        update = self.db.query(model.Update).options(*options).one()
+
+        self.assertIn('comments', update.__dict__)
+        self.assertIn('builds', update.__dict__)
+        self.assertNotIn('release', update.__dict__)
+
+    def test_load_options_nested(self):
+        """The options reach the relationships of the serialized relationships."""
+        fields = model.JSONFields.parse(['comments.text'])
+
+        options = model.Update.json_load_options(fields)
+        self.db.expunge_all()
+        update = self.db.query(model.Update).options(*options).one()
+
+        self.assertIn('comments', update.__dict__)
+        self.assertNotIn('builds', update.__dict__)
+        self.assertEqual(update.__json__(fields=fields),
+                         {'comments': [{'text': c.text} for c in update.comments]})
+
+
+class TestUpdateLoadingProfile(BaseTestCase):
+    """Test the Update.loading_profile() method."""
+    def setUp(self):
+        super(TestUpdateLoadingProfile, self).setUp()
+        update = model.Update.query.one()
+        update.comment(self.db, u'Works for me', karma=1, author=u'guest')
+        self.db.commit()
+        self.db.expunge_all()
+
+    def _query(self, profile):
+        """Return the update, loaded with the given profile."""
+        return self.db.query(model.Update).options(*model.Update.loading_profile(profile)).one()
+
+    def test_unknown(self):
+        """An unknown profile raises a ValueError."""
+        with self.assertRaises(ValueError) as exc:
+            model.Update.loading_profile('nope')
+
+        self.assertEqual(str(exc.exception), 'Unknown loading profile: nope')
+
+    def test_list(self):
+        """The list profile loads the collections in separate queries, once."""
+        with self.count_statements() as counter:
+            update = self._query('list')
+
+        self.assertNotIn('comments', counter.statements[0])
+        self.assertNotIn('builds', counter.statements[0])
+        model.Update.prefetch_test_cases(self.db, [update])
+        with self.assertStatementCount(0):
+            update.__json__()
+
+    def test_detail(self):
+        """The detail profile loads everything the JSON of the update contains."""
+        update = self._query('detail')
+
+        model.Update.prefetch_test_cases(self.db, [update])
+        with self.assertStatementCount(0):
+            update.__json__()
+
+    def test_masher(self):
+        """The masher profile loads the builds and release, but not the comments."""
+        update = self._query('masher')
+
+        self.assertIn('builds', update.__dict__)
+        self.assertIn('release', update.__dict__)
+        self.assertNotIn('comments', update.__dict__)
+
+
+class TestUpdateSearch(BaseTestCase):
+    """Test the Update.search() and Comment.search() methods."""
+    def _postgresql_session(self):
+        """Return a mock session bound to PostgreSQL."""
+        session = mock.MagicMock()
+        session.get_bind.return_value.dialect = postgresql.dialect()
+        return session
+
+    def test_sqlite(self):
+        """SQLite searches the title and alias of updates, without ranking them."""
+        criterion, rank = model.Update.search(self.db, u'BODHI')
+
+        self.assertIsNone(rank)
+        self.assertEqual([u.title for u in model.Update.query.filter(criterion)],
+                         [u'bodhi-2.0-1.fc17'])
+        self.assertEqual(model.Update.query.filter(model.Update.search(self.db, u'wat')[0]).count(),
+                         0)
+
+    def test_postgresql(self):
+        """PostgreSQL also matches and ranks the updates with their search vector."""
+        criterion, rank = model.Update.search(self._postgresql_session(), u'bodhi')
+
+        sql = str(criterion.compile(dialect=postgresql.dialect()))
+        self.assertIn('updates.search_vector @@ plainto_tsquery(', sql)
+        self.assertIn('updates.title ILIKE', sql)
+        rank_sql = str(rank.compile(dialect=postgresql.dialect()))
+        self.assertIn('ts_rank(updates.search_vector, plainto_tsquery(', rank_sql)
+        # A real would not equal the rank of a pagination cursor after its JSON round trip
+        self.assertIn('AS FLOAT(53))', rank_sql)
+
+    def test_comment_postgresql(self):
+        """Comments are matched and ranked with their search vector on PostgreSQL."""
+        criterion, rank = model.Comment.search(self._postgresql_session(), u'works')
+
+        sql = str(criterion.compile(dialect=postgresql.dialect()))
+        self.assertIn('comments.search_vector @@ plainto_tsquery(', sql)
+        self.assertIn('comments.text ILIKE', sql)
+        self.assertIsNotNone(rank)
+
+    def test_not_serialized(self):
+        """The search vectors are neither loaded nor serialized."""
+        update = model.Update.query.one()
+
+        self.assertNotIn('search_vector', update.__json__())
+        self.assertNotIn('search_vector', update.__dict__)
+
+
+class TestGetMany(BaseTestCase):
+    """Test the get_many() class method of the models."""
+    def setUp(self):
+        super(TestGetMany, self).setUp()
+        self.create_update([u'python-nose-1.3.7-11.fc17'])
+        self.db.flush()
+
+    def test_get_many(self):
+        """Objects are found by any of the columns of __get_by__."""
+        with self.assertStatementCount(1):
+            releases = model.Release.get_many([u'F17', u'Fedora 17', u'F18', u'f17'], self.db)
+
+        release = model.Release.query.one()
+        self.assertEqual(releases, {u'F17': release, u'Fedora 17': release, u'f17': release})
+
+    def test_updates(self):
+        """Updates are found by title, alias or the NVRs of their builds."""
+        update = model.Update.query.filter_by(title=u'bodhi-2.0-1.fc17').one()
+        other = model.Update.query.filter_by(title=u'python-nose-1.3.7-11.fc17').one()
+        other.alias = u'FEDORA-2017-a3bbe1a8f2'
+        self.db.flush()
+
+        updates = model.Update.get_many(
+            [u'bodhi-2.0-1.fc17', u'FEDORA-2017-a3bbe1a8f2', u'python-nose-1.3.7-11.fc17',
+             u'bodhi-2.0-2.fc17'], self.db)
+
+        self.assertEqual(updates, {u'bodhi-2.0-1.fc17': update, u'FEDORA-2017-a3bbe1a8f2': other,
+                                   u'python-nose-1.3.7-11.fc17': other})
+
+    def test_batches(self):
+        """The identifiers are queried in batches of batch_size."""
+        with self.assertStatementCount(2):
+            builds = model.Build.get_many(
+                [u'bodhi-2.0-1.fc17', u'python-nose-1.3.7-11.fc17'], self.db, batch_size=1)
+
+        self.assertEqual(sorted(builds), [u'bodhi-2.0-1.fc17', u'python-nose-1.3.7-11.fc17'])
+
+
+class TestUpdatePrefetchTestCases(BaseTestCase):
+    """Test the Update.prefetch_test_cases() method."""
+    def setUp(self):
+        super(TestUpdatePrefetchTestCases, self).setUp()
+        other = self.create_update([u'python-nose-1.3.7-11.fc17'])
+        other.builds[0].package.test_cases.append(model.TestCase(name=u'Other'))
+        self.db.commit()
+        self.db.expunge_all()
+
+    def test_prefetch(self):
+        """The test cases of all the updates are loaded with one query."""
+        updates = self.db.query(model.Update).options(
+            *model.Update.loading_profile('list')).order_by(model.Update.id).all()
+
+        with self.assertStatementCount(1):
+            model.Update.prefetch_test_cases(self.db, updates)
+
+        with self.assertStatementCount(0):
+            self.assertEqual([sorted(t.name for t in u.full_test_cases) for u in updates],
+                             [[u'Wat'], [u'Other', u'Wat']])
+
+    def test_packages_not_loaded(self):
+        """The packages of the builds are loaded with one more query if they weren't joined."""
+        updates = self.db.query(model.Update).options(
+            *model.Update.loading_profile('masher')).options(
+                subqueryload(model.Update.builds).lazyload(model.Build.package)).order_by(
+                    model.Update.id).all()
+
+        with self.assertStatementCount(2):
+            model.Update.prefetch_test_cases(self.db, updates)
+
+        with self.assertStatementCount(0):
+            self.assertEqual([sorted(t.name for t in u.full_test_cases) for u in updates],
+                             [[u'Wat'], [u'Other', u'Wat']])
+
+    def test_already_loaded(self):
+        """Packages and test cases that are already loaded aren't loaded again."""
+        update = model.Update.query.first()
+        [test.name for build in update.builds for test in build.package.test_cases]
+
+        with self.assertStatementCount(0):
+            model.Update.prefetch_test_cases(self.db, [update])
+
+    def test_batches(self):
+        """The ids are queried in batches of batch_size."""
+        updates = self.db.query(model.Update).options(
+            *model.Update.loading_profile('list')).all()
+
+        with self.assertStatementCount(2):
+            model.Update.prefetch_test_cases(self.db, updates, batch_size=1)
+
+    def test_no_updates(self):
+        """Nothing is queried without updates."""
+        with self.assertStatementCount(0):
+            model.Update.prefetch_test_cases(self.db, [])
+
+
 class TestComment(BaseTestCase):
     def test_text_not_nullable(self):
         """Assert that the text column does not allow NULL values.
@@ -181,6 +624,106 @@ class TestRelease(ModelTest):
         # Make sure it's the same cached object
         assert releases is model.Release.all_releases(self.db)
 
+    def test_from_tags(self):
+        """Assert that from_tags() returns the release of the first tag."""
+        release = model.Release.from_tags([u'dist-f11-updates-testing', u'f17'], self.db)
+
+        self.assertTrue(release is self.obj)
+
+    def test_from_tags_unknown_tag(self):
+        """Assert that from_tags() raises KeyError when the first tag is unknown."""
+        self.assertRaises(KeyError, model.Release.from_tags, [u'nope'], self.db)
+
+
+class TestReleaseRegistry(BaseTestCase):
+    """Unit test case for the ``ReleaseRegistry`` class."""
+
+    def test_get_tags(self):
+        """Assert that the tags are loaded once and then looked up without queries."""
+        tag_types, tag_rels = model.Release.get_tags(self.db)
+
+        self.assertEqual(tag_rels[u'f17-updates-testing'], u'F17')
+        self.assertTrue(u'f17-updates-candidate' in tag_types['candidate'])
+        with mock.patch.object(self.db, 'query', side_effect=AssertionError('queried')):
+            self.assertEqual(model.Release.get_tags(self.db)[1], tag_rels)
+            self.assertEqual(model.Release.all_releases(self.db)['current'][0]['name'], u'F17')
+
+    def test_get_tags_copies(self):
+        """Assert that changing the returned tags does not change the registry."""
+        tag_types, tag_rels = model.Release.get_tags(self.db)
+        tag_types['candidate'].append(u'f42-updates-candidate')
+        tag_rels[u'f42-updates-candidate'] = u'F42'
+
+        tag_types, tag_rels = model.Release.get_tags(self.db)
+        self.assertFalse(u'f42-updates-candidate' in tag_types['candidate'])
+        self.assertFalse(u'f42-updates-candidate' in tag_rels)
+
+    def test_clear_locks(self):
+        """Assert that the registry is cleared under its lock."""
+        registry = model.ReleaseRegistry()
+        registry._lock = mock.MagicMock()
+
+        registry.clear()
+
+        registry._lock.__enter__.assert_called_once_with()
+        registry._lock.__exit__.assert_called_once_with(None, None, None)
+
+    def test_get(self):
+        """Assert that releases are looked up by name."""
+        release = self.db.query(model.Release).filter_by(name=u'F17').one()
+
+        self.assertTrue(model.Release.registry.get(u'F17', self.db) is release)
+        self.assertEqual(model.Release.registry.get(u'F42', self.db), None)
+
+    def test_edit_release(self):
+        """Assert that editing a release bumps its generation and clears the registry."""
+        model.Release.get_tags(self.db)
+        generation = model.CacheGeneration.current(self.db, u'releases')
+        release = self.db.query(model.Release).filter_by(name=u'F17').one()
+
+        release.testing_tag = u'f17-testing'
+        self.db.flush()
+
+        self.assertEqual(model.CacheGeneration.current(self.db, u'releases'), generation + 1)
+        self.assertFalse(model.Release.registry._loaded)
+        self.assertEqual(model.Release.get_tags(self.db)[1][u'f17-testing'], u'F17')
+
+    def test_rollback(self):
+        """Assert that the registry is cleared when changes to releases are rolled back."""
+        release = self.db.query(model.Release).filter_by(name=u'F17').one()
+        release.testing_tag = u'f17-testing'
+        self.db.flush()
+        self.assertTrue(u'f17-testing' in model.Release.get_tags(self.db)[1])
+
+        self.db.rollback()
+
+        self.assertFalse(model.Release.registry._loaded)
+        self.assertFalse(u'f17-testing' in model.Release.get_tags(self.db)[1])
+
+    @mock.patch.dict(config, {'release_registry.check_interval': 0})
+    def test_changed_by_another_process(self):
+        """Assert that the registry is reloaded when another process bumped the generation."""
+        model.Release.get_tags(self.db)
+        model.CacheGeneration.bump(self.db, u'releases')
+        # Make the change without going through this process' listeners
+        self.db.execute(model.Release.__table__.update().values(testing_tag=u'f17-testing'))
+        self.db.flush()
+        self.db.expire_all()
+
+        self.assertTrue(u'f17-testing' in model.Release.get_tags(self.db)[1])
+
+    @mock.patch.dict(config, {'release_registry.check_interval': 3600})
+    def test_check_interval(self):
+        """Assert that the generation is not checked more often than the check interval."""
+        model.Release.get_tags(self.db)
+        model.CacheGeneration.bump(self.db, u'releases')
+        self.db.flush()
+
+        with mock.patch.object(model.Release.registry, '_load') as _load:
+            model.Release.get_tags(self.db)
+
+        self.assertEqual(_load.call_count, 0)
+
 
 class MockWiki(object):
     """ Mocked simplemediawiki.MediaWiki class. """
@@ -527,6 +1070,137 @@ class TestRpmBuild(ModelTest):
     def test_url(self):
         self.assertEqual(self.obj.get_url(), u'/TurboGears-1.0.8-3.fc11')
 
+    def test_epoch_without_evr_key(self):
+        """A stored epoch is used to compute the EVR sort key without asking Koji."""
+        self.obj.epoch = 1
+
+        with mock.patch('bodhi.server.models.buildsys.get_cached_session') as get_session:
+            self.assertEqual(self.obj.evr, ("1", "1.0.8", "3.fc11"))
+
+        self.assertEqual(get_session.call_count, 0)
+        self.assertEqual(self.obj.evr_key, util.evr_sort_key((1, '1.0.8', '3.fc11')))
+
+    def test_evr_fetches_epoch_once(self):
+        """The epoch is fetched from Koji the first time only."""
+        self.obj.epoch = 0
+
+        with mock.patch('bodhi.server.models.buildsys.get_cached_session') as get_session:
+            get_session.return_value.getBuild.return_value = {'epoch': 2}
+            self.assertEqual(self.obj.evr, ("2", "1.0.8", "3.fc11"))
+            self.assertEqual(self.obj.evr, ("2", "1.0.8", "3.fc11"))
+
+        get_session.return_value.getBuild.assert_called_once_with(u"TurboGears-1.0.8-3.fc11")
+        self.assertEqual(self.obj.epoch, 2)
+        self.assertEqual(self.obj.evr_key, util.evr_sort_key((2, '1.0.8', '3.fc11')))
+
+    def test_set_evr_no_epoch(self):
+        """An epoch of None in Koji is stored as 0."""
+        self.obj.set_evr({'epoch': None})
+
+        self.assertEqual(self.obj.epoch, 0)
+        self.assertEqual(self.obj.evr_key, util.evr_sort_key((0, '1.0.8', '3.fc11')))
+
+    def test_evr_key_not_serialized(self):
+        """The EVR sort key is an implementation detail that isn't exposed in the API."""
+        self.assertNotIn('evr_key', self.obj.__json__())
+
+
+class TestRpmBuildNewerBuilds(BaseTestCase):
+    """Test the RpmBuild.newer_builds() method."""
+    def setUp(self):
+        super(TestRpmBuildNewerBuilds, self).setUp()
+        self.build = model.RpmBuild.query.filter_by(nvr=u'bodhi-2.0-1.fc17').one()
+        self.newer = self.create_update([u'bodhi-2.0.1-1.fc17'])
+        self.newer.status = model.UpdateStatus.testing
+        self.older = self.create_update([u'bodhi-1.9-3.fc17'])
+        self.older.status = model.UpdateStatus.testing
+        self.db.flush()
+
+    def test_stored_evr_keys(self):
+        """Newer builds are found with the EVR sort keys stored in the database."""
+        for build in model.RpmBuild.query:
+            build.set_evr({'epoch': None})
+        self.db.flush()
+
+        with mock.patch('bodhi.server.models.rpm.labelCompare') as labelCompare:
+            builds = self.build.newer_builds(self.db, [model.UpdateStatus.testing])
+
+        self.assertEqual(builds, self.newer.builds)
+        self.assertEqual(labelCompare.call_count, 0)
+
+    def test_missing_evr_keys(self):
+        """Builds whose EVR sort key wasn't stored yet are compared with rpm.labelCompare()."""
+        builds = self.build.newer_builds(self.db, [model.UpdateStatus.testing])
+
+        self.assertEqual(builds, self.newer.builds)
+
+    def test_epoch(self):
+        """A build with a greater epoch is newer, whatever its version."""
+        self.older.builds[0].set_evr({'epoch': 1})
+        self.db.flush()
+
+        builds = self.build.newer_builds(self.db, [model.UpdateStatus.testing])
+
+        self.assertEqual(set(builds), set(self.newer.builds + self.older.builds))
+
+    def test_statuses(self):
+        """Only builds of updates with the given statuses are considered."""
+        self.assertEqual(self.build.newer_builds(self.db, [model.UpdateStatus.stable]), [])
+
+    def test_release(self):
+        """Only builds of updates for the given release are considered, if one is given."""
+        release = model.Release.query.filter_by(name=u'F17').one()
+        other_release = model.Release(**TestRelease.attrs)
+        self.db.add(other_release)
+        self.db.flush()
+
+        self.assertEqual(
+            self.build.newer_builds(self.db, [model.UpdateStatus.testing], release=release),
+            self.newer.builds)
+        self.assertEqual(
+            self.build.newer_builds(self.db, [model.UpdateStatus.testing], release=other_release),
+            [])
+
+
+class TestRpmBuildIsNewerThan(TestRpmBuildNewerBuilds):
+    """Test the RpmBuild.is_newer_than() method."""
+
+    def test_stored_evr_keys(self):
+        """Builds are compared by their EVR sort keys when they are stored."""
+        for build in model.RpmBuild.query:
+            build.set_evr({'epoch': None})
+
+        with mock.patch('bodhi.server.models.rpm.labelCompare') as labelCompare:
+            self.assertTrue(self.newer.builds[0].is_newer_than(self.build))
+            self.assertFalse(self.older.builds[0].is_newer_than(self.build))
+            self.assertFalse(self.build.is_newer_than(self.build))
+
+        self.assertEqual(labelCompare.call_count, 0)
+
+    def test_missing_evr_keys(self):
+        """Builds whose EVR sort key wasn't stored yet are compared with rpm.labelCompare()."""
+        self.assertTrue(self.newer.builds[0].is_newer_than(self.build))
+        self.assertFalse(self.older.builds[0].is_newer_than(self.build))
+
+    def test_epoch(self):
+        """A build with a greater epoch is newer, whatever its version."""
+        self.older.builds[0].set_evr({'epoch': 1})
+        self.build.set_evr({'epoch': 0})
+
+        self.assertTrue(self.older.builds[0].is_newer_than(self.build))
+
+    def test_obsolete_older_updates(self):
+        """Update.obsolete_older_updates() only obsoletes the updates of older builds."""
+        self.older.builds[0].set_evr({'epoch': 1})
+        self.newer.request = None
+        self.build.update.locked = False
+        self.db.flush()
+
+        self.newer.obsolete_older_updates(self.db)
+
+        self.assertEqual(self.older.status, model.UpdateStatus.testing)
+        self.assertEqual(self.build.update.status, model.UpdateStatus.obsolete)
+
 
 class TestUpdateValidateBuilds(BaseTestCase):
     """Tests for the :class:`Update` validator for builds."""
@@ -1311,6 +1985,93 @@ class TestUpdate(ModelTest):
         """Assert _composite_karma with no comments is (0, 0)."""
         self.assertEqual(self.obj._composite_karma, (0, 0))
 
+    def test_karma_counters_stored(self):
+        """The karma counters are stored as comments are added, and match a full count."""
+        self.obj.comment(self.db, u"ignored", -1, u'foo1')
+        self.obj.comment(self.db, u"Removed build", 0, u'bodhi')
+        self.obj.comment(self.db, u"Nice job", -1, u'foo')
+        self.obj.comment(self.db, u"Whoops my last comment was wrong", 1, u'foo')
+        self.obj.comment(self.db, u"Don't ignore me", -1, u'foo1')
+        reset = [c for c in self.obj.comments if c.text == u'Removed build'][0]
+
+        counters = {'positive_karma': 1, 'negative_karma': -1, 'karma_reset_id': reset.id}
+        self.assertEqual(dict((key, getattr(self.obj, key)) for key in counters), counters)
+        self.assertEqual(self.obj.tally_karma(), counters)
+
+    def test_reading_karma_writes_nothing(self):
+        """Reading the karma of an update doesn't change it."""
+        self.obj.comment(self.db, u"foo", 1, u'foo')
+        self.obj.comment(self.db, u"foo", -1, u'bar')
+        self.db.flush()
+
+        self.assertEqual(self.obj.karma, 0)
+        self.assertEqual(len(list(self.obj.comments_since_karma_reset)), 2)
+        self.assertEqual(self.obj.num_admin_approvals, 0)
+        self.assertFalse(self.db.dirty)
+
+    def test_karma_of_unflushed_update(self):
+        """The karma of an update that was never flushed is counted without storing it."""
+        update = model.Update(title=u'unflushed', release=self.obj.release)
+        update.comments.append(model.Comment(text=u'foo', karma=1, user=model.User(name=u'foo')))
+
+        self.assertEqual(update.karma, 1)
+        self.assertEqual(len(list(update.comments_since_karma_reset)), 1)
+        self.assertIsNone(update.positive_karma)
+
+    def test_recount_karma(self):
+        """recount_karma() counts the comments that were not added with comment()."""
+        self.obj.comment(self.db, u"foo", 1, u'foo')
+        user = model.User(name=u'bar')
+        self.db.add(model.Comment(text=u'bar', karma=1, user=user, update=self.obj))
+        self.db.flush()
+
+        self.assertEqual(self.obj.karma, 1)
+
+        self.obj.recount_karma()
+
+        self.assertEqual(self.obj.karma, 2)
+
+    @mock.patch.dict(config, {'admin_groups': [u'proventesters']})
+    def test_admin_approvals_counted(self):
+        """The approvals of admins are counted, even before a karma reset."""
+        user = model.User(name=u'admin')
+        user.groups.append(model.Group(name=u'proventesters'))
+        self.db.add(user)
+        self.db.flush()
+
+        self.obj.comment(self.db, u"foo", 1, u'admin')
+        self.obj.comment(self.db, u"foo", 1, u'foo')
+        self.obj.comment(self.db, u"Removed build", 0, u'bodhi')
+
+        self.assertEqual(self.obj.num_admin_approvals, 1)
+        self.assertEqual(self.obj.karma, 0)
+
+    @mock.patch.dict(config, {'admin_groups': [u'proventesters']})
+    def test_admin_approvals_current_groups(self):
+        """The approvals are counted from the groups the commenters are in now."""
+        user = model.User(name=u'admin')
+        group = model.Group(name=u'proventesters')
+        user.groups.append(group)
+        self.db.add(user)
+        self.db.flush()
+        self.obj.comment(self.db, u"foo", 1, u'admin')
+
+        user.groups.remove(group)
+
+        self.assertEqual(self.obj.num_admin_approvals, 0)
+
+    def test_karma_expression(self):
+        """Updates can be filtered and sorted by karma in SQL."""
+        self.obj.comment(self.db, u"foo", 1, u'foo')
+        self.obj.comment(self.db, u"foo", 1, u'bar')
+        self.db.flush()
+
+        query = self.db.query(model.Update).filter(model.Update.karma >= 2)
+
+        self.assertEqual(query.all(), [self.obj])
+        self.assertEqual(
+            self.db.query(model.Update).order_by(model.Update.karma.desc()).first(), self.obj)
+
     def test__composite_karma_one_negative_two_positive(self):
         """Assert that _composite_karma returns (2, -1) with one negative and two positive comments.
         """
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""This module contains tests for the bodhi.server.pagination module."""
+
+from datetime import datetime
+import base64
+import unittest
+
+from pyramid.httpexceptions import HTTPBadRequest
+from pyramid.testing import DummyRequest
+import mock
+from sqlalchemy import cast, Float, func
+
+from bodhi.server import models, pagination
+from bodhi.tests.server import base
+
+
+class TestCursors(unittest.TestCase):
+    """Test encode_cursor() and decode_cursor()."""
+    def test_round_trip(self):
+        """The values of a cursor are decoded back, datetimes included."""
+        values = [datetime(2017, 8, 1, 12, 30, 15, 123), 42, u'bodhi']
+
+        self.assertEqual(pagination.decode_cursor(pagination.encode_cursor(values)), values)
+
+    def test_invalid(self):
+        """Cursors that encode_cursor() doesn't return raise a ValueError."""
+        for cursor in ('wat', base64.urlsafe_b64encode('{"a": 1}'),
+                       base64.urlsafe_b64encode('[{"date": 1}]')):
+            with self.assertRaises(ValueError):
+                pagination.decode_cursor(cursor)
+
+
+class TestPaginate(base.BaseTestCase):
+    """Test paginate()."""
+    def setUp(self):
+        super(TestPaginate, self).setUp()
+        for name in (u'a', u'b', u'c', u'd'):
+            self.db.add(models.RpmPackage(name=name))
+        self.db.flush()
+
+    def _paginate(self, descending=False, **validated):
+        """Return the given page of the packages named a to d."""
+        request = DummyRequest(db=self.db)
+        request.validated = dict({'page': 1, 'rows_per_page': 3}, **validated)
+        query = self.db.query(models.Package).filter(
+            models.Package.name.in_([u'a', u'b', u'c', u'd']))
+        return pagination.paginate(request, query, 'packages', [models.Package.name],
+                                   models.Package.id, descending=descending)
+
+    def test_pages(self):
+        """The pages are found by number, and the next cursor follows the last result."""
+        first = self._paginate()
+        second = self._paginate(page=2)
+
+        self.assertEqual([p.name for p in first['packages']], [u'a', u'b', u'c'])
+        self.assertEqual(first['total'], 4)
+        self.assertEqual(first['pages'], 2)
+        self.assertEqual(pagination.decode_cursor(first['next_cursor']), [u'c'])
+        self.assertEqual([p.name for p in second['packages']], [u'd'])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_cursor(self):
+        """The cursor takes precedence over the page."""
+        result = self._paginate(cursor=pagination.encode_cursor([u'b']), page=5)
+
+        self.assertEqual([p.name for p in result['packages']], [u'c', u'd'])
+        self.assertIsNone(result['next_cursor'])
+
+    def test_descending(self):
+        """The results after the cursor come in descending order."""
+        result = self._paginate(descending=True, cursor=pagination.encode_cursor([u'c']))
+
+        self.assertEqual([p.name for p in result['packages']], [u'b', u'a'])
+
+    def test_count_false(self):
+        """The results are not counted if count is false."""
+        with self.assertStatementCount(1):
+            result = self._paginate(count=False)
+
+        self.assertIsNone(result['total'])
+        self.assertIsNone(result['pages'])
+        self.assertEqual(len(result['packages']), 3)
+
+    def test_tied_float_keys(self):
+        """Results tied on a float key are paged through by the next keys."""
+        request = DummyRequest(db=self.db)
+        query = self.db.query(models.Package).filter(
+            models.Package.name.in_([u'a', u'b', u'c', u'd']))
+        rank = cast(func.length(models.Package.name) / 3.0, Float(53))
+
+        names = []
+        request.validated = {'page': 1, 'rows_per_page': 3}
+        while True:
+            result = pagination.paginate(request, query, 'packages', [rank, models.Package.name],
+                                         models.Package.id, descending=True)
+            names.extend(p.name for p in result['packages'])
+            if result['next_cursor'] is None:
+                break
+            request.validated['cursor'] = result['next_cursor']
+
+        self.assertEqual(names, [u'd', u'c', u'b', u'a'])
+
+    def test_cursor_of_other_keys(self):
+        """A cursor with another number of keys is refused."""
+        with self.assertRaises(HTTPBadRequest):
+            self._paginate(cursor=pagination.encode_cursor([u'b', 2]))
+
+
+class TestFilterSignature(unittest.TestCase):
+    """Test filter_signature()."""
+    def test_normalized(self):
+        """The signature doesn't depend on the order of lists or on the pagination parameters."""
+        self.assertEqual(
+            pagination.filter_signature({'packages': [u'a', u'b'], 'page': 1, 'status': None,
+                                         'submitted_since': datetime(2017, 8, 1)}),
+            pagination.filter_signature({'packages': [u'b', u'a'], 'page': 3, 'cursor': 'abc',
+                                         'submitted_since': datetime(2017, 8, 1)}))
+
+    def test_different_filters(self):
+        """Different filters have different signatures."""
+        self.assertNotEqual(
+            pagination.filter_signature({'status': models.UpdateStatus.testing}),
+            pagination.filter_signature({'status': models.UpdateStatus.stable}))
+
+
+class TestCachedTotals(base.BaseTestCase):
+    """Test the caching of the totals of paginate()."""
+    def _paginate(self, **validated):
+        """Return the first page of updates, caching the total."""
+        request = DummyRequest(db=self.db)
+        request.validated = dict({'page': 1, 'rows_per_page': 20}, **validated)
+        return pagination.paginate(request, self.db.query(models.Update), 'updates',
+                                   [models.Update.id], models.Update.id, depends_on=('updates',))
+
+    def test_cached(self):
+        """The total is only counted once for the same filters."""
+        self._paginate(locked=False)
+
+        with self.assertStatementCount(1):
+            result = self._paginate(locked=False, page=2)
+
+        self.assertEqual(result['total'], 1)
+
+    def test_other_filters(self):
+        """The totals of other filters are counted."""
+        self._paginate(locked=False)
+
+        with self.assertStatementCount(2):
+            self._paginate(locked=True)
+
+    def test_invalidated_by_writes(self):
+        """The totals are counted again once the updates are written."""
+        self._paginate()
+
+        self.create_update([u'python-nose-1.3.7-11.fc17'])
+        self.db.flush()
+
+        self.assertEqual(self._paginate()['total'], 2)
+
+    def test_stale_totals_replaced(self):
+        """A total counted again replaces the stale one, so the cache doesn't grow."""
+        self._paginate()
+        region = pagination._get_totals_cache()
+        with mock.patch.object(region, 'set', wraps=region.set) as set_:
+            self.create_update([u'python-nose-1.3.7-11.fc17'])
+            self.db.flush()
+            self._paginate()
+
+        keys = [c[0][0] for c in set_.call_args_list if c[0][0].startswith('total:')]
+        self.assertEqual(len(keys), 1)
+        generations, total = region.get(keys[0])
+        self.assertEqual(generations, pagination.get_generations(('updates',)))
+        self.assertEqual(total, 2)
+
+    def test_generations(self):
+        """The generations of the written tables are bumped after flushes and commits."""
+        update = models.Update.query.one()
+        generations = pagination.get_generations(['updates', 'comments', 'overrides'])
+
+        with mock.patch('bodhi.server.pagination.bump_generations',
+                        wraps=pagination.bump_generations) as bump:
+            update.notes = u'New notes'
+            self.db.flush()
+            bump.assert_called_once_with(set(['updates']))
+            self.db.commit()
+
+        self.assertEqual(bump.call_count, 2)
+        new_generations = pagination.get_generations(['updates', 'comments', 'overrides'])
+        self.assertNotEqual(new_generations[0], generations[0])
+        self.assertEqual(new_generations[1:], generations[1:])
+
+    def test_cache_errors(self):
+        """Errors of the cache while bumping the generations are only logged."""
+        update = models.Update.query.one()
+
+        with mock.patch('bodhi.server.pagination.bump_generations', side_effect=IOError):
+            with mock.patch('bodhi.server.pagination.log.exception') as exception:
+                update.notes = u'New notes'
+                self.db.flush()
+
+        exception.assert_called_once_with('Unable to invalidate the cached totals of updates')
@@ -167,8 +167,8 @@ Push these 2 updates? [y/N]: n
 Aborted!
 """
 
-TEST_BUILDS_FLAG_EXPECTED_OUTPUT = """ejabberd-16.09-4.fc17
-python-nose-1.3.7-11.fc17
+TEST_BUILDS_FLAG_EXPECTED_OUTPUT = """python-nose-1.3.7-11.fc17
+ejabberd-16.09-4.fc17
 Push these 2 updates? [y/N]: y
 
 Locking updates...
@@ -209,10 +209,10 @@ Locking updates...
 Sending masher.start fedmsg
 """
 
-TEST_NO_UPDATES_TO_PUSH_EXPECTED_OUTPUT = """Warning: python-nose-1.3.7-11.fc17 has unsigned builds and has been skipped
-Warning: python-paste-deploy-1.5.2-8.fc17 has unsigned builds and has been skipped
-Warning: bodhi-2.0-1.fc17 is locked but not in a push
+TEST_NO_UPDATES_TO_PUSH_EXPECTED_OUTPUT = """Warning: bodhi-2.0-1.fc17 is locked but not in a push
 Warning: bodhi-2.0-1.fc17 has unsigned builds and has been skipped
+Warning: python-nose-1.3.7-11.fc17 has unsigned builds and has been skipped
+Warning: python-paste-deploy-1.5.2-8.fc17 has unsigned builds and has been skipped
 
 There are no updates to push.
 """
@@ -266,9 +266,9 @@ Locking updates...
 Sending masher.start fedmsg
 """
 
-TEST_UNSIGNED_UPDATES_SKIPPED_EXPECTED_OUTPUT = """Warning: python-nose-1.3.7-11.fc17 has unsigned builds and has been skipped
-Warning: bodhi-2.0-1.fc17 is locked but not in a push
+TEST_UNSIGNED_UPDATES_SKIPPED_EXPECTED_OUTPUT = """Warning: bodhi-2.0-1.fc17 is locked but not in a push
 Warning: bodhi-2.0-1.fc17 has unsigned builds and has been skipped
+Warning: python-nose-1.3.7-11.fc17 has unsigned builds and has been skipped
 python-paste-deploy-1.5.2-8.fc17
 Push these 1 updates? [y/N]: y
 
@@ -352,7 +352,7 @@ class TestPush(base.BaseTestCase):
         self.assertEqual(result.output, TEST_BUILDS_FLAG_EXPECTED_OUTPUT)
         publish.assert_called_once_with(
             topic='masher.start',
-            msg={'updates': [u'ejabberd-16.09-4.fc17', u'python-nose-1.3.7-11.fc17'],
+            msg={'updates': [u'python-nose-1.3.7-11.fc17', u'ejabberd-16.09-4.fc17'],
                  'resume': False, 'agent': 'bowlofeggs'},
             force=True)
 
@@ -471,8 +471,8 @@ class TestPush(base.BaseTestCase):
         glob.assert_called_once_with('/mnt/koji/mash/updates/MASHING-*')
         publish.assert_called_once_with(
             topic='masher.start',
-            msg={'updates': ['ejabberd-16.09-4.fc17', 'python-nose-1.3.7-11.fc17',
-                             'python-paste-deploy-1.5.2-8.fc17'],
+            msg={'updates': ['python-nose-1.3.7-11.fc17', 'python-paste-deploy-1.5.2-8.fc17',
+                             'ejabberd-16.09-4.fc17'],
                  'resume': False, 'agent': 'bowlofeggs'},
             force=True)
         mock_file.assert_called_once_with('/mnt/koji/mash/updates/MASHING-f17-updates')
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+# Copyright © 2017 Red Hat, Inc.
+#
+# This file is part of Bodhi.
+#
+# This program is free software; you can redistribute it and/or
+# modify it under the terms of the GNU General Public License
+# as published by the Free Software Foundation; either version 2
+# of the License, or (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
+"""This module contains tests for the bodhi.server.stats module."""
+
+from collections import Counter
+from datetime import datetime
+import unittest
+
+from sqlalchemy.dialects import postgresql
+import mock
+
+from bodhi.server import models, stats
+from bodhi.server.views import generic, metrics
+from bodhi.tests.server import base
+
+
+class TestCountUpdates(base.BaseTestCase):
+    """Test count_updates()."""
+    def setUp(self):
+        super(TestCountUpdates, self).setUp()
+        update = self.create_update([u'python-nose-1.3.7-11.fc17'])
+        update.status = models.UpdateStatus.testing
+        update.type = models.UpdateType.security
+        update.date_submitted = datetime(2017, 8, 1)
+        self.db.flush()
+
+    def test_count_updates(self):
+        """The updates are counted by status, type and month."""
+        counts = stats.count_updates(self.db, [u'F17', u'F18'])
+
+        self.assertEqual(sorted(counts[u'F17']),
+                         [stats.UpdateCount(u'pending', u'bugfix', '1984/11', 1),
+                          stats.UpdateCount(u'testing', u'security', '2017/08', 1)])
+        self.assertEqual(counts[u'F18'], [])
+
+    def test_cached(self):
+        """The counts are cached until the updates are written."""
+        stats.count_updates(self.db, [u'F17'])
+
+        with self.assertStatementCount(0):
+            counts = stats.count_updates(self.db, [u'F17'])
+
+        self.assertEqual(sum(c.count for c in counts[u'F17']), 2)
+        models.Update.query.filter_by(title=u'bodhi-2.0-1.fc17').one().status = \
+            models.UpdateStatus.stable
+        self.db.flush()
+
+        counts = stats.count_updates(self.db, [u'F17'])
+
+        self.assertIn(stats.UpdateCount(u'stable', u'bugfix', '1984/11', 1), counts[u'F17'])
+
+    def test_get_update_counts(self):
+        """The home page counts of all the releases are counted with one query."""
+        request = mock.MagicMock(db=self.db)
+
+        with self.assertStatementCount(1):
+            counts = generic.get_update_counts(request, [u'F17', u'F18'])
+
+        self.assertEqual(counts[u'F17']['pending_updates_total'], 1)
+        self.assertEqual(counts[u'F17']['pending_bugfix_total'], 1)
+        self.assertEqual(counts[u'F17']['testing_security_total'], 1)
+        self.assertEqual(counts[u'F17']['stable_updates_total'], 0)
+        self.assertEqual(counts[u'F18']['testing_updates_total'], 0)
+
+
+class TestSumCounts(unittest.TestCase):
+    """Test sum_counts()."""
+    def test_sum_counts(self):
+        """The counts are summed by the values of one or more fields."""
+        counts = [stats.UpdateCount(u'testing', u'bugfix', '2017/07', 2),
+                  stats.UpdateCount(u'testing', u'bugfix', '2017/08', 3),
+                  stats.UpdateCount(u'stable', u'bugfix', '2017/08', 4)]
+
+        self.assertEqual(stats.sum_counts(counts, 'status'), {u'testing': 5, u'stable': 4})
+        self.assertEqual(stats.sum_counts(counts, 'type', 'month'),
+                         {(u'bugfix', '2017/07'): 2, (u'bugfix', '2017/08'): 7})
+
+
+class TestUpdateStats(base.BaseTestCase):
+    """Test the maintenance and rebuilding of the update_stats rows."""
+    def _rows(self):
+        """Return the update_stats rows that count something, as tuples."""
+        rows = []
+        for row in self.db.query(models.UpdateStats):
+            counters = tuple(getattr(row, name) for name in stats.STATS_COUNTERS)
+            if any(counters):
+                rows.append((row.release.name, row.type.value, row.status.value, row.day) +
+                            counters)
+        return sorted(rows)
+
+    def test_new_update(self):
+        """New updates are counted in the row of their release, type, status and day."""
+        update = self.create_update([u'python-nose-1.3.7-11.fc17'])
+        update.date_submitted = datetime(2017, 8, 1, 12)
+        self.db.flush()
+
+        self.assertIn((u'F17', u'bugfix', u'pending', datetime(2017, 8, 1).date(),
+                       1, 0, 0, 0, 0, 0), self._rows())
+
+    def test_comments(self):
+        """Comments are counted, and only the first feedback of an update counts."""
+        update = models.Update.query.one()
+        before = self._rows()
+
+        update.comment(self.db, u'Works', karma=1, author=u'bob')
+        update.comment(self.db, u'Works for me', karma=1, author=u'ralph')
+        update.comment(self.db, u'Hmm', karma=0, author=u'bob')
+        update.comment(self.db, u'Broken', karma=-1, author=u'someone', anonymous=True)
+        self.db.flush()
+
+        [row] = [r for r in self._rows() if r[0] == u'F17']
+        [previous] = [r for r in before if r[0] == u'F17']
+        self.assertEqual([a - b for a, b in zip(row[4:], previous[4:])],
+                         [0, 2, 1, 1, 1, int(previous[-1] == 0)])
+
+    def test_status_change(self):
+        """Updates whose status changes take their comments to the row of the new status."""
+        update = models.Update.query.one()
+        update.comment(self.db, u'Works', karma=1, author=u'bob')
+        self.db.flush()
+        counters = [r for r in self._rows() if r[0] == u'F17'][0][4:]
+
+        update.status = models.UpdateStatus.stable
+        update.comment(self.db, u'Still works', karma=1, author=u'ralph')
+        self.db.flush()
+
+        [row] = [r for r in self._rows() if r[0] == u'F17']
+        self.assertEqual(row[2], u'stable')
+        self.assertEqual(row[4:], (counters[0], counters[1] + 1) + counters[2:])
+
+    def test_status_change_expired(self):
+        """The statistics of an update leave the row of its old status once it was expired."""
+        update = models.Update.query.one()
+        self.db.flush()
+        before = [r for r in self._rows() if r[0] == u'F17']
+        self.db.expire(update)
+
+        update.status = models.UpdateStatus.stable
+        self.db.flush()
+
+        [row] = [r for r in self._rows() if r[0] == u'F17']
+        self.assertEqual(row[2], u'stable')
+        self.assertEqual(row[4:], before[0][4:])
+        self.assertNotEqual(before[0][2], u'stable')
+
+    def test_deleted_comments(self):
+        """Deleted comments leave their row, and the update stops counting as having feedback."""
+        update = models.Update.query.one()
+        before = self._rows()
+        update.comment(self.db, u'Works', karma=1, author=u'bob')
+        update.comment(self.db, u'Hmm', karma=0, author=u'ralph')
+        self.db.flush()
+
+        for comment in update.comments[-2:]:
+            self.db.delete(comment)
+        self.db.flush()
+
+        self.assertEqual(self._rows(), before)
+        self.assertEqual(stats.rebuild_update_stats(self.db), len(before))
+        self.assertEqual(self._rows(), before)
+
+    def test_deleted_update(self):
+        """Deleted updates leave their row with their comments."""
+        before = self._rows()
+        update = self.create_update([u'python-nose-1.3.7-11.fc17'])
+        update.comment(self.db, u'Works', karma=1, author=u'bob')
+        self.db.flush()
+
+        self.db.delete(update)
+        self.db.flush()
+
+        self.assertEqual(self._rows(), before)
+
+    def test_upsert_postgresql(self):
+        """PostgreSQL creates or updates each row with a single statement."""
+        session = mock.MagicMock()
+        session.get_bind.return_value.dialect = postgresql.dialect()
+        key = (1, models.UpdateType.bugfix, models.UpdateStatus.stable, datetime(2017, 8, 1).date())
+
+        stats._apply_deltas(session, {key: Counter(updates=1, positive_comments=0)})
+
+        [statement] = [c[0][0] for c in session.execute.call_args_list]
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+        self.assertIn('INSERT INTO update_stats', sql)
+        self.assertIn('ON CONFLICT ON CONSTRAINT update_stats_key DO UPDATE SET '
+                      'updates = (update_stats.updates + excluded.updates)', sql)
+        self.assertNotIn('positive_comments = ', sql)
+
+    def test_rebuild(self):
+        """Rebuilding the rows counts the same as maintaining them."""
+        update = models.Update.query.one()
+        update.comment(self.db, u'Works', karma=1, author=u'bob')
+        update.comment(self.db, u'Broken', karma=-1, author=u'someone', anonymous=True)
+        update.status = models.UpdateStatus.testing
+        other = self.create_update([u'python-nose-1.3.7-11.fc17'])
+        other.comment(self.db, u'Hmm', karma=0, author=u'ralph')
+        self.db.flush()
+        maintained = self._rows()
+
+        rows = stats.rebuild_update_stats(self.db)
+
+        self.assertEqual(self._rows(), maintained)
+        self.assertEqual(rows, len(maintained))
+
+    def test_compute_ticks_and_data(self):
+        """The metrics count the stable updates of each release and type from the rows."""
+        update = models.Update.query.one()
+        update.status = models.UpdateStatus.stable
+        self.db.flush()
+        releases = models.Release.query.all()
+
+        with self.assertStatementCount(1):
+            data, ticks = metrics.compute_ticks_and_data(
+                self.db, releases, {'bugfix': 'Bug fixes', 'security': 'Security updates'})
+
+        self.assertEqual(ticks, [[0, u'F17']])
+        self.assertEqual(sorted(data, key=lambda d: d['label']),
+                         [{'data': [[0, 1]], 'label': 'Bug fixes'},
+                          {'data': [[0, 0]], 'label': 'Security updates'}])
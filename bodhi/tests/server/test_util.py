@@ -720,6 +720,50 @@ class TestUtils(base.BaseTestCase):
         self.assertIn('Too many result pages, aborting at', log_debug.call_args[0][0])
 
 
+class TestEVRSortKey(base.BaseTestCase):
+    """Test the evr_sort_key() function."""
+    def assertOlder(self, older, newer):
+        """Assert that the older EVR sorts before the newer one."""
+        self.assertLess(util.evr_sort_key(older), util.evr_sort_key(newer))
+
+    def test_digits_only(self):
+        """The key must only be made of digits, so it sorts the same way in any collation."""
+        self.assertTrue(util.evr_sort_key(('1', '2.0~rc1^git3', 'Fc_26')).isdigit())
+
+    def test_epoch(self):
+        """The epoch wins over the version and release, and None is the same as 0."""
+        self.assertOlder(('0', '9.9', '9'), ('1', '1.0', '1'))
+        self.assertEqual(util.evr_sort_key((None, '1.0', '1')),
+                         util.evr_sort_key(('0', '1.0', '1')))
+
+    def test_equal(self):
+        """Versions that rpmvercmp considers equal have the same key."""
+        self.assertEqual(util.evr_sort_key(('0', '1.01', '1')),
+                         util.evr_sort_key(('0', '1.1', '1')))
+        self.assertEqual(util.evr_sort_key(('0', '1_0', '1')), util.evr_sort_key(('0', '1.0', '1')))
+
+    def test_ordering(self):
+        """The keys sort the same way rpm.labelCompare() sorts the EVRs."""
+        evrs = [
+            ('0', '1.0~rc1', '1'),
+            ('0', '1.0', '1'),
+            ('0', '1.0^git1', '1'),
+            ('0', '1.0a', '1'),
+            ('0', '1.0.1', '1'),
+            ('0', '1.2', '1'),
+            ('0', '1.10', '1.fc26'),
+            ('0', '1.10', '2.fc25'),
+            ('0', '1.10', '10.fc25'),
+            ('0', '1.10.A', '1'),
+            ('0', '1.10a', '1'),
+            ('0', '1.10.b', '1'),
+            ('0', '1.10.1', '1'),
+        ]
+
+        for older, newer in zip(evrs, evrs[1:]):
+            self.assertOlder(older, newer)
+
+
 class TestCMDFunctions(base.BaseTestCase):
     @mock.patch('bodhi.server.log.debug')
     @mock.patch('bodhi.server.log.error')
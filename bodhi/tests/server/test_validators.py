@@ -15,6 +15,7 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA  02110-1301, USA.
 """This module contains tests for bodhi.server.validators."""
+from collections import defaultdict
 import unittest
 
 import mock
@@ -50,6 +51,82 @@ class TestGetValidRequirements(unittest.TestCase):
         self.assertEqual(result, [])
 
 
+class TestPrefetchBuilds(unittest.TestCase):
+    """Test the prefetch_builds() function."""
+    def setUp(self):
+        self.request = mock.Mock()
+        self.request.buildinfo = defaultdict(dict)
+        self.request.validated = {'builds': ['bodhi-2.0-1.fc17', 'python-3.6-1.fc17']}
+
+    def test_prefetch(self):
+        """Assert that the builds and their tags are fetched in one multicall."""
+        self.request.koji.multiCall.return_value = [
+            [{'nvr': 'bodhi-2.0-1.fc17'}], [[{'name': 'f17-updates-candidate'}]],
+            [{'nvr': 'python-3.6-1.fc17'}], [[{'name': 'f17'}, {'name': 'f17-updates'}]]]
+
+        validators.prefetch_builds(self.request)
+
+        self.assertEqual(
+            self.request.buildinfo,
+            {'bodhi-2.0-1.fc17': {'info': {'nvr': 'bodhi-2.0-1.fc17'},
+                                  'tags': ['f17-updates-candidate']},
+             'python-3.6-1.fc17': {'info': {'nvr': 'python-3.6-1.fc17'},
+                                   'tags': ['f17', 'f17-updates']}})
+        self.assertEqual(self.request.koji.multiCall.call_count, 1)
+        self.assertEqual(
+            self.request.koji.getBuild.mock_calls,
+            [mock.call('bodhi-2.0-1.fc17'), mock.call('python-3.6-1.fc17')])
+        self.assertEqual(
+            self.request.koji.listTags.mock_calls,
+            [mock.call('bodhi-2.0-1.fc17'), mock.call('python-3.6-1.fc17')])
+
+    def test_faults_left_out(self):
+        """Assert that failed calls are left for the other validators to make again."""
+        fault = {'faultCode': 1000, 'faultString': 'No such build'}
+        self.request.koji.multiCall.return_value = [
+            [{'nvr': 'bodhi-2.0-1.fc17'}], fault, fault, fault]
+
+        validators.prefetch_builds(self.request)
+
+        self.assertEqual(
+            self.request.buildinfo,
+            {'bodhi-2.0-1.fc17': {'info': {'nvr': 'bodhi-2.0-1.fc17'}}, 'python-3.6-1.fc17': {}})
+
+    def test_multicall_failure(self):
+        """Assert that nothing is prefetched if the multicall fails."""
+        self.request.koji.multiCall.side_effect = IOError('Koji is down')
+
+        validators.prefetch_builds(self.request)
+
+        self.assertEqual(self.request.koji.multicall, False)
+        self.assertEqual(self.request.buildinfo,
+                         {'bodhi-2.0-1.fc17': {}, 'python-3.6-1.fc17': {}})
+
+    def test_already_fetched(self):
+        """Assert that builds that were already fetched are skipped."""
+        self.request.validated = {'builds': ['bodhi-2.0-1.fc17']}
+        self.request.buildinfo['bodhi-2.0-1.fc17']['info'] = {'nvr': 'bodhi-2.0-1.fc17'}
+
+        validators.prefetch_builds(self.request)
+
+        self.assertEqual(self.request.koji.multiCall.call_count, 0)
+
+
+class TestCacheNvrs(unittest.TestCase):
+    """Test the cache_nvrs() function."""
+    def test_prefetched_info(self):
+        """Assert that Koji is not asked about builds that were prefetched."""
+        request = mock.Mock()
+        request.buildinfo = defaultdict(dict)
+        request.buildinfo['bodhi-2.0-1.fc17']['info'] = {'nvr': 'bodhi-2.0-1.fc17'}
+
+        validators.cache_nvrs(request, 'bodhi-2.0-1.fc17')
+
+        self.assertEqual(request.buildinfo['bodhi-2.0-1.fc17']['nvr'],
+                         (u'bodhi', u'2.0', u'1.fc17'))
+        self.assertEqual(request.koji.getBuild.call_count, 0)
+
+
 @mock.patch.dict(
     'bodhi.server.validators.config',
     {'pagure_url': u'http://domain.local', 'admin_packager_groups': [u'provenpackager'],
@@ -19,7 +19,10 @@
 """Contains tests for the bodhi.server.views.search module."""
 import unittest
 
+import mock
+
 from bodhi.server import buildsys
+from bodhi.server.config import config
 from bodhi.server.views import search
 from bodhi.tests.server import base
 
@@ -38,6 +41,63 @@ class TestGetAllPackages(unittest.TestCase):
         self.assertEqual(result, ['nethack'])
 
 
+class TestPackageIndex(unittest.TestCase):
+    """Contains tests for the PackageIndex class."""
+    def setUp(self):
+        """Create an index of a few packages."""
+        self.loader = mock.MagicMock(return_value=[
+            'python-requests', 'requests', 'python-bodhi', 'bodhi', 'bodhi-client', 'bodhi'])
+        self.index = search.PackageIndex(loader=self.loader)
+
+    def test_search(self):
+        """Assert that prefix matches come first, then other matches, without duplicates."""
+        self.assertEqual(self.index.search('bodhi'), ['bodhi', 'bodhi-client', 'python-bodhi'])
+        self.assertEqual(self.index.search('quest'), ['python-requests', 'requests'])
+        self.assertEqual(self.index.search('nope'), [])
+        self.assertEqual(self.loader.call_count, 1)
+
+    def test_search_short_term(self):
+        """Assert that terms shorter than a trigram still match anywhere in the name."""
+        self.assertEqual(self.index.search('py'), ['python-bodhi', 'python-requests'])
+        self.assertEqual(self.index.search('q'), ['python-requests', 'requests'])
+
+    @mock.patch('bodhi.server.views.search.Thread')
+    def test_stale_index(self, Thread):
+        """Assert that a stale index is refreshed in the background and still used meanwhile."""
+        self.index.search('bodhi')
+        self.index.loaded_at -= config.get('search_packages.refresh_interval') + 1
+
+        self.assertEqual(self.index.search('bodhi'), ['bodhi', 'bodhi-client', 'python-bodhi'])
+        self.index.search('bodhi')
+
+        Thread.assert_called_once_with(target=self.index._refresh_in_background,
+                                       name='package-index-refresh')
+        Thread.return_value.start.assert_called_once_with()
+
+    @mock.patch.dict(config, {'search_packages.refresh_interval': 3600})
+    def test_fresh_index(self):
+        """Assert that a fresh index is not refreshed."""
+        self.index.search('bodhi')
+
+        with mock.patch.object(self.index, 'refresh_in_background') as refresh_in_background:
+            self.index.search('bodhi')
+
+        self.assertEqual(refresh_in_background.call_count, 0)
+
+    @mock.patch('bodhi.server.views.search.log.exception')
+    @mock.patch('bodhi.server.views.search.buildsys.release_session')
+    def test_background_refresh_error(self, release_session, exception):
+        """Assert that errors while refreshing in the background are logged."""
+        self.loader.side_effect = IOError('Koji is down')
+        self.index._refreshing = True
+
+        self.index._refresh_in_background()
+
+        exception.assert_called_once_with('Unable to refresh the package index')
+        release_session.assert_called_once_with()
+        self.assertFalse(self.index._refreshing)
+
+
 class TestSearchPackages(base.BaseTestCase):
     """Contains tests for the search_packages() view."""
     def test_match(self):
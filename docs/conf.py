@@ -223,7 +223,13 @@ man_pages = [
     ('man_pages/initialize_bodhi_db', 'initialize_bodhi_db', u'intialize bodhi\'s database',
      ['Randy Barlow'], 1),
     ('man_pages/bodhi-check-policies', 'bodhi-check-policies', u'check policies',
-     ['Matt Jia'], 1)
+     ['Matt Jia'], 1),
+    ('man_pages/bodhi-backfill-evr', 'bodhi-backfill-evr', u'store the EVR of RPM builds',
+     ['Bodhi developers'], 1),
+    ('man_pages/bodhi-check-karma', 'bodhi-check-karma', u'check the karma counters of updates',
+     ['Bodhi developers'], 1),
+    ('man_pages/bodhi-rebuild-stats', 'bodhi-rebuild-stats', u'rebuild the statistics of updates',
+     ['Bodhi developers'], 1)
 ]
 
 # If true, show URL addresses after external links.
@@ -160,6 +160,9 @@ setup(
     bodhi-approve-testing = bodhi.server.scripts.approve_testing:main
     bodhi-manage-releases = bodhi.server.scripts.manage_releases:main
     bodhi-check-policies = bodhi.server.scripts.check_policies:check
+    bodhi-backfill-evr = bodhi.server.scripts.backfill_evr:backfill
+    bodhi-check-karma = bodhi.server.scripts.check_karma:check
+    bodhi-rebuild-stats = bodhi.server.scripts.rebuild_stats:rebuild
     [moksha.consumer]
     masher = bodhi.server.consumers.masher:Masher
     updates = bodhi.server.consumers.updates:UpdatesHandler
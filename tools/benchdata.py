@@ -0,0 +1,78 @@
+""" benchdata.py
+
+Rows for the benchmarks in this directory, in an in-memory database. The benchmarks are run as
+``python tools/<benchmark>.py``, which puts this directory on the path so they can import this
+module without depending on Bodhi's test suite.
+"""
+
+from datetime import datetime, timedelta
+
+from bodhi.server import initialize_db, Session
+from bodhi.server.models import (
+    Base, BuildrootOverride, Group, RpmBuild, RpmPackage, Release, ReleaseState, TestCase,
+    TestGatingStatus, Update, UpdateRequest, UpdateType, User)
+
+
+def create_db():
+    """ Return a session of a new, empty, in-memory database. """
+    engine = initialize_db({'sqlalchemy.url': 'sqlite://'})
+    Base.metadata.create_all(bind=engine)
+    return Session()
+
+
+def populate(db, version=17):
+    """ Add the guest user, the packager groups and the Fedora release of the given version. """
+    user = User(name=u'guest', email=u'guest@example.com')
+    db.add(user)
+    packager = Group(name=u'packager')
+    db.add(packager)
+    db.add(Group(name=u'provenpackager'))
+    user.groups.append(packager)
+    tag = u'f%d' % version
+    db.add(Release(
+        name=u'F%d' % version, long_name=u'Fedora %d' % version,
+        id_prefix=u'FEDORA', version=unicode(version),
+        dist_tag=tag, stable_tag=tag + u'-updates',
+        testing_tag=tag + u'-updates-testing',
+        candidate_tag=tag + u'-updates-candidate',
+        pending_signing_tag=tag + u'-updates-testing-signing',
+        pending_testing_tag=tag + u'-updates-testing-pending',
+        pending_stable_tag=tag + u'-updates-pending',
+        override_tag=tag + u'-override',
+        branch=tag, state=ReleaseState.current))
+    db.flush()
+
+
+def create_update(db, build_nvrs, release_name=u'F17', request=UpdateRequest.testing):
+    """
+    Create an update of the given builds, each with a package, a test case and an override.
+
+    The release must already exist, see populate().
+    """
+    release = db.query(Release).filter_by(name=release_name).one()
+    user = db.query(User).filter_by(name=u'guest').one()
+
+    builds = []
+    for nvr in build_nvrs:
+        name = nvr.rsplit('-', 2)[0]
+        package = db.query(RpmPackage).filter_by(name=name).first()
+        if package is None:
+            package = RpmPackage(name=name)
+            db.add(package)
+            user.packages.append(package)
+            testcase = TestCase(name=u'Wat')
+            db.add(testcase)
+            package.test_cases.append(testcase)
+
+        builds.append(RpmBuild(nvr=nvr, release=release, package=package, signed=True))
+        db.add(builds[-1])
+        db.add(BuildrootOverride(build=builds[-1], submitter=user, notes=u'blah blah blah',
+                                 expiration_date=datetime.utcnow() + timedelta(days=1)))
+
+    update = Update(
+        title=u', '.join(build_nvrs), builds=builds, user=user, request=request,
+        notes=u'Useful details!', release=release, date_submitted=datetime(1984, 11, 2),
+        requirements=u'rpmlint', stable_karma=3, unstable_karma=-3,
+        type=UpdateType.bugfix, test_gating_status=TestGatingStatus.passed)
+    db.add(update)
+    return update
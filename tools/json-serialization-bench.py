@@ -0,0 +1,116 @@
+""" json-serialization-bench.py
+
+Time the JSON serialization of a page of updates, with their comments, builds, bugs and test
+cases, with the cached serialization plans of BodhiBase._to_json and with the uncached serializer
+it replaced. Both must produce the same JSON.
+
+Usage: python tools/json-serialization-bench.py [updates] [comments] [rounds]
+"""
+
+from datetime import datetime
+import json
+import sys
+import time
+
+from bodhi.server import models
+from bodhi.server.config import config
+import benchdata
+
+
+def legacy_to_json(obj, seen=None, request=None, anonymize=False):
+    """ Serialize obj the way BodhiBase._to_json() did before it cached its plans. """
+    if not seen:
+        seen = []
+    if not obj:
+        return
+
+    exclude = getattr(obj, '__exclude_columns__', [])
+    properties = list(models.class_mapper(type(obj)).iterate_properties)
+    rels = [p.key for p in properties if type(p) is models.RelationshipProperty]
+    attrs = [p.key for p in properties if p.key not in rels]
+    d = dict([(attr, getattr(obj, attr)) for attr in attrs
+              if attr not in exclude and not attr.startswith('_')])
+
+    for name in getattr(obj, '__include_extras__', []):
+        attribute = getattr(obj, name)
+        if callable(attribute):
+            attribute = attribute(request)
+        d[name] = attribute
+
+    for attr in rels:
+        if attr in exclude:
+            continue
+        target = getattr(type(obj), attr).property.mapper.class_
+        if target in seen:
+            continue
+        d[attr] = legacy_expand(obj, getattr(obj, attr), seen, request)
+
+    for key, value in d.iteritems():
+        if isinstance(value, datetime):
+            d[key] = value.strftime('%Y-%m-%d %H:%M:%S')
+        if isinstance(value, models.EnumSymbol):
+            d[key] = unicode(value)
+
+    if anonymize:
+        for key1, key2 in getattr(obj, '__anonymity_map__', {}).items():
+            if getattr(obj, key2):
+                d[key1] = 'anonymous'
+
+    return d
+
+
+def legacy_expand(obj, relation, seen, req):
+    """ Expand a relationship the way BodhiBase._expand() did before it cached its plans. """
+    if hasattr(relation, 'all'):
+        relation = relation.all()
+    if hasattr(relation, '__iter__'):
+        return [legacy_expand(obj, item, seen, req) for item in relation]
+    if type(relation) not in seen:
+        return legacy_to_json(relation, seen + [type(obj)], req)
+    else:
+        return relation.id
+
+
+def serialize(update, to_json):
+    """ Serialize the update the way Update.__json__ does, with the given serializer. """
+    result = to_json(update)
+    result['test_cases'] = [to_json(test, seen=[models.Package, models.TestCaseKarma])
+                            for test in update.full_test_cases]
+    return json.dumps(result)
+
+
+def clock(name, func, rounds):
+    """ Run func rounds times and print how long each run took on average. """
+    start = time.time()
+    for i in range(rounds):
+        func()
+    print '%-40s %8.2fms' % (name, (time.time() - start) * 1000 / rounds)
+
+
+def main(updates=100, comments=5, rounds=20):
+    config['libravatar_enabled'] = False
+    db = benchdata.create_db()
+    benchdata.populate(db)
+    user = db.query(models.User).filter_by(name=u'guest').one()
+
+    print 'Creating %d updates with %d comments each' % (updates, comments)
+    page = []
+    for i in range(updates):
+        update = benchdata.create_update(db, [u'package-%d-1.0-1.fc17' % i])
+        update.bugs.append(models.Bug(bug_id=100000 + i))
+        for j in range(comments):
+            db.add(models.Comment(text=u'Comment %d' % j, karma=j % 3 - 1, user=user,
+                                  update=update))
+        page.append(update)
+    db.flush()
+
+    legacy = [serialize(u, legacy_to_json) for u in page]
+    cached = [serialize(u, u._to_json) for u in page]
+    assert legacy == cached, 'The serializers produce different JSON'
+
+    clock('uncached serializer', lambda: [serialize(u, legacy_to_json) for u in page], rounds)
+    clock('cached serialization plans', lambda: [serialize(u, u._to_json) for u in page], rounds)
+
+
+if __name__ == '__main__':
+    main(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,161 @@
+""" koji-simulator-bench.py
+
+Time Bodhi's Koji access patterns against the in-memory Koji simulator, with a
+stable tag holding a realistic number of builds: individual Koji calls, the
+validators of a new update, the tagging phases of a testing push by the masher,
+and the ExtendedMetadata of the testing and stable repositories.
+
+Usage: python tools/koji-simulator-bench.py [builds] [latency] [failure_rate] [updates]
+"""
+
+from collections import defaultdict
+import logging
+import shutil
+import sys
+import tempfile
+import time
+
+from cornice.errors import Errors
+from munch import Munch
+
+from bodhi.server import buildsys, models, validators
+from bodhi.server.config import config
+from bodhi.server.consumers.masher import MasherThread
+from bodhi.server.metadata import ExtendedMetadata
+import benchdata
+
+
+def clock(name, func):
+    """ Run func, print how long it took and how many round trips it made. """
+    simulator = buildsys._buildsystem
+    round_trips = simulator.round_trips
+    start = time.time()
+    result = func()
+    print '%-40s %8.3fs %6d round trips' % (name, time.time() - start,
+                                            simulator.round_trips - round_trips)
+    return result
+
+
+def koji_calls(session, nvrs, candidates):
+    """ Time the individual Koji calls Bodhi makes the most. """
+    clock('getLatestBuilds(f26-updates)', lambda: session.getLatestBuilds('f26-updates'))
+    clock('listTagged(f26-updates, latest=True)',
+          lambda: session.listTagged('f26-updates', latest=True))
+
+    def sequential():
+        for nvr in nvrs[:100]:
+            session.getBuild(nvr)
+            session.listTags(nvr)
+    clock('getBuild + listTags x100, sequential', sequential)
+
+    def multicall():
+        session.multicall = True
+        for nvr in nvrs[:100]:
+            session.getBuild(nvr)
+            session.listTags(nvr)
+        session.multiCall()
+    clock('getBuild + listTags x100, multicall', multicall)
+
+    def move():
+        session.multicall = True
+        for nvr in candidates:
+            session.moveBuild('f26-updates-candidate', 'f26-updates-testing', nvr)
+        tasks = [task[0] for task in session.multiCall() if isinstance(task, list)]
+        buildsys.wait_for_tasks(tasks, session, sleep=15)
+    clock('moveBuild x200 + wait_for_tasks', move)
+
+
+def validate(db, session, builds):
+    """ Run the validators of a new update of the given builds, and return its errors. """
+    request = Munch(db=db, koji=session, buildinfo=defaultdict(dict), errors=Errors(),
+                    validated={'builds': builds, 'edited': None},
+                    user=Munch(name=u'guest', groups=[Munch(name=u'packager')]))
+    for validator in (validators.prefetch_builds, validators.validate_nvrs,
+                      validators.validate_builds, validators.validate_uniqueness,
+                      validators.validate_build_tags, validators.validate_acls):
+        validator(request)
+    return list(request.errors)
+
+
+def push(db, titles, mash_dir):
+    """ Run the phases of a testing push that talk to Koji, without mashing. """
+    thread = MasherThread(u'F26', 'testing', titles, u'bodhi', logging.getLogger('bodhi'),
+                          None, mash_dir)
+    thread.db = db
+    thread.release = db.query(models.Release).filter_by(name=u'F26').one()
+    thread.id = thread.release.testing_tag
+    thread.skip_mash = False
+    thread.init_state()
+    thread.init_path()
+    thread.load_updates()
+    thread.verify_updates()
+    thread.determine_and_perform_tag_actions()
+    thread.remove_pending_tags()
+    return thread.updates
+
+
+def main(builds=20000, latency=0.05, failure_rate=0.0, updates=200):
+    config['libravatar_enabled'] = False
+    buildsys.setup_buildsystem({'buildsystem': 'simulator',
+                                'koji_simulator.latency': latency,
+                                'koji_simulator.failure_rate': failure_rate,
+                                'koji_simulator.seed': 0})
+    simulator = buildsys._buildsystem
+    print 'Populating f26-updates with %d builds' % builds
+    nvrs = simulator.populate('f26-updates', builds, packages=builds // 4)
+    candidates = simulator.populate('f26-updates-candidate', 200, release='2.fc26')
+    for tag in ('f26', 'f26-updates-testing', 'f26-updates-testing-pending',
+                'f26-updates-pending', 'f26-updates-testing-signing', 'f26-override'):
+        simulator.add_tag(tag)
+    session = buildsys.get_session()
+
+    koji_calls(session, nvrs, candidates)
+
+    print
+    print 'Creating %d testing updates' % updates
+    db = benchdata.create_db()
+    benchdata.populate(db, version=26)
+    titles = []
+    for i in range(updates):
+        nvr = u'update%05d-1.0-1.fc26' % i
+        simulator.add_build(nvr, tags=['f26-updates-candidate', 'f26-updates-testing-pending'])
+        update = benchdata.create_update(db, [nvr], release_name=u'F26')
+        update.alias = u'FEDORA-2017-%010d' % i
+        titles.append(update.title)
+    # Updates of a part of the stable builds, for the metadata of the stable repository
+    for i, nvr in enumerate(nvrs[:updates]):
+        update = benchdata.create_update(db, [unicode(nvr)], release_name=u'F26',
+                                         request=None)
+        update.status = models.UpdateStatus.stable
+        update.alias = u'FEDORA-2016-%010d' % i
+    db.flush()
+
+    submitted = simulator.populate('f26-updates-candidate', 20, release='3.fc26')
+    errors = clock('validators, 20 new builds', lambda: validate(db, session, submitted))
+    assert not errors, errors
+
+    mash_dir = tempfile.mkdtemp()
+    try:
+        pushed = clock('masher tag actions, %d updates' % updates,
+                       lambda: push(db, titles, mash_dir))
+        assert len(pushed) == updates, 'Updates were ejected from the push'
+        for update in pushed:
+            update.status = models.UpdateStatus.testing
+            update.request = None
+        db.flush()
+
+        release = db.query(models.Release).filter_by(name=u'F26').one()
+        clock('ExtendedMetadata, testing', lambda: ExtendedMetadata(
+            release, models.UpdateRequest.testing, db, mash_dir))
+        clock('ExtendedMetadata, stable', lambda: ExtendedMetadata(
+            release, models.UpdateRequest.stable, db, mash_dir))
+    finally:
+        shutil.rmtree(mash_dir)
+
+    print
+    for method, count in sorted(simulator.calls.items()):
+        print '%-40s %8d calls' % (method, count)
+
+
+if __name__ == '__main__':
+    main(*[cast(arg) for cast, arg in zip((int, float, float, int), sys.argv[1:])])
@@ -23,10 +23,12 @@ from datetime import timedelta
 from operator import itemgetter
 import sys
 
-from sqlalchemy.sql import and_
+from sqlalchemy import and_, case, distinct, false, func, true
 
 from bodhi.server import Session, initialize_db
-from bodhi.server.models import Update, Release, UpdateStatus, UpdateType
+from bodhi.server.models import (Bug, Build, Comment, Group, Package, Release, Update, UpdateStats,
+                                 UpdateStatus, User)
+from bodhi.server.stats import IGNORED_COMMENTERS, STATS_COUNTERS, sum_update_stats
 from bodhi.server.util import header, get_critpath_components
 import bodhi
 
@@ -34,13 +36,25 @@ import bodhi
 statuses = ('stable', 'testing', 'pending', 'obsolete')
 types = ('bugfix', 'enhancement', 'security', 'newpackage')
 
+TESTING_MSG = 'This update has been pushed to testing'
+STABLE_MSG = 'This update has been pushed to stable'
+STABLE_KARMA_MSG = ('This update has reached the stable karma threshold and will be pushed to the '
+                    'stable updates repository')
+TESTING_TIME_MSG = 'days in testing and can be pushed to stable now if the maintainer wishes'
 
-def short_url(update):
-    if not update.builds:
-        print('%s missing builds' % update.title)
+
+def short_url(title, nvr):
+    """Return the URL of an update with the given title and first build, if it has one."""
+    if nvr is None:
+        print('%s missing builds' % title)
         return ''
     else:
-        return 'https://admin.fedoraproject.org/updates/%s' % update.builds[0].nvr
+        return 'https://admin.fedoraproject.org/updates/%s' % nvr
+
+
+def _first(condition):
+    """Return the SQL expression of the time of the first comment matching the condition."""
+    return func.min(case([(condition, Comment.timestamp)]))
 
 
 def main(releases=None):
@@ -50,14 +64,17 @@ def main(releases=None):
     stats = {}  # {release: {'stat': ...}}
     feedback = 0  # total number of updates that received feedback
     karma = defaultdict(int)  # {username: # of karma submissions}
-    num_updates = db.query(Update).count()
+    num_updates = sum(row[0] for row in sum_update_stats(db, []))
 
     for release in db.query(Release).all():
         if releases and release.name not in releases:
             continue
-        updates = db.query(Update).filter_by(release=release)
+        in_release = Update.release_id == release.id
         critpath_pkgs = get_critpath_components(release.name.lower())
-        total = updates.count()
+        # The counts of updates, karma and feedback come from the update_stats rollup.
+        counts = [dict(zip(('status', 'type') + STATS_COUNTERS, row)) for row in sum_update_stats(
+            db, [UpdateStats.status, UpdateStats.type], UpdateStats.release_id == release.id)]
+        total = sum(c['updates'] for c in counts)
         if not total:
             continue
         print header(release.long_name)
@@ -65,8 +82,8 @@ def main(releases=None):
             'num_updates': total,
             'num_tested': 0,
             'num_tested_without_karma': 0,
-            'num_feedback': 0,
-            'num_anon_feedback': 0,
+            'num_feedback': sum(c['updates_with_feedback'] for c in counts),
+            'num_anon_feedback': sum(c['anonymous_feedback'] for c in counts),
             'critpath_pkgs': defaultdict(int),
             'num_critpath': 0,
             'num_critpath_approved': 0,
@@ -77,10 +94,10 @@ def main(releases=None):
             'conflicted_proventesters': [],
             'critpath_positive_karma_including_proventesters': [],
             'critpath_positive_karma_negative_proventesters': [],
-            'stable_with_negative_karma': updates.filter(
-                and_(Update.status == UpdateStatus.stable,
-                     Update.karma < 0)).count(),
-            'bugs': set(),
+            'stable_with_negative_karma': db.query(func.count(Update.id)).filter(
+                in_release, Update.status == UpdateStatus.stable, Update.karma < 0).scalar(),
+            'bugs': db.query(func.count(distinct(Bug.bug_id))).select_from(Update).join(
+                Update.bugs).filter(in_release).scalar(),
             'karma': defaultdict(int),
             'deltas': [],
             'occurrences': {},
@@ -92,135 +109,116 @@ def main(releases=None):
             'proventesters_-1': 0,
             'submitters': defaultdict(int),
             # for tracking number of types of karma
-            '1': 0,
-            '0': 0,
-            '-1': 0,
+            '1': sum(c['positive_comments'] for c in counts),
+            '0': sum(c['neutral_comments'] for c in counts),
+            '-1': sum(c['negative_comments'] for c in counts),
         }
         data = stats[release.name]
+        feedback += data['num_feedback']
 
         for status in statuses:
-            data['num_%s' % status] = updates.filter(
-                and_(Update.status == UpdateStatus.from_string(status))).count()
+            data['num_%s' % status] = sum(
+                c['updates'] for c in counts if c['status'].value == status)
 
         for type in types:
-            data['num_%s' % type] = updates.filter(
-                Update.type == UpdateType.from_string(type)).count()
-
-        for update in updates.all():
-            assert update.user, update.title
-            data['submitters'][update.user.name] += 1
-            for build in update.builds:
-                data['packages'][build.package.name] += 1
-                if build.package.name in critpath_pkgs:
-                    data['critpath_pkgs'][build.package.name] += 1
-            for bug in update.bugs:
-                data['bugs'].add(bug.bug_id)
-
-            feedback_done = False
-            testingtime_done = False
-            stablekarma_done = False
-
-            for comment in update.comments:
-                if not comment.user:
-                    print('Error: None comment for %s' % update.title)
-                if comment.user.name == 'autoqa':
-                    continue
-
-                # Track the # of +1's, -1's, and +0's.
-                if comment.user.name != 'bodhi':
-                    data[str(comment.karma)] += 1
-
-                if 'proventesters' in [g.name for g in comment.user.groups]:
-                    data['proventesters'].add(comment.user.name)
-                    data['proventesters_%d' % comment.karma] += 1
-
-                if update.status == UpdateStatus.stable:
-                    if not stablekarma_done:
-                        if comment.text == (
-                                'This update has reached the stable karma threshold and will be '
-                                'pushed to the stable updates repository'):
-                            data['num_stablekarma'] += 1
-                            stablekarma_done = True
-                        elif comment.text and comment.text.endswith(
-                                'days in testing and can be pushed to stable now if the maintainer '
-                                'wishes'):
-                            data['num_testingtime'] += 1
-                            stablekarma_done = True
-
-                # For figuring out if an update has received feedback or not
-                if not feedback_done:
-                    if (not comment.user.name == 'bodhi' and
-                            comment.karma != 0 and not comment.anonymous):
-                        data['num_feedback'] += 1  # per-release tracking of feedback
-                        feedback += 1  # total number of updates that have received feedback
-                        feedback_done = True  # so we don't run this for each comment
-
-                # Tracking per-author karma & anonymous feedback
-                if not comment.user.name == 'bodhi':
-                    if comment.anonymous:
-                        # @@: should we track anon +0 comments as "feedback"?
-                        if comment.karma != 0:
-                            data['num_anon_feedback'] += 1
-                    else:
-                        author = comment.user.name
-                        data['karma'][author] += 1
-                        karma[author] += 1
-
-                if (not testingtime_done and
-                        comment.text == 'This update has been pushed to testing'):
-                    for othercomment in update.comments:
-                        if othercomment.text == 'This update has been pushed to stable':
-                            delta = othercomment.timestamp - comment.timestamp
-                            data['deltas'].append(delta)
-                            data['occurrences'][delta.days] = \
-                                data['occurrences'].setdefault(
-                                    delta.days, 0) + 1
-                            data['accumulative'] += delta
-                            testingtime_done = True
-                            break
-
-            if update.critpath:
-                if update.critpath_approved or update.status == UpdateStatus.stable:
-                    data['num_critpath_approved'] += 1
-                else:
-                    if update.status in (UpdateStatus.testing, UpdateStatus.pending):
-                        data['num_critpath_unapproved'] += 1
-                data['num_critpath'] += 1
-                if update.status == UpdateStatus.stable and update.karma == 0:
-                    data['critpath_without_karma'].add(update)
-
-                # Proventester metrics
-                proventester_karma = defaultdict(int)  # {username: karma}
-                positive_proventesters = 0
-                negative_proventesters = 0
-                for comment in update.comments:
-                    if 'proventesters' in [g.name for g in comment.user.groups]:
-                        proventester_karma[comment.user.name] += comment.karma
-                for _karma in proventester_karma.values():
-                    if _karma > 0:
-                        positive_proventesters += 1
-                    elif _karma < 0:
-                        negative_proventesters += 1
-
-                # Conflicting proventesters
-                if positive_proventesters and negative_proventesters:
-                    data['conflicted_proventesters'] += [short_url(update)]
-
-                # Track updates with overall positive karma, including positive
-                # karma from a proventester
-                if update.karma > 0 and positive_proventesters:
-                    data['critpath_positive_karma_including_proventesters'] += [short_url(update)]
-
-                # Track updates with overall positive karma, including negative
-                # karma from a proventester
-                if update.karma > 0 and negative_proventesters:
-                    data['critpath_positive_karma_negative_proventesters'] += [short_url(update)]
-
-            if testingtime_done:
+            data['num_%s' % type] = sum(c['updates'] for c in counts if c['type'].value == type)
+
+        data['submitters'].update(db.query(User.name, func.count(Update.id)).select_from(
+            Update).join(Update.user).filter(in_release).group_by(User.name))
+        data['packages'].update(db.query(Package.name, func.count(Build.nvr)).select_from(
+            Build).join(Build.package).join(Build.update).filter(in_release).group_by(
+            Package.name))
+        for name, count in data['packages'].items():
+            if name in critpath_pkgs:
+                data['critpath_pkgs'][name] = count
+
+        # Tracking per-author karma
+        for author, count in db.query(User.name, func.count(Comment.id)).select_from(
+                Comment).join(Comment.user).join(Comment.update).filter(
+                in_release, Comment.anonymous == false(),
+                User.name.notin_(IGNORED_COMMENTERS)).group_by(User.name):
+            data['karma'][author] += count
+            karma[author] += count
+
+        for author, comment_karma, count in db.query(
+                User.name, Comment.karma, func.count(Comment.id)).select_from(Comment).join(
+                Comment.user).join(User.groups).join(Comment.update).filter(
+                in_release, Group.name == u'proventesters', User.name != u'autoqa').group_by(
+                User.name, Comment.karma):
+            data['proventesters'].add(author)
+            data['proventesters_%d' % comment_karma] += count
+
+        # When each update first got each of these comments, and whether it received feedback
+        feedback_given = and_(Comment.karma != 0, Comment.anonymous == false(),
+                              User.name != u'bodhi')
+        timeline = db.query(
+            Update.status, _first(Comment.text == TESTING_MSG), _first(Comment.text == STABLE_MSG),
+            _first(Comment.text == STABLE_KARMA_MSG),
+            _first(Comment.text.endswith(TESTING_TIME_MSG)),
+            func.max(case([(feedback_given, 1)], else_=0))).select_from(Comment).join(
+            Comment.update).join(Comment.user).filter(
+            in_release, User.name != u'autoqa').group_by(Update.id, Update.status)
+        for status, testing, stable, stablekarma, testingtime, got_feedback in timeline:
+            if status == UpdateStatus.stable:
+                if stablekarma is not None and (testingtime is None or stablekarma <= testingtime):
+                    data['num_stablekarma'] += 1
+                elif testingtime is not None:
+                    data['num_testingtime'] += 1
+            if testing is not None and stable is not None:
+                delta = stable - testing
+                data['deltas'].append(delta)
+                data['occurrences'][delta.days] = data['occurrences'].setdefault(delta.days, 0) + 1
+                data['accumulative'] += delta
                 data['num_tested'] += 1
-                if not feedback_done:
+                if not got_feedback:
                     data['num_tested_without_karma'] += 1
 
+        # Proventester metrics
+        proventester_karma = defaultdict(list)  # {update id: [karma of each proventester]}
+        for update_id, proventester in db.query(Comment.update_id, func.sum(Comment.karma)).join(
+                Comment.user).join(User.groups).join(Comment.update).filter(
+                in_release, Update.critpath == true(), Group.name == u'proventesters').group_by(
+                Comment.update_id, User.name):
+            proventester_karma[update_id].append(proventester)
+
+        critpath = db.query(
+            Update.id, Update.title, Update.status, Update.karma, func.min(Build.nvr)).outerjoin(
+            Update.builds).filter(in_release, Update.critpath == true()).group_by(
+            Update.id, Update.title, Update.status, Update.karma)
+        # Only the updates that aren't stable yet need to be loaded to know if they were approved.
+        approved = set(update.id for update in db.query(Update).options(
+            *Update.loading_profile('list')).filter(
+            in_release, Update.critpath == true(), Update.status != UpdateStatus.stable)
+            if update.critpath_approved)
+        for update_id, title, status, update_karma, nvr in critpath:
+            if update_id in approved or status == UpdateStatus.stable:
+                data['num_critpath_approved'] += 1
+            else:
+                if status in (UpdateStatus.testing, UpdateStatus.pending):
+                    data['num_critpath_unapproved'] += 1
+            data['num_critpath'] += 1
+            if status == UpdateStatus.stable and update_karma == 0:
+                data['critpath_without_karma'].add(update_id)
+
+            positive_proventesters = len([k for k in proventester_karma[update_id] if k > 0])
+            negative_proventesters = len([k for k in proventester_karma[update_id] if k < 0])
+
+            # Conflicting proventesters
+            if positive_proventesters and negative_proventesters:
+                data['conflicted_proventesters'] += [short_url(title, nvr)]
+
+            # Track updates with overall positive karma, including positive
+            # karma from a proventester
+            if update_karma > 0 and positive_proventesters:
+                data['critpath_positive_karma_including_proventesters'] += [
+                    short_url(title, nvr)]
+
+            # Track updates with overall positive karma, including negative
+            # karma from a proventester
+            if update_karma > 0 and negative_proventesters:
+                data['critpath_positive_karma_negative_proventesters'] += [
+                    short_url(title, nvr)]
+
         data['deltas'].sort()
 
         print " * %d updates" % data['num_updates']
@@ -231,7 +229,7 @@ def main(releases=None):
             print " * %d %s updates (%0.2f%%)" % (
                 data['num_%s' % type], type,
                 float(data['num_%s' % type]) / data['num_updates'] * 100)
-        print " * %d bugs resolved" % len(data['bugs'])
+        print " * %d bugs resolved" % data['bugs']
         print " * %d critical path updates (%0.2f%%)" % (
             data['num_critpath'], float(data['num_critpath']) / data['num_updates'] * 100)
         print " * %d approved critical path updates" % (